@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CalculosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'calculos'
+
+    def ready(self):
+        if getattr(settings, 'CALCULOS_AQUECER_FORMULAS', False):
+            from .formulas import aquecer_cache_formulas
+            aquecer_cache_formulas()
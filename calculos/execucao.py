@@ -0,0 +1,144 @@
+# calculos/execucao.py
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+# ==============================================================================
+# CONJUNTO LIMITADO DE TRABALHADORES PARA AS VIEWS ASSÍNCRONAS
+# ==============================================================================
+# Os serviços de cálculo e o WeasyPrint são síncronos e ocupam o CPU. Nas views
+# assíncronas correm aqui, fora do ciclo de eventos, para que um PDF ou uma sapata
+# demorados não atrasem os pedidos rápidos (histórico, páginas sem cálculo).
+# Configuração (settings): CALCULOS_MAX_WORKERS, CALCULOS_MAX_PENDENTES e
+# CALCULOS_TIPO_POOL ('threads' ou 'processos').
+
+class FilaCheia(Exception):
+    """Já existem CALCULOS_MAX_PENDENTES tarefas em execução ou à espera."""
+
+_executor = None
+_executor_threads = None
+_pendentes = 0
+_trinco = threading.Lock()
+
+def obter_executor(threads=False):
+    """
+    Executor partilhado, criado no primeiro uso com a configuração atual. Com
+    threads=True devolve sempre um conjunto de threads (para resultados que não
+    passam entre processos, como os documentos do WeasyPrint): no modo 'processos'
+    é um segundo conjunto, com o mesmo nº de trabalhadores.
+    """
+    global _executor, _executor_threads
+    with _trinco:
+        if _executor is None:
+            if settings.CALCULOS_TIPO_POOL == 'processos':
+                _executor = ProcessPoolExecutor(max_workers=settings.CALCULOS_MAX_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=settings.CALCULOS_MAX_WORKERS, thread_name_prefix='calculos')
+        if not threads or isinstance(_executor, ThreadPoolExecutor):
+            return _executor
+        if _executor_threads is None:
+            _executor_threads = ThreadPoolExecutor(max_workers=settings.CALCULOS_MAX_WORKERS, thread_name_prefix='calculos')
+        return _executor_threads
+
+def encerrar_executor(esperar=True):
+    """Encerra os executores (são recriados no próximo uso, p. ex. após alterar a configuração)."""
+    global _executor, _executor_threads
+    with _trinco:
+        executores = (_executor, _executor_threads)
+        _executor = _executor_threads = None
+    for executor in executores:
+        if executor is not None:
+            executor.shutdown(wait=esperar)
+
+def tarefas_pendentes():
+    return _pendentes
+
+def fila_cheia():
+    return _pendentes >= settings.CALCULOS_MAX_PENDENTES
+
+def _reservar():
+    global _pendentes
+    with _trinco:
+        if _pendentes >= settings.CALCULOS_MAX_PENDENTES:
+            raise FilaCheia("Demasiados cálculos em curso.")
+        _pendentes += 1
+
+def _libertar():
+    global _pendentes
+    with _trinco:
+        _pendentes -= 1
+
+def _submeter(executor, funcao, *args, **kwargs):
+    """
+    executor.submit com uma vaga reservada. Devolve um Future que só termina depois de
+    libertada a vaga, para quem espera pelo resultado poder logo submeter outra tarefa.
+    """
+    _reservar()
+    try:
+        tarefa = executor.submit(funcao, *args, **kwargs)
+    except BaseException:
+        _libertar()
+        raise
+    futuro = Future()
+
+    def concluir(tarefa):
+        _libertar()
+        try:
+            if tarefa.cancelled():
+                futuro.cancel()
+            elif tarefa.exception() is not None:
+                futuro.set_exception(tarefa.exception())
+            else:
+                futuro.set_result(tarefa.result())
+        except InvalidStateError:  # já cancelado por quem o pediu
+            pass
+
+    futuro.add_done_callback(lambda futuro: futuro.cancelled() and tarefa.cancel())
+    tarefa.add_done_callback(concluir)
+    return futuro
+
+def submeter(funcao, *args, **kwargs):
+    """
+    Executor.submit contado em CALCULOS_MAX_PENDENTES (a vaga é libertada quando a
+    tarefa termina ou é cancelada). Levanta FilaCheia com a fila cheia.
+    """
+    return _submeter(obter_executor(), funcao, *args, **kwargs)
+
+def mapear(funcao, *iteraveis, em_curso=None, threads=False):
+    """
+    Executor.map contado em CALCULOS_MAX_PENDENTES, com no máximo em_curso (por
+    defeito CALCULOS_MAX_WORKERS) tarefas deste mapa submetidas de cada vez. Gerador
+    dos resultados pela ordem dos argumentos. Com a fila cheia espera pelas próprias
+    tarefas; se não tiver nenhuma em curso, levanta FilaCheia.
+    """
+    em_curso = em_curso or settings.CALCULOS_MAX_WORKERS
+    executor = obter_executor(threads)
+    futuros = deque()
+    try:
+        for args in zip(*iteraveis):
+            while True:
+                if len(futuros) < em_curso:
+                    try:
+                        futuros.append(_submeter(executor, funcao, *args))
+                        break
+                    except FilaCheia:
+                        if not futuros:
+                            raise
+                yield futuros.popleft().result()
+        while futuros:
+            yield futuros.popleft().result()
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+
+async def executar(funcao, *args, **kwargs):
+    """
+    Executa funcao(*args, **kwargs) no executor e aguarda o resultado sem bloquear o
+    ciclo de eventos. Com o modo 'processos', a função e os argumentos têm de ser
+    serializáveis (funções de topo de módulo). Levanta FilaCheia em vez de acumular
+    mais do que CALCULOS_MAX_PENDENTES tarefas.
+    """
+    return await asyncio.wrap_future(submeter(funcao, *args, **kwargs))
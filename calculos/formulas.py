@@ -0,0 +1,126 @@
+# calculos/formulas.py
+import re
+from functools import lru_cache
+
+# ==============================================================================
+# CONVERSÃO DE FÓRMULAS LaTeX PARA HTML (RELATÓRIOS PDF)
+# ==============================================================================
+# As fórmulas do passo a passo são quase sempre as constantes FORMULAS_* dos
+# serviços: cada uma é convertida uma única vez por processo (cache LRU), e a
+# cache pode ser pré-carregada no arranque (CALCULOS_AQUECER_FORMULAS).
+
+TAMANHO_CACHE_FORMULAS = 1024
+
+# Separadores e comandos de apresentação (aplicados antes dos símbolos).
+_SEPARADORES = {r'\,;\,': ' ; ', r'\;': ' ', r'\displaylines': '', r'\\': '<br/>'}
+_SIMBOLOS = {
+    r'\cdot': '×', r'\beta': 'β', r'\lambda': 'λ', r'\mu': 'μ',
+    r'\phi': 'φ', r'\sigma': 'σ', r'\xi': 'ξ', r'\omega': 'ω',
+    r'\epsilon': 'ε', r'\gamma': 'γ', r'\rho': 'ρ',
+    r'\ge': '≥', r'\le': '≤', r'\approx': '≈', r'\implies': '=>',
+    r'\pm': '±',
+}
+
+def _padrao_literais(substituicoes):
+    # Os mais compridos primeiro, para que um comando nunca seja cortado por um prefixo.
+    return re.compile("|".join(re.escape(chave) for chave in sorted(substituicoes, key=len, reverse=True)))
+
+_RE_SEPARADORES = _padrao_literais(_SEPARADORES)
+_RE_SIMBOLOS = _padrao_literais(_SIMBOLOS)
+_RE_INDICE = re.compile(r'[a-zA-Z0-9,]+')
+_RE_EXPOENTE = re.compile(r'[a-zA-Z0-9]+')
+_RE_COMANDO = re.compile(r'\\(frac|sqrt)(?![a-zA-Z])')
+
+_FRACAO_HTML = ('<span style="display: inline-block; vertical-align: middle; text-align: center; font-size: 0.9em; margin: 0 0.2em;">'
+                '<span style="display: block; border-bottom: 1px solid black; padding: 0 0.2em;">{}</span>'
+                '<span style="display: block; padding: 0 0.2em;">{}</span>'
+                '</span>')
+
+def _fim_grupo(texto, inicio):
+    """Índice da chaveta que fecha o grupo aberto em texto[inicio] (ou None se não fechar)."""
+    nivel = 0
+    for i in range(inicio, len(texto)):
+        if texto[i] == '{':
+            nivel += 1
+        elif texto[i] == '}':
+            nivel -= 1
+            if nivel == 0:
+                return i
+    return None
+
+def _converter(texto):
+    """
+    Tokenizador de uma só passagem: \\frac{a}{b}, \\sqrt{x}, índices (_x, _{x}),
+    expoentes (^x, ^{x}) e grupos {…} (de qualquer profundidade) são convertidos
+    recursivamente; as chavetas e as barras restantes são retiradas.
+    """
+    partes = []
+    i, n = 0, len(texto)
+    while i < n:
+        c = texto[i]
+        if c == '\\':
+            comando = _RE_COMANDO.match(texto, i)
+            if comando:
+                j = comando.end()
+                fim_1 = _fim_grupo(texto, j) if j < n and texto[j] == '{' else None
+                if comando.group(1) == 'sqrt' and fim_1 is not None:
+                    partes.append(f"√({_converter(texto[j + 1:fim_1])})")
+                    i = fim_1 + 1
+                    continue
+                k = fim_1 + 1 if fim_1 is not None else None
+                fim_2 = _fim_grupo(texto, k) if k is not None and k < n and texto[k] == '{' else None
+                if comando.group(1) == 'frac' and fim_2 is not None:
+                    partes.append(_FRACAO_HTML.format(_converter(texto[j + 1:fim_1]), _converter(texto[k + 1:fim_2])))
+                    i = fim_2 + 1
+                    continue
+            i += 1  # barra de um comando desconhecido: fica só o nome
+        elif c in '_^':
+            etiqueta = 'sub' if c == '_' else 'sup'
+            fim = _fim_grupo(texto, i + 1) if i + 1 < n and texto[i + 1] == '{' else None
+            if fim is not None and fim > i + 2:
+                partes.append(f"<{etiqueta}>{_converter(texto[i + 2:fim])}</{etiqueta}>")
+                i = fim + 1
+                continue
+            simples = (_RE_INDICE if c == '_' else _RE_EXPOENTE).match(texto, i + 1)
+            if simples:
+                partes.append(f"<{etiqueta}>{simples.group()}</{etiqueta}>")
+                i = simples.end()
+                continue
+            partes.append(c)
+            i += 1
+        elif c in '{}':
+            i += 1
+        else:
+            partes.append(c)
+            i += 1
+    return "".join(partes)
+
+@lru_cache(maxsize=TAMANHO_CACHE_FORMULAS)
+def formatar_latex_para_html(texto):
+    """
+    Converte uma string LaTeX para um HTML mais robusto e visualmente correto.
+    """
+    if not texto:
+        return ""
+    texto = _RE_SEPARADORES.sub(lambda m: _SEPARADORES[m.group()], texto)
+    texto = _RE_SIMBOLOS.sub(lambda m: _SIMBOLOS[m.group()], texto)
+    return _converter(texto)
+
+def formulas_declaradas():
+    """Fórmulas constantes do passo a passo declaradas pelos serviços (FORMULAS_*)."""
+    from .services import pilar_service, sapata_service, viga_service
+    return [*viga_service.FORMULAS_VIGA.values(), *pilar_service.FORMULAS_PILAR.values(), *sapata_service.FORMULAS_SAPATA.values()]
+
+def aquecer_cache_formulas():
+    """Converte de antemão as fórmulas declaradas; devolve quantas ficaram em cache."""
+    for formula in formulas_declaradas():
+        formatar_latex_para_html(formula)
+    return formatar_latex_para_html.cache_info().currsize
+
+def estatisticas_cache_formulas():
+    """Devolve as estatísticas (acertos, falhas, ocupação) da cache de fórmulas."""
+    info = formatar_latex_para_html.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "maxsize": info.maxsize, "currsize": info.currsize}
+
+def limpar_cache_formulas():
+    formatar_latex_para_html.cache_clear()
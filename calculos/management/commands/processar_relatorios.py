@@ -0,0 +1,25 @@
+# calculos/management/commands/processar_relatorios.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from calculos.services.relatorios_service import processar_relatorios_pendentes
+
+
+class Command(BaseCommand):
+    help = "Gera em segundo plano os relatórios PDF pedidos (fila RelatorioPDF)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true', help="Processa a fila atual e termina.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos de espera quando a fila está vazia.")
+        parser.add_argument('--limite', type=int, default=None, help="Número máximo de relatórios por passagem.")
+
+    def handle(self, *args, **opcoes):
+        while True:
+            processados = processar_relatorios_pendentes(limite=opcoes['limite'])
+            if processados:
+                self.stdout.write(f"{processados} relatório(s) processado(s).")
+            if opcoes['uma_vez']:
+                return
+            if not processados:
+                time.sleep(opcoes['intervalo'])
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0004_alter_historicocalculo_input_data_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash_conteudo', models.CharField(max_length=64)),
+                ('url_base', models.CharField(blank=True, max_length=200)),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('em_curso', 'Em curso'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=10)),
+                ('mensagem_erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('calculo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relatorios', to='calculos.historicocalculo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('calculo', 'hash_conteudo'), name='relatorio_unico_por_conteudo')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0005_relatoriopdf'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicocalculo',
+            index=models.Index(fields=['-timestamp', '-id'], name='historico_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicocalculo',
+            index=models.Index(fields=['elemento', '-timestamp', '-id'], name='historico_elemento_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calculos', '0006_historicocalculo_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatoriopdf',
+            name='iniciado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -13,6 +13,13 @@ class HistoricoCalculo(models.Model):
     input_data = models.JSONField()
     resultado_final = models.JSONField()
 
+    class Meta:
+        # A listagem do histórico é paginada por (timestamp, id), com ou sem filtro de elemento.
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='historico_timestamp_idx'),
+            models.Index(fields=['elemento', '-timestamp', '-id'], name='historico_elemento_idx'),
+        ]
+
     def __str__(self):
         return f"{self.elemento} - {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
 
@@ -48,4 +55,39 @@ class SystemConfiguration(models.Model):
 
     class Meta:
         # Nome que aparecerá na área de administração do Django
-        verbose_name_plural = "Configuração do Sistema"
\ No newline at end of file
+        verbose_name_plural = "Configuração do Sistema"
+
+
+class RelatorioPDF(models.Model):
+    """
+    Pedido de relatório PDF de um cálculo, processado em segundo plano pelo comando
+    processar_relatorios. O PDF fica em disco, identificado pelo id do cálculo e pelo
+    hash do conteúdo (cálculo, configuração e versão do relatório).
+    """
+    ESTADO_PENDENTE = 'pendente'
+    ESTADO_EM_CURSO = 'em_curso'
+    ESTADO_CONCLUIDO = 'concluido'
+    ESTADO_ERRO = 'erro'
+    ESTADO_CHOICES = [
+        (ESTADO_PENDENTE, 'Pendente'),
+        (ESTADO_EM_CURSO, 'Em curso'),
+        (ESTADO_CONCLUIDO, 'Concluído'),
+        (ESTADO_ERRO, 'Erro'),
+    ]
+
+    calculo = models.ForeignKey(HistoricoCalculo, on_delete=models.CASCADE, related_name='relatorios')
+    hash_conteudo = models.CharField(max_length=64)
+    url_base = models.CharField(max_length=200, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=ESTADO_PENDENTE)
+    mensagem_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['calculo', 'hash_conteudo'], name='relatorio_unico_por_conteudo'),
+        ]
+
+    def __str__(self):
+        return f"Relatório {self.calculo_id} ({self.get_estado_display()})"
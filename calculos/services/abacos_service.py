@@ -0,0 +1,131 @@
+# calculos/services/abacos_service.py
+import csv
+import io
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+# ==============================================================================
+# ÁBACOS DE DIMENSIONAMENTO À FLEXÃO SIMPLES (μ → ξ → z/d → ω)
+# ==============================================================================
+# Com os coeficientes usados em viga_service.dimensionar_viga, a relação entre o
+# momento reduzido μ = M/(b·d²·f_cd) e a percentagem mecânica de armadura
+# ω = As·f_yd/(b·d·f_cd) não depende da classe dos materiais: f_cd e f_yd só
+# entram na conversão para As. Guarda-se por isso uma única tabela adimensional
+# (por conjunto de coeficientes), partilhada por todos os pares betão/aço.
+
+GAMMA_C, GAMMA_S, ALPHA_CC, LAMBDA = 1.5, 1.15, 1.0, 0.8
+MU_LIM = LAMBDA * 0.45 * (1 - 0.5 * LAMBDA * 0.45)
+
+N_PONTOS_ABACO = 4001
+# Nº de subdivisões de cada intervalo usadas para medir o erro de interpolação.
+_SUBDIVISOES_VERIFICACAO = 8
+_VERSAO_FICHEIRO = 1
+
+def _diretorio_abacos():
+    return Path(getattr(settings, 'ABACOS_DIR', Path(settings.BASE_DIR) / 'cache' / 'abacos'))
+
+def _nome_ficheiro():
+    return f"abaco_flexao_v{_VERSAO_FICHEIRO}_l{LAMBDA:.3f}_a{ALPHA_CC:.3f}_n{N_PONTOS_ABACO}.npz"
+
+def _relacao_exata(mu):
+    """ξ, z/d e ω exatos para um vetor de momentos reduzidos (μ ≤ μ_lim)."""
+    xi = (1 - np.sqrt(1 - 2 * mu)) / LAMBDA
+    zeta = 1 - 0.5 * LAMBDA * xi
+    return xi, zeta, mu / zeta
+
+def _calcular_tabela():
+    mu = np.linspace(0.0, MU_LIM, N_PONTOS_ABACO)
+    xi, zeta, omega = _relacao_exata(mu)
+
+    # Erro relativo máximo da interpolação linear de ω (= erro relativo em As),
+    # medido em pontos intermédios de todos os intervalos da tabela.
+    fracoes = np.arange(1, _SUBDIVISOES_VERIFICACAO) / _SUBDIVISOES_VERIFICACAO
+    mu_teste = (mu[:-1, None] + np.diff(mu)[:, None] * fracoes).ravel()
+    omega_exato = _relacao_exata(mu_teste)[2]
+    omega_interp = np.interp(mu_teste, mu, omega)
+    erro_max = float(np.max(np.abs(omega_interp - omega_exato) / omega_exato))
+
+    return {"mu": mu, "xi": xi, "zeta": zeta, "omega": omega, "erro_max_relativo": erro_max}
+
+@lru_cache(maxsize=1)
+def _tabela_adimensional():
+    """Lê a tabela da cache em disco ou calcula-a e grava-a."""
+    caminho = _diretorio_abacos() / _nome_ficheiro()
+    try:
+        with np.load(caminho) as dados:
+            return {chave: dados[chave] if chave != "erro_max_relativo" else float(dados[chave]) for chave in dados.files}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    tabela = _calcular_tabela()
+    try:
+        os.makedirs(caminho.parent, exist_ok=True)
+        # Escrita atómica: grava num ficheiro temporário e renomeia.
+        temporario = caminho.with_suffix(f".{os.getpid()}.tmp.npz")
+        np.savez(temporario, **tabela)
+        os.replace(temporario, caminho)
+    except OSError:
+        pass  # Sem permissões de escrita: a tabela fica apenas em memória.
+    return tabela
+
+def limpar_cache_abacos():
+    _tabela_adimensional.cache_clear()
+
+def obter_abaco(f_ck, f_yk):
+    """
+    Ábaco de flexão simples para o par de materiais: tabela μ, ξ, z/d, ω,
+    as resistências de cálculo f_cd e f_yd [MPa], μ_lim e o erro relativo
+    máximo da interpolação (verificado contra o cálculo exato).
+    """
+    tabela = _tabela_adimensional()
+    return {
+        **tabela,
+        "f_ck": float(f_ck),
+        "f_yk": float(f_yk),
+        "f_cd_mpa": ALPHA_CC * f_ck / GAMMA_C,
+        "f_yd_mpa": f_yk / GAMMA_S,
+        "mu_lim": MU_LIM,
+    }
+
+def As_req_abaco(b_mm, d_mm, M_Ed_kNm, f_ck, f_yk):
+    """
+    Área de aço necessária [cm²] obtida por interpolação no ábaco. Aceita escalares
+    ou vetores; devolve NaN quando μ > μ_lim ou a secção é inválida.
+    O erro relativo face ao cálculo exato é inferior a obter_abaco(...)['erro_max_relativo'].
+    """
+    abaco = obter_abaco(f_ck, f_yk)
+    b_m = np.asarray(b_mm, dtype=float) / 1000
+    d_m = np.asarray(d_mm, dtype=float) / 1000
+    M_Ed_Nm = np.asarray(M_Ed_kNm, dtype=float) * 1000
+    f_cd_pa = abaco["f_cd_mpa"] * 10**6
+
+    denominador = b_m * d_m**2 * f_cd_pa
+    mu = np.divide(M_Ed_Nm, denominador, out=np.full(np.broadcast(M_Ed_Nm, denominador).shape, np.nan), where=denominador > 0)
+    omega = np.interp(mu, abaco["mu"], abaco["omega"], right=np.nan)
+    As_req_cm2 = omega * b_m * d_m * f_cd_pa / (abaco["f_yd_mpa"] * 10**6) * 10000
+    As_req_cm2 = np.where(mu >= 0, As_req_cm2, np.nan)
+    return As_req_cm2 if As_req_cm2.ndim else float(As_req_cm2)
+
+def verificar_erro_abaco(f_ck, f_yk, n_amostras=10000, semente=0):
+    """Compara o ábaco com o cálculo exato em μ aleatórios e devolve o erro relativo máximo."""
+    abaco = obter_abaco(f_ck, f_yk)
+    mu = np.random.default_rng(semente).uniform(abaco["mu"][1], MU_LIM, n_amostras)
+    omega_exato = _relacao_exata(mu)[2]
+    omega_interp = np.interp(mu, abaco["mu"], abaco["omega"])
+    return float(np.max(np.abs(omega_interp - omega_exato) / omega_exato))
+
+def exportar_abaco_csv(f_ck, f_yk, passo=1):
+    """Exporta o ábaco em CSV (μ, ξ, z/d, ω e As/(b·d) em cm²/m²), uma linha em cada 'passo'."""
+    abaco = obter_abaco(f_ck, f_yk)
+    fator_as = abaco["f_cd_mpa"] / abaco["f_yd_mpa"] * 10000
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow([f"# Ábaco de flexão simples C{f_ck:g} / A{f_yk:g}; f_cd = {abaco['f_cd_mpa']:.2f} MPa; f_yd = {abaco['f_yd_mpa']:.2f} MPa; erro máx. interpolação = {abaco['erro_max_relativo']:.1e}"])
+    escritor.writerow(["mu", "xi", "z_d", "omega", "As_bd_cm2_m2"])
+    for i in range(0, len(abaco["mu"]), max(int(passo), 1)):
+        escritor.writerow([f"{abaco['mu'][i]:.6f}", f"{abaco['xi'][i]:.6f}", f"{abaco['zeta'][i]:.6f}", f"{abaco['omega'][i]:.6f}", f"{abaco['omega'][i] * fator_as:.4f}"])
+    return saida.getvalue()
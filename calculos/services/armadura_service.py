@@ -1,6 +1,11 @@
 # calculos/services/armadura_service.py
 import math
-from itertools import combinations_with_replacement
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement, islice
+
+import numpy as np
 
 # Diâmetros de varão padrão [mm] e respetivas áreas [cm²]
 VERGALHOES_PADRAO = {
@@ -17,83 +22,151 @@ VERGALHOES_PADRAO = {
 
 }
 
-def _verificar_espacamento(combinacao, largura_disponivel):
-    """Verifica se uma dada combinação de diâmetros de varão respeita o espaçamento mínimo."""
+# Resolução da quantização das chaves das caches de pesquisa.
+_QUANTUM_AREA_CM2 = 1e-4
+_QUANTUM_LARGURA_MM = 0.1
+
+def _largura_necessaria(combinacao):
+    """Largura mínima [mm] ocupada por uma combinação de varões dispostos numa única camada."""
     num_barras = len(combinacao)
     if num_barras <= 1:
-        return True
+        return sum(combinacao)
     espacamento_minimo_horizontal = max(max(combinacao), 20)
-    largura_necessaria = sum(combinacao) + (num_barras - 1) * espacamento_minimo_horizontal
-    return largura_necessaria <= largura_disponivel
+    return sum(combinacao) + (num_barras - 1) * espacamento_minimo_horizontal
 
-def encontrar_combinacoes_otimas(As_req_cm2, largura_disponivel_mm, tipo_elemento="viga"):
+def _verificar_espacamento(combinacao, largura_disponivel):
+    """Verifica se uma dada combinação de diâmetros de varão respeita o espaçamento mínimo."""
+    if len(combinacao) <= 1:
+        return True
+    return _largura_necessaria(combinacao) <= largura_disponivel
+
+def _formatar_combinacao(combinacao):
+    """Converte um tuplo de diâmetros no texto usado nos resultados (ex: '4 Ø 12 + 2 Ø 16')."""
+    counts = {d: combinacao.count(d) for d in set(combinacao)}
+    return " + ".join([f"{count} Ø {diam}" for diam, count in sorted(counts.items())])
+
+# ==============================================================================
+# CATÁLOGO PRÉ-CALCULADO DE COMBINAÇÕES (VIGAS)
+# ==============================================================================
+
+class SolucaoArmadura(namedtuple("SolucaoArmadura", ["area_total_cm2", "largura_mm", "combinacao_str", "contagens", "camadas"])):
     """
-    Encontra a melhor combinação de diâmetro único e a melhor combinação mista que
-    satisfazem a área de aço e os espaçamentos.
+    Solução de armadura imutável (apoiada num tuplo): contagens por diâmetro
+    ((Ø, n), ...) por ordem crescente de diâmetro, área total [cm²], largura ocupada
+    na camada mais larga [mm], texto de apresentação e varões de cada camada/face.
+    As entradas dos catálogos são já instâncias desta classe.
     """
-    solucoes_unicas = []
-    solucoes_mistas = []
-    diametros = sorted(list(VERGALHOES_PADRAO.keys()))
+    __slots__ = ()
+
+    @property
+    def As_final_cm2(self):
+        return round(self.area_total_cm2, 2)
 
-    max_barras = 8 
-    todas_as_combinacoes = []
+    @property
+    def n_barras(self):
+        return sum(n for _, n in self.contagens)
+
+    @property
+    def phi_max(self):
+        return self.contagens[-1][0]
+
+    @property
+    def mista(self):
+        return len(self.contagens) > 1
+
+    def para_dict(self):
+        """Representação serializável em JSON (histórico, templates e relatório PDF)."""
+        return {
+            "combinacao_str": self.combinacao_str,
+            "area_total_cm2": self.area_total_cm2,
+            "As_final_cm2": self.As_final_cm2,
+            "contagens": [list(c) for c in self.contagens],
+            "n_barras": self.n_barras,
+            "camadas": [list(camada) for camada in self.camadas],
+        }
+
+def _criar_solucao(contagens, camadas):
+    """Cria a SolucaoArmadura de umas contagens ((Ø, n), ...) já distribuídas por camadas."""
+    area_total_cm2 = sum(VERGALHOES_PADRAO[d] * n for d, n in contagens)
+    largura_mm = max(_largura_necessaria(camada) for camada in camadas)
+    combinacao_str = " + ".join(f"{n} Ø {d}" for d, n in contagens)
+    return SolucaoArmadura(area_total_cm2, largura_mm, combinacao_str, tuple(contagens), tuple(tuple(c) for c in camadas))
+
+def _gerar_combinacoes_viga(max_barras=8):
+    """
+    Gera todas as combinações de varões admissíveis em vigas: diâmetro único
+    (2 a max_barras varões) e misturas simétricas de dois diâmetros.
+    """
+    diametros = sorted(VERGALHOES_PADRAO.keys())
+    todas_as_combinacoes = set()
 
     for num_barras in range(2, max_barras + 1):
         # 1. Combinações de diâmetro único (ex: [12, 12, 12])
         for diametro in diametros:
-            todas_as_combinacoes.append(tuple([diametro] * num_barras))
-        
+            todas_as_combinacoes.add(tuple([diametro] * num_barras))
+
         # 2. Combinações de diâmetros mistos (simétricas)
         if num_barras >= 4 and num_barras % 2 == 0:
-            pares_de_diametros = list(combinations_with_replacement(diametros, 2))
-            for d1, d2 in pares_de_diametros:
+            for d1, d2 in combinations_with_replacement(diametros, 2):
                 if d1 == d2: continue
                 # Gera splits simétricos (ex: para 6 barras, testa 2+4; para 8, testa 2+6 e 4+4)
                 for i in range(1, num_barras // 2):
                     if (num_barras - 2*i) == i * 2: # Evita duplicar o split 50/50
                         break
-                    comb = tuple(sorted([d1]*(i*2) + [d2]*(num_barras - i*2)))
-                    todas_as_combinacoes.append(comb)
-
-
-    # Remove duplicados
-    todas_as_combinacoes = sorted(list(set(todas_as_combinacoes)), key=lambda x: (len(x), sum(x)))
-
-    # 3. Verifica cada combinação e guarda as válidas
-    for comb in todas_as_combinacoes:
-        if _verificar_espacamento(comb, largura_disponivel_mm):
-            area_total_cm2 = sum(VERGALHOES_PADRAO[d] for d in comb)
-            if area_total_cm2 >= As_req_cm2:
-                counts = {d: comb.count(d) for d in set(comb)}
-                # CORREÇÃO DE FORMATAÇÃO: Adicionado espaço antes do Ø
-                combinacao_str = " + ".join([f"{count} Ø {diam}" for diam, count in sorted(counts.items())])
-                
-                if len(counts) > 1:
-                    solucoes_mistas.append({"combinacao_str": combinacao_str, "area_total_cm2": area_total_cm2})
-                else:
-                    solucoes_unicas.append({"combinacao_str": combinacao_str, "area_total_cm2": area_total_cm2})
-
-    # 4. Encontra a melhor solução de cada categoria
-    melhor_unica = min(solucoes_unicas, key=lambda x: x["area_total_cm2"]) if solucoes_unicas else None
-    melhor_mista = min(solucoes_mistas, key=lambda x: x["area_total_cm2"]) if solucoes_mistas else None
-
-    # NOVO PASSO: Prioridade a soluções de diâmetro único em vigas quando As_prov <= 1.10 As_req
-    if tipo_elemento == "viga":
-        solucoes_diametro_unico_boas = [s for s in solucoes_unicas if s["area_total_cm2"] <= 1.10 * As_req_cm2]
-        
-        if solucoes_diametro_unico_boas:
-            # Restringe o conjunto a apenas essas soluções de diâmetro único e escolhe a de menor As_prov
-            melhor_unica = min(solucoes_diametro_unico_boas, key=lambda x: x["area_total_cm2"])
-            
-            # Se a opção mista for globalmente mais económica, anulamo-la para forçar 
-            # a escolha da opção de diâmetro único (que já cumpre a tolerância de 10%).
-            if melhor_mista and melhor_mista["area_total_cm2"] < melhor_unica["area_total_cm2"]:
-                melhor_mista = None
-
-    if melhor_unica:
-        melhor_unica["As_final_cm2"] = round(melhor_unica["area_total_cm2"], 2)
-    if melhor_mista:
-        melhor_mista["As_final_cm2"] = round(melhor_mista["area_total_cm2"], 2)
+                    todas_as_combinacoes.add(tuple(sorted([d1]*(i*2) + [d2]*(num_barras - i*2))))
+
+    return todas_as_combinacoes
+
+def _construir_catalogo(combinacoes):
+    """
+    Constrói o catálogo ordenado por área. O desempate (nº de varões, soma dos
+    diâmetros) reproduz a ordem pela qual as soluções eram avaliadas.
+    """
+    entradas = []
+    for comb in sorted(combinacoes, key=lambda x: (len(x), sum(x), x)):
+        # A área é somada varão a varão, como na verificação original, para manter os mesmos valores.
+        area_total_cm2 = sum(VERGALHOES_PADRAO[d] for d in comb)
+        contagens = tuple(sorted((d, comb.count(d)) for d in set(comb)))
+        entradas.append(SolucaoArmadura(area_total_cm2, _largura_necessaria(comb), _formatar_combinacao(comb), contagens, (comb,)))
+    entradas.sort(key=lambda e: e.area_total_cm2)
+    return tuple(entradas)
+
+_CATALOGO_VIGA = _construir_catalogo(_gerar_combinacoes_viga())
+_AREAS_CATALOGO_VIGA = [e.area_total_cm2 for e in _CATALOGO_VIGA]
+
+def _consultar_catalogo(catalogo, areas, As_req_cm2, largura_disponivel_mm):
+    """
+    Devolve a primeira (menor área) entrada de diâmetro único e a primeira entrada
+    mista que cumprem As_req e cabem na largura disponível.
+    """
+    melhor_unica, melhor_mista = None, None
+    for entrada in islice(catalogo, bisect_left(areas, As_req_cm2), None):
+        if not entrada.largura_mm <= largura_disponivel_mm:  # também exclui larguras NaN
+            continue
+        if entrada.mista:
+            if melhor_mista is None:
+                melhor_mista = entrada
+        elif melhor_unica is None:
+            melhor_unica = entrada
+        if melhor_unica is not None and melhor_mista is not None:
+            break
+    return melhor_unica, melhor_mista
+
+def encontrar_combinacoes_otimas(As_req_cm2, largura_disponivel_mm, tipo_elemento="viga"):
+    """
+    Encontra a melhor combinação de diâmetro único e a melhor combinação mista que
+    satisfazem a área de aço e os espaçamentos (SolucaoArmadura ou None).
+    A pesquisa é feita sobre o catálogo pré-calculado (ordenado por área), pelo que
+    a primeira entrada válida de cada categoria é a de menor área.
+    """
+    melhor_unica, melhor_mista = _consultar_catalogo(_CATALOGO_VIGA, _AREAS_CATALOGO_VIGA, As_req_cm2, largura_disponivel_mm)
+
+    # Prioridade a soluções de diâmetro único em vigas quando As_prov <= 1.10 As_req:
+    # se a opção mista for globalmente mais económica, anulamo-la para forçar
+    # a escolha da opção de diâmetro único (que já cumpre a tolerância de 10%).
+    if tipo_elemento == "viga" and melhor_unica and melhor_unica.area_total_cm2 <= 1.10 * As_req_cm2:
+        if melhor_mista and melhor_mista.area_total_cm2 < melhor_unica.area_total_cm2:
+            melhor_mista = None
 
     return {
         "unica": melhor_unica,
@@ -101,106 +174,360 @@ def encontrar_combinacoes_otimas(As_req_cm2, largura_disponivel_mm, tipo_element
     }
 
 # ==============================================================================
-# NOVA FUNÇÃO, ESPECÍFICA PARA PILARES
+# CATÁLOGO PRÉ-CALCULADO DE DISPOSIÇÕES (PILARES)
 # ==============================================================================
 
-def encontrar_combinacoes_otimas_pilar(As_req_cm2, largura_disponivel_mm, b_mm=None, h_mm=None):
+def _gerar_combinacoes_pilar(max_barras=8):
     """
-    Encontra a melhor combinação de armadura para PILARES, garantindo um número
-    par de varões para manter a simetria (mínimo de 4 varões).
-    Se a secção for quadrada (b ~= h), dá preferência a soluções de diâmetro único ou perfeitamente simétricas.
+    Enumera uma única vez cada disposição simétrica de pilar (número par de varões,
+    mínimo de 4), já com as regras construtivas aplicadas:
+    - com 4 varões só se admite diâmetro único (simetria);
+    - acima de 4 varões, um dos diâmetros tem de ter pelo menos 4 varões para ocupar os 4 cantos.
     """
-    solucoes_unicas = []
-    solucoes_mistas = []
-    diametros = sorted(list(VERGALHOES_PADRAO.keys()))
-
-    max_barras = 8 
-    
-    # A ALTERAÇÃO PRINCIPAL ESTÁ AQUI: O loop agora só itera sobre números pares (4, 6, 8)
+    diametros = sorted(VERGALHOES_PADRAO.keys())
     for num_barras in range(4, max_barras + 1, 2):
-        
         # 1. Combinações de diâmetro único (ex: 4Ø12, 6Ø12, etc.)
         for diametro in diametros:
-            comb = tuple([diametro] * num_barras)
-            if _verificar_espacamento(comb, largura_disponivel_mm):
-                area_total_cm2 = sum(VERGALHOES_PADRAO[d] for d in comb)
-                if area_total_cm2 >= As_req_cm2:
-                    combinacao_str = f"{num_barras} Ø {diametro}"
-                    solucoes_unicas.append({"combinacao_str": combinacao_str, "area_total_cm2": area_total_cm2})
-
-        # 2. Combinações de diâmetros mistos (simétricas)
-        # Ex: 2ØD1 + 2ØD2 (para 4 varões), 2ØD1 + 4ØD2 (para 6 varões), etc.
-        import itertools
-        pares_de_diametros = list(itertools.permutations(diametros, 2))
-        for d1, d2 in pares_de_diametros:
-            # Gera splits simétricos. Ex: para 6 barras -> 2+4; para 8 barras -> 2+6 e 4+4
-            for i in range(1, num_barras // 2 + 1):
-                n1 = i * 2
-                n2 = num_barras - n1
-                if n2 == 0: continue
-                if n1 > n2: continue # Evita duplicados como 6+2 depois de 2+6
-                
-                comb = tuple(sorted([d1]*n1 + [d2]*n2))
-                if _verificar_espacamento(comb, largura_disponivel_mm):
-                    area_total_cm2 = sum(VERGALHOES_PADRAO[d] for d in comb)
-                    if area_total_cm2 >= As_req_cm2:
-                        counts = {d: comb.count(d) for d in set(comb)}
-                        combinacao_str = " + ".join([f"{count} Ø {diam}" for diam, count in sorted(counts.items())])
-                        solucoes_mistas.append({"combinacao_str": combinacao_str, "area_total_cm2": area_total_cm2, "counts": counts})
-
-    # -------------------------------------------------------------------------
-    # Regras Construtivas de Pilares: Simetria em 4 varões e Cantos iguais
-    # -------------------------------------------------------------------------
-    mistas_filtradas = []
-    for m in solucoes_mistas:
-        counts = m.get("counts", {})
-        total_barras = sum(counts.values())
-        
-        # Regra de simetria para 4 varões:
-        # Se n_barras_total == 4, rejeita misturas (só permite 4 varões do mesmo diâmetro)
-        if total_barras == 4:
+            yield (diametro,) * num_barras
+        if num_barras == 4:
             continue
-            
-        # 4 cantos com mesmo diâmetro quando há mais varões:
-        # Quando há >4 varões, pelo menos um dos diâmetros deve ter 4 ou mais varões para ocupar os 4 cantos.
-        if total_barras > 4:
-            if not any(c >= 4 for c in counts.values()):
-                continue
-                
-        mistas_filtradas.append(m)
-        
-    solucoes_mistas = mistas_filtradas
-
-    # Regra específica para secções quadradas:
-    # Se abs(b - h) <= 5 mm, dá preferência a soluções de diâmetro único.
-    # As mistas só são aceites se forem simétricas em todas as direções (quantidades múltiplas de 4).
-    is_quadrado = False
+        # 2. Combinações mistas: cada par de diâmetros (d1 < d2) e cada split par (n1 + n2) uma só vez
+        for d1, d2 in combinations(diametros, 2):
+            for n1 in range(2, num_barras - 1, 2):
+                n2 = num_barras - n1
+                if n1 < 4 and n2 < 4:
+                    continue
+                yield (d1,) * n1 + (d2,) * n2
+
+def _simetria_total(entrada):
+    """Disposição simétrica em todas as direções (quantidades múltiplas de 4 em cada diâmetro)."""
+    return all(n % 4 == 0 for _, n in entrada.contagens)
+
+_CATALOGO_PILAR = _construir_catalogo(_gerar_combinacoes_pilar())
+_AREAS_CATALOGO_PILAR = [e.area_total_cm2 for e in _CATALOGO_PILAR]
+_CATALOGO_PILAR_SIMETRICO = tuple(e for e in _CATALOGO_PILAR if e.mista and _simetria_total(e))
+_AREAS_CATALOGO_PILAR_SIMETRICO = [e.area_total_cm2 for e in _CATALOGO_PILAR_SIMETRICO]
+
+# ==============================================================================
+# AVALIAÇÃO EM LOTE (NUMPY)
+# ==============================================================================
+
+# Nº máximo de linhas avaliadas de cada vez, para limitar a memória da matriz de comparação.
+_TAMANHO_BLOCO_LOTE = 4096
+
+def _matrizes_catalogo(catalogo):
+    """Converte um catálogo em vetores NumPy (áreas, larguras, textos e diâmetros máximos)."""
+    areas = np.array([e.area_total_cm2 for e in catalogo])
+    larguras = np.array([e.largura_mm for e in catalogo])
+    # O último elemento (None / 0) é usado pelos índices -1 ("sem solução").
+    textos = np.array([e.combinacao_str for e in catalogo] + [None], dtype=object)
+    phi_max = np.array([e.phi_max for e in catalogo] + [0], dtype=np.int64)
+    # Áreas arredondadas como em SolucaoArmadura.As_final_cm2 (np.round arredonda de outra forma).
+    as_final = np.array([e.As_final_cm2 for e in catalogo] + [np.nan])
+    return areas, larguras, textos, phi_max, as_final
+
+_AREAS_VIGA_NP, _LARGURAS_VIGA_NP, _TEXTOS_VIGA_NP, _PHI_MAX_VIGA_NP, _AS_FINAL_VIGA_NP = _matrizes_catalogo(_CATALOGO_VIGA)
+_MISTA_VIGA_NP = np.array([e.mista for e in _CATALOGO_VIGA])
+
+_AREAS_PILAR_NP, _LARGURAS_PILAR_NP, _TEXTOS_PILAR_NP, _PHI_MAX_PILAR_NP, _AS_FINAL_PILAR_NP = _matrizes_catalogo(_CATALOGO_PILAR)
+_MISTA_PILAR_NP = np.array([e.mista for e in _CATALOGO_PILAR])
+_SIMETRIA_TOTAL_PILAR_NP = np.array([_simetria_total(e) for e in _CATALOGO_PILAR])
+
+def _melhor_por_linha(areas, larguras, colunas, As_req, largura):
+    """
+    Para cada linha, devolve o índice (no catálogo completo) da entrada de menor área
+    entre as colunas dadas que cumpre As_req e a largura disponível (-1 se nenhuma).
+    """
+    if colunas.size == 0:
+        return np.full(As_req.shape, -1, dtype=np.int64)
+    indices = np.empty(As_req.shape, dtype=np.int64)
+    areas_sub, larguras_sub = areas[colunas], larguras[colunas]
+    for inicio in range(0, As_req.size, _TAMANHO_BLOCO_LOTE):
+        bloco = slice(inicio, inicio + _TAMANHO_BLOCO_LOTE)
+        validas = (areas_sub >= As_req[bloco, None]) & (larguras_sub <= largura[bloco, None])
+        candidatas = np.where(validas, areas_sub, np.inf)
+        posicao = candidatas.argmin(axis=1)
+        encontrada = validas[np.arange(posicao.size), posicao]
+        indices[bloco] = np.where(encontrada, colunas[posicao], -1)
+    return indices
+
+def _resultado_lote(indices, areas, textos, phi_max, as_final):
+    area_ext = np.append(areas, np.nan)
+    return {"indice": indices, "area_total_cm2": area_ext[indices], "As_final_cm2": as_final[indices], "combinacao_str": textos[indices], "phi_max": phi_max[indices]}
+
+def encontrar_combinacoes_otimas_lote(As_req_cm2, largura_disponivel_mm, tipo_elemento="viga"):
+    """
+    Versão vetorizada de encontrar_combinacoes_otimas para vários pedidos.
+    Recebe vetores de As_req [cm²] e de larguras disponíveis [mm] e devolve, para
+    'unica' e 'mista', os índices no catálogo (-1 sem solução), as áreas (NaN sem
+    solução), as áreas arredondadas, os textos das combinações e o maior diâmetro
+    (0 sem solução), linha a linha.
+    """
+    As_req, largura = np.broadcast_arrays(np.asarray(As_req_cm2, dtype=float).ravel(), np.asarray(largura_disponivel_mm, dtype=float).ravel())
+    idx_unica = _melhor_por_linha(_AREAS_VIGA_NP, _LARGURAS_VIGA_NP, np.flatnonzero(~_MISTA_VIGA_NP), As_req, largura)
+    idx_mista = _melhor_por_linha(_AREAS_VIGA_NP, _LARGURAS_VIGA_NP, np.flatnonzero(_MISTA_VIGA_NP), As_req, largura)
+
+    if tipo_elemento == "viga":
+        area_ext = np.append(_AREAS_VIGA_NP, np.inf)
+        area_unica, area_mista = area_ext[idx_unica], area_ext[idx_mista]
+        anular = (idx_unica >= 0) & (area_unica <= 1.10 * As_req) & (idx_mista >= 0) & (area_mista < area_unica)
+        idx_mista = np.where(anular, -1, idx_mista)
+
+    return {
+        "unica": _resultado_lote(idx_unica, _AREAS_VIGA_NP, _TEXTOS_VIGA_NP, _PHI_MAX_VIGA_NP, _AS_FINAL_VIGA_NP),
+        "mista": _resultado_lote(idx_mista, _AREAS_VIGA_NP, _TEXTOS_VIGA_NP, _PHI_MAX_VIGA_NP, _AS_FINAL_VIGA_NP),
+    }
+
+def encontrar_combinacoes_otimas_pilar_lote(As_req_cm2, largura_disponivel_mm, b_mm=None, h_mm=None):
+    """
+    Versão vetorizada de encontrar_combinacoes_otimas_pilar. b_mm e h_mm podem ser
+    vetores (ou None) e servem apenas para identificar as secções quadradas.
+    """
+    As_req, largura = np.broadcast_arrays(np.asarray(As_req_cm2, dtype=float).ravel(), np.asarray(largura_disponivel_mm, dtype=float).ravel())
     if b_mm is not None and h_mm is not None:
-        if abs(b_mm - h_mm) <= 5:
-            is_quadrado = True
+        is_quadrado = np.broadcast_to(np.abs(np.asarray(b_mm, dtype=float) - np.asarray(h_mm, dtype=float)) <= 5, As_req.shape).ravel()
+    else:
+        is_quadrado = np.zeros(As_req.shape, dtype=bool)
+
+    idx_unica = _melhor_por_linha(_AREAS_PILAR_NP, _LARGURAS_PILAR_NP, np.flatnonzero(~_MISTA_PILAR_NP), As_req, largura)
+    idx_mista = _melhor_por_linha(_AREAS_PILAR_NP, _LARGURAS_PILAR_NP, np.flatnonzero(_MISTA_PILAR_NP), As_req, largura)
+    idx_mista_simetrica = _melhor_por_linha(_AREAS_PILAR_NP, _LARGURAS_PILAR_NP, np.flatnonzero(_MISTA_PILAR_NP & _SIMETRIA_TOTAL_PILAR_NP), As_req, largura)
+
+    # Secções quadradas: sem misturas se houver diâmetro único; caso contrário só misturas totalmente simétricas.
+    idx_mista = np.where(is_quadrado, np.where(idx_unica >= 0, -1, idx_mista_simetrica), idx_mista)
+
+    return {
+        "unica": _resultado_lote(idx_unica, _AREAS_PILAR_NP, _TEXTOS_PILAR_NP, _PHI_MAX_PILAR_NP, _AS_FINAL_PILAR_NP),
+        "mista": _resultado_lote(idx_mista, _AREAS_PILAR_NP, _TEXTOS_PILAR_NP, _PHI_MAX_PILAR_NP, _AS_FINAL_PILAR_NP),
+    }
+
+# ==============================================================================
+# OTIMIZADOR EXATO (ATÉ 24 VARÕES, VÁRIAS CAMADAS E ATÉ 3 DIÂMETROS)
+# ==============================================================================
+
+MAX_BARRAS_OTIMIZADOR = 24
+MAX_CAMADAS_VIGA = 3
+MAX_DIAMETROS_MISTURA = 3
+
+def distribuir_camadas(contagens, largura_disponivel_mm, max_camadas=MAX_CAMADAS_VIGA):
+    """
+    Distribui os varões de uma viga por camadas horizontais, simétricas e com pelo
+    menos 2 varões cada (os cantos do estribo), enchendo primeiro a camada inferior,
+    com o mesmo espaçamento mínimo de _verificar_espacamento em cada camada.
+    - Diâmetro único: cada camada leva o máximo de varões que cabe, desde que sobrem
+      pelo menos 2 para cada uma das camadas seguintes.
+    - Misturas (nº par de cada diâmetro): os varões são colocados aos pares, por ordem
+      decrescente de diâmetro; cada camada começa pelo par de maior diâmetro (os cantos)
+      e os pares seguintes ficam para o interior.
+    Devolve a lista de camadas (tuplos de diâmetros, pela ordem em que ficam na
+    camada) ou None se não houver disposição admissível.
+    """
+    espacamento = max(max(d for d, _ in contagens), 20)
+    if len(contagens) == 1:
+        (d, n), = contagens
+        capacidade = int((largura_disponivel_mm + espacamento) // (d + espacamento))
+        while capacidade >= 2 and _largura_necessaria((d,) * capacidade) > largura_disponivel_mm:
+            capacidade -= 1
+        if capacidade < 2:
+            return None
+        n_camadas = math.ceil(n / capacidade)
+        if n_camadas > max_camadas or n < 2 * n_camadas:
+            return None
+        camadas, restantes = [], n
+        for seguintes in range(n_camadas - 1, -1, -1):
+            k = min(capacidade, restantes - 2 * seguintes)
+            camadas.append((d,) * k)
+            restantes -= k
+        return camadas
+
+    if any(n % 2 for _, n in contagens):
+        return None
+    pares = [d for d, n in sorted(contagens, reverse=True) for _ in range(n // 2)]
+    camadas, i = [], 0
+    while i < len(pares):
+        largura = 2 * pares[i] + espacamento
+        if largura > largura_disponivel_mm:
+            return None
+        metade = [pares[i]]
+        i += 1
+        while i < len(pares) and largura + 2 * (pares[i] + espacamento) <= largura_disponivel_mm:
+            largura += 2 * (pares[i] + espacamento)
+            metade.append(pares[i])
+            i += 1
+        camadas.append(tuple(metade) + tuple(reversed(metade)))
+    return camadas if len(camadas) <= max_camadas else None
+
+def desvio_centroide_camadas(camadas):
+    """
+    Distância vertical [mm] entre o eixo da camada inferior e o centro de gravidade
+    da armadura, com camadas afastadas de max(Ø, 20 mm) livres.
+    """
+    cotas, cota = [], 0.0
+    for i, camada in enumerate(camadas):
+        if i > 0:
+            anterior = max(camadas[i - 1])
+            cota += anterior / 2 + max(anterior, max(camada), 20) + max(camada) / 2
+        cotas.append(cota)
+    areas = [sum(VERGALHOES_PADRAO[d] for d in camada) for camada in camadas]
+    return sum(a * y for a, y in zip(areas, cotas)) / sum(areas)
+
+def _faces_pilar(contagens, largura_disponivel_mm):
+    """
+    Metade de cada diâmetro em cada uma das duas faces. O espaçamento é verificado
+    com todos os varões numa fila, como no catálogo de pilares.
+    """
+    todos = tuple(d for d, n in contagens for _ in range(n))
+    if not _verificar_espacamento(todos, largura_disponivel_mm):
+        return None
+    face = tuple(d for d, n in contagens for _ in range(n // 2))
+    return [face, face]
 
+def _pesquisar_otima(As_req_cm2, largura_disponivel_mm, diametros_por_solucao, n_min, passo, exige_canto, distribuir, max_barras, n_filas):
+    """
+    Pesquisa exata (branch-and-bound) da solução de menor área com 'diametros_por_solucao'
+    diâmetros distintos. As contagens dos diâmetros menores são enumeradas e a do maior é
+    a mínima que cumpre As_req. São cortados os ramos cuja área mínima já excede a melhor
+    e os que violam a condição necessária de largura: com s = max(Ø_max, 20), cada fila
+    cumpre Σ(Ø + s) <= largura + s, logo Σ n·(Ø + s) <= n_filas·(largura + s).
+    Devolve (área, nº de varões, SolucaoArmadura) ou None.
+    """
+    melhor = None
+    for subconjunto in combinations(sorted(VERGALHOES_PADRAO), diametros_por_solucao):
+        *prefixo, ultimo = subconjunto
+        area_ultimo = VERGALHOES_PADRAO[ultimo]
+        area_minima_restante = [sum(VERGALHOES_PADRAO[d] * n_min for d in subconjunto[i:]) for i in range(len(subconjunto))]
+        espacamento = max(ultimo, 20)
+        ocupacao_maxima = n_filas * (largura_disponivel_mm + espacamento)
+        ocupacao_minima_restante = [sum((d + espacamento) * n_min for d in subconjunto[i:]) for i in range(len(subconjunto))]
+
+        def ramificar(i, contagens, area, n, ocupacao):
+            nonlocal melhor
+            if melhor is not None and area + area_minima_restante[i] > melhor[0]:
+                return
+            if ocupacao + ocupacao_minima_restante[i] > ocupacao_maxima:
+                return
+            if i < len(prefixo):
+                d = prefixo[i]
+                c = n_min
+                while n + c + n_min * (len(subconjunto) - i - 1) <= max_barras:
+                    ramificar(i + 1, contagens + ((d, c),), area + c * VERGALHOES_PADRAO[d], n + c, ocupacao + c * (d + espacamento))
+                    c += passo
+                return
+            n_ultimo = max(n_min, passo * math.ceil(max(As_req_cm2 - area, 0) / (area_ultimo * passo) - 1e-9))
+            if exige_canto and all(c < 4 for _, c in contagens):
+                n_ultimo = max(n_ultimo, 4)
+            while area + n_ultimo * area_ultimo < As_req_cm2:
+                n_ultimo += passo
+            while n + n_ultimo <= max_barras and ocupacao + n_ultimo * (ultimo + espacamento) <= ocupacao_maxima:
+                area_total = area + n_ultimo * area_ultimo
+                if melhor is not None and (area_total, n + n_ultimo) >= melhor[:2]:
+                    return
+                solucao = contagens + ((ultimo, n_ultimo),)
+                camadas = distribuir(solucao, largura_disponivel_mm)
+                if camadas is not None:
+                    melhor = (area_total, n + n_ultimo, _criar_solucao(solucao, camadas))
+                    return
+                n_ultimo += passo
+
+        ramificar(0, (), 0.0, 0, 0.0)
+    return melhor
+
+@lru_cache(maxsize=256)
+def _otimizar_armadura(As_req_q, largura_q, tipo_elemento, is_quadrado, max_barras, max_camadas, max_diametros):
+    As_req_cm2 = As_req_q * _QUANTUM_AREA_CM2
+    largura_disponivel_mm = largura_q * _QUANTUM_LARGURA_MM
+
+    if tipo_elemento == "pilar":
+        # Pilares: nº par de varões (mínimo 4), metade em cada face; misturas simétricas
+        # com um diâmetro nos 4 cantos; em secções quadradas, múltiplos de 4. A largura é
+        # verificada com todos os varões numa fila (n_filas = 1), como no catálogo.
+        distribuir = _faces_pilar
+        unica = _pesquisar_otima(As_req_cm2, largura_disponivel_mm, 1, 4, 2, False, distribuir, max_barras, 1)
+        mista = None
+        if not (is_quadrado and unica):
+            passo = 4 if is_quadrado else 2
+            for k in range(2, max_diametros + 1):
+                candidata = _pesquisar_otima(As_req_cm2, largura_disponivel_mm, k, passo, passo, True, distribuir, max_barras, 1)
+                if candidata and (mista is None or candidata[:2] < mista[:2]):
+                    mista = candidata
+        return unica, mista
+
+    # Vigas: diâmetro único com 2 ou mais varões; misturas simétricas (nº par de cada diâmetro).
+    distribuir = lambda contagens, largura: distribuir_camadas(contagens, largura, max_camadas)
+    unica = _pesquisar_otima(As_req_cm2, largura_disponivel_mm, 1, 2, 1, False, distribuir, max_barras, max_camadas)
+    mista = None
+    for k in range(2, max_diametros + 1):
+        candidata = _pesquisar_otima(As_req_cm2, largura_disponivel_mm, k, 2, 2, False, distribuir, max_barras, max_camadas)
+        if candidata and (mista is None or candidata[:2] < mista[:2]):
+            mista = candidata
+    if unica and mista and unica[0] <= 1.10 * As_req_cm2 and mista[0] < unica[0]:
+        mista = None
+    return unica, mista
+
+def otimizar_armadura(As_req_cm2, largura_disponivel_mm, tipo_elemento="viga", b_mm=None, h_mm=None,
+                      max_barras=MAX_BARRAS_OTIMIZADOR, max_camadas=MAX_CAMADAS_VIGA, max_diametros=MAX_DIAMETROS_MISTURA):
+    """
+    Otimizador exato para os casos fora do catálogo (mais de 8 varões, várias camadas
+    em vigas e misturas de até 3 diâmetros). Devolve a SolucaoArmadura de menor área
+    de cada categoria, como encontrar_combinacoes_otimas, com a disposição por camadas
+    (vigas) ou por face (pilares) em "camadas".
+    """
+    is_quadrado = b_mm is not None and h_mm is not None and abs(b_mm - h_mm) <= 5
+    As_req_q = math.ceil(round(As_req_cm2 / _QUANTUM_AREA_CM2, 6))
+    largura_q = math.floor(round(largura_disponivel_mm / _QUANTUM_LARGURA_MM, 6))
+    unica, mista = _otimizar_armadura(As_req_q, largura_q, tipo_elemento, is_quadrado, max_barras, max_camadas, max_diametros)
+    return {
+        "unica": unica[2] if unica else None,
+        "mista": mista[2] if mista else None
+    }
+
+# ==============================================================================
+# NOVA FUNÇÃO, ESPECÍFICA PARA PILARES
+# ==============================================================================
+
+# Dimensão máxima da cache de pesquisas de pilares.
+TAMANHO_CACHE_PILAR = 1024
+
+@lru_cache(maxsize=TAMANHO_CACHE_PILAR)
+def _pesquisar_pilar(As_req_q, largura_q, is_quadrado):
+    """
+    Pesquisa no catálogo de pilares para uma chave quantizada. Devolve as entradas
+    (imutáveis) da melhor solução de diâmetro único e da melhor solução mista.
+    """
+    As_req_cm2 = As_req_q * _QUANTUM_AREA_CM2
+    largura_disponivel_mm = largura_q * _QUANTUM_LARGURA_MM
+    melhor_unica, melhor_mista = _consultar_catalogo(_CATALOGO_PILAR, _AREAS_CATALOGO_PILAR, As_req_cm2, largura_disponivel_mm)
+
+    # Regra específica para secções quadradas: dá preferência a soluções de diâmetro único.
+    # As mistas só são aceites se forem simétricas em todas as direções (quantidades múltiplas de 4).
     if is_quadrado:
-        if solucoes_unicas:
-            # Se houver opções de diâmetro único viáveis, descartar as opções mistas
-            solucoes_mistas = []
+        if melhor_unica:
+            melhor_mista = None
         else:
-            # Se não houver, filtrar as mistas para garantir simetria total (múltiplos de 4 em cada diâmetro)
-            mistas_simetricas = []
-            for m in solucoes_mistas:
-                if all(c % 4 == 0 for c in m["counts"].values()):
-                    mistas_simetricas.append(m)
-            solucoes_mistas = mistas_simetricas
-
-    # Encontra a melhor solução de cada categoria
-    melhor_unica = min(solucoes_unicas, key=lambda x: x["area_total_cm2"]) if solucoes_unicas else None
-    melhor_mista = min(solucoes_mistas, key=lambda x: x["area_total_cm2"]) if solucoes_mistas else None
-
-    if melhor_unica:
-        melhor_unica["As_final_cm2"] = round(melhor_unica["area_total_cm2"], 2)
-    if melhor_mista:
-        melhor_mista["As_final_cm2"] = round(melhor_mista["area_total_cm2"], 2)
+            _, melhor_mista = _consultar_catalogo(_CATALOGO_PILAR_SIMETRICO, _AREAS_CATALOGO_PILAR_SIMETRICO, As_req_cm2, largura_disponivel_mm)
+    return melhor_unica, melhor_mista
+
+def estatisticas_cache_pilar():
+    """Devolve as estatísticas (acertos, falhas, ocupação) da cache de pesquisas de pilares."""
+    info = _pesquisar_pilar.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "maxsize": info.maxsize, "currsize": info.currsize}
+
+def limpar_cache_pilar():
+    _pesquisar_pilar.cache_clear()
 
+def encontrar_combinacoes_otimas_pilar(As_req_cm2, largura_disponivel_mm, b_mm=None, h_mm=None):
+    """
+    Encontra a melhor combinação de armadura para PILARES, garantindo um número
+    par de varões para manter a simetria (mínimo de 4 varões).
+    Se a secção for quadrada (b ~= h), dá preferência a soluções de diâmetro único ou perfeitamente simétricas.
+    A chave da cache é quantizada do lado da segurança: As_req arredondado por excesso
+    e a largura disponível por defeito.
+    """
+    is_quadrado = b_mm is not None and h_mm is not None and abs(b_mm - h_mm) <= 5
+    As_req_q = math.ceil(round(As_req_cm2 / _QUANTUM_AREA_CM2, 6))
+    largura_q = math.floor(round(largura_disponivel_mm / _QUANTUM_LARGURA_MM, 6))
+    melhor_unica, melhor_mista = _pesquisar_pilar(As_req_q, largura_q, is_quadrado)
     return {
         "unica": melhor_unica,
         "mista": melhor_mista
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,135 @@
+# calculos/services/desenho_service.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+# ==============================================================================
+# CONSTRUTOR DE DESENHOS SVG
+# ==============================================================================
+
+class DesenhoSVG:
+    """
+    Acumula os elementos de um desenho SVG numa lista e só os junta em render(),
+    evitando a cópia da cadeia completa a cada elemento acrescentado.
+    As coordenadas são escritas tal como recebidas (sem arredondamentos).
+    """
+
+    def __init__(self, largura, altura, tamanho_letra=14, fundo=None):
+        self._partes = [
+            f'<svg width="100%" viewBox="0 0 {largura} {altura}" xmlns="http://www.w3.org/2000/svg">',
+            f'<style>.dim-text {{ font-family: Arial, sans-serif; font-size: {tamanho_letra}px; fill: #333; text-anchor: middle; }}</style>',
+        ]
+        if fundo:
+            self.retangulo(0, 0, largura, altura, fundo)
+
+    # --- Primitivas ---------------------------------------------------------------
+
+    def retangulo(self, x, y, largura, altura, preenchimento, contorno=None, espessura=None, raio=None):
+        partes = self._partes
+        partes.append(f'<rect x="{x}" y="{y}" width="{largura}" height="{altura}" fill="{preenchimento}"')
+        if contorno is not None:
+            partes.append(f' stroke="{contorno}" stroke-width="{espessura}"')
+        if raio is not None:
+            partes.append(f' rx="{raio}" ry="{raio}"')
+        partes.append('/>')
+
+    def circulo(self, cx, cy, r, preenchimento="#333", contorno=None, espessura=None):
+        traco = f' stroke="{contorno}" stroke-width="{espessura}"' if contorno is not None else ''
+        self._partes.append(f'<circle cx="{cx}" cy="{cy}" r="{r}" fill="{preenchimento}"{traco}/>')
+
+    def linha(self, x1, y1, x2, y2, cor="#333", espessura=1):
+        self._partes.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{cor}" stroke-width="{espessura}"/>')
+
+    def caminho(self, d, cor="#333", espessura=1):
+        self._partes.append(f'<path d="{d}" stroke="{cor}" stroke-width="{espessura}" fill="none"/>')
+
+    def texto(self, x, y, conteudo, cor=None, negrito=False, rotacao=None):
+        """Texto de cota (classe dim-text); a rotação, em graus, é feita em torno de (x, y)."""
+        atributos = f' fill="{cor}"' if cor else ''
+        if negrito:
+            atributos += ' font-weight="bold"'
+        if rotacao is not None:
+            atributos += f' transform="rotate({rotacao}, {x}, {y})"'
+        self._partes.append(f'<text x="{x}" y="{y}" class="dim-text"{atributos}>{conteudo}</text>')
+
+    # --- Elementos de betão armado ----------------------------------------------------
+
+    def seccao(self, x, y, b, h):
+        """Contorno de uma secção transversal de betão."""
+        self.retangulo(x, y, b, h, "#e0e0e0", "#555", 2)
+
+    def estribo(self, x, y, largura, altura, phi_estribo):
+        """Estribo desenhado pelo eixo, com raio de dobragem 2Ø."""
+        raio = phi_estribo * 2
+        self.retangulo(x, y, largura, altura, "none", "#777", phi_estribo / 2, raio=raio)
+
+    def varoes(self, posicoes, phi, preenchimento="#333", contorno=None, espessura=None):
+        """Varões de diâmetro phi (na escala do desenho) nas posições (x, y) dadas."""
+        for x, y in posicoes:
+            self.circulo(x, y, phi / 2, preenchimento, contorno, espessura)
+
+    def cota_horizontal(self, x1, x2, y, aba):
+        """Linha de cota horizontal entre x1 e x2, com abas verticais de meia-altura aba."""
+        self.caminho(f"M {x1} {y - aba} L {x1} {y + aba} M {x1} {y} L {x2} {y} M {x2} {y - aba} L {x2} {y + aba}")
+
+    def cota_vertical(self, x, y1, y2, aba):
+        """Linha de cota vertical entre y1 e y2, com abas horizontais de meia-largura aba."""
+        self.caminho(f"M {x - aba} {y1} L {x + aba} {y1} M {x} {y1} L {x} {y2} M {x - aba} {y2} L {x + aba} {y2}")
+
+    def render(self):
+        return "".join(self._partes) + '</svg>'
+
+# ==============================================================================
+# CACHE DE DESENHOS (ENDEREÇADA PELO CONTEÚDO)
+# ==============================================================================
+
+# Número máximo de desenhos guardados (os menos usados recentemente são descartados).
+TAMANHO_CACHE_DESENHOS = 512
+
+_cache_desenhos = OrderedDict()
+_estatisticas_desenhos = {"hits": 0, "misses": 0}
+_trinco_desenhos = threading.Lock()
+
+def chave_desenho(nome, dados_desenho):
+    """Impressão digital (SHA-256) de um desenho: função que o gera + dados_desenho normalizados."""
+    conteudo = json.dumps(dados_desenho, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{nome}:{conteudo}".encode("utf-8")).hexdigest()
+
+def svg_em_cache(funcao):
+    """
+    Guarda o SVG produzido por funcao(dados_desenho) indexado pelo hash dos dados,
+    para que a página de histórico e o relatório PDF reutilizem a mesma cadeia.
+    """
+    nome = f"{funcao.__module__}.{funcao.__qualname__}"
+
+    @wraps(funcao)
+    def envolvida(dados_desenho):
+        chave = chave_desenho(nome, dados_desenho)
+        with _trinco_desenhos:
+            svg = _cache_desenhos.get(chave)
+            if svg is not None:
+                _cache_desenhos.move_to_end(chave)
+                _estatisticas_desenhos["hits"] += 1
+                return svg
+            _estatisticas_desenhos["misses"] += 1
+        svg = funcao(dados_desenho)
+        with _trinco_desenhos:
+            _cache_desenhos[chave] = svg
+            while len(_cache_desenhos) > TAMANHO_CACHE_DESENHOS:
+                _cache_desenhos.popitem(last=False)
+        return svg
+
+    envolvida.sem_cache = funcao
+    return envolvida
+
+def estatisticas_cache_desenhos():
+    """Devolve as estatísticas (acertos, falhas, ocupação) da cache de desenhos SVG."""
+    with _trinco_desenhos:
+        return {**_estatisticas_desenhos, "maxsize": TAMANHO_CACHE_DESENHOS, "currsize": len(_cache_desenhos)}
+
+def limpar_cache_desenhos():
+    with _trinco_desenhos:
+        _cache_desenhos.clear()
+        _estatisticas_desenhos.update(hits=0, misses=0)
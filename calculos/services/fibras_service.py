@@ -0,0 +1,235 @@
+# calculos/services/fibras_service.py
+import math
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from . import armadura_service, pilar_service
+
+# ==============================================================================
+# SECÇÃO DISCRETIZADA EM FIBRAS (FLEXÃO DESVIADA)
+# ==============================================================================
+# Convenções: origem no centro da secção, y segundo b e z segundo h; extensões e
+# tensões de compressão positivas. M_y = Σ σ·A·z comprime a face z > 0 (flexão
+# segundo h, como no cálculo uniaxial de pilar_service) e M_z = Σ σ·A·y comprime a
+# face y > 0. Betão com o diagrama parábola-retângulo do EC2 (3.1.7(1)), sem
+# resistência à tração; aço elasto-perfeitamente plástico, como em
+# pilar_service._dimensionar_pilar_rigoroso.
+#
+# Os planos de deformação últimos são parametrizados pela direção θ da zona
+# comprimida e pela profundidade x da linha neutra (medida na perpendicular):
+#   x ≤ D: rotação em torno de ε_cu2 na fibra mais comprimida (pivô B);
+#   x > D: rotação em torno do ponto a (1 - ε_c2/ε_cu2)·D dessa fibra, com ε_c2 (pivô C),
+# sendo D a altura da secção na direção θ. Usa-se t = x / (x + D) ∈ ]0, 1[.
+
+ES_MPA = 200000
+N_FIBRAS = (30, 30)
+N_ANGULOS = 72
+N_PROFUNDIDADES = 120
+_ITERACOES_BISSECCAO = 50
+_TAMANHO_BLOCO_PLANOS = 2048
+
+SeccaoFibras = namedtuple("SeccaoFibras", [
+    "b_mm", "h_mm", "y_mm", "z_mm", "A_mm2", "n_fibras_betao",
+    "f_cd_mpa", "f_yd_mpa", "epsilon_c2", "epsilon_cu2", "n_parabola",
+])
+
+def _parametros_parabola_retangulo(f_ck):
+    """ε_c2, ε_cu2 e expoente n do diagrama parábola-retângulo (EC2, Quadro 3.1)."""
+    if f_ck <= 50:
+        return 0.002, 0.0035, 2.0
+    r = (90 - f_ck) / 100
+    return (2.0 + 0.085 * (f_ck - 50)**0.53) / 1000, (2.6 + 35 * r**4) / 1000, 1.4 + 23.4 * r**4
+
+def seccao_retangular(b_mm, h_mm, f_ck, f_yk, varoes, n_fibras=N_FIBRAS):
+    """
+    Secção retangular b × h discretizada em n_fibras = (n_y, n_z) fibras de betão,
+    com varões em posições arbitrárias: varoes = [(y_mm, z_mm, area_mm2), ...],
+    coordenadas a partir do centro da secção.
+    """
+    n_y, n_z = n_fibras
+    dy, dz = b_mm / n_y, h_mm / n_z
+    y = -b_mm / 2 + dy * (np.arange(n_y) + 0.5)
+    z = -h_mm / 2 + dz * (np.arange(n_z) + 0.5)
+    y_c, z_c = (grelha.ravel() for grelha in np.meshgrid(y, z, indexing="ij"))
+    varoes = np.asarray(varoes, dtype=float).reshape(-1, 3)
+    epsilon_c2, epsilon_cu2, n_parabola = _parametros_parabola_retangulo(f_ck)
+    return SeccaoFibras(
+        b_mm=float(b_mm), h_mm=float(h_mm),
+        y_mm=np.concatenate((y_c, varoes[:, 0])),
+        z_mm=np.concatenate((z_c, varoes[:, 1])),
+        A_mm2=np.concatenate((np.full(y_c.size, dy * dz), varoes[:, 2])),
+        n_fibras_betao=y_c.size,
+        f_cd_mpa=f_ck / 1.5, f_yd_mpa=f_yk / 1.15,
+        epsilon_c2=epsilon_c2, epsilon_cu2=epsilon_cu2, n_parabola=n_parabola,
+    )
+
+def varoes_pilar(b_mm, h_mm, c_nom_mm, n_barras, phi_long, phi_estribo=8.0):
+    """
+    Varões na disposição de desenhar_pilar_svg (cantos + pares ao longo das faces h), em
+    coordenadas da secção. O recobrimento c_nom é medido até ao estribo: os centros ficam a
+    c_nom + Ø_estribo + Ø/2 das faces, como em _dimensionar_pilar_rigoroso.
+    """
+    area_mm2 = armadura_service.VERGALHOES_PADRAO.get(phi_long, math.pi * phi_long**2 / 400) * 100
+    return [(x - b_mm / 2, h_mm / 2 - y, area_mm2)
+            for x, y in pilar_service.posicoes_varoes_pilar(b_mm, h_mm, c_nom_mm + phi_estribo, n_barras, phi_long)]
+
+def _planos(seccao, theta, t):
+    """Extensão ε = ε_0 + k·s (s = y·cos θ + z·sin θ) dos planos últimos (θ, t), vetores do mesmo tamanho."""
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    s_max = seccao.b_mm / 2 * np.abs(cos_t) + seccao.h_mm / 2 * np.abs(sin_t)
+    D = 2 * s_max
+    x = D * t / (1 - t)
+    s_n = s_max - x
+    pivo_c = x > D
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = np.where(pivo_c, seccao.epsilon_c2 / (x - (1 - seccao.epsilon_c2 / seccao.epsilon_cu2) * D), seccao.epsilon_cu2 / x)
+    return -k * s_n, k * cos_t, k * sin_t
+
+def esforcos_resistentes(seccao, theta, t):
+    """
+    N [kN], M_y e M_z [kNm] dos planos últimos (θ, t), calculados em blocos:
+    cada plano é integrado sobre todas as fibras de uma só vez.
+    """
+    theta, t = np.broadcast_arrays(np.asarray(theta, dtype=float), np.asarray(t, dtype=float))
+    forma = theta.shape
+    theta, t = theta.ravel(), t.ravel()
+    n_c = seccao.n_fibras_betao
+    A_y, A_z = seccao.A_mm2 * seccao.y_mm, seccao.A_mm2 * seccao.z_mm
+    N, M_y, M_z = (np.empty(theta.size) for _ in range(3))
+    for inicio in range(0, theta.size, _TAMANHO_BLOCO_PLANOS):
+        bloco = slice(inicio, inicio + _TAMANHO_BLOCO_PLANOS)
+        eps0, k_y, k_z = _planos(seccao, theta[bloco], t[bloco])
+        epsilon = eps0[:, None] + k_y[:, None] * seccao.y_mm + k_z[:, None] * seccao.z_mm
+        sigma = np.empty_like(epsilon)
+        eps_c = np.clip(epsilon[:, :n_c] / seccao.epsilon_c2, 0.0, 1.0)
+        sigma[:, :n_c] = seccao.f_cd_mpa * (1 - (1 - eps_c)**seccao.n_parabola)
+        sigma[:, n_c:] = np.clip(ES_MPA * epsilon[:, n_c:], -seccao.f_yd_mpa, seccao.f_yd_mpa)
+        N[bloco] = sigma @ seccao.A_mm2 / 1000
+        M_y[bloco] = sigma @ A_z / 1e6
+        M_z[bloco] = sigma @ A_y / 1e6
+    return N.reshape(forma), M_y.reshape(forma), M_z.reshape(forma)
+
+def superficie_interacao(seccao, n_angulos=N_ANGULOS, n_profundidades=N_PROFUNDIDADES):
+    """Superfície de interação N–M_y–M_z: matrizes (n_angulos × n_profundidades) de N [kN], M_y e M_z [kNm]."""
+    theta = np.linspace(0, 2 * np.pi, n_angulos, endpoint=False)
+    # Mais planos junto à tração pura e à compressão pura, onde a superfície é mais curva.
+    u = np.linspace(0, 1, n_profundidades + 2)[1:-1]
+    t = 0.5 - 0.5 * np.cos(np.pi * u)
+    N, M_y, M_z = esforcos_resistentes(seccao, theta[:, None], t[None, :])
+    return {"theta": theta, "t": t, "N_kN": N, "My_kNm": M_y, "Mz_kNm": M_z,
+            "N_min_kN": float(N.min()), "N_max_kN": float(N.max())}
+
+def contorno_momentos(seccao, N_Ed_kN, n_angulos=N_ANGULOS):
+    """
+    Contorno (M_y, M_z) resistente para o esforço axial N_Ed: em cada direção θ procura-se,
+    por bissecção feita em simultâneo para todas as direções, o plano último com N = N_Ed.
+    Devolve None se N_Ed estiver fora do intervalo resistente da secção.
+    """
+    theta = np.linspace(0, 2 * np.pi, n_angulos, endpoint=False)
+    t_min, t_max = np.full(n_angulos, 1e-6), np.full(n_angulos, 1 - 1e-9)
+    N_min = esforcos_resistentes(seccao, theta, t_min)[0]
+    N_max = esforcos_resistentes(seccao, theta, t_max)[0]
+    if N_Ed_kN < N_min.max() or N_Ed_kN > N_max.min():
+        return None
+    for _ in range(_ITERACOES_BISSECCAO):
+        t = (t_min + t_max) / 2
+        abaixo = esforcos_resistentes(seccao, theta, t)[0] < N_Ed_kN
+        t_min = np.where(abaixo, t, t_min)
+        t_max = np.where(abaixo, t_max, t)
+    _, M_y, M_z = esforcos_resistentes(seccao, theta, (t_min + t_max) / 2)
+    return {"theta": theta, "My_kNm": M_y, "Mz_kNm": M_z}
+
+def verificar_flexao_desviada(seccao, N_Ed_kN, My_Ed_kNm, Mz_Ed_kNm, n_angulos=N_ANGULOS):
+    """
+    Verificação à flexão desviada: fator de utilização = |M_Ed| / |M_Rd| na direção do
+    momento atuante, com M_Rd no contorno resistente (poligonal) para N_Ed.
+    """
+    contorno = contorno_momentos(seccao, N_Ed_kN, n_angulos)
+    if contorno is None:
+        return {"dentro": False, "fator_utilizacao": math.inf, "My_Rd_kNm": 0.0, "Mz_Rd_kNm": 0.0, "contorno": None}
+    M_Ed = math.hypot(My_Ed_kNm, Mz_Ed_kNm)
+    direcao = math.atan2(My_Ed_kNm, Mz_Ed_kNm) if M_Ed > 0 else 0.0
+
+    # Interseção do raio com o segmento do contorno que o contém (ângulos polares ordenados).
+    P_z, P_y = contorno["Mz_kNm"], contorno["My_kNm"]
+    alfa = np.arctan2(P_y, P_z)
+    ordem = np.argsort(alfa)
+    P_z, P_y, alfa = P_z[ordem], P_y[ordem], alfa[ordem]
+    i = (np.searchsorted(alfa, direcao, side="right") - 1) % alfa.size
+    j = (i + 1) % alfa.size
+    d_z, d_y = math.cos(direcao), math.sin(direcao)
+    seg_z, seg_y = P_z[j] - P_z[i], P_y[j] - P_y[i]
+    R = (P_z[i] * P_y[j] - P_y[i] * P_z[j]) / (d_z * seg_y - d_y * seg_z)
+    fator = M_Ed / R
+    return {
+        "dentro": bool(fator <= 1.0), "fator_utilizacao": float(fator),
+        "My_Rd_kNm": float(R * d_y), "Mz_Rd_kNm": float(R * d_z),
+        "contorno": {"My_kNm": contorno["My_kNm"].tolist(), "Mz_kNm": contorno["Mz_kNm"].tolist()},
+    }
+
+@lru_cache(maxsize=64)
+def _seccao_pilar_cache(b_mm, h_mm, c_nom_mm, f_ck, f_yk, n_barras, phi_long, phi_estribo, n_fibras):
+    return seccao_retangular(b_mm, h_mm, f_ck, f_yk, varoes_pilar(b_mm, h_mm, c_nom_mm, n_barras, phi_long, phi_estribo), n_fibras)
+
+@lru_cache(maxsize=64)
+def _superficie_pilar_cache(chave, n_angulos, n_profundidades):
+    superficie = superficie_interacao(_seccao_pilar_cache(*chave), n_angulos, n_profundidades)
+    for valor in superficie.values():
+        if isinstance(valor, np.ndarray):
+            valor.flags.writeable = False
+    return superficie
+
+def superficie_interacao_pilar(b_mm, h_mm, c_nom_mm, f_ck, f_yk, n_barras, phi_long, phi_estribo=8.0,
+                               n_fibras=N_FIBRAS, n_angulos=N_ANGULOS, n_profundidades=N_PROFUNDIDADES):
+    """Superfície de interação de um pilar com a disposição de varões habitual (cache LRU por secção)."""
+    chave = (float(b_mm), float(h_mm), float(c_nom_mm), float(f_ck), float(f_yk), int(n_barras), int(phi_long), float(phi_estribo), tuple(n_fibras))
+    return _superficie_pilar_cache(chave, int(n_angulos), int(n_profundidades))
+
+# ==============================================================================
+# DIMENSIONAMENTO À FLEXÃO DESVIADA
+# ==============================================================================
+N_BARRAS_BIAXIAL = (4, 6, 8, 10, 12)
+PHI_BIAXIAL = (12, 16, 20, 25, 32)
+
+def _disposicoes_candidatas(b_mm, h_mm, c_nom_mm, phi_estribo):
+    """Disposições (n_barras, Ø) que cabem na secção, por ordem crescente de área."""
+    candidatas = []
+    for phi in PHI_BIAXIAL:
+        espacamento_min = max(phi, 20)
+        for n_barras in N_BARRAS_BIAXIAL:
+            n_por_face = 2 + math.ceil((n_barras - 4) / 2)
+            espaco_h = h_mm - 2 * c_nom_mm - 2 * phi_estribo
+            espaco_b = b_mm - 2 * c_nom_mm - 2 * phi_estribo
+            if (espaco_h - n_por_face * phi) / (n_por_face - 1) < espacamento_min or espaco_b - 2 * phi < espacamento_min:
+                continue
+            candidatas.append((n_barras * armadura_service.VERGALHOES_PADRAO[phi], n_barras, phi))
+    return sorted(candidatas)
+
+def dimensionar_pilar_biaxial(b_mm, h_mm, c_nom_mm, f_ck, f_yk, N_Ed_kN, My_Ed_kNm, Mz_Ed_kNm, phi_estribo=8.0, n_fibras=N_FIBRAS):
+    """
+    Dimensiona a armadura de um pilar à flexão desviada (esforços de cálculo já com os
+    efeitos de 2ª ordem): percorre as disposições habituais por ordem crescente de área,
+    a partir da armadura mínima, e adota a primeira que verifica na secção em fibras.
+    """
+    if b_mm <= 0 or h_mm <= 0:
+        raise ValueError("As dimensões da secção devem ser positivas.")
+    f_yd_mpa = f_yk / 1.15
+    As_min_cm2 = max(0.10 * N_Ed_kN * 1000 / f_yd_mpa, 0.002 * b_mm * h_mm) / 100
+    As_max_cm2 = 0.04 * b_mm * h_mm / 100
+    for area_cm2, n_barras, phi in _disposicoes_candidatas(b_mm, h_mm, c_nom_mm, phi_estribo):
+        if area_cm2 < As_min_cm2:
+            continue
+        if area_cm2 > As_max_cm2:
+            break
+        seccao = _seccao_pilar_cache(float(b_mm), float(h_mm), float(c_nom_mm), float(f_ck), float(f_yk), n_barras, phi, float(phi_estribo), tuple(n_fibras))
+        verificacao = verificar_flexao_desviada(seccao, N_Ed_kN, My_Ed_kNm, Mz_Ed_kNm)
+        if verificacao["dentro"]:
+            return {
+                "status": "Sucesso", "mensagem": "Cálculo efetuado com sucesso.",
+                "combinacao_final": f"{n_barras} Ø {phi}", "As_final_cm2": f"{area_cm2:.2f}",
+                "n_barras": n_barras, "phi_long": phi, "As_min_cm2": As_min_cm2,
+                "verificacao": verificacao,
+                "dados_desenho": {"b": b_mm, "h": h_mm, "c_nom": c_nom_mm, "phi_estribo": phi_estribo, "n_barras": n_barras, "phi_long": phi},
+            }
+    raise ValueError("Nenhuma disposição de armadura (até 4% da secção) verifica a flexão desviada.")
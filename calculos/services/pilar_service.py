@@ -1,11 +1,40 @@
 # calculos/services/pilar_service.py
 import math
-from . import armadura_service
+from functools import lru_cache
+
+import numpy as np
+from . import armadura_service, desenho_service, raizes
 
 # ==============================================================================
 # NOVA FUNÇÃO PARA DESENHAR O PILAR EM SVG
 # ==============================================================================
 
+def posicoes_varoes_pilar(b, h, c_nom, n_barras, phi_long):
+    """
+    Posições (x, y) [mm] dos centros dos varões, com origem no canto superior esquerdo
+    da secção (x segundo b, y segundo h): quatro cantos e, se houver mais varões,
+    pares intermédios ao longo das faces de dimensão h.
+    """
+    estribo_w = b - 2 * c_nom
+    estribo_h = h - 2 * c_nom
+    canto_sup_esq = (c_nom + phi_long/2, c_nom + phi_long/2)
+    canto_sup_dir = (c_nom + estribo_w - phi_long/2, c_nom + phi_long/2)
+    canto_inf_esq = (c_nom + phi_long/2, c_nom + estribo_h - phi_long/2)
+    canto_inf_dir = (c_nom + estribo_w - phi_long/2, c_nom + estribo_h - phi_long/2)
+
+    posicoes = [canto_sup_esq, canto_sup_dir, canto_inf_esq, canto_inf_dir]
+
+    # Varões intermédios (se existirem)
+    barras_restantes = n_barras - 4
+    if barras_restantes > 0:
+        n_inter_h = math.ceil(barras_restantes / 2)
+        esp_h = (estribo_h - phi_long) / (n_inter_h + 1)
+        for i in range(1, n_inter_h + 1):
+            posicoes.append((canto_sup_esq[0], canto_sup_esq[1] + i * esp_h))
+            posicoes.append((canto_sup_dir[0], canto_sup_dir[1] + i * esp_h))
+    return posicoes[:n_barras]
+
+@desenho_service.svg_em_cache
 def desenhar_pilar_svg(dados_desenho):
     """
     Gera uma representação SVG da secção transversal de um pilar.
@@ -18,130 +47,371 @@ def desenhar_pilar_svg(dados_desenho):
     phi_long = dados_desenho.get('phi_long', 16)
 
     PADDING = 60
-    viewbox_width = b + PADDING * 2
-    viewbox_height = h + PADDING * 2
-
-    svg = f'<svg width="100%" viewBox="0 0 {viewbox_width} {viewbox_height}" xmlns="http://www.w3.org/2000/svg">'
-    svg += '<style>.dim-text { font-family: Arial, sans-serif; font-size: 14px; fill: #333; text-anchor: middle; }</style>'
-
-    svg += f'<rect x="{PADDING}" y="{PADDING}" width="{b}" height="{h}" fill="#e0e0e0" stroke="#555" stroke-width="2"/>'
-
-    estribo_x = PADDING + c_nom
-    estribo_y = PADDING + c_nom
-    estribo_w = b - 2 * c_nom
-    estribo_h = h - 2 * c_nom
-    raio_curvatura_estribo = phi_estribo * 2
-    svg += f'<rect x="{estribo_x}" y="{estribo_y}" width="{estribo_w}" height="{estribo_h}" fill="none" stroke="#777" stroke-width="{phi_estribo / 2}" rx="{raio_curvatura_estribo}" ry="{raio_curvatura_estribo}"/>'
+    desenho = desenho_service.DesenhoSVG(b + PADDING * 2, h + PADDING * 2)
+    desenho.seccao(PADDING, PADDING, b, h)
+    desenho.estribo(PADDING + c_nom, PADDING + c_nom, b - 2 * c_nom, h - 2 * c_nom, phi_estribo)
 
     if n_barras > 0 and phi_long > 0:
-        # Posições dos varões
-        canto_sup_esq = (estribo_x + phi_long/2, estribo_y + phi_long/2)
-        canto_sup_dir = (estribo_x + estribo_w - phi_long/2, estribo_y + phi_long/2)
-        canto_inf_esq = (estribo_x + phi_long/2, estribo_y + estribo_h - phi_long/2)
-        canto_inf_dir = (estribo_x + estribo_w - phi_long/2, estribo_y + estribo_h - phi_long/2)
-
-        posicoes = [canto_sup_esq, canto_sup_dir, canto_inf_esq, canto_inf_dir]
-
-        # Varões intermédios (se existirem)
-        barras_restantes = n_barras - 4
-        if barras_restantes > 0:
-            n_inter_h = math.ceil(barras_restantes / 2)
-            esp_h = (estribo_h - phi_long) / (n_inter_h + 1)
-            for i in range(1, n_inter_h + 1):
-                posicoes.append((canto_sup_esq[0], canto_sup_esq[1] + i * esp_h))
-                posicoes.append((canto_sup_dir[0], canto_sup_dir[1] + i * esp_h))
-
-        for x, y in posicoes[:n_barras]:
-            svg += f'<circle cx="{x}" cy="{y}" r="{phi_long/2}" fill="#333"/>'
-
+        posicoes = posicoes_varoes_pilar(b, h, c_nom, n_barras, phi_long)
+        desenho.varoes([(PADDING + x, PADDING + y) for x, y in posicoes], phi_long)
 
     # Cotas
-    svg += f'<path d="M {PADDING/4} {PADDING} L {PADDING*3/4} {PADDING} M {PADDING/2} {PADDING} L {PADDING/2} {PADDING+h} M {PADDING/4} {PADDING+h} L {PADDING*3/4} {PADDING+h}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{PADDING/2 - 10}" y="{PADDING + h/2}" class="dim-text" transform="rotate(-90, {PADDING/2 - 10}, {PADDING + h/2})">{h}</text>'
-    svg += f'<path d="M {PADDING} {PADDING/4} L {PADDING} {PADDING*3/4} M {PADDING} {PADDING/2} L {PADDING+b} {PADDING/2} M {PADDING+b} {PADDING/4} L {PADDING+b} {PADDING*3/4}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{PADDING + b/2}" y="{PADDING/2 - 10}" class="dim-text">{b}</text>'
-
-    svg += '</svg>'
-    return svg
+    desenho.cota_vertical(PADDING/2, PADDING, PADDING + h, PADDING/4)
+    desenho.texto(PADDING/2 - 10, PADDING + h/2, h, rotacao=-90)
+    desenho.cota_horizontal(PADDING, PADDING + b, PADDING/2, PADDING/4)
+    desenho.texto(PADDING + b/2, PADDING/2 - 10, b)
+    return desenho.render()
 
 # ==============================================================================
 # FUNÇÃO AUXILIAR RIGOROSA
 # ==============================================================================
 
-def _dimensionar_pilar_rigoroso(b_mm, h_mm, f_ck, f_cd_mpa, f_yd_mpa, N_Ed_N, M_Ed_total_Nm, c_nom_mm, passos_ref):
-    """
-    Itera em x para equilibrar NRd = NEd e garantir MRd >= MEd.
-    EC2 3.1.7 - Diagrama retangular simplificado.
-    """
-    # Verificação de lambda e eta segundo EC2 (3.1.7)
+# Tolerância (mm²) na armadura total obtida pela resolução de MRd(As) = MEd.
+TOL_AS_PILAR_MM2 = 0.01
+
+def _parametros_ec2(f_ck):
+    """λ, η e ε_cu3 segundo o EC2 (3.1.7)."""
     if f_ck <= 50:
         lambda_val = 0.8
         eta = 1.0
     else:
         lambda_val = max(0.8 - (f_ck - 50) / 400, 0.7)
         eta = max(1.0 - (f_ck - 50) / 200, 0.9)
-        
+    epsilon_cu3 = 0.0035 if f_ck <= 50 else (0.0026 + 35 * ((90 - f_ck) / 100)**4)
+    return lambda_val, eta, epsilon_cu3
+
+def _limitar(valor, minimo, maximo):
+    return max(minimo, min(valor, maximo))
+
+def _forcas_seccao(x, As_face_mm2, b_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa):
+    """
+    Forças no betão e nas duas faces de armadura para a linha neutra x > 0 (compressão
+    positiva, Fst positiva à tração). x pode ser um escalar ou um vetor NumPy.
+    """
+    limitar = np.clip if isinstance(x, np.ndarray) else _limitar
+    sigma_sc = limitar(Es_mpa * epsilon_cu3 * (x - d_linha_mm) / x, -f_yd_mpa, f_yd_mpa)
+    sigma_st = limitar(Es_mpa * epsilon_cu3 * (d_mm - x) / x, -f_yd_mpa, f_yd_mpa)
+    Fc = eta * f_cd_mpa * b_mm * (lambda_val * x)
+    return Fc, As_face_mm2 * sigma_sc, As_face_mm2 * sigma_st
+
+def _esforcos_resistentes(x, As_face_mm2, b_mm, h_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa):
+    """NRd [N] e MRd [N·mm] (em relação ao centro da secção) para a linha neutra x (escalar ou vetor)."""
+    Fc, Fsc, Fst = _forcas_seccao(x, As_face_mm2, b_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa)
+    z_c = h_mm / 2 - (lambda_val * x) / 2
+    z_s = h_mm / 2 - d_linha_mm
+    return Fc + Fsc - Fst, Fc * z_c + Fsc * z_s + Fst * z_s
+
+def _limites_linha_neutra(h_mm):
+    """Intervalo de x pesquisado pelo dimensionamento e pelo diagrama de interação."""
+    return 0.001, h_mm * 2
+
+def _estado_aco(sigma_elastica, f_yd_mpa):
+    """0: cedido à compressão, 1: elástico, 2: cedido à tração (tensão positiva = compressão)."""
+    if sigma_elastica >= f_yd_mpa:
+        return 0
+    if sigma_elastica <= -f_yd_mpa:
+        return 2
+    return 1
+
+def _linha_neutra_equilibrio(N_Ed_N, As_face_mm2, x_min, x_max, b_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa, ramo_inicial=(1, 2)):
+    """
+    Linha neutra x em [x_min, x_max] com NRd(x) = NEd. NRd é crescente em x e, em
+    cada ramo (aço cedido à compressão / elástico / cedido à tração, em cada face),
+    NRd(x)·x é um polinómio de 2º grau: resolve-se cada ramo analiticamente, a começar
+    por ramo_inicial, e aceita-se a raiz coerente com o ramo. Se NEd estiver fora do
+    intervalo, devolve o extremo.
+    Devolve (x, ramo, nº de ramos/avaliações de NRd usados).
+    """
+    # σ·x em cada ramo, na forma α·x + β (compressão positiva na face comprimida, tração positiva na face tracionada)
+    k = Es_mpa * epsilon_cu3
+    ramos_sc = ((f_yd_mpa, 0.0), (k, -k * d_linha_mm), (-f_yd_mpa, 0.0))
+    ramos_st = ((-f_yd_mpa, 0.0), (-k, k * d_mm), (f_yd_mpa, 0.0))
+    a2 = eta * f_cd_mpa * b_mm * lambda_val
+    ordem = [ramo_inicial] + [(i, j) for i in range(3) for j in range(3) if (i, j) != ramo_inicial]
+    for n, (i, j) in enumerate(ordem, 1):
+        alfa_sc, beta_sc = ramos_sc[i]
+        alfa_st, beta_st = ramos_st[j]
+        a1 = As_face_mm2 * (alfa_sc - alfa_st) - N_Ed_N
+        a0 = As_face_mm2 * (beta_sc - beta_st)
+        discriminante = a1 * a1 - 4 * a2 * a0
+        if discriminante < 0:
+            continue
+        # Forma numericamente estável das raízes
+        q = -0.5 * (a1 + math.copysign(math.sqrt(discriminante), a1))
+        for x in (q / a2, a0 / q if q != 0 else None):
+            if x is None or not (x_min < x < x_max):
+                continue
+            # Estado da face comprimida (σ_sc) e da tracionada (σ_st, com o sinal invertido)
+            if (_estado_aco(k * (x - d_linha_mm) / x, f_yd_mpa) == i
+                    and _estado_aco(-k * (d_mm - x) / x, f_yd_mpa) == j):
+                return x, (i, j), n
+
+    argumentos = (As_face_mm2, b_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa)
+
+    def excesso_N(x):
+        Fc, Fsc, Fst = _forcas_seccao(x, *argumentos)
+        return Fc + Fsc - Fst - N_Ed_N
+
+    f_min, f_max = excesso_N(x_min), excesso_N(x_max)
+    avaliacoes = len(ordem) + 2
+    if f_min >= 0:
+        return x_min, ramo_inicial, avaliacoes
+    if f_max <= 0:
+        return x_max, ramo_inicial, avaliacoes
+    x, n = raizes.brent(excesso_N, x_min, x_max, fa=f_min, fb=f_max, xtol=1e-6)
+    return x, ramo_inicial, avaliacoes + n
+
+def _dimensionar_pilar_rigoroso(b_mm, h_mm, f_ck, f_cd_mpa, f_yd_mpa, N_Ed_N, M_Ed_total_Nm, c_nom_mm, tol_As_mm2=TOL_AS_PILAR_MM2, palpite=None):
+    """
+    Armadura simétrica mínima com NRd = NEd e MRd ≥ MEd.
+    EC2 3.1.7 - Diagrama retangular simplificado.
+    Parte da armadura mínima; se esta não bastar, resolve MRd(As) = MEd pelo método
+    de Brent (com x de equilíbrio calculado em cada avaliação) até à tolerância tol_As_mm2.
+    palpite ({"As_req_mm2", "ramo"}, p.ex. de um ponto vizinho num varrimento) dá um
+    arranque a quente: a raiz é enquadrada junto dessa armadura e a linha neutra parte
+    do mesmo ramo de equilíbrio.
+    Devolve um dicionário com a armadura, MRd, x, os valores da armadura inicial
+    (para o relatório; None se o arranque a quente a dispensou) e o nº de avaliações efetuadas.
+    """
+    lambda_val, eta, epsilon_cu3 = _parametros_ec2(f_ck)
     Es_mpa = 200000
     d_linha_mm = c_nom_mm + 8 + 16/2
     d_mm = h_mm - d_linha_mm
-    epsilon_cu3 = 0.0035 if f_ck <= 50 else (0.0026 + 35 * ((90 - f_ck) / 100)**4)
-    epsilon_s_ced = f_yd_mpa / Es_mpa
     Ac_mm2 = b_mm * h_mm
-    As_total_req_mm2 = max(0.10 * N_Ed_N / f_yd_mpa, 0.002 * Ac_mm2)
-    
-    calculo_iterativo_str = ""
-    MRd_Nmm, x_final = 0, 0
-    
-    for i in range(100):
-        As_face_mm2 = As_total_req_mm2 / 2
-        x_min, x_max = 0.001, h_mm * 2
-        x = (x_min + x_max) / 2
-        
-        for j in range(50):
-            epsilon_sc = epsilon_cu3 * (x - d_linha_mm) / x if x > 0 else 0
-            epsilon_st = epsilon_cu3 * (d_mm - x) / x if x > 0 else 0
-            sigma_sc = max(-f_yd_mpa, min(Es_mpa * epsilon_sc, f_yd_mpa))
-            sigma_st = max(-f_yd_mpa, min(Es_mpa * epsilon_st, f_yd_mpa))
-            Fc = eta * f_cd_mpa * b_mm * (lambda_val * x) if x > 0 else 0
-            Fsc = As_face_mm2 * sigma_sc
-            Fst = As_face_mm2 * sigma_st
-            NRd = Fc + Fsc - Fst
-            if abs(NRd - N_Ed_N) < 0.001 * abs(N_Ed_N): break
-            if NRd < N_Ed_N: x_min = x
-            else: x_max = x
-            x = (x_min + x_max) / 2
-        
-        z_c = h_mm / 2 - (lambda_val * x) / 2
-        z_s = h_mm / 2 - d_linha_mm
-        MRd_Nmm = (Fc * z_c + Fsc * z_s + Fst * z_s)
-        x_final = x
-        
-        if i == 0:
-             calculo_iterativo_str += f"<b>Início da Iteração:</b><br>Assume-se: λ = {lambda_val:.2f}, η = {eta:.2f} (EC2 3.1.7).<br>"
-             calculo_iterativo_str += f"Começa-se com a armadura mínima (As,req = {As_total_req_mm2/100:.2f} cm²).<br>"
-             calculo_iterativo_str += f"Para As = {As_total_req_mm2/100:.2f} cm² e NEd = {N_Ed_N/1000:.1f} kN, o equilíbrio de forças é atingido para x = {x:.1f} mm.<br>"
-             calculo_iterativo_str += f"Com este x, o momento resistente é MRd = {MRd_Nmm/1000000:.2f} kNm.<br>"
-
-        if MRd_Nmm >= M_Ed_total_Nm * 1000:
-            calculo_iterativo_str += (
-                f"<b>Conclusão:</b> O momento resistente (MRd = {MRd_Nmm/1000000:.2f} kNm) é superior ao momento de cálculo (MEd = {M_Ed_total_Nm/1000:.2f} kNm).<br>"
-                f"A armadura é, portanto, suficiente para equilibrar a secção (com x = {x_final:.1f} mm)."
-            )
-            passos_ref.append({
-                "titulo": "6. Área de Aço Calculada (Método Iterativo)",
-                "formula": r"N_{Rd} = F_c + F_{sc} - F_{st} \implies M_{Rd} \ge M_{Ed}",
-                "calculo": calculo_iterativo_str
-            })
-            return As_total_req_mm2, MRd_Nmm / 1000000, x_final
-
-        As_total_req_mm2 *= 1.05
-
-    raise ValueError("O algoritmo de dimensionamento do pilar não convergiu.")
+    x_min, x_max = _limites_linha_neutra(h_mm)
+    z_s = h_mm / 2 - d_linha_mm
+    M_Ed_Nmm = M_Ed_total_Nm * 1000
+    contagem = {"avaliacoes_MRd": 0, "avaliacoes_NRd": 0}
+    ramo = [tuple(palpite["ramo"]) if palpite and palpite.get("ramo") else (1, 2)]  # ramo da avaliação anterior
+    seguro = [math.inf, None, None]  # menor As avaliada com MRd ≥ MEd: (As, MRd, x)
+
+    def resistencia(As_total_mm2):
+        As_face_mm2 = As_total_mm2 / 2
+        x, ramo[0], n = _linha_neutra_equilibrio(N_Ed_N, As_face_mm2, x_min, x_max, b_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa, ramo[0])
+        _, MRd_Nmm = _esforcos_resistentes(x, As_face_mm2, b_mm, h_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa)
+        contagem["avaliacoes_MRd"] += 1
+        contagem["avaliacoes_NRd"] += n
+        if MRd_Nmm >= M_Ed_Nmm and As_total_mm2 < seguro[0]:
+            seguro[:] = [As_total_mm2, MRd_Nmm, x]
+        return MRd_Nmm, x
+
+    def resultado(As_mm2, MRd_Nmm, x):
+        return {
+            "lambda_val": lambda_val, "eta": eta, "inicial": inicial,
+            "As_req_mm2": As_mm2, "MRd_kNm": MRd_Nmm / 1000000, "x_mm": x,
+            "iteracoes": dict(contagem), "ramo": list(ramo[0]),
+        }
+
+    As_inicial_mm2 = max(0.10 * N_Ed_N / f_yd_mpa, 0.002 * Ac_mm2)
+    inicial = None
+    As_palpite = palpite["As_req_mm2"] if palpite else 0.0
+    As_alto = None
+    if As_palpite > As_inicial_mm2:
+        # Arranque a quente: intervalo apertado em torno da armadura vizinha, alargado
+        # (×4) até conter a raiz. A armadura mínima só é avaliada se o intervalo lá chegar.
+        MRd_palpite, x = resistencia(As_palpite)
+        # 1º passo: correção de Newton com ΔMRd ≈ ΔAs·f_yd·z_s, com 50% de folga.
+        passo = max(1.5 * abs(M_Ed_Nmm - MRd_palpite) / (f_yd_mpa * z_s), 2 * tol_As_mm2) if z_s > 0 else 0.01 * As_palpite
+        if MRd_palpite >= M_Ed_Nmm:
+            As_alto, MRd_alto = As_palpite, MRd_palpite
+            while As_alto - passo > As_inicial_mm2:
+                MRd_teste, x = resistencia(As_alto - passo)
+                if MRd_teste < M_Ed_Nmm:
+                    As_baixo, f_baixo = As_alto - passo, MRd_teste - M_Ed_Nmm
+                    break
+                As_alto, MRd_alto = As_alto - passo, MRd_teste
+                passo *= 4
+            else:
+                MRd_Nmm, x = resistencia(As_inicial_mm2)
+                inicial = {"As_mm2": As_inicial_mm2, "x_mm": x, "MRd_Nmm": MRd_Nmm}
+                if MRd_Nmm >= M_Ed_Nmm:
+                    return resultado(As_inicial_mm2, MRd_Nmm, x)
+                As_baixo, f_baixo = As_inicial_mm2, MRd_Nmm - M_Ed_Nmm
+        else:
+            As_baixo, f_baixo = As_palpite, MRd_palpite - M_Ed_Nmm
+            As_tentativa, incremento, fator = As_palpite + passo, passo, 4
+    else:
+        MRd_Nmm, x = resistencia(As_inicial_mm2)
+        inicial = {"As_mm2": As_inicial_mm2, "x_mm": x, "MRd_Nmm": MRd_Nmm}
+        if MRd_Nmm >= M_Ed_Nmm:
+            return resultado(As_inicial_mm2, MRd_Nmm, x)
+        As_baixo, f_baixo = As_inicial_mm2, MRd_Nmm - M_Ed_Nmm
+        # 1ª tentativa com ambas as faces em cedência (ΔMRd ≈ ΔAs·f_yd·z_s, +10%);
+        # depois duplica-se a armadura.
+        As_tentativa = 1.1 * (As_inicial_mm2 + (M_Ed_Nmm - MRd_Nmm) / (f_yd_mpa * z_s)) if z_s > 0 else 2 * As_inicial_mm2
+        incremento, fator = As_tentativa, 2
+
+    if As_alto is None:
+        # Enquadramento da raiz: aumenta-se a armadura até MRd ≥ MEd.
+        for _ in range(40):
+            MRd_alto, _ = resistencia(As_tentativa)
+            if MRd_alto >= M_Ed_Nmm:
+                As_alto = As_tentativa
+                break
+            As_baixo, f_baixo = As_tentativa, MRd_alto - M_Ed_Nmm
+            As_tentativa += incremento
+            incremento *= fator
+        else:
+            raise ValueError("O algoritmo de dimensionamento do pilar não convergiu.")
+
+    raizes.brent(lambda As: resistencia(As)[0] - M_Ed_Nmm, As_baixo, As_alto,
+                 fa=f_baixo, fb=MRd_alto - M_Ed_Nmm, xtol=tol_As_mm2, rtol=0.0)
+    # O intervalo final do Brent tem largura ≤ tol e MRd é crescente em As: a menor
+    # armadura avaliada com MRd ≥ MEd está do lado seguro, a menos de tol da raiz.
+    return resultado(*seguro)
+
+# ==============================================================================
+# DIAGRAMA DE INTERAÇÃO N–M
+# ==============================================================================
+
+N_PONTOS_DIAGRAMA = 241
+# Erro máximo admitido nas cordas do polígono, em fração de M_Rd,máx.
+TOL_DIAGRAMA = 1e-6
+
+@lru_cache(maxsize=128)
+def _diagrama_interacao_cache(b_mm, h_mm, c_nom_mm, f_ck, f_yk, As_total_mm2, n_pontos):
+    lambda_val, eta, epsilon_cu3 = _parametros_ec2(f_ck)
+    Es_mpa = 200000
+    f_cd_mpa, f_yd_mpa = f_ck / 1.5, f_yk / 1.15
+    d_linha_mm = c_nom_mm + 8 + 16/2
+    d_mm = h_mm - d_linha_mm
+    As_face_mm2 = As_total_mm2 / 2
+
+    def curva(x):
+        N_N, M_Nmm = _esforcos_resistentes(x, As_face_mm2, b_mm, h_mm, d_mm, d_linha_mm, f_cd_mpa, f_yd_mpa, lambda_val, eta, epsilon_cu3, Es_mpa)
+        return N_N / 1000, M_Nmm / 1000000
+
+    # Varrimento da linha neutra no mesmo intervalo e com os mesmos esforços do
+    # dimensionamento, refinado onde a corda se afasta da curva (zonas de cedência do aço).
+    x = np.linspace(*_limites_linha_neutra(h_mm), n_pontos)
+    N_kN, M_kNm = curva(x)
+    for _ in range(12):
+        x_meio = (x[:-1] + x[1:]) / 2
+        N_meio, M_meio = curva(x_meio)
+        M_corda = M_kNm[:-1] + (N_meio - N_kN[:-1]) * np.diff(M_kNm) / np.diff(N_kN)
+        refinar = np.abs(M_meio - M_corda) > TOL_DIAGRAMA * M_kNm.max()
+        if not refinar.any():
+            break
+        ordem = np.argsort(np.concatenate((x, x_meio[refinar])), kind="stable")
+        x = np.concatenate((x, x_meio[refinar]))[ordem]
+        N_kN = np.concatenate((N_kN, N_meio[refinar]))[ordem]
+        M_kNm = np.concatenate((M_kNm, M_meio[refinar]))[ordem]
+
+    # Com a linha neutra muito abaixo da secção o momento resistente torna-se negativo:
+    # o dimensionamento nunca aceita esses pontos e a curva termina em M = 0.
+    pico = int(M_kNm.argmax())
+    negativos = np.flatnonzero(M_kNm[pico:] < 0)
+    if negativos.size:
+        k = pico + int(negativos[0])
+        t = M_kNm[k - 1] / (M_kNm[k - 1] - M_kNm[k])
+        x = np.append(x[:k], x[k - 1] + t * (x[k] - x[k - 1]))
+        N_kN = np.append(N_kN[:k], N_kN[k - 1] + t * (N_kN[k] - N_kN[k - 1]))
+        M_kNm = np.append(M_kNm[:k], 0.0)
+
+    # Polígono fechado e simétrico (momentos positivos e negativos).
+    N_poligono = np.concatenate((N_kN, N_kN[::-1], N_kN[:1]))
+    M_poligono = np.concatenate((M_kNm, -M_kNm[::-1], M_kNm[:1]))
+    for vetor in (x, N_poligono, M_poligono):
+        vetor.flags.writeable = False
+    return {
+        "x_mm": x, "N_kN": N_poligono, "M_kNm": M_poligono,
+        "N_min_kN": float(N_kN.min()), "N_max_kN": float(N_kN.max()), "M_max_kNm": float(M_kNm.max()),
+    }
+
+def diagrama_interacao_pilar(b_mm, h_mm, c_nom_mm, f_ck, f_yk, As_total_mm2, n_pontos=N_PONTOS_DIAGRAMA):
+    """
+    Diagrama de interação N–M de uma secção retangular com armadura simétrica
+    (metade de As_total em cada face), com as mesmas hipóteses, o mesmo intervalo
+    de linha neutra e os mesmos esforços (_esforcos_resistentes) de
+    _dimensionar_pilar_rigoroso (EC2 3.1.7, ε_cu3, aço elasto-plástico).
+    Devolve o polígono fechado em N_kN / M_kNm (arrays só de leitura), guardado
+    em cache LRU por secção e materiais.
+    """
+    chave = (float(b_mm), float(h_mm), float(c_nom_mm), float(f_ck), float(f_yk), round(float(As_total_mm2), 2), int(n_pontos))
+    return _diagrama_interacao_cache(*chave)
+
+def verificar_esforcos_diagrama(diagrama, N_Ed_kN, M_Ed_kNm):
+    """
+    Verifica se os pares (N_Ed, M_Ed) estão dentro do diagrama de interação
+    (teste de ponto em polígono por contagem de interseções). Aceita escalares ou vetores.
+    """
+    N = np.asarray(N_Ed_kN, dtype=float)[..., None]
+    M = np.asarray(M_Ed_kNm, dtype=float)[..., None]
+    N1, N2 = diagrama["N_kN"][:-1], diagrama["N_kN"][1:]
+    M1, M2 = diagrama["M_kNm"][:-1], diagrama["M_kNm"][1:]
+    atravessa = (N1 > N) != (N2 > N)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        M_intersecao = M1 + (N - N1) * (M2 - M1) / (N2 - N1)
+    dentro = np.count_nonzero(atravessa & (M < M_intersecao), axis=-1) % 2 == 1
+    return dentro if dentro.ndim else bool(dentro)
+
+def diagrama_interacao_da_memoria(memoria):
+    """Diagrama de interação da armadura adotada, a partir da memória de cálculo de calcular_pilar."""
+    area_cm2 = memoria.get("area_prov_cm2", memoria["As_prov_cm2"])
+    return diagrama_interacao_pilar(memoria["b_mm"], memoria["h_mm"], memoria["c_nom_mm"], memoria["f_ck"], memoria["f_yk"], area_cm2 * 100)
+
+def dados_diagrama_interacao(diagrama):
+    """Versão serializável em JSON do diagrama (para gráficos na página e no relatório)."""
+    return {
+        "N_kN": [round(v, 3) for v in diagrama["N_kN"].tolist()],
+        "M_kNm": [round(v, 3) for v in diagrama["M_kNm"].tolist()],
+        "N_min_kN": diagrama["N_min_kN"], "N_max_kN": diagrama["N_max_kN"], "M_max_kNm": diagrama["M_max_kNm"],
+    }
+
+def desenhar_diagrama_interacao_svg(diagrama, N_Ed_kN=None, M_Ed_kNm=None):
+    """Gera o diagrama de interação N–M em SVG (M nas abcissas, N nas ordenadas, compressão para cima)."""
+    LARGURA, ALTURA, PADDING = 400, 400, 50
+    N, M = diagrama["N_kN"], diagrama["M_kNm"]
+    N_lim = [float(N.min()), float(N.max())]
+    M_lim = float(np.abs(M).max())
+    if N_Ed_kN is not None and M_Ed_kNm is not None:
+        N_lim = [min(N_lim[0], N_Ed_kN), max(N_lim[1], N_Ed_kN)]
+        M_lim = max(M_lim, abs(M_Ed_kNm))
+    M_lim = M_lim * 1.1 or 1.0
+    N_intervalo = (N_lim[1] - N_lim[0]) or 1.0
+    N_base, N_amplitude = N_lim[0] - 0.05 * N_intervalo, 1.1 * N_intervalo
+
+    def px(m):
+        return PADDING + (m + M_lim) / (2 * M_lim) * LARGURA
+
+    def py(n):
+        return PADDING + ALTURA - (n - N_base) / N_amplitude * ALTURA
+
+    svg = f'<svg width="100%" viewBox="0 0 {LARGURA + 2 * PADDING} {ALTURA + 2 * PADDING}" xmlns="http://www.w3.org/2000/svg">'
+    svg += '<style>.dim-text { font-family: Arial, sans-serif; font-size: 12px; fill: #333; text-anchor: middle; }</style>'
+    svg += f'<rect x="0" y="0" width="{LARGURA + 2 * PADDING}" height="{ALTURA + 2 * PADDING}" fill="#f9f9f9"/>'
+    svg += f'<line x1="{PADDING}" y1="{py(0):.1f}" x2="{PADDING + LARGURA}" y2="{py(0):.1f}" stroke="#999" stroke-width="1"/>'
+    svg += f'<line x1="{px(0):.1f}" y1="{PADDING}" x2="{px(0):.1f}" y2="{PADDING + ALTURA}" stroke="#999" stroke-width="1"/>'
+    pontos = " ".join(f"{px(m):.1f},{py(n):.1f}" for n, m in zip(N.tolist(), M.tolist()))
+    svg += f'<polygon points="{pontos}" fill="#005a9e" fill-opacity="0.15" stroke="#005a9e" stroke-width="2"/>'
+    svg += f'<text x="{PADDING + LARGURA - 20}" y="{py(0) - 6:.1f}" class="dim-text">M [kNm]</text>'
+    svg += f'<text x="{px(0) + 6:.1f}" y="{PADDING - 10}" class="dim-text" style="text-anchor: start;">N [kN]</text>'
+    svg += f'<text x="{px(0) + 6:.1f}" y="{py(diagrama["N_max_kN"]) + 14:.1f}" class="dim-text" style="text-anchor: start;">{diagrama["N_max_kN"]:.0f}</text>'
+    svg += f'<text x="{px(diagrama["M_max_kNm"]):.1f}" y="{py(0) + 16:.1f}" class="dim-text">{diagrama["M_max_kNm"]:.0f}</text>'
+    if N_Ed_kN is not None and M_Ed_kNm is not None:
+        cor = "#198754" if verificar_esforcos_diagrama(diagrama, N_Ed_kN, M_Ed_kNm) else "#cc0000"
+        svg += f'<circle cx="{px(M_Ed_kNm):.1f}" cy="{py(N_Ed_kN):.1f}" r="5" fill="{cor}"/>'
+        svg += f'<text x="{px(M_Ed_kNm):.1f}" y="{py(N_Ed_kN) - 10:.1f}" class="dim-text" fill="{cor}">(M_Ed, N_Ed)</text>'
+    svg += '</svg>'
+    return svg
 
 # ==============================================================================
 # FUNÇÕES AUXILIARES DE ESBELTEZA E 2ª ORDEM
 # ==============================================================================
 
+# Coeficiente de comprimento efetivo l0 = β·l por ligação topo-base.
+CASOS_BETA = {"encab-encab": 0.7, "encab-artic": 0.85, "encab-livre": 2.2, "artic-encab": 0.85, "artic-artic": 1.0, "livre-encab": 2.2}
+
+def _coeficiente_beta(lig_topo, lig_base):
+    """Coeficiente β de comprimento efetivo; rejeita as combinações de ligações instáveis."""
+    beta = CASOS_BETA.get(f"{lig_topo}-{lig_base}", 1.0)
+    if lig_base == 'livre' or (lig_topo == 'livre' and not lig_base == 'encab'): raise ValueError("Combinação de ligações instável.")
+    return beta
+
+def _escalar_ou_vetor(*valores):
+    """Converte resultados de numpy para float quando o cálculo foi feito para um único caso."""
+    return tuple(float(v) if np.ndim(v) == 0 else v for v in valores)
+
 def calcular_esbelteza_e_lambda_lim(h_mm, l0_m, N_Ed_N, Ac_mm2, f_cd_mpa, phi_ef):
     """
     Calcula a esbelteza e a esbelteza limite segundo o Eurocódigo 2 (EN 1992-1-1).
@@ -149,37 +419,43 @@ def calcular_esbelteza_e_lambda_lim(h_mm, l0_m, N_Ed_N, Ac_mm2, f_cd_mpa, phi_ef
     - lambda = l0 / i
     - EC2 5.8.3.1 (Esbelteza limite): lambda_lim = 20 * A * B * C / √n
     - A = 1 / (1 + 0.2*phi_ef), B = 1.1 e C = 0.7 (valores recomendados por defeito)
+    N_Ed_N, l0_m e phi_ef podem ser vetores (vários casos de carga ou um varrimento).
     """
     i_mm = h_mm / math.sqrt(12)
     esbelteza = (l0_m * 1000) / i_mm if i_mm > 0 else 0
     
-    n = N_Ed_N / (Ac_mm2 * f_cd_mpa) if (Ac_mm2 * f_cd_mpa) > 0 else 0
+    N_Ed_N = np.asarray(N_Ed_N, dtype=float)
+    n = N_Ed_N / (Ac_mm2 * f_cd_mpa) if (Ac_mm2 * f_cd_mpa) > 0 else np.zeros_like(N_Ed_N)
     A = 1 / (1 + 0.2 * phi_ef)
     B, C = 1.1, 0.7 
-    lambda_lim = 20 * A * B * C / math.sqrt(n) if n > 0 else float('inf')
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lambda_lim = np.where(n > 0, 20 * A * B * C / np.sqrt(n), float('inf'))
     
+    n, lambda_lim = _escalar_ou_vetor(n, lambda_lim)
     return i_mm, esbelteza, n, A, B, C, lambda_lim
 
 def calcular_momento_segunda_ordem(esbelteza, f_ck, f_yd_mpa, f_cd_mpa, Es_mpa, N_Ed_N, Ac_mm2, As_est_mm2, l0_m, h_mm, c_nom_mm, phi_estribo, phi_ef, n):
     """
     Calcula o momento de 2ª ordem pelo método da curvatura nominal (EC2 5.8.8).
+    N_Ed_N, As_est_mm2, n, esbelteza, l0_m e phi_ef podem ser vetores (um valor por caso).
     """
-    omega = (As_est_mm2 * f_yd_mpa) / (Ac_mm2 * f_cd_mpa)
+    omega = (np.asarray(As_est_mm2, dtype=float) * f_yd_mpa) / (Ac_mm2 * f_cd_mpa)
     n_u = 1 + omega
     n_bal = 0.4
     
     # Prevenção de divisão por zero ou resultados absurdos
     diff_n = n_u - n_bal
-    K_r = (n_u - n) / diff_n if abs(diff_n) > 0.001 else 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        K_r = np.where(np.abs(diff_n) > 0.001, (n_u - n) / diff_n, 1.0)
     # Limita K_r entre 0 e 1 de forma robusta
-    K_r = max(0.0, min(K_r, 1.0))
+    K_r = np.clip(K_r, 0.0, 1.0)
     
     beta_creep = 0.35 + f_ck/200 - esbelteza/150
     # Limita beta_creep num intervalo razoável [0.0, 0.7] para evitar instabilidade com esbeltezas enormes
-    beta_creep = max(0.0, min(beta_creep, 0.7))
+    beta_creep = np.clip(beta_creep, 0.0, 0.7)
     
     K_phi = 1 + beta_creep * phi_ef
-    K_phi = max(1.0, K_phi)
+    K_phi = np.maximum(1.0, K_phi)
     
     d_estimado_mm = h_mm - c_nom_mm - phi_estribo - 16 / 2
     inv_r0 = (f_yd_mpa / Es_mpa) / (0.45 * d_estimado_mm) if d_estimado_mm > 0 else 0
@@ -188,13 +464,19 @@ def calcular_momento_segunda_ordem(esbelteza, f_ck, f_yd_mpa, f_cd_mpa, Es_mpa,
     e2_mm = inv_r * (l0_m * 1000)**2 / 10
     M2_Ed_Nm = N_Ed_N * (e2_mm / 1000)
     
+    M2_Ed_Nm, e2_mm, inv_r, omega, K_r, beta_creep, K_phi = _escalar_ou_vetor(M2_Ed_Nm, e2_mm, inv_r, omega, K_r, beta_creep, K_phi)
     return M2_Ed_Nm, e2_mm, inv_r, omega, K_r, beta_creep, K_phi, inv_r0, d_estimado_mm
 
 # ==============================================================================
-# FUNÇÃO PRINCIPAL DE DIMENSIONAMENTO
+# NÚCLEO NUMÉRICO
 # ==============================================================================
-def dimensionar_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN, M0_Ed_kNm, c_nom_mm, phi_ef):
-    
+def calcular_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN, M0_Ed_kNm, c_nom_mm, phi_ef, rigoroso=None):
+    """
+    Núcleo numérico do dimensionamento de um pilar. Devolve a memória de cálculo
+    (serializável em JSON) sem construir texto; ver gerar_passos_pilar.
+    rigoroso: resultado de _dimensionar_pilar_rigoroso já obtido para estes esforços
+    (p.ex. por dimensionar_pilar_casos), que dispensa um segundo cálculo.
+    """
     if b_mm <= 0 or h_mm <= 0:
         raise ValueError("As dimensões da secção devem ser positivas.")
     if N_Ed_kN <= 0:
@@ -202,16 +484,11 @@ def dimensionar_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN,
     if N_Ed_kN < 0.1:
         N_Ed_kN = 0.1
         
-    passos = []
     phi_estribo = 8.0
     
     # --- Secção 1 a 7 (Cálculos de esforços e área de aço mínima) ---
-    casos_beta = {"encab-encab": 0.7, "encab-artic": 0.85, "encab-livre": 2.2, "artic-encab": 0.85, "artic-artic": 1.0, "livre-encab": 2.2}
-    caso = f"{lig_topo}-{lig_base}"
-    beta = casos_beta.get(caso, 1.0)
-    if lig_base == 'livre' or (lig_topo == 'livre' and not lig_base == 'encab'): raise ValueError("Combinação de ligações instável.")
+    beta = _coeficiente_beta(lig_topo, lig_base)
     l0_m = beta * l_m
-    passos.append({"titulo": "1. Comprimento de Encurvadura (l₀)", "formula": r"l_0 = \beta \cdot l", "calculo": f"Para ligação {lig_topo}-{lig_base}, β = {beta}<br>l₀ = {beta} x {l_m} = {l0_m:.2f} m"})
     
     gamma_c, gamma_s, Es_mpa = 1.5, 1.15, 200000
     f_cd_mpa = f_ck / gamma_c
@@ -219,106 +496,207 @@ def dimensionar_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN,
     N_Ed_N = N_Ed_kN * 1000
     M0_Ed_Nm = M0_Ed_kNm * 1000
     Ac_mm2 = b_mm * h_mm
-    passos.append({"titulo": "2. Parâmetros de Cálculo", "calculo": f"f_cd = {f_ck:.0f} / {gamma_c} = {f_cd_mpa:.2f} MPa<br>f_yd = {f_yk:.0f} / {gamma_s} = {f_yd_mpa:.2f} MPa"})
     
     i_mm, esbelteza, n, A, B, C, lambda_lim = calcular_esbelteza_e_lambda_lim(h_mm, l0_m, N_Ed_N, Ac_mm2, f_cd_mpa, phi_ef)
-    passos.append({"titulo": "3. Verificação de Esbelteza (λ)", "formula": r"i = \frac{h}{\sqrt{12}} \, ; \, \lambda = \frac{l_0}{i}", "calculo": f"i = {h_mm:.0f} / √12 = {i_mm:.1f} mm<br>λ = {l0_m * 1000:.0f} / {i_mm:.1f} = {esbelteza:.2f}"})
     
+    M_Ed_total_Nm = M0_Ed_Nm
+    segunda_ordem = None
+    if esbelteza > lambda_lim:
+        As_est_mm2 = max(0.10 * N_Ed_N / f_yd_mpa, 0.002 * Ac_mm2)
+        M2_Ed_Nm, e2_mm, inv_r, omega, K_r, beta_creep, K_phi, inv_r0, d_estimado_mm = calcular_momento_segunda_ordem(
+            esbelteza, f_ck, f_yd_mpa, f_cd_mpa, Es_mpa, N_Ed_N, Ac_mm2, As_est_mm2, l0_m, h_mm, c_nom_mm, phi_estribo, phi_ef, n
+        )
+        M_Ed_total_Nm = M0_Ed_Nm + M2_Ed_Nm
+        segunda_ordem = {
+            "M2_Ed_Nm": M2_Ed_Nm, "e2_mm": e2_mm, "inv_r": inv_r, "omega": omega, "K_r": K_r,
+            "beta_creep": beta_creep, "K_phi": K_phi, "inv_r0": inv_r0, "d_estimado_mm": d_estimado_mm,
+        }
+    
+    if rigoroso is None:
+        rigoroso = _dimensionar_pilar_rigoroso(b_mm, h_mm, f_ck, f_cd_mpa, f_yd_mpa, N_Ed_N, M_Ed_total_Nm, c_nom_mm)
+    As_req_mm2_final = rigoroso["As_req_mm2"]
+    
+    As_min_cm2_1 = 0.10 * N_Ed_N / f_yd_mpa / 100
+    As_min_cm2_2 = 0.002 * Ac_mm2 / 100
+    As_min_cm2 = max(As_min_cm2_1, As_min_cm2_2)
+    As_final_req_cm2 = max(As_req_mm2_final/100, As_min_cm2)
+    Ac_cm2 = Ac_mm2 / 100
+    As_max_cm2 = 0.04 * Ac_cm2
+
+    # --- Secção 8 (Escolha da Armadura Final) ---
+    largura_disponivel = h_mm - 2 * c_nom_mm - 2 * phi_estribo
+    
+    solucoes = armadura_service.encontrar_combinacoes_otimas_pilar(As_final_req_cm2, largura_disponivel, b_mm, h_mm)
+    if not solucoes.get('unica') and not solucoes.get('mista'):
+        # Fora do catálogo (mais de 8 varões): otimizador exato, com metade dos varões em cada face
+        solucoes = armadura_service.otimizar_armadura(As_final_req_cm2, largura_disponivel, "pilar", b_mm, h_mm)
+    
+    solucao_unica = solucoes.get('unica')
+    solucao_mista = solucoes.get('mista')
+
+    if not solucao_unica and not solucao_mista:
+        raise ValueError("Não foi possível encontrar uma combinação de armadura válida que coubesse na secção.")
+
+    if solucao_unica and solucao_mista:
+        solucao_principal = min([solucao_unica, solucao_mista], key=lambda x: x.area_total_cm2)
+    else:
+        solucao_principal = solucao_unica or solucao_mista
+
+    # Verificação final da armadura adotada no diagrama de interação (ponto em polígono).
+    diagrama = diagrama_interacao_pilar(b_mm, h_mm, c_nom_mm, f_ck, f_yk, solucao_principal.area_total_cm2 * 100)
+    verificacao_diagrama = {
+        "dentro": verificar_esforcos_diagrama(diagrama, N_Ed_N / 1000, M_Ed_total_Nm / 1000),
+        "N_min_kN": diagrama["N_min_kN"], "N_max_kN": diagrama["N_max_kN"], "M_max_kNm": diagrama["M_max_kNm"],
+    }
+
+    return {
+        "b_mm": b_mm, "h_mm": h_mm, "l_m": l_m, "lig_topo": lig_topo, "lig_base": lig_base,
+        "f_ck": f_ck, "f_yk": f_yk, "N_Ed_kN": N_Ed_kN, "M0_Ed_kNm": M0_Ed_kNm, "c_nom_mm": c_nom_mm, "phi_ef": phi_ef,
+        "phi_estribo": phi_estribo, "beta": beta, "l0_m": l0_m,
+        "gamma_c": gamma_c, "gamma_s": gamma_s, "Es_mpa": Es_mpa, "f_cd_mpa": f_cd_mpa, "f_yd_mpa": f_yd_mpa,
+        "N_Ed_N": N_Ed_N, "M0_Ed_Nm": M0_Ed_Nm, "Ac_mm2": Ac_mm2,
+        "i_mm": i_mm, "esbelteza": esbelteza, "n": n, "A": A, "B": B, "C": C, "lambda_lim": lambda_lim,
+        "segunda_ordem": segunda_ordem, "M_Ed_total_Nm": M_Ed_total_Nm,
+        "rigoroso": rigoroso,
+        "As_min_cm2_1": As_min_cm2_1, "As_min_cm2_2": As_min_cm2_2, "As_min_cm2": As_min_cm2,
+        "As_final_req_cm2": As_final_req_cm2, "Ac_cm2": Ac_cm2, "As_max_cm2": As_max_cm2,
+        "combinacao_unica": solucao_unica.para_dict() if solucao_unica else None,
+        "combinacao_mista": solucao_mista.para_dict() if solucao_mista else None,
+        "combinacao_final": solucao_principal.combinacao_str,
+        "n_barras": solucao_principal.n_barras, "phi_long": solucao_principal.phi_max,
+        "As_prov_cm2": solucao_principal.As_final_cm2, "area_prov_cm2": solucao_principal.area_total_cm2,
+        "verificacao_diagrama": verificacao_diagrama,
+    }
+
+# ==============================================================================
+# RELATÓRIO (PASSO A PASSO)
+# ==============================================================================
+FORMULAS_PILAR = {
+    "encurvadura": r"l_0 = \beta \cdot l",
+    "esbelteza": r"i = \frac{h}{\sqrt{12}} \, ; \, \lambda = \frac{l_0}{i}",
+    "esbelteza_limite": r"n = \frac{N_{Ed}}{A_c f_{cd}} \, ; \, \lambda_{lim} = \frac{20 A B C}{\sqrt{n}}",
+    "segunda_ordem": (r"\displaylines{"
+        r"\frac{1}{r_0} = \frac{\epsilon_{yd}}{0.45d} \ ; \ "
+        r"\omega = \frac{A_s f_{yd}}{A_c f_{cd}} \ ; \ K_r = \frac{n_u - n}{n_u - n_{bal}} \ ; \\ "
+        r"\beta = 0.35 + \frac{f_{ck}}{200} - \frac{\lambda}{150} \ ; \ K_\phi = 1 + \beta \cdot \phi_{ef} \ ; \ "
+        r"\frac{1}{r} = K_r K_\phi \frac{1}{r_0} \ ; \ e_2 = \frac{(1/r) l_0^2}{c} \ ; \ M_2 = N_{Ed} \cdot e_2"
+        r"}"),
+    "esforcos_finais": r"M_{Ed,total} = M_{0Ed} + M_{2}",
+    "equilibrio": r"N_{Rd} = F_c + F_{sc} - F_{st} \implies M_{Rd} \ge M_{Ed}",
+    "limites_armadura": r"A_c = b x× h \ ; \ A_{s,min} = max(0.10\frac{N_{Ed}}{f_{yd}} ; 0.002 A_c) \ ; \ A_{s,max} = 0.04 A_c",
+    "diagrama_interacao": r"(N_{Ed}, M_{Ed}) \in \{(N_{Rd}(x), \pm M_{Rd}(x))\}",
+}
+
+def gerar_passos_pilar(memoria):
+    """Constrói o passo a passo do relatório a partir da memória de cálculo de calcular_pilar."""
+    m = memoria
+    b_mm, h_mm, l_m, lig_topo, lig_base = m["b_mm"], m["h_mm"], m["l_m"], m["lig_topo"], m["lig_base"]
+    f_ck, f_yk, N_Ed_kN, M0_Ed_kNm, phi_ef = m["f_ck"], m["f_yk"], m["N_Ed_kN"], m["M0_Ed_kNm"], m["phi_ef"]
+    beta, l0_m, gamma_c, gamma_s, Es_mpa = m["beta"], m["l0_m"], m["gamma_c"], m["gamma_s"], m["Es_mpa"]
+    f_cd_mpa, f_yd_mpa, N_Ed_N, M0_Ed_Nm, Ac_mm2 = m["f_cd_mpa"], m["f_yd_mpa"], m["N_Ed_N"], m["M0_Ed_Nm"], m["Ac_mm2"]
+    i_mm, esbelteza, n, A, B, C, lambda_lim = m["i_mm"], m["esbelteza"], m["n"], m["A"], m["B"], m["C"], m["lambda_lim"]
+    passos = []
+
+    casos_carga = m.get("casos_carga")
+    if casos_carga:
+        linhas = "".join(
+            f"Caso {i}: N_Ed = {c['N_Ed_kN']:.1f} kN ; M_0Ed = {c['M0_Ed_kNm']:.2f} kNm ; M_Ed,total = {c['M_Ed_total_kNm']:.2f} kNm ; "
+            f"As,req {'≤' if c.get('As_req_majorante') else '='} {c['As_req_cm2']:.2f} cm²{'' if c['resolvido'] else ' (dentro do diagrama de As,min)'} -> "
+            f"{'OK' if c['verifica'] else 'NÃO VERIFICA'}{' <b>(condicionante)</b>' if i == casos_carga['condicionante'] else ''}<br>"
+            for i, c in enumerate(casos_carga["casos"], 1)
+        )
+        passos.append({
+            "titulo": "0. Combinações de Ações",
+            "calculo": f"Foram analisadas {len(casos_carga['casos'])} combinações. A armadura é dimensionada para a combinação condicionante "
+                       f"(caso {casos_carga['condicionante']}) e verificada para todas no diagrama de interação da armadura adotada.<br><br>" + linhas,
+        })
+
+    passos.append({"titulo": "1. Comprimento de Encurvadura (l₀)", "formula": FORMULAS_PILAR["encurvadura"], "calculo": f"Para ligação {lig_topo}-{lig_base}, β = {beta}<br>l₀ = {beta} x {l_m} = {l0_m:.2f} m"})
+    passos.append({"titulo": "2. Parâmetros de Cálculo", "calculo": f"f_cd = {f_ck:.0f} / {gamma_c} = {f_cd_mpa:.2f} MPa<br>f_yd = {f_yk:.0f} / {gamma_s} = {f_yd_mpa:.2f} MPa"})
+    passos.append({"titulo": "3. Verificação de Esbelteza (λ)", "formula": FORMULAS_PILAR["esbelteza"], "calculo": f"i = {h_mm:.0f} / √12 = {i_mm:.1f} mm<br>λ = {l0_m * 1000:.0f} / {i_mm:.1f} = {esbelteza:.2f}"})
     passos.append({
         "titulo": "3.1. Esbelteza Limite (λ_lim)", 
-        "formula": r"n = \frac{N_{Ed}}{A_c f_{cd}} \, ; \, \lambda_{lim} = \frac{20 A B C}{\sqrt{n}}", 
+        "formula": FORMULAS_PILAR["esbelteza_limite"], 
         "calculo": f"n = {N_Ed_N:.0f} / (({b_mm:.0f} x {h_mm:.0f}) x {f_cd_mpa:.2f}) = {n:.3f}<br>A = 1 / (1 + 0.2 x {phi_ef:.1f}) = {A:.3f}<br>B = {B:.1f}, C = {C:.1f}<br>λ_lim = (20 x {A:.3f} x {B:.1f} x {C:.1f}) / √n = {lambda_lim:.2f}"
     })
-    
-    M_Ed_total_Nm = M0_Ed_Nm
-    if esbelteza > lambda_lim:
+
+    segunda_ordem = m["segunda_ordem"]
+    if segunda_ordem:
         calc_32 = (
             f"Como λ = {esbelteza:.2f} > λ_lim = {lambda_lim:.2f}, "
             "conclui-se que o pilar é esbelto e é necessário considerar efeitos de 2ª ordem."
         )
         passos.append({"titulo": "3.2. Conclusão", "calculo": calc_32})
-        As_est_mm2 = max(0.10 * N_Ed_N / f_yd_mpa, 0.002 * Ac_mm2)
-        
-        M2_Ed_Nm, e2_mm, inv_r, omega, K_r, beta_creep, K_phi, inv_r0, d_estimado_mm = calcular_momento_segunda_ordem(
-            esbelteza, f_ck, f_yd_mpa, f_cd_mpa, Es_mpa, N_Ed_N, Ac_mm2, As_est_mm2, l0_m, h_mm, c_nom_mm, phi_estribo, phi_ef, n
-        )
-        
-        M_Ed_total_Nm = M0_Ed_Nm + M2_Ed_Nm
-        formula_m2 = (r"\displaylines{"
-            r"\frac{1}{r_0} = \frac{\epsilon_{yd}}{0.45d} \ ; \ "
-            r"\omega = \frac{A_s f_{yd}}{A_c f_{cd}} \ ; \ K_r = \frac{n_u - n}{n_u - n_{bal}} \ ; \\ "
-            r"\beta = 0.35 + \frac{f_{ck}}{200} - \frac{\lambda}{150} \ ; \ K_\phi = 1 + \beta \cdot \phi_{ef} \ ; \ "
-            r"\frac{1}{r} = K_r K_\phi \frac{1}{r_0} \ ; \ e_2 = \frac{(1/r) l_0^2}{c} \ ; \ M_2 = N_{Ed} \cdot e_2"
-            r"}"
-        )
+        so = segunda_ordem
         calculo_m2 =  f"<b>a) Curvatura (1/r)</b><br>"
-        calculo_m2 += f"1/r₀ = ({f_yd_mpa:.2f} / {Es_mpa:.0f}) / (0.45 x {d_estimado_mm:.1f}) = {inv_r0:.8f} mm⁻¹<br>"
-        calculo_m2 += f"ω (com As,min estimado) ≈ {omega:.3f}<br>"
-        calculo_m2 += f"K_r = {K_r:.3f}<br>"
-        calculo_m2 += f"β (limitado entre 0 e 0.7) = {beta_creep:.3f}<br>"
-        calculo_m2 += f"K_φ = {K_phi:.3f}<br>"
-        calculo_m2 += f"1/r = {K_r:.3f} x {K_phi:.3f} x {inv_r0:.8f} = {inv_r:.8f} mm⁻¹<br>"
+        calculo_m2 += f"1/r₀ = ({f_yd_mpa:.2f} / {Es_mpa:.0f}) / (0.45 x {so['d_estimado_mm']:.1f}) = {so['inv_r0']:.8f} mm⁻¹<br>"
+        calculo_m2 += f"ω (com As,min estimado) ≈ {so['omega']:.3f}<br>"
+        calculo_m2 += f"K_r = {so['K_r']:.3f}<br>"
+        calculo_m2 += f"β (limitado entre 0 e 0.7) = {so['beta_creep']:.3f}<br>"
+        calculo_m2 += f"K_φ = {so['K_phi']:.3f}<br>"
+        calculo_m2 += f"1/r = {so['K_r']:.3f} x {so['K_phi']:.3f} x {so['inv_r0']:.8f} = {so['inv_r']:.8f} mm⁻¹<br>"
         calculo_m2 += f"<b>b) Momento de 2ª Ordem (M₂)</b><br>"
-        calculo_m2 += f"e₂ = {inv_r:.8f} x ({l0_m*1000:.0f})² / 10 = {e2_mm:.1f} mm<br>"
-        calculo_m2 += f"M₂ = {N_Ed_kN:.1f} kN x {e2_mm / 1000:.3f} m = {M2_Ed_Nm/1000:.2f} kNm"
-        passos.append({"titulo": "4. Efeitos de 2ª Ordem (M₂)", "formula": formula_m2, "calculo": calculo_m2})
+        calculo_m2 += f"e₂ = {so['inv_r']:.8f} x ({l0_m*1000:.0f})² / 10 = {so['e2_mm']:.1f} mm<br>"
+        calculo_m2 += f"M₂ = {N_Ed_kN:.1f} kN x {so['e2_mm'] / 1000:.3f} m = {so['M2_Ed_Nm']/1000:.2f} kNm"
+        passos.append({"titulo": "4. Efeitos de 2ª Ordem (M₂)", "formula": FORMULAS_PILAR["segunda_ordem"], "calculo": calculo_m2})
     else:
         calc_32 = (
             f"Como λ = {esbelteza:.2f} ≤ λ_lim = {lambda_lim:.2f}, "
             "conclui-se que o pilar não é esbelto e os efeitos de 2ª ordem podem ser desprezados."
         )
         passos.append({"titulo": "3.2. Conclusão", "calculo": calc_32})
-        
+
+    M_Ed_total_Nm = m["M_Ed_total_Nm"]
     momento_2a_ordem = M_Ed_total_Nm - M0_Ed_Nm
     calculo_m_final = f"M_Ed,total = {M0_Ed_kNm:.2f} + {momento_2a_ordem/1000:.2f} = {M_Ed_total_Nm/1000:.2f} kNm"
-    passos.append({"titulo": "5. Esforços Finais de Dimensionamento", "formula": r"M_{Ed,total} = M_{0Ed} + M_{2}", "calculo": calculo_m_final})
-    
-    As_req_mm2_final, MRd_final_kNm, x_final_mm = _dimensionar_pilar_rigoroso(b_mm, h_mm, f_ck, f_cd_mpa, f_yd_mpa, N_Ed_N, M_Ed_total_Nm, c_nom_mm, passos)
-    
-    As_min_cm2_1 = 0.10 * N_Ed_N / f_yd_mpa / 100
-    As_min_cm2_2 = 0.002 * Ac_mm2 / 100
-    As_min_cm2 = max(As_min_cm2_1, As_min_cm2_2)
-    As_final_req_cm2 = max(As_req_mm2_final/100, As_min_cm2)
-    Ac_cm2 = Ac_mm2 / 100
-    As_max_cm2 = 0.04 * Ac_cm2
-    
+    passos.append({"titulo": "5. Esforços Finais de Dimensionamento", "formula": FORMULAS_PILAR["esforcos_finais"], "calculo": calculo_m_final})
+
+    rig = m["rigoroso"]
+    inicial = rig["inicial"]
+    calculo_iterativo_str = f"<b>Início da Iteração:</b><br>Assume-se: λ = {rig['lambda_val']:.2f}, η = {rig['eta']:.2f} (EC2 3.1.7).<br>"
+    if inicial is not None:
+        calculo_iterativo_str += f"Começa-se com a armadura mínima (As,req = {inicial['As_mm2']/100:.2f} cm²).<br>"
+        calculo_iterativo_str += f"Para As = {inicial['As_mm2']/100:.2f} cm² e NEd = {N_Ed_N/1000:.1f} kN, o equilíbrio de forças é atingido para x = {inicial['x_mm']:.1f} mm.<br>"
+        calculo_iterativo_str += f"Com este x, o momento resistente é MRd = {inicial['MRd_Nmm']/1000000:.2f} kNm.<br>"
+    else:
+        # Arranque a quente (varrimento): a armadura mínima não chegou a ser avaliada.
+        calculo_iterativo_str += "Parte-se da armadura obtida para um ponto vizinho (a armadura mínima não é suficiente).<br>"
+    if inicial is None or rig["As_req_mm2"] > inicial["As_mm2"]:
+        n_avaliacoes = rig.get("iteracoes", {}).get("avaliacoes_MRd")
+        calculo_iterativo_str += (
+            f"Como MRd < MEd, resolve-se MRd(As) = MEd em ordem a As (método de Brent, recalculando o x de equilíbrio em cada avaliação"
+            + (f"; {n_avaliacoes} avaliações" if n_avaliacoes else "")
+            + f"): As,req = {rig['As_req_mm2']/100:.2f} cm².<br>"
+        )
+    calculo_iterativo_str += (
+        f"<b>Conclusão:</b> O momento resistente (MRd = {rig['MRd_kNm']:.2f} kNm) é superior ao momento de cálculo (MEd = {M_Ed_total_Nm/1000:.2f} kNm).<br>"
+        f"A armadura é, portanto, suficiente para equilibrar a secção (com x = {rig['x_mm']:.1f} mm)."
+    )
+    passos.append({
+        "titulo": "6. Área de Aço Calculada (Método Iterativo)",
+        "formula": FORMULAS_PILAR["equilibrio"],
+        "calculo": calculo_iterativo_str
+    })
+
+    As_min_cm2_1, As_min_cm2_2, As_min_cm2 = m["As_min_cm2_1"], m["As_min_cm2_2"], m["As_min_cm2"]
+    As_final_req_cm2, Ac_cm2, As_max_cm2 = m["As_final_req_cm2"], m["Ac_cm2"], m["As_max_cm2"]
     calculo_as_min = (
         f"Ac = {b_mm:.0f} x {h_mm:.0f} = {Ac_mm2:.0f} mm² = {Ac_cm2:.2f} cm²<br>"
         f"As,min₁ = 0.10 x {N_Ed_N:.0f} / {f_yd_mpa:.2f} / 100 = {As_min_cm2_1:.2f} cm²<br>"
         f"As,min₂ = 0.002 x {Ac_mm2:.0f} / 100 = {As_min_cm2_2:.2f} cm²<br>"
         f"As,min = max({As_min_cm2_1:.2f}, {As_min_cm2_2:.2f}) = {As_min_cm2:.2f} cm²<br>"
-        f"As,req = max({As_req_mm2_final/100:.2f}, {As_min_cm2:.2f}) = {As_final_req_cm2:.2f} cm²<br>"
+        f"As,req = max({rig['As_req_mm2']/100:.2f}, {As_min_cm2:.2f}) = {As_final_req_cm2:.2f} cm²<br>"
         f"As,max = 0.04 x {Ac_cm2:.2f} = {As_max_cm2:.2f} cm²"
     )
-    
     if As_final_req_cm2 > As_max_cm2:
         calculo_as_min += f"<br><br><b style='color:red;'>AVISO:</b> A área de aço necessária ({As_final_req_cm2:.2f} cm²) supera a armadura máxima permitida ({As_max_cm2:.2f} cm²). A secção de betão poderá estar subdimensionada."
-        
     passos.append({
         "titulo": "7. Verificação de Armadura (Mínimos e Máximos)",
-        "formula": r"A_c = b x× h \ ; \ A_{s,min} = max(0.10\frac{N_{Ed}}{f_{yd}} ; 0.002 A_c) \ ; \ A_{s,max} = 0.04 A_c",
+        "formula": FORMULAS_PILAR["limites_armadura"],
         "calculo": calculo_as_min
     })
 
-    # --- Secção 8 (Escolha da Armadura Final) ---
-    largura_disponivel = h_mm - 2 * c_nom_mm - 2 * phi_estribo
-    
-    solucoes = armadura_service.encontrar_combinacoes_otimas_pilar(As_final_req_cm2, largura_disponivel, b_mm, h_mm)
-    
-    solucao_unica = solucoes.get('unica')
-    solucao_mista = solucoes.get('mista')
-
-    if not solucao_unica and not solucao_mista:
-        raise ValueError("Não foi possível encontrar uma combinação de armadura válida que coubesse na secção.")
-
-    if solucao_unica and solucao_mista:
-        solucao_principal = min([solucao_unica, solucao_mista], key=lambda x: x['area_total_cm2'])
-    else:
-        solucao_principal = solucao_unica or solucao_mista
-
-    combinacao_final_str = solucao_principal['combinacao_str']
-    As_prov_cm2 = solucao_principal['As_final_cm2']
-    
+    solucao_unica, solucao_mista = m["combinacao_unica"], m["combinacao_mista"]
     calculo_final = (
         f"O programa procura a combinação de varões mais económica que satisfaz a área de aço necessária ({As_final_req_cm2:.2f} cm²).<br>"
     )
@@ -326,22 +704,218 @@ def dimensionar_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN,
         calculo_final += f" • <b>Opção Mista: {solucao_mista['combinacao_str']}</b> ({solucao_mista['As_final_cm2']:.2f} cm²)<br>"
     if solucao_unica:
         calculo_final += f" • <b>Opção Diâmetro Único: {solucao_unica['combinacao_str']}</b> ({solucao_unica['As_final_cm2']:.2f} cm²)<br>"
-    calculo_final += f"<br>A solução ótima adotada é: <b>{combinacao_final_str}</b>."
+    calculo_final += f"<br>A solução ótima adotada é: <b>{m['combinacao_final']}</b>."
     passos.append({ "titulo": "8. Escolha da Armadura Final", "calculo": calculo_final })
-    
-    try:
-        phi_long_final = max([int(s.split('Ø')[1].strip()) for s in combinacao_final_str.split(' + ')])
-        n_barras = sum([int(s.split('Ø')[0].strip()) for s in combinacao_final_str.split(' + ')])
-    except (ValueError, IndexError):
-        phi_long_final, n_barras = 0, 0
-    
-    dados_desenho = {"b": b_mm, "h": h_mm, "c_nom": c_nom_mm, "phi_estribo": phi_estribo, "n_barras": n_barras, "phi_long": phi_long_final}
+
+    verificacao = m.get("verificacao_diagrama")
+    if verificacao:
+        calculo_diagrama = (
+            f"Diagrama de interação da secção com As = {m['As_prov_cm2']:.2f} cm² (metade em cada face): "
+            f"N entre {verificacao['N_min_kN']:.1f} kN e {verificacao['N_max_kN']:.1f} kN, M_Rd,máx = {verificacao['M_max_kNm']:.2f} kNm.<br>"
+            f"Ponto de cálculo (N_Ed = {N_Ed_N/1000:.1f} kN ; M_Ed = {M_Ed_total_Nm/1000:.2f} kNm): "
+            + ("<b>dentro do diagrama -> OK</b>" if verificacao["dentro"] else "<b style='color:red;'>fora do diagrama -> NÃO VERIFICA</b>")
+        )
+        passos.append({"titulo": "9. Verificação no Diagrama de Interação N–M", "formula": FORMULAS_PILAR["diagrama_interacao"], "calculo": calculo_diagrama})
+    return passos
+
+# ==============================================================================
+# FUNÇÃO PRINCIPAL DE DIMENSIONAMENTO
+# ==============================================================================
+def _resultado_pilar(memoria, fast):
+    dados_desenho = {"b": memoria["b_mm"], "h": memoria["h_mm"], "c_nom": memoria["c_nom_mm"], "phi_estribo": memoria["phi_estribo"], "n_barras": memoria["n_barras"], "phi_long": memoria["phi_long"]}
     resultado = {
-        'status': 'Sucesso', 'mensagem': 'Cálculo com aviso (Seção pode estar superarmada).' if As_final_req_cm2 > As_max_cm2 else 'Cálculo efetuado com sucesso.', 
-        'combinacao_final': combinacao_final_str, 'As_final_cm2': f"{As_prov_cm2:.2f}",
-        'combinacao_unica': solucao_unica,
-        'combinacao_mista': solucao_mista,
-        'passos': passos, 'dados_desenho': dados_desenho
+        'status': 'Sucesso', 'mensagem': 'Cálculo com aviso (Seção pode estar superarmada).' if memoria["As_final_req_cm2"] > memoria["As_max_cm2"] else 'Cálculo efetuado com sucesso.', 
+        'combinacao_final': memoria["combinacao_final"], 'As_final_cm2': f"{memoria['As_prov_cm2']:.2f}",
+        'combinacao_unica': memoria["combinacao_unica"],
+        'combinacao_mista': memoria["combinacao_mista"],
+        'dados_desenho': dados_desenho, 'memoria': memoria,
+    }
+    if not fast:
+        resultado['passos'] = gerar_passos_pilar(memoria)
+    return resultado
+
+def dimensionar_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN, M0_Ed_kNm, c_nom_mm, phi_ef, fast=False):
+    """
+    Dimensiona um pilar à flexão composta. Com fast=True devolve apenas o resultado
+    numérico (sem 'passos'); o passo a passo pode ser gerado depois a partir de resultado['memoria'].
+    """
+    memoria = calcular_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, N_Ed_kN, M0_Ed_kNm, c_nom_mm, phi_ef)
+    return _resultado_pilar(memoria, fast)
+
+# ==============================================================================
+# VÁRIAS COMBINAÇÕES DE AÇÕES NUM SÓ PILAR
+# ==============================================================================
+def dimensionar_pilar_casos(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, casos, c_nom_mm, phi_ef, fast=False):
+    """
+    Dimensiona um pilar para várias combinações de ações (lista de pares
+    (N_Ed_kN, M0_Ed_kNm)). A esbelteza e os momentos de 2ª ordem são calculados de
+    uma só vez para todos os casos; as combinações que ficam dentro do diagrama de
+    interação da armadura mínima dispensam o cálculo rigoroso. A armadura é
+    dimensionada para a combinação condicionante (maior As necessária) e todas são
+    verificadas no diagrama da armadura adotada.
+    O resultado tem o formato de dimensionar_pilar, com 'caso_condicionante' (índice
+    a partir de 1) e a tabela 'casos'; a memória de cálculo é a do caso condicionante.
+    """
+    if not casos:
+        raise ValueError("É necessário indicar pelo menos uma combinação de ações.")
+    N_Ed_kN = np.array([float(caso[0]) for caso in casos])
+    M0_Ed_kNm = np.abs(np.array([float(caso[1]) for caso in casos]))
+    if (N_Ed_kN <= 0).any():
+        raise ValueError(f"O esforço axial N_Ed deve ser maior que zero (combinação {int(np.argmax(N_Ed_kN <= 0)) + 1}).")
+    N_Ed_kN = np.maximum(N_Ed_kN, 0.1)
+
+    # Validação das ligações, l0 e materiais: iguais a calcular_pilar (1º caso).
+    if b_mm <= 0 or h_mm <= 0:
+        raise ValueError("As dimensões da secção devem ser positivas.")
+    l0_m = _coeficiente_beta(lig_topo, lig_base) * l_m
+    phi_estribo, Es_mpa = 8.0, 200000
+    f_cd_mpa, f_yd_mpa = f_ck / 1.5, f_yk / 1.15
+    Ac_mm2 = b_mm * h_mm
+    N_Ed_N = N_Ed_kN * 1000
+
+    _, esbelteza, n, _, _, _, lambda_lim = calcular_esbelteza_e_lambda_lim(h_mm, l0_m, N_Ed_N, Ac_mm2, f_cd_mpa, phi_ef)
+    As_min_mm2 = np.maximum(0.10 * N_Ed_N / f_yd_mpa, 0.002 * Ac_mm2)
+    M2_Ed_Nm = calcular_momento_segunda_ordem(
+        esbelteza, f_ck, f_yd_mpa, f_cd_mpa, Es_mpa, N_Ed_N, Ac_mm2, As_min_mm2, l0_m, h_mm, c_nom_mm, phi_estribo, phi_ef, n
+    )[0]
+    M_Ed_total_Nm = M0_Ed_kNm * 1000 + np.where(esbelteza > lambda_lim, M2_Ed_Nm, 0.0)
+
+    # Triagem: um caso dentro do diagrama da maior armadura mínima precisa de As,req
+    # entre o seu As,min e esse máximo; só os restantes são resolvidos. Para escolher o
+    # condicionante usa-se o As,min do próprio caso (o de maior As,min condiciona se
+    # nenhum for resolvido); na tabela indica-se o majorante.
+    As_min_max_mm2 = As_min_mm2.max()
+    diagrama_min = diagrama_interacao_pilar(b_mm, h_mm, c_nom_mm, f_ck, f_yk, As_min_max_mm2)
+    resolvido = ~verificar_esforcos_diagrama(diagrama_min, N_Ed_kN, M_Ed_total_Nm / 1000)
+    As_req_mm2 = As_min_mm2.copy()
+    solucoes = {}
+    for i in np.flatnonzero(resolvido):
+        solucoes[i] = _dimensionar_pilar_rigoroso(b_mm, h_mm, f_ck, f_cd_mpa, f_yd_mpa, N_Ed_N[i], M_Ed_total_Nm[i], c_nom_mm)
+        As_req_mm2[i] = max(solucoes[i]["As_req_mm2"], As_min_mm2[i])
+    # Em empate, condiciona o caso com maior momento total.
+    condicionante = int(np.lexsort((M_Ed_total_Nm, As_req_mm2))[-1])
+    majorante = ~resolvido
+    majorante[condicionante] = False
+    As_tabela_mm2 = np.where(majorante, As_min_max_mm2, As_req_mm2)
+
+    memoria = calcular_pilar(b_mm, h_mm, l_m, lig_topo, lig_base, f_ck, f_yk, float(N_Ed_kN[condicionante]), float(M0_Ed_kNm[condicionante]), c_nom_mm, phi_ef,
+                             rigoroso=solucoes.get(condicionante))
+    verifica = verificar_esforcos_diagrama(diagrama_interacao_da_memoria(memoria), N_Ed_kN, M_Ed_total_Nm / 1000)
+    memoria["casos_carga"] = {
+        "condicionante": condicionante + 1,
+        "casos": [
+            {"N_Ed_kN": float(N_Ed_kN[i]), "M0_Ed_kNm": float(M0_Ed_kNm[i]), "esbelteza": float(esbelteza),
+             "lambda_lim": float(lambda_lim[i]), "M_Ed_total_kNm": float(M_Ed_total_Nm[i] / 1000),
+             "As_req_cm2": float(As_tabela_mm2[i] / 100), "As_req_majorante": bool(majorante[i]),
+             "resolvido": bool(resolvido[i]), "verifica": bool(verifica[i])}
+            for i in range(len(N_Ed_kN))
+        ],
+    }
+
+    resultado = _resultado_pilar(memoria, fast)
+    resultado['caso_condicionante'] = condicionante + 1
+    resultado['casos'] = memoria["casos_carga"]["casos"]
+    if not verifica.all():
+        resultado['mensagem'] = "Cálculo com aviso: nem todas as combinações verificam no diagrama de interação."
+    return resultado
+
+# ==============================================================================
+# VARRIMENTO PARAMÉTRICO DE ESBELTEZA
+# ==============================================================================
+MAX_PONTOS_VARRIMENTO = 2000
+
+def _valores_intervalo(minimo, maximo, passo):
+    """Valores de minimo a maximo (inclusive) com o passo indicado; passo nulo dá um só valor."""
+    if maximo < minimo:
+        raise ValueError("O valor máximo do intervalo não pode ser inferior ao mínimo.")
+    if not passo or maximo == minimo:
+        return np.array([float(minimo)])
+    if passo < 0:
+        raise ValueError("O passo do intervalo deve ser positivo.")
+    n_valores = int(math.floor((maximo - minimo) / passo + 1e-9)) + 1
+    if n_valores > MAX_PONTOS_VARRIMENTO:
+        raise ValueError(f"O varrimento está limitado a {MAX_PONTOS_VARRIMENTO} pontos.")
+    return np.round(minimo + passo * np.arange(n_valores), 10)
+
+def varrimento_esbelteza_pilar(b_mm, h_mm, f_ck, f_yk, N_Ed_kN, M0_Ed_kNm, c_nom_mm, l_intervalo, ligacoes=None, phi_ef_intervalo=(2.0, 2.0, 0)):
+    """
+    Estudo paramétrico da esbelteza de um pilar: para cada comprimento l (l_intervalo =
+    (mínimo, máximo, passo)), ligação topo-base ("encab-artic", ...; por defeito todas as
+    estáveis de CASOS_BETA) e coeficiente de fluência φ_ef (phi_ef_intervalo), devolve λ,
+    λ_lim, M₂ e a armadura necessária.
+    λ, λ_lim e M₂ são calculados de uma só vez para a grelha inteira; o cálculo rigoroso de
+    cada ponto arranca da armadura e do ramo de equilíbrio do ponto vizinho (l crescente),
+    o que reduz bastante o número de avaliações de MRd.
+    """
+    if b_mm <= 0 or h_mm <= 0:
+        raise ValueError("As dimensões da secção devem ser positivas.")
+    if N_Ed_kN <= 0:
+        raise ValueError("O esforço axial N_Ed deve ser maior que zero para o cálculo de pilares.")
+    N_Ed_kN = max(N_Ed_kN, 0.1)
+    M0_Ed_kNm = abs(M0_Ed_kNm)
+    if ligacoes is None:
+        ligacoes = [caso for caso in CASOS_BETA if caso.split("-")[1] != "livre"]
+    betas = []
+    for ligacao in ligacoes:
+        lig_topo, _, lig_base = ligacao.partition("-")
+        betas.append(_coeficiente_beta(lig_topo, lig_base))
+    l_m = _valores_intervalo(*l_intervalo)
+    phi_ef = _valores_intervalo(*phi_ef_intervalo)
+    if (l_m <= 0).any() or (phi_ef < 0).any():
+        raise ValueError("O comprimento deve ser positivo e φ_ef não pode ser negativo.")
+    if len(betas) * len(phi_ef) * len(l_m) > MAX_PONTOS_VARRIMENTO:
+        raise ValueError(f"O varrimento está limitado a {MAX_PONTOS_VARRIMENTO} pontos.")
+
+    phi_estribo, Es_mpa = 8.0, 200000
+    f_cd_mpa, f_yd_mpa = f_ck / 1.5, f_yk / 1.15
+    Ac_mm2 = b_mm * h_mm
+    N_Ed_N = N_Ed_kN * 1000
+    As_min_mm2 = max(0.10 * N_Ed_N / f_yd_mpa, 0.002 * Ac_mm2)
+
+    # Grelha (ligação, φ_ef, l) com l a variar mais depressa.
+    beta_g, phi_g, l_g = (v.ravel() for v in np.meshgrid(np.array(betas), phi_ef, l_m, indexing="ij"))
+    l0_g = beta_g * l_g
+    _, esbelteza, n, _, _, _, lambda_lim = calcular_esbelteza_e_lambda_lim(h_mm, l0_g, N_Ed_N, Ac_mm2, f_cd_mpa, phi_g)
+    M2_Ed_Nm = calcular_momento_segunda_ordem(
+        esbelteza, f_ck, f_yd_mpa, f_cd_mpa, Es_mpa, N_Ed_N, Ac_mm2, As_min_mm2, l0_g, h_mm, c_nom_mm, phi_estribo, phi_g, n
+    )[0]
+    segunda_ordem = esbelteza > lambda_lim
+    M2_Ed_Nm = np.where(segunda_ordem, M2_Ed_Nm, 0.0)
+    M_Ed_total_Nm = M0_Ed_kNm * 1000 + M2_Ed_Nm
+
+    pontos = []
+    avaliacoes = {"avaliacoes_MRd": 0, "avaliacoes_NRd": 0}
+    inicio_serie = None
+    for k in range(len(beta_g)):
+        if k % len(l_m) == 0:
+            # Nova série: arranca do 1º ponto da série anterior (mesmo l, φ_ef ou β vizinho).
+            anteriores = [inicio_serie] if inicio_serie else []
+        palpite = None
+        if anteriores:
+            M2, A2, ramo = anteriores[-1]
+            palpite = {"As_req_mm2": A2, "ramo": ramo}
+            if len(anteriores) == 2:
+                # Extrapolação secante de As(M_Ed) a partir dos dois pontos anteriores.
+                M1, A1, _ = anteriores[0]
+                if A1 > As_min_mm2 and M2 != M1:
+                    palpite["As_req_mm2"] = A2 + (A2 - A1) / (M2 - M1) * (float(M_Ed_total_Nm[k]) - M2)
+        rigoroso = _dimensionar_pilar_rigoroso(b_mm, h_mm, f_ck, f_cd_mpa, f_yd_mpa, N_Ed_N, float(M_Ed_total_Nm[k]), c_nom_mm, palpite=palpite)
+        ponto_resolvido = (float(M_Ed_total_Nm[k]), rigoroso["As_req_mm2"], rigoroso["ramo"])
+        if k % len(l_m) == 0:
+            inicio_serie = ponto_resolvido
+        anteriores = anteriores[-1:] + [ponto_resolvido]
+        for chave in avaliacoes:
+            avaliacoes[chave] += rigoroso["iteracoes"][chave]
+        pontos.append({
+            "l_m": float(l_g[k]), "ligacao": ligacoes[k // (len(phi_ef) * len(l_m))], "beta": float(beta_g[k]),
+            "l0_m": float(l0_g[k]), "phi_ef": float(phi_g[k]),
+            "esbelteza": float(esbelteza[k]), "lambda_lim": float(lambda_lim[k]), "segunda_ordem": bool(segunda_ordem[k]),
+            "M2_kNm": float(M2_Ed_Nm[k] / 1000), "M_Ed_total_kNm": float(M_Ed_total_Nm[k] / 1000),
+            "As_req_cm2": rigoroso["As_req_mm2"] / 100, "As_final_req_cm2": max(rigoroso["As_req_mm2"], As_min_mm2) / 100,
+            "avaliacoes_MRd": rigoroso["iteracoes"]["avaliacoes_MRd"],
+        })
+
+    return {
+        "b_mm": b_mm, "h_mm": h_mm, "f_ck": f_ck, "f_yk": f_yk, "N_Ed_kN": N_Ed_kN, "M0_Ed_kNm": M0_Ed_kNm, "c_nom_mm": c_nom_mm,
+        "As_min_cm2": As_min_mm2 / 100, "n_pontos": len(pontos), "iteracoes": avaliacoes, "pontos": pontos,
     }
-    
-    return resultado
\ No newline at end of file
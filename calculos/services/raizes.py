@@ -0,0 +1,66 @@
+# calculos/services/raizes.py
+import math
+
+# ==============================================================================
+# RESOLUÇÃO DE EQUAÇÕES NÃO LINEARES (MÉTODO DE BRENT)
+# ==============================================================================
+
+def brent(f, a, b, fa=None, fb=None, xtol=1e-9, rtol=1e-12, max_iter=100):
+    """
+    Raiz de f em [a, b] pelo método de Brent (bissecção + secante + interpolação
+    quadrática inversa). f(a) e f(b) têm de ter sinais contrários; podem ser
+    passados em fa/fb para evitar avaliações repetidas.
+    Devolve (raiz, nº de avaliações de f).
+    """
+    avaliacoes = 0
+    if fa is None:
+        fa = f(a); avaliacoes += 1
+    if fb is None:
+        fb = f(b); avaliacoes += 1
+    if fa == 0:
+        return a, avaliacoes
+    if fb == 0:
+        return b, avaliacoes
+    if (fa > 0) == (fb > 0):
+        raise ValueError("O intervalo não contém uma raiz (f(a) e f(b) têm o mesmo sinal).")
+
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(max_iter):
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * rtol * abs(b) + 0.5 * xtol
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or fb == 0:
+            return b, avaliacoes
+
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                # Secante
+                p, q = 2 * m * s, 1 - s
+            else:
+                # Interpolação quadrática inversa
+                q, r = fa / fc, fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol, m)
+        fb = f(b); avaliacoes += 1
+
+    raise ValueError("O método de Brent não convergiu.")
@@ -0,0 +1,186 @@
+# calculos/services/relatorios_service.py
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from weasyprint import HTML
+
+from ..formulas import formatar_latex_para_html
+from ..models import RelatorioPDF, SystemConfiguration
+from . import pilar_service, sapata_service, viga_service
+
+# ==============================================================================
+# CONTEÚDO DOS RELATÓRIOS (PASSO A PASSO, DESENHOS E ENTRADAS)
+# ==============================================================================
+def diagrama_pilar(memoria):
+    """Diagrama de interação N–M (SVG e dados para gráficos) a partir da memória de cálculo do pilar."""
+    diagrama = pilar_service.diagrama_interacao_da_memoria(memoria)
+    return {
+        'diagrama_interacao': pilar_service.dados_diagrama_interacao(diagrama),
+        'diagrama_interacao_svg': pilar_service.desenhar_diagrama_interacao_svg(diagrama, memoria['N_Ed_N'] / 1000, memoria['M_Ed_total_Nm'] / 1000),
+    }
+
+GERADORES_PASSOS = {
+    'Viga': viga_service.gerar_passos_viga,
+    'Pilar': pilar_service.gerar_passos_pilar,
+    'Sapata': sapata_service.gerar_passos_sapata,
+}
+
+def preencher_passos(elemento, resultado_final):
+    """Gera o passo a passo a partir da memória guardada (registos antigos já trazem 'passos')."""
+    if not resultado_final.get('passos') and resultado_final.get('memoria') and elemento in GERADORES_PASSOS:
+        resultado_final['passos'] = GERADORES_PASSOS[elemento](resultado_final['memoria'])
+    return resultado_final
+
+# Rótulos das entradas guardadas no histórico (página de detalhe e relatório).
+INPUT_MAP = {
+    'b': {'label': 'Largura', 'symbol': 'b', 'unit': 'mm'}, 'h': {'label': 'Altura', 'symbol': 'h', 'unit': 'mm'},
+    'l': {'label': 'Comprimento Real', 'symbol': 'l', 'unit': 'm'}, 'f_ck': {'label': 'Classe do Betão', 'symbol': 'f_{ck}', 'unit': ''},
+    'f_yk': {'label': 'Classe do Aço', 'symbol': 'f_{yk}', 'unit': ''}, 'M_Ed': {'label': 'Momento Fletor', 'symbol': 'M_{Ed}', 'unit': 'kNm'},
+    'c_nom': {'label': 'Recobrimento', 'symbol': 'c_{nom}', 'unit': 'mm'}, 'lig_topo': {'label': 'Ligação no Topo', 'symbol': '', 'unit': ''},
+    'lig_base': {'label': 'Ligação na Base', 'symbol': '', 'unit': ''}, 'N_Ed': {'label': 'Esforço Axial', 'symbol': 'N_{Ed}', 'unit': 'kN'},
+    'phi_ef': {'label': 'Coef. Fluência', 'symbol': r'\phi_{ef}', 'unit': ''}, 'sigma_adm': {'label': 'Tensão Admissível', 'symbol': r'\sigma_{adm}', 'unit': 'kPa'},
+    'bp': {'label': 'Largura do Pilar', 'symbol': 'b_p', 'unit': 'mm'}, 'hp': {'label': 'Altura do Pilar', 'symbol': 'h_p', 'unit': 'mm'},
+    'M_Edy': {'label': 'Momento Fletor', 'symbol': 'M_{Ed,y}', 'unit': 'kNm'},
+    'casos': {'label': 'Combinações Adicionais (N_Ed; M_Ed)', 'symbol': '', 'unit': ''},
+}
+
+def preparar_relatorio(calculo):
+    """Acrescenta ao cálculo os desenhos, as entradas e o passo a passo do relatório (sem base de dados)."""
+    resultado_final = preencher_passos(calculo.elemento, calculo.resultado_final)
+    if 'dados_desenho' in resultado_final:
+        if calculo.elemento == 'Viga':
+            calculo.desenho_svg = viga_service.desenhar_viga_svg(resultado_final['dados_desenho'])
+        elif calculo.elemento == 'Pilar':
+            calculo.desenho_svg = pilar_service.desenhar_pilar_svg(resultado_final['dados_desenho'])
+            if 'memoria' in resultado_final:
+                calculo.diagrama_interacao_svg = diagrama_pilar(resultado_final['memoria'])['diagrama_interacao_svg']
+        elif calculo.elemento == 'Sapata':
+            calculo.desenho_planta_svg = sapata_service.desenhar_sapata_planta_svg(resultado_final['dados_desenho'])
+            calculo.desenho_corte_svg = sapata_service.desenhar_sapata_corte_svg(resultado_final['dados_desenho'])
+
+    input_formatado = []
+    for key, value in calculo.input_data.items():
+        if key in INPUT_MAP:
+            info = INPUT_MAP[key]
+            input_formatado.append({'label': info['label'], 'value': value, 'unit': info['unit']})
+    calculo.input_data_formatado = input_formatado
+
+    if calculo.resultado_final.get('passos'):
+        for passo in calculo.resultado_final['passos']:
+            if 'formula' in passo and passo['formula']:
+                passo['formula_formatada'] = formatar_latex_para_html(passo['formula'])
+    return calculo
+
+# ==============================================================================
+# FILA DE RELATÓRIOS PDF (COMANDO processar_relatorios)
+# ==============================================================================
+# Cada RelatorioPDF pendente é reservado por um trabalhador, gerado com o WeasyPrint e
+# gravado em disco, identificado pelo id do cálculo e pelo hash do conteúdo.
+
+# Versão do relatório: alterá-la (p. ex. ao mudar o template) invalida os PDF em disco.
+VERSAO_RELATORIO = 1
+TEMPLATE_RELATORIO = 'calculos/relatorio_pdf.html'
+
+def diretorio_relatorios():
+    return Path(getattr(settings, 'RELATORIOS_DIR', Path(settings.BASE_DIR) / 'cache' / 'relatorios'))
+
+def caminho_relatorio_pdf(calculo_id, hash_conteudo):
+    return diretorio_relatorios() / str(calculo_id) / f"{hash_conteudo}.pdf"
+
+def hash_relatorio(calculo, config, url_base):
+    """Hash de tudo o que determina o PDF: o cálculo, a configuração visual, o URL base e a versão."""
+    conteudo = {
+        'versao': VERSAO_RELATORIO, 'elemento': calculo.elemento,
+        'input_data': calculo.input_data, 'resultado_final': calculo.resultado_final,
+        'cor': config.primary_color if config else None,
+        'fundo': config.background_image.name if config and config.background_image else None,
+        'url_base': url_base,
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def html_relatorio(calculo, config, url_base):
+    """HTML do relatório de um cálculo (desenhos, entradas e passo a passo)."""
+    calculo = preparar_relatorio(calculo)
+    return render_to_string(TEMPLATE_RELATORIO, {'calculo': calculo, 'system_config': config, 'url_base': url_base})
+
+def gerar_pdf_em_ficheiro(html_string, url_base, caminho):
+    """WeasyPrint → caminho, com escrita atómica (função de topo, para poder correr noutro processo)."""
+    os.makedirs(caminho.parent, exist_ok=True)
+    temporario = caminho.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    HTML(string=html_string, base_url=f"{url_base}/").write_pdf(temporario)
+    os.replace(temporario, caminho)
+    return caminho
+
+def renderizar_documento(html_string, url_base):
+    """Documento do WeasyPrint (páginas já compostas), para juntar vários relatórios num PDF."""
+    return HTML(string=html_string, base_url=f"{url_base}/").render()
+
+def renderizar_relatorio(relatorio, config=None):
+    """Gera o PDF de um pedido e grava-o em disco. Devolve o caminho."""
+    html_string = html_relatorio(relatorio.calculo, config or SystemConfiguration.objects.first(), relatorio.url_base)
+    return gerar_pdf_em_ficheiro(html_string, relatorio.url_base, caminho_relatorio_pdf(relatorio.calculo_id, relatorio.hash_conteudo))
+
+def processar_relatorio(relatorio):
+    """
+    Reserva o pedido (pendente → em curso, por atualização condicional, para que vários
+    trabalhadores possam correr em simultâneo) e gera-o. Devolve False se outro
+    trabalhador já o tinha reservado.
+    """
+    pendente = RelatorioPDF.objects.filter(id=relatorio.id, estado=RelatorioPDF.ESTADO_PENDENTE)
+    if not pendente.update(estado=RelatorioPDF.ESTADO_EM_CURSO, iniciado_em=timezone.now()):
+        return False
+    try:
+        renderizar_relatorio(relatorio)
+    except Exception as e:  # um relatório com erro não pode parar o trabalhador
+        RelatorioPDF.objects.filter(id=relatorio.id).update(estado=RelatorioPDF.ESTADO_ERRO, mensagem_erro=str(e))
+    else:
+        RelatorioPDF.objects.filter(id=relatorio.id).update(estado=RelatorioPDF.ESTADO_CONCLUIDO, mensagem_erro='', concluido_em=timezone.now())
+    return True
+
+def _limite_em_curso():
+    return timezone.now() - timedelta(seconds=settings.RELATORIOS_TEMPO_MAXIMO_S)
+
+def _em_curso_interrompido(relatorio):
+    return (relatorio.estado == RelatorioPDF.ESTADO_EM_CURSO
+            and (relatorio.iniciado_em is None or relatorio.iniciado_em < _limite_em_curso()))
+
+def repor_relatorios_interrompidos():
+    """
+    Volta a pôr em fila os pedidos em curso há mais de RELATORIOS_TEMPO_MAXIMO_S (o
+    trabalhador que os reservou terminou sem os concluir, p. ex. sem memória no WeasyPrint).
+    Devolve quantos foram repostos.
+    """
+    interrompidos = RelatorioPDF.objects.filter(estado=RelatorioPDF.ESTADO_EM_CURSO).filter(
+        Q(iniciado_em__isnull=True) | Q(iniciado_em__lt=_limite_em_curso()))
+    return interrompidos.update(estado=RelatorioPDF.ESTADO_PENDENTE, iniciado_em=None)
+
+def processar_relatorios_pendentes(limite=None):
+    """Gera os relatórios pendentes por ordem de chegada; devolve quantos foram processados."""
+    repor_relatorios_interrompidos()
+    processados = 0
+    while limite is None or processados < limite:
+        relatorio = (RelatorioPDF.objects.filter(estado=RelatorioPDF.ESTADO_PENDENTE)
+                     .select_related('calculo').order_by('criado_em', 'id').first())
+        if relatorio is None:
+            break
+        processados += processar_relatorio(relatorio)
+    return processados
+
+def apagar_relatorios_em_disco(calculo_id):
+    shutil.rmtree(diretorio_relatorios() / str(calculo_id), ignore_errors=True)
+
+def repor_pedido_relatorio(relatorio):
+    """Volta a pôr em fila um pedido concluído cujo ficheiro desapareceu, que falhou ou que ficou interrompido."""
+    if relatorio.estado in (RelatorioPDF.ESTADO_CONCLUIDO, RelatorioPDF.ESTADO_ERRO) or _em_curso_interrompido(relatorio):
+        relatorio.estado, relatorio.iniciado_em = RelatorioPDF.ESTADO_PENDENTE, None
+        return True
+    return False
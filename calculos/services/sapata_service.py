@@ -1,10 +1,77 @@
 # calculos/services/sapata_service.py
 import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+from . import desenho_service, raizes
 
 # ==============================================================================
 # FUNÇÕES AUXILIARES PARA ENCONTRAR COMBINAÇÃO DE BARRAS OTIMIZADAS
 # ==============================================================================
 
+VERGALHOES_SAPATA = {
+    8:  0.503,
+    10: 0.785,
+    12: 1.131,
+    16: 2.011,
+    20: 3.142,
+    25: 4.909,
+}
+S_MAX_ABS_SAPATA = 300.0
+S_ALVO_SAPATA = 200.0
+
+@lru_cache(maxsize=4096)
+def _melhor_n_barras(As_req_total_cm2, diametro, largura_disp_mm):
+    """
+    Melhor nº de varões de um diâmetro numa direção: menor área em excesso mais a
+    distância ao espaçamento alvo (x0.01). Devolve (score, n_barras, área, espaçamento)
+    ou None se nenhum número de varões cumpre os espaçamentos.
+    """
+    area_varao_cm2 = VERGALHOES_SAPATA[diametro]
+    espacamento_min = max(diametro, 20, 27)
+    largura_centros = largura_disp_mm - diametro
+    if largura_centros <= 0:
+        return None
+
+    # n_min para assegurar pelo menos a área requerida
+    n_min = max(2, math.ceil(As_req_total_cm2 / area_varao_cm2))
+    melhor = None
+    for n_barras in range(n_min, 100):
+        espacamento_mm = largura_centros / (n_barras - 1)
+        if espacamento_mm < espacamento_min:
+            break
+        if espacamento_mm > S_MAX_ABS_SAPATA:
+            continue
+        as_prov_total_cm2 = n_barras * area_varao_cm2
+        score = (as_prov_total_cm2 - As_req_total_cm2) + abs(espacamento_mm - S_ALVO_SAPATA) * 0.01
+        if melhor is None or score < melhor[0]:
+            melhor = (score, n_barras, as_prov_total_cm2, espacamento_mm)
+    return melhor
+
+def _melhor_armadura(As_req_total_cm2, largura_disp_mm):
+    """Melhor (diâmetro, score, n_barras, área, espaçamento) de todos os diâmetros numa direção, ou None."""
+    melhor = None
+    for diametro in VERGALHOES_SAPATA:
+        opcao = _melhor_n_barras(As_req_total_cm2, diametro, largura_disp_mm)
+        if opcao and (melhor is None or opcao[0] < melhor[1]):
+            melhor = (diametro,) + opcao
+    return melhor
+
+def _melhor_malha_quadrada(As_req_total_x_cm2, As_req_total_y_cm2, largura_disp_mm):
+    """
+    Malha de um só diâmetro nas duas direções de uma sapata quadrada. O score é a soma
+    dos scores de cada direção, pelo que basta otimizar x e y separadamente para cada
+    diâmetro: O(diâmetros x n). Devolve (diâmetro, opção x, opção y) ou None.
+    """
+    melhor = None
+    for diametro in VERGALHOES_SAPATA:
+        opcao_x = _melhor_n_barras(As_req_total_x_cm2, diametro, largura_disp_mm)
+        opcao_y = _melhor_n_barras(As_req_total_y_cm2, diametro, largura_disp_mm)
+        if opcao_x and opcao_y and (melhor is None or opcao_x[0] + opcao_y[0] < melhor[0]):
+            melhor = (opcao_x[0] + opcao_y[0], diametro, opcao_x, opcao_y)
+    return melhor[1:] if melhor else None
+
 def escolher_armadura_sapata_total(As_req_cm2_m, L_distrib_m, c_nom_mm):
     """
     Escolhe a combinação de barras considerando a largura total da sapata disponível
@@ -12,76 +79,19 @@ def escolher_armadura_sapata_total(As_req_cm2_m, L_distrib_m, c_nom_mm):
     """
     As_req_total_cm2 = As_req_cm2_m * L_distrib_m
     largura_disp_mm = L_distrib_m * 1000.0 - 2.0 * c_nom_mm
-    
-    vergalhoes_padrao = {
-        8:  0.503,
-        10: 0.785,
-        12: 1.131,
-        16: 2.011,
-        20: 3.142,
-        25: 4.909,
-    }
-
-    S_MAX_ABS = 300.0
-    S_ALVO    = 200.0
-
-    solucoes = []
 
-    for diametro, area_varao_cm2 in vergalhoes_padrao.items():
-        espacamento_min = max(diametro, 20, 27)
-
-        # n_min para assegurar pelo menos a área requerida
-        n_min = math.ceil(As_req_total_cm2 / area_varao_cm2) if area_varao_cm2 > 0 else 2
-        n_min = max(int(n_min), 2)
-        
-        largura_centros = largura_disp_mm - diametro
-        if largura_centros <= 0:
-            continue
-
-        for n_barras in range(n_min, 100):
-            as_prov_total_cm2 = n_barras * area_varao_cm2
-            as_prov_cm2_m = as_prov_total_cm2 / L_distrib_m
-
-            espacamento_mm = largura_centros / (n_barras - 1) if n_barras > 1 else largura_centros
-            
-            if espacamento_mm < espacamento_min:
-                break
-            if espacamento_mm > S_MAX_ABS:
-                continue
-
-            # Priorizamos a área necessária + proximidade ao espaçamento alvo
-            excesso = as_prov_total_cm2 - As_req_total_cm2
-            score = excesso + abs(espacamento_mm - S_ALVO) * 0.01
-
-            texto_verificacao = (
-                f"Para {n_barras}Ø{diametro}: As,prov,total ≈ {as_prov_total_cm2:.2f} cm² (Req: {As_req_total_cm2:.2f} cm²); "
-                f"s ≈ {espacamento_mm:.0f} mm (mín={espacamento_min} mm, máx={S_MAX_ABS} mm); "
-                f"As,prov ≈ {as_prov_cm2_m:.2f} cm²/m. -> OK"
-            )
-
-            solucoes.append({
-                "n_barras": n_barras,
-                "diametro": diametro,
-                "area_total_prov": as_prov_total_cm2,
-                "area_prov_m": as_prov_cm2_m,
-                "espacamento": espacamento_mm,
-                "score": score,
-                "verificacao": texto_verificacao
-            })
-
-    if not solucoes:
+    melhor = _melhor_armadura(As_req_total_cm2, largura_disp_mm)
+    if not melhor:
         return (0, 0, 0, 0, 0, "Nenhuma combinação de armadura válida.")
 
-    sol_otima = min(solucoes, key=lambda x: x['score'])
-
-    return (
-        sol_otima['n_barras'],
-        sol_otima['diametro'],
-        sol_otima['area_total_prov'],
-        sol_otima['area_prov_m'],
-        sol_otima['espacamento'],
-        sol_otima['verificacao'],
+    diametro, _, n_barras, as_prov_total_cm2, espacamento_mm = melhor
+    as_prov_cm2_m = as_prov_total_cm2 / L_distrib_m
+    texto_verificacao = (
+        f"Para {n_barras}Ø{diametro}: As,prov,total ≈ {as_prov_total_cm2:.2f} cm² (Req: {As_req_total_cm2:.2f} cm²); "
+        f"s ≈ {espacamento_mm:.0f} mm (mín={max(diametro, 20, 27)} mm, máx={S_MAX_ABS_SAPATA} mm); "
+        f"As,prov ≈ {as_prov_cm2_m:.2f} cm²/m. -> OK"
     )
+    return (n_barras, diametro, as_prov_total_cm2, as_prov_cm2_m, espacamento_mm, texto_verificacao)
 
 # ==============================================================================
 # FUNÇÕES AUXILIARES PARA DESENHOS
@@ -91,6 +101,7 @@ def escolher_armadura_sapata_total(As_req_cm2_m, L_distrib_m, c_nom_mm):
 # FUNÇÕES AUXILIARES PARA DESENHOS
 # ==============================================================================
 
+@desenho_service.svg_em_cache
 def desenhar_sapata_planta_svg(dados_desenho):
     A = dados_desenho['A_m']
     B = dados_desenho['B_m']
@@ -102,14 +113,10 @@ def desenhar_sapata_planta_svg(dados_desenho):
 
     padding = 60
     escala = 300 / max(A, B) if max(A, B) > 0 else 1
-    largura_svg, altura_svg = A * escala + 2 * padding, B * escala + 2 * padding
-    
-    svg = f'<svg width="100%" viewBox="0 0 {largura_svg} {altura_svg}" xmlns="http://www.w3.org/2000/svg">'
-    svg += '<style>.dim-text { font-family: Arial, sans-serif; font-size: 12px; fill: #333; text-anchor: middle; }</style>'
-    svg += f'<rect x="0" y="0" width="{largura_svg}" height="{altura_svg}" fill="#f9f9f9"/>'
-    svg += f'<rect x="{padding}" y="{padding}" width="{A*escala}" height="{B*escala}" fill="#ececec" stroke="#333" stroke-width="2"/>'
+    desenho = desenho_service.DesenhoSVG(A * escala + 2 * padding, B * escala + 2 * padding, tamanho_letra=12, fundo="#f9f9f9")
+    desenho.retangulo(padding, padding, A*escala, B*escala, "#ececec", "#333", 2)
     x_pilar, y_pilar = padding + (A - bp) / 2 * escala, padding + (B - hp) / 2 * escala
-    svg += f'<rect x="{x_pilar}" y="{y_pilar}" width="{bp*escala}" height="{hp*escala}" fill="#c0c0c0" stroke="#333" stroke-width="1"/>'
+    desenho.retangulo(x_pilar, y_pilar, bp*escala, hp*escala, "#c0c0c0", "#333", 1)
     n_barras_x = dados_desenho.get('n_barras_x', 0)
     n_barras_y = dados_desenho.get('n_barras_y', 0)
 
@@ -119,9 +126,9 @@ def desenhar_sapata_planta_svg(dados_desenho):
         for i in range(n_barras_x):
             y_i = comeco_y + i * dist_x_m * escala
             if y_i > padding + B*escala - c_nom*escala: break
-            svg += f'<line x1="{padding + c_nom*escala}" y1="{y_i}" x2="{padding + A*escala - c_nom*escala}" y2="{y_i}" stroke="#005a9e" stroke-width="{max(1, phi_x/4)}"/>'
+            desenho.linha(padding + c_nom*escala, y_i, padding + A*escala - c_nom*escala, y_i, "#005a9e", max(1, phi_x/4))
         y_text_x = padding + B*escala - c_nom*escala - 10
-        svg += f'<text x="{padding + A*escala/2}" y="{y_text_x}" class="dim-text" fill="#005a9e" font-weight="bold">Dir X: {n_barras_x}Ø{phi_x}</text>'
+        desenho.texto(padding + A*escala/2, y_text_x, f"Dir X: {n_barras_x}Ø{phi_x}", cor="#005a9e", negrito=True)
 
     if phi_y > 0 and n_barras_y > 0:
         dist_y_m = esp_y_mm / 1000
@@ -129,29 +136,26 @@ def desenhar_sapata_planta_svg(dados_desenho):
         for i in range(n_barras_y):
             x_i = comeco_x + i * dist_y_m * escala
             if x_i > padding + A*escala - c_nom*escala: break
-            svg += f'<line x1="{x_i}" y1="{padding + c_nom*escala}" x2="{x_i}" y2="{padding + B*escala - c_nom*escala}" stroke="#cc0000" stroke-width="{max(1, phi_y/4)}"/>'
+            desenho.linha(x_i, padding + c_nom*escala, x_i, padding + B*escala - c_nom*escala, "#cc0000", max(1, phi_y/4))
         x_text_y = padding + c_nom*escala + 15
-        svg += f'<text x="{x_text_y}" y="{padding + B*escala/2}" class="dim-text" fill="#cc0000" font-weight="bold" transform="rotate(-90, {x_text_y}, {padding + B*escala/2})">Dir Y: {n_barras_y}Ø{phi_y}</text>'
+        desenho.texto(x_text_y, padding + B*escala/2, f"Dir Y: {n_barras_y}Ø{phi_y}", cor="#cc0000", negrito=True, rotacao=-90)
     y_cota_a = padding + B * escala + padding/2
-    svg += f'<path d="M {padding} {y_cota_a - 10} L {padding} {y_cota_a + 10} M {padding} {y_cota_a} L {padding + A*escala} {y_cota_a} M {padding + A*escala} {y_cota_a - 10} L {padding + A*escala} {y_cota_a + 10}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{padding + A*escala/2}" y="{y_cota_a - 5}" class="dim-text">{B:.2f} m</text>'
+    desenho.cota_horizontal(padding, padding + A*escala, y_cota_a, 10)
+    desenho.texto(padding + A*escala/2, y_cota_a - 5, f"{B:.2f} m")
     x_cota_b = padding / 2
-    svg += f'<path d="M {x_cota_b - 10} {padding} L {x_cota_b + 10} {padding} M {x_cota_b} {padding} L {x_cota_b} {padding + B*escala} M {x_cota_b - 10} {padding + B*escala} L {x_cota_b + 10} {padding + B*escala}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{x_cota_b - 5}" y="{padding + B*escala/2}" class="dim-text" transform="rotate(-90, {x_cota_b - 5}, {padding + B*escala/2})">{A:.2f} m</text>'
-    svg += '</svg>'
-    return svg
+    desenho.cota_vertical(x_cota_b, padding, padding + B*escala, 10)
+    desenho.texto(x_cota_b - 5, padding + B*escala/2, f"{A:.2f} m", rotacao=-90)
+    return desenho.render()
 
+@desenho_service.svg_em_cache
 def desenhar_sapata_corte_svg(dados_desenho):
     A, H, bp, c_nom, phi_x = dados_desenho['A_m'], dados_desenho['H_mm'] / 1000, dados_desenho['bp_mm'] / 1000, dados_desenho['c_nom_mm'] / 1000, dados_desenho['phi_x']
     padding, escala = 50, 350 / A if A > 0 else 1
-    largura_svg, altura_svg = A * escala + 2 * padding, H * escala + 2 * padding + 30
-    svg = f'<svg width="100%" viewBox="0 0 {largura_svg} {altura_svg}" xmlns="http://www.w3.org/2000/svg">'
-    svg += '<style>.dim-text { font-family: Arial, sans-serif; font-size: 12px; fill: #333; text-anchor: middle; }</style>'
-    svg += f'<rect x="0" y="0" width="{largura_svg}" height="{altura_svg}" fill="#f9f9f9"/>'
+    desenho = desenho_service.DesenhoSVG(A * escala + 2 * padding, H * escala + 2 * padding + 30, tamanho_letra=12, fundo="#f9f9f9")
     y_base = padding + 30
-    svg += f'<rect x="{padding}" y="{y_base}" width="{A*escala}" height="{H*escala}" fill="#ececec" stroke="#333" stroke-width="2"/>'
+    desenho.retangulo(padding, y_base, A*escala, H*escala, "#ececec", "#333", 2)
     x_pilar = padding + (A - bp) / 2 * escala
-    svg += f'<rect x="{x_pilar}" y="{y_base - 30}" width="{bp*escala}" height="30" fill="#c0c0c0" stroke="#333" stroke-width="1"/>'
+    desenho.retangulo(x_pilar, y_base - 30, bp*escala, 30, "#c0c0c0", "#333", 1)
     n_barras_x = dados_desenho.get('n_barras_x', 0)
     if phi_x > 0 and n_barras_x > 0:
         num_barras = n_barras_x
@@ -159,241 +163,433 @@ def desenhar_sapata_corte_svg(dados_desenho):
         cy = y_base + H * escala - c_nom * escala - (phi_x/2000*escala)
         for i in range(num_barras):
             cx = padding + c_nom*escala + i * esp_barras
-            svg += f'<circle cx="{cx}" cy="{cy}" r="{phi_x/2000*escala}" fill="#005a9e" stroke="#333" stroke-width="0.5"/>'
+            desenho.circulo(cx, cy, phi_x/2000*escala, "#005a9e", "#333", 0.5)
     y_cota_a, x_cota_h = y_base + H * escala + padding/2, padding + A * escala + padding/2
-    svg += f'<path d="M {padding} {y_cota_a - 10} L {padding} {y_cota_a + 10} M {padding} {y_cota_a} L {padding + A*escala} {y_cota_a} M {padding + A*escala} {y_cota_a - 10} L {padding + A*escala} {y_cota_a + 10}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{padding + A*escala/2}" y="{y_cota_a - 5}" class="dim-text">{A:.2f} m</text>'
-    svg += f'<path d="M {x_cota_h-10} {y_base} L {x_cota_h+10} {y_base} M {x_cota_h} {y_base} L {x_cota_h} {y_base+H*escala} M {x_cota_h-10} {y_base+H*escala} L {x_cota_h+10} {y_base+H*escala}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{x_cota_h + 15}" y="{y_base + H*escala/2}" class="dim-text" transform="rotate(90, {x_cota_h + 15}, {y_base + H*escala/2})">{H*1000:.0f} mm</text>'
-    svg += '</svg>'
-    return svg
+    desenho.cota_horizontal(padding, padding + A*escala, y_cota_a, 10)
+    desenho.texto(padding + A*escala/2, y_cota_a - 5, f"{A:.2f} m")
+    desenho.cota_vertical(x_cota_h, y_base, y_base+H*escala, 10)
+    desenho.texto(x_cota_h + 15, y_base + H*escala/2, f"{H*1000:.0f} mm", rotacao=90)
+    return desenho.render()
 
 # ==============================================================================
-# FUNÇÃO PRINCIPAL DE DIMENSIONAMENTO 
+# DIMENSIONAMENTO GEOTÉCNICO (ELS)
 # ==============================================================================
-def dimensionar_sapata(sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm):
-    passos = []
+PASSO_PLANTA_M = 0.05
+
+def _tensoes_solo(A_m, B_m, N_k_kN, M_ky_kNm):
+    """Tensões no solo (ELS) para uma sapata A x B, incluindo o peso próprio estimado."""
+    H_estimado_m = max(A_m, B_m) / 8 if max(A_m, B_m) / 8 > 0.4 else 0.4
+    W_k_kN = A_m * B_m * H_estimado_m * 25
+    N_total_k_kN = N_k_kN + W_k_kN
+    e_y_m = M_ky_kNm / N_total_k_kN if N_total_k_kN > 0 else 0
+    sigma_max_kpa_real = (N_total_k_kN / (A_m * B_m)) * (1 + 6 * e_y_m / B_m) if (A_m * B_m) > 0 else 0
+    sigma_min_kpa_real = (N_total_k_kN / (A_m * B_m)) * (1 - 6 * e_y_m / B_m) if (A_m * B_m) > 0 else 0
+    return {"A_m": A_m, "B_m": B_m, "H_estimado_m": H_estimado_m, "W_k_kN": W_k_kN, "N_total_k_kN": N_total_k_kN,
+            "e_y_m": e_y_m, "sigma_max_kpa": sigma_max_kpa_real, "sigma_min_kpa": sigma_min_kpa_real}
+
+def _tensoes_admissiveis(tentativa, sigma_adm_kpa):
+    return (tentativa["e_y_m"] <= tentativa["B_m"] / 6 and tentativa["sigma_max_kpa"] <= sigma_adm_kpa
+            and tentativa["sigma_min_kpa"] >= 0)
+
+def _dimensoes_geotecnicas(A_inicial_m, B_inicial_m, razao_A_B, N_k_kN, M_ky_kNm, sigma_adm_kpa):
+    """
+    Menor sapata da grelha B = B₀ + 0.05·k (A = B·b_p/h_p) com e ≤ B/6 e σ_max ≤ σ_adm.
+    Em vez de avançar 5 cm de cada vez, resolve-se diretamente e = B/6 (e decresce com B)
+    e σ_max(B) = σ_adm pelo método de Brent; σ_max(B) é convexa (N/AB e 6M/AB² decrescem,
+    o peso próprio cresce), pelo que a zona admissível é um intervalo e a raiz procurada
+    está no ramo descendente. Devolve (A, B, tentativas avaliadas para o relatório).
+    """
+    def tensoes(B_m):
+        return _tensoes_solo(B_m * razao_A_B, B_m, N_k_kN, M_ky_kNm)
+
+    inicial = _tensoes_solo(A_inicial_m, B_inicial_m, N_k_kN, M_ky_kNm)
+    if _tensoes_admissiveis(inicial, sigma_adm_kpa):
+        return A_inicial_m, B_inicial_m, [inicial]
+
+    def raiz_descendente(g):
+        # 1ª raiz de g (positiva em B₀) para B > B₀; None se g não chega a anular-se.
+        B_baixo, g_baixo = B_inicial_m, g(B_inicial_m)
+        g_inicial = g_baixo
+        if g_baixo <= 0:
+            return B_inicial_m
+        B_alto = B_inicial_m
+        for _ in range(60):
+            B_alto = 2 * B_alto + PASSO_PLANTA_M
+            g_alto = g(B_alto)
+            if g_alto <= 0:
+                return raizes.brent(g, B_baixo, B_alto, fa=g_baixo, fb=g_alto, xtol=1e-6)[0]
+            if g_alto >= g_baixo:
+                # Passou-se o mínimo de g (convexa): procura-se-o por secção dourada.
+                a, b = B_inicial_m, B_alto
+                razao = (math.sqrt(5) - 1) / 2
+                while b - a > 1e-6:
+                    c, d = b - razao * (b - a), a + razao * (b - a)
+                    if g(c) < g(d):
+                        b = d
+                    else:
+                        a = c
+                B_min, g_min = (a + b) / 2, g((a + b) / 2)
+                if g_min > 0:
+                    return None
+                return raizes.brent(g, B_inicial_m, B_min, fa=g_inicial, fb=g_min, xtol=1e-6)[0]
+            B_baixo, g_baixo = B_alto, g_alto
+        return None
+
+    B_excentricidade = raiz_descendente(lambda B: tensoes(B)["e_y_m"] - B / 6)
+    B_tensao = raiz_descendente(lambda B: tensoes(B)["sigma_max_kpa"] - sigma_adm_kpa)
+    if B_excentricidade is None or B_tensao is None:
+        raise ValueError("Não foi possível encontrar dimensões geotécnicas válidas.")
+
+    # Arredondamento à grelha de 5 cm, confirmado nos pontos vizinhos (erros de arredondamento).
+    k = max(1, math.ceil((max(B_excentricidade, B_tensao) - B_inicial_m) / PASSO_PLANTA_M - 1e-9))
+    final = tensoes(B_inicial_m + k * PASSO_PLANTA_M)
+    for _ in range(3):
+        if _tensoes_admissiveis(final, sigma_adm_kpa):
+            break
+        k += 1
+        final = tensoes(B_inicial_m + k * PASSO_PLANTA_M)
+    else:
+        # e ≤ B/6 só é atingido depois de σ_max voltar a exceder σ_adm.
+        raise ValueError("Não foi possível encontrar dimensões geotécnicas válidas.")
+    tentativas = [inicial]
+    while k > 1:
+        anterior = tensoes(B_inicial_m + (k - 1) * PASSO_PLANTA_M)
+        if not _tensoes_admissiveis(anterior, sigma_adm_kpa):
+            tentativas.append(anterior)
+            break
+        k, final = k - 1, anterior
+    tentativas.append(final)
+    return final["A_m"], final["B_m"], tentativas
+
+# ==============================================================================
+# ALTURA ÚTIL AO PUNÇOAMENTO (ELU)
+# ==============================================================================
+D_MIN_PUNCOAMENTO_M = 0.15
+PASSO_D_PUNCOAMENTO_MM = 10
+RHO_L_PUNCOAMENTO = 0.005
+
+def _esforcos_puncoamento(d_m, N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, gamma_c=1.5):
+    """
+    V_Ed e V_Rd,c no perímetro de controlo a 2d (EC2 6.4) para a altura útil d.
+    Aceita vetores (várias sapatas ou várias alturas); V_Rd,c - V_Ed cresce com d.
+    """
+    d_m = np.asarray(d_m, dtype=float)
+    u1 = 2*(bp_mm+hp_mm)+math.pi*2*d_m*1000
+    Acrit_m2 = (bp_mm/1000+math.pi*d_m)*(hp_mm/1000+math.pi*d_m)
+    V_Ed_pun_kN = N_Ed_kN - sigma_Ed_kpa*Acrit_m2
+    k = np.where(d_m > 0, np.minimum(2.0, 1+np.sqrt(200/np.maximum(d_m*1000, 1e-12))), 1.0)
+    VRd_c_pun_kN = np.where(d_m > 0, (0.18/gamma_c)*k*(100*RHO_L_PUNCOAMENTO*np.asarray(f_ck, dtype=float))**(1/3)*(u1/1000)*d_m*1000, 0.0)
+    return u1, Acrit_m2, V_Ed_pun_kN, VRd_c_pun_kN, k
+
+def altura_util_puncoamento(N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, passo_d_mm=PASSO_D_PUNCOAMENTO_MM, gamma_c=1.5):
+    """
+    Menor altura útil d = 0.15 m + k·passo com V_Rd,c > V_Ed. Resolve V_Rd,c(d) - V_Ed(d) = 0
+    pelo método de Brent e arredonda ao passo, confirmando os pontos vizinhos.
+    Devolve (d_m, nº de avaliações).
+    """
+    passo_m = passo_d_mm / 1000
+    avaliacoes = [0]
+
+    def folga(d_m):
+        avaliacoes[0] += 1
+        _, _, V_Ed, VRd_c, _ = _esforcos_puncoamento(d_m, N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, gamma_c)
+        return float(VRd_c - V_Ed)
+
+    def d_grelha(i):
+        return round(D_MIN_PUNCOAMENTO_M + i * passo_m, 10)
+
+    f_baixo = folga(D_MIN_PUNCOAMENTO_M)
+    if f_baixo > 0:
+        return D_MIN_PUNCOAMENTO_M, avaliacoes[0]
+    d_alto = D_MIN_PUNCOAMENTO_M
+    for _ in range(30):
+        d_alto *= 2
+        f_alto = folga(d_alto)
+        if f_alto > 0:
+            break
+    else:
+        raise ValueError("Não foi possível determinar uma altura válida contra o punçoamento.")
+    d_raiz, _ = raizes.brent(folga, D_MIN_PUNCOAMENTO_M, d_alto, fa=f_baixo, fb=f_alto, xtol=0.1 * passo_m)
+
+    i = max(1, math.ceil((d_raiz - D_MIN_PUNCOAMENTO_M) / passo_m - 1e-9))
+    while folga(d_grelha(i)) <= 0:
+        i += 1
+    while i > 0 and folga(d_grelha(i - 1)) > 0:
+        i -= 1
+    return d_grelha(i), avaliacoes[0]
+
+def altura_util_puncoamento_lote(N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, passo_d_mm=PASSO_D_PUNCOAMENTO_MM, gamma_c=1.5):
+    """
+    Versão vetorizada de altura_util_puncoamento para muitas sapatas de uma só vez:
+    bissecção no índice da grelha de d (V_Rd,c - V_Ed é monótona), com todas as
+    sapatas avaliadas em conjunto em cada passo. Devolve (d_m, nº de passos de bissecção).
+    """
+    N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck)))
+    passo_m = passo_d_mm / 1000
+
+    def verifica(i):
+        d_m = np.round(D_MIN_PUNCOAMENTO_M + i * passo_m, 10)
+        _, _, V_Ed, VRd_c, _ = _esforcos_puncoamento(d_m, N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, gamma_c)
+        return VRd_c > V_Ed
+
+    # Enquadramento: índice alto a duplicar até todas as sapatas verificarem.
+    baixo = np.full(N_Ed_kN.shape, -1, dtype=np.int64)
+    alto = np.zeros(N_Ed_kN.shape, dtype=np.int64)
+    for _ in range(40):
+        ok = verifica(alto)
+        if ok.all():
+            break
+        baixo = np.where(ok, baixo, alto)
+        alto = np.where(ok, alto, 2 * alto + 1)
+    else:
+        raise ValueError("Não foi possível determinar uma altura válida contra o punçoamento.")
+
+    passos = 0
+    while (alto - baixo > 1).any():
+        ativo = alto - baixo > 1
+        meio = (baixo + alto) // 2
+        ok = verifica(meio)
+        alto, baixo = np.where(ativo & ok, meio, alto), np.where(ativo & ~ok, meio, baixo)
+        passos += 1
+    return np.round(D_MIN_PUNCOAMENTO_M + alto * passo_m, 10), passos
+
+# ==============================================================================
+# NÚCLEO NUMÉRICO
+# ==============================================================================
+def calcular_sapata(sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm, passo_d_mm=PASSO_D_PUNCOAMENTO_MM):
+    """
+    Núcleo numérico do dimensionamento de uma sapata. Devolve a memória de cálculo
+    (serializável em JSON), incluindo os valores de cada iteração geotécnica, sem
+    construir texto; ver gerar_passos_sapata.
+    """
+    if N_Ed_kN <= 0:
+        raise ValueError("O esforço axial N_Ed deve ser maior que zero.")
     gamma_g_avg = 1.4
-    
-    passos.append({"titulo": "FASE 1: DIMENSIONAMENTO GEOTÉCNICO (ELS)", "calculo": "Objetivo: encontrar as dimensões em planta (A x B) da sapata que garantem que as tensões no solo são admissíveis."})
-    
     N_k_kN = N_Ed_kN / gamma_g_avg
     M_ky_kNm = M_Edy_kNm / gamma_g_avg
-    passos.append({"titulo": "1.1. Esforços de Serviço (ELS)", "formula": r"N_k = \frac{N_{Ed}}{\gamma_{G,avg}} \, ; \, M_k = \frac{M_{Ed}}{\gamma_{G,avg}}", "calculo": f"N_k ≈ {N_Ed_kN:.2f} / {gamma_g_avg} = {N_k_kN:.2f} kN<br>M_k,y ≈ {M_Edy_kNm:.2f} / {gamma_g_avg} = {M_ky_kNm:.2f} kNm"})
 
     A_req_preliminar = N_k_kN / sigma_adm_kpa if sigma_adm_kpa > 0 else 1.0
     A_majorada = A_req_preliminar * 1.2
     
-    calculo_estimativa = f"Área teórica necessária = {N_k_kN:.2f} kN / {sigma_adm_kpa} kPa = {A_req_preliminar:.2f} m²<br>"
-    calculo_estimativa += f"Área majorada (≈+20% para peso próprio e momentos) = {A_req_preliminar:.2f} x 1.20 = {A_majorada:.2f} m²<br>"
-    
+    proporcao = None
     if bp_mm == hp_mm:
         A_m = math.sqrt(A_majorada)
         B_m = A_m
-        calculo_estimativa += f"Como o pilar é quadrado, a sapata será quadrada: A = B = √{A_majorada:.2f} = {A_m:.2f} m"
     else:
         proporcao = hp_mm / bp_mm if bp_mm > 0 else 1
         A_m = math.sqrt(A_majorada / proporcao)
         B_m = A_m * proporcao
+    A_inicial_m, B_inicial_m = A_m, B_m
+    
+    razao_A_B = bp_mm / hp_mm if hp_mm > 0 else 1
+    A_m, B_m, iteracoes = _dimensoes_geotecnicas(A_m, B_m, razao_A_B, N_k_kN, M_ky_kNm, sigma_adm_kpa)
+
+    A_final_m, B_final_m = math.ceil(A_m*20)/20, math.ceil(B_m*20)/20
+
+    gamma_c, gamma_s = 1.5, 1.15; f_cd_mpa, f_yd_mpa = f_ck/gamma_c, f_yk/gamma_s
+    sigma_Ed_kpa = N_Ed_kN/(A_final_m*B_final_m) if (A_final_m*B_final_m)>0 else 0
+    d_pre_rigidez = (max(A_final_m, B_final_m)*1000 - max(bp_mm, hp_mm))/3
+    
+    d_m, iteracoes_d = altura_util_puncoamento(N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, passo_d_mm, gamma_c)
+    u1, Acrit_m2, V_Ed_pun_kN, VRd_c_pun_kN, k = (float(v) for v in _esforcos_puncoamento(d_m, N_Ed_kN, sigma_Ed_kpa, bp_mm, hp_mm, f_ck, gamma_c))
+    rho_l = RHO_L_PUNCOAMENTO
+    H_final_mm = math.ceil((d_m + c_nom_mm/1000 + 0.016)*1000/50)*50
+    puncoamento = {"d_m": d_m, "u1": u1, "Acrit_m2": Acrit_m2, "V_Ed_kN": V_Ed_pun_kN, "VRd_c_kN": VRd_c_pun_kN, "k": k, "rho_l": rho_l,
+                   "passo_d_mm": passo_d_mm, "iteracoes": iteracoes_d}
+    
+    # Diâmetros de referência (1 cm²/m) para estimar as alturas úteis de flexão.
+    largura_A_mm, largura_B_mm = A_final_m * 1000.0 - 2.0 * c_nom_mm, B_final_m * 1000.0 - 2.0 * c_nom_mm
+    phi_y_temp = (_melhor_armadura(A_final_m, largura_A_mm) or (0,))[0]
+    phi_x_temp = (_melhor_armadura(B_final_m, largura_B_mm) or (0,))[0]
+    phi_maior = max(phi_x_temp, phi_y_temp)
+    phi_menor = min(phi_x_temp, phi_y_temp)
+    d_flex_x = (H_final_mm - c_nom_mm - phi_maior/2) / 1000
+    d_flex_y = (H_final_mm - c_nom_mm - phi_maior - phi_menor/2) / 1000
+
+    ly = (B_final_m - hp_mm/1000) / 2
+    M_Edy_flex_kNm_m = (sigma_Ed_kpa * ly**2) / 2 
+    Asy_req_cm2_m = (M_Edy_flex_kNm_m / (0.9 * d_flex_y * f_yd_mpa * 1000)) * 10000 if d_flex_y > 0 else 0
+    
+    lx, M_Edx_flex_kNm_m = (A_final_m - bp_mm/1000)/2, (sigma_Ed_kpa * ((A_final_m - bp_mm/1000)/2)**2)/2
+    Asx_req_cm2_m = (M_Edx_flex_kNm_m / (0.9 * d_flex_x * f_yd_mpa * 1000)) * 10000 if d_flex_x > 0 else 0
+    
+    f_ctm = 0.3 * f_ck**(2/3)
+    As_min_cm2 = max(0.26 * (f_ctm/f_yk) * 1 * d_flex_x, 0.0013 * 1 * d_flex_x) * 10000
+    Asy_final_cm2_m, Asx_final_cm2_m = max(Asy_req_cm2_m, As_min_cm2), max(Asx_req_cm2_m, As_min_cm2)
+    
+    quadrada = abs(A_final_m - B_final_m) < 0.01
+    malha_unica = False
+
+    As_req_total_x_cm2 = Asx_final_cm2_m * B_final_m
+    As_req_total_y_cm2 = Asy_final_cm2_m * A_final_m
+    
+    if quadrada:
+        malha = _melhor_malha_quadrada(As_req_total_x_cm2, As_req_total_y_cm2, largura_A_mm)
+        if malha:
+            phi_x, (_, n_barras_x, Asx_prov_total_cm2, esp_x), (_, n_barras_y, Asy_prov_total_cm2, esp_y) = malha
+            phi_y = phi_x
+            as_prov_x_m = Asx_prov_total_cm2 / B_final_m
+            as_prov_y_m = Asy_prov_total_cm2 / A_final_m
+            malha_unica = True
+
+    if not malha_unica:
+        n_barras_y, phi_y, Asy_prov_total_cm2, as_prov_y_m, esp_y, _ = escolher_armadura_sapata_total(Asy_final_cm2_m, A_final_m, c_nom_mm)
+        n_barras_x, phi_x, Asx_prov_total_cm2, as_prov_x_m, esp_x, _ = escolher_armadura_sapata_total(Asx_final_cm2_m, B_final_m, c_nom_mm)
+    
+    if n_barras_x == 0 or n_barras_y == 0: raise ValueError("Não foi possível encontrar uma combinação de armadura válida.")
+    
+    return {
+        "sigma_adm_kpa": sigma_adm_kpa, "f_ck": f_ck, "f_yk": f_yk, "c_nom_mm": c_nom_mm,
+        "bp_mm": bp_mm, "hp_mm": hp_mm, "N_Ed_kN": N_Ed_kN, "M_Edy_kNm": M_Edy_kNm,
+        "gamma_g_avg": gamma_g_avg, "N_k_kN": N_k_kN, "M_ky_kNm": M_ky_kNm,
+        "A_req_preliminar": A_req_preliminar, "A_majorada": A_majorada, "proporcao": proporcao,
+        "A_inicial_m": A_inicial_m, "B_inicial_m": B_inicial_m,
+        "iteracoes": iteracoes,
+        "A_final_m": A_final_m, "B_final_m": B_final_m,
+        "gamma_c": gamma_c, "gamma_s": gamma_s, "f_cd_mpa": f_cd_mpa, "f_yd_mpa": f_yd_mpa,
+        "sigma_Ed_kpa": sigma_Ed_kpa, "d_pre_rigidez": d_pre_rigidez,
+        "puncoamento": puncoamento, "H_final_mm": H_final_mm,
+        "d_flex_x": d_flex_x, "d_flex_y": d_flex_y,
+        "ly": ly, "M_Edy_flex_kNm_m": M_Edy_flex_kNm_m, "Asy_req_cm2_m": Asy_req_cm2_m,
+        "lx": lx, "M_Edx_flex_kNm_m": M_Edx_flex_kNm_m, "Asx_req_cm2_m": Asx_req_cm2_m,
+        "f_ctm": f_ctm, "As_min_cm2": As_min_cm2,
+        "Asx_final_cm2_m": Asx_final_cm2_m, "Asy_final_cm2_m": Asy_final_cm2_m,
+        "quadrada": quadrada, "malha_unica": malha_unica,
+        "As_req_total_x_cm2": As_req_total_x_cm2, "As_req_total_y_cm2": As_req_total_y_cm2,
+        "n_barras_x": n_barras_x, "phi_x": phi_x, "Asx_prov_total_cm2": Asx_prov_total_cm2, "as_prov_x_m": as_prov_x_m, "esp_x": esp_x,
+        "n_barras_y": n_barras_y, "phi_y": phi_y, "Asy_prov_total_cm2": Asy_prov_total_cm2, "as_prov_y_m": as_prov_y_m, "esp_y": esp_y,
+    }
+
+# ==============================================================================
+# RELATÓRIO (PASSO A PASSO)
+# ==============================================================================
+FORMULAS_SAPATA = {
+    "esforcos_servico": r"N_k = \frac{N_{Ed}}{\gamma_{G,avg}} \, ; \, M_k = \frac{M_{Ed}}{\gamma_{G,avg}}",
+    "estimativa_inicial": r"A_{req} = \frac{N_k}{\sigma_{adm}} \, ; \, A_{maj} = A_{req} \cdot 1.20",
+    "iteracao_geotecnica": r"H_{est} \approx \frac{max(A,B)}{8} \, ; \, W_k = A{\cdot}B{\cdot}H_{est}{\cdot}\gamma_{c} \, ; \, N_{total,k} = N_k + W_k \, ; \,e_y = \frac{M_k}{N_{total,k}} \, ; \, \sigma_{max,min} = \frac{N_{total,k}}{A \cdot B} (1 \pm \frac{6e_y}{B})",
+    "materiais": r"f_{cd} = \frac{f_{ck}}{\gamma_c} \, ; \, f_{yd} = \frac{f_{yk}}{\gamma_s}",
+    "tensao_solo": r"\sigma_{Ed} = \frac{N_{Ed}}{A \cdot B}",
+    "altura_pre": r"d \ge \frac{B-h_p}{3}",
+    "puncoamento": (r"u_1 = 2(b_p+h_p) + 2\pi d \, ; \, A_{crit} = (b_p+\pi d)(h_p+\pi d) \, ; \, k = 1+\sqrt{\frac{200}{d}} \le 2.0"
+                    r"\, ; \, V_{Ed} = N_{Ed} - \sigma_{Ed} \cdot A_{crit} \, ; \, V_{Rd,c} = \frac{0.18}{\gamma_c} k (100 \rho_l f_{ck})^{1/3} u_1 d"),
+    "armadura_y": r"l_y = \frac{B-h_p}{2} \, ; \, M_{Ed,y} = \frac{\sigma_{Ed} \cdot l_y^2}{2} \, ; \, A_{s,y} \approx \frac{M_{Ed,y}}{0.9d \cdot f_{yd}}",
+    "armadura_x": r"l_x = \frac{A-b_p}{2} \, ; \, M_{Ed,x} = \frac{\sigma_{Ed} \cdot l_x^2}{2} \, ; \, A_{s,x} \approx \frac{M_{Ed,x}}{0.9d \cdot f_{yd}}",
+    "armadura_minima": r"A_{s,min} = max(0.26\frac{f_{ctm}}{f_{yk}} b_t d; 0.0013 b_t d)",
+}
+
+def gerar_passos_sapata(memoria):
+    """Constrói o passo a passo do relatório a partir da memória de cálculo de calcular_sapata."""
+    m = memoria
+    sigma_adm_kpa, f_ck, f_yk, c_nom_mm = m["sigma_adm_kpa"], m["f_ck"], m["f_yk"], m["c_nom_mm"]
+    bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm = m["bp_mm"], m["hp_mm"], m["N_Ed_kN"], m["M_Edy_kNm"]
+    gamma_g_avg, N_k_kN, M_ky_kNm = m["gamma_g_avg"], m["N_k_kN"], m["M_ky_kNm"]
+    A_req_preliminar, A_majorada = m["A_req_preliminar"], m["A_majorada"]
+    passos = []
+    
+    passos.append({"titulo": "FASE 1: DIMENSIONAMENTO GEOTÉCNICO (ELS)", "calculo": "Objetivo: encontrar as dimensões em planta (A x B) da sapata que garantem que as tensões no solo são admissíveis."})
+    passos.append({"titulo": "1.1. Esforços de Serviço (ELS)", "formula": FORMULAS_SAPATA["esforcos_servico"], "calculo": f"N_k ≈ {N_Ed_kN:.2f} / {gamma_g_avg} = {N_k_kN:.2f} kN<br>M_k,y ≈ {M_Edy_kNm:.2f} / {gamma_g_avg} = {M_ky_kNm:.2f} kNm"})
+
+    A_m, B_m, proporcao = m["A_inicial_m"], m["B_inicial_m"], m["proporcao"]
+    calculo_estimativa = f"Área teórica necessária = {N_k_kN:.2f} kN / {sigma_adm_kpa} kPa = {A_req_preliminar:.2f} m²<br>"
+    calculo_estimativa += f"Área majorada (≈+20% para peso próprio e momentos) = {A_req_preliminar:.2f} x 1.20 = {A_majorada:.2f} m²<br>"
+    if proporcao is None:
+        calculo_estimativa += f"Como o pilar é quadrado, a sapata será quadrada: A = B = √{A_majorada:.2f} = {A_m:.2f} m"
+    else:
         calculo_estimativa += f"Como o pilar é retangular, a sapata mantém a proporção ({proporcao:.2f}): B ≈ {proporcao:.2f} * A<br>"
         calculo_estimativa += f"A ≈ √({A_majorada:.2f} / {proporcao:.2f}) = {A_m:.2f} m<br>"
         calculo_estimativa += f"B ≈ {A_m:.2f} * {proporcao:.2f} = {B_m:.2f} m"
-
-    passos.append({"titulo": "1.2. Estimativa Inicial das Dimensões", "formula": r"A_{req} = \frac{N_k}{\sigma_{adm}} \, ; \, A_{maj} = A_{req} \cdot 1.20", "calculo": calculo_estimativa})
+    passos.append({"titulo": "1.2. Estimativa Inicial das Dimensões", "formula": FORMULAS_SAPATA["estimativa_inicial"], "calculo": calculo_estimativa})
     
-    for i in range(50):
-        H_estimado_m = max(A_m, B_m) / 8 if max(A_m, B_m) / 8 > 0.4 else 0.4
-        W_k_kN = A_m * B_m * H_estimado_m * 25
-        N_total_k_kN = N_k_kN + W_k_kN
-        e_y_m = M_ky_kNm / N_total_k_kN if N_total_k_kN > 0 else 0
-        
-        sigma_max_kpa_real = (N_total_k_kN / (A_m * B_m)) * (1 + 6 * e_y_m / B_m) if (A_m * B_m) > 0 else 0
-        sigma_min_kpa_real = (N_total_k_kN / (A_m * B_m)) * (1 - 6 * e_y_m / B_m) if (A_m * B_m) > 0 else 0
-
+    for i, it in enumerate(m["iteracoes"]):
+        A_m, B_m, H_estimado_m = it["A_m"], it["B_m"], it["H_estimado_m"]
+        W_k_kN, N_total_k_kN, e_y_m = it["W_k_kN"], it["N_total_k_kN"], it["e_y_m"]
+        sigma_max_kpa_real, sigma_min_kpa_real = it["sigma_max_kpa"], it["sigma_min_kpa"]
         calculo_iter = f"<b>Tentativa #{i+1} com A={A_m:.2f}m, B={B_m:.2f}m</b><br>"
         calculo_iter += f"H_estimado (Regra empírica: max(A,B)/8 ≥ 0.4m) = max({A_m:.2f}, {B_m:.2f})/8 = {max(A_m, B_m)/8:.3f}m. Adota-se {H_estimado_m:.2f}m<br>"
         calculo_iter += f"W_k = {A_m:.2f} x {B_m:.2f} x {H_estimado_m:.2f} x 25 = {W_k_kN:.2f} kN<br>"
         calculo_iter += f"N_total,k = {N_k_kN:.2f} + {W_k_kN:.2f} = {N_total_k_kN:.2f} kN<br>"
         calculo_iter += f"e_y = {M_ky_kNm:.2f} / {N_total_k_kN:.2f} = {e_y_m:.3f} m<br>"
         calculo_iter += f"Limite (B/6) = {B_m/6:.3f} m.  Verificação: {e_y_m:.3f} ≤ {B_m/6:.3f} -> {'OK' if e_y_m <= B_m / 6 else 'FALHOU'}<br>"
-        
         if e_y_m > B_m / 6:
             passos.append({"titulo": f"1.3. Iteração Geotécnica", "calculo": calculo_iter + "<br><b>A excentricidade é muito elevada. A aumentar dimensões...</b>"})
-            B_m += 0.05; A_m = B_m * (bp_mm / hp_mm) if hp_mm > 0 else B_m
             continue
-        
         calculo_iter += f"σ_max = ({N_total_k_kN:.2f} / ({A_m:.2f}x{B_m:.2f})) x (1 + 6x{e_y_m:.3f}/{B_m:.2f}) = {sigma_max_kpa_real:.2f} kPa<br>"
         calculo_iter += f"σ_min = ({N_total_k_kN:.2f} / ({A_m:.2f}x{B_m:.2f})) x (1 - 6x{e_y_m:.3f}/{B_m:.2f}) = {sigma_min_kpa_real:.2f} kPa<br>"
         calculo_iter += f"Verificação σ_max: {sigma_max_kpa_real:.2f} kPa ≤ {sigma_adm_kpa} kPa -> {'OK' if sigma_max_kpa_real <= sigma_adm_kpa else 'FALHOU'}<br>"
         calculo_iter += f"Verificação σ_min: {sigma_min_kpa_real:.2f} kPa ≥ 0 kPa -> {'OK' if sigma_min_kpa_real >= 0 else 'FALHOU'}"
-        passos.append({"titulo": f"1.3. Iteração Geotécnica", "formula": r"H_{est} \approx \frac{max(A,B)}{8} \, ; \, W_k = A{\cdot}B{\cdot}H_{est}{\cdot}\gamma_{c} \, ; \, N_{total,k} = N_k + W_k \, ; \,e_y = \frac{M_k}{N_{total,k}} \, ; \, \sigma_{max,min} = \frac{N_{total,k}}{A \cdot B} (1 \pm \frac{6e_y}{B})", "calculo": calculo_iter})
-        
-        if sigma_max_kpa_real <= sigma_adm_kpa and sigma_min_kpa_real >= 0:
-            break
-        B_m += 0.05
-        A_m = B_m * (bp_mm / hp_mm) if hp_mm > 0 else B_m
-    else: raise ValueError("Não foi possível encontrar dimensões geotécnicas válidas.")
-
-    A_final_m, B_final_m = math.ceil(A_m*20)/20, math.ceil(B_m*20)/20
-    passos.append({"titulo": "1.4. Dimensões Finais em Planta", "calculo": f"Adotam-se as dimensões da última iteração válida, arredondadas para o múltiplo de 5 cm superior:<br><b>A = {A_final_m:.2f} m</b><br><b>B = {B_final_m:.2f} m</b>"})
+        passos.append({"titulo": f"1.3. Iteração Geotécnica", "formula": FORMULAS_SAPATA["iteracao_geotecnica"], "calculo": calculo_iter})
+
+    A_final_m, B_final_m = m["A_final_m"], m["B_final_m"]
+    calculo_final = "As condições e ≤ B/6 e σ_max ≤ σ_adm são resolvidas diretamente em ordem a B (aumentos de 5 cm a partir da estimativa inicial); "
+    if len(m["iteracoes"]) > 1:
+        calculo_final += "as tentativas acima são a estimativa inicial, a dimensão imediatamente inferior (não verifica) e a adotada.<br>"
+    calculo_final += f"Adotam-se as dimensões da última tentativa válida, arredondadas para o múltiplo de 5 cm superior:<br><b>A = {A_final_m:.2f} m</b><br><b>B = {B_final_m:.2f} m</b>"
+    passos.append({"titulo": "1.4. Dimensões Finais em Planta", "calculo": calculo_final})
     
     passos.append({"titulo": "FASE 2: DIMENSIONAMENTO ESTRUTURAL (ELU)", "calculo": "Objetivo: encontrar a altura (H) e as armaduras para resistir aos esforços de cálculo."})
 
-    gamma_c, gamma_s = 1.5, 1.15; f_cd_mpa, f_yd_mpa = f_ck/gamma_c, f_yk/gamma_s
-    passos.append({"titulo": "2.1. Parâmetros dos Materiais (ELU)", "formula": r"f_{cd} = \frac{f_{ck}}{\gamma_c} \, ; \, f_{yd} = \frac{f_{yk}}{\gamma_s}", "calculo": f"f_cd = {f_ck:.0f} / {gamma_c} = {f_cd_mpa:.2f} MPa<br>f_yd = {f_yk:.0f} / {gamma_s} = {f_yd_mpa:.2f} MPa"})
+    gamma_c, gamma_s, f_cd_mpa, f_yd_mpa = m["gamma_c"], m["gamma_s"], m["f_cd_mpa"], m["f_yd_mpa"]
+    passos.append({"titulo": "2.1. Parâmetros dos Materiais (ELU)", "formula": FORMULAS_SAPATA["materiais"], "calculo": f"f_cd = {f_ck:.0f} / {gamma_c} = {f_cd_mpa:.2f} MPa<br>f_yd = {f_yk:.0f} / {gamma_s} = {f_yd_mpa:.2f} MPa"})
     
-    sigma_Ed_kpa = N_Ed_kN/(A_final_m*B_final_m) if (A_final_m*B_final_m)>0 else 0
-    passos.append({"titulo": "2.2. Tensão de Cálculo no Solo (ELU)", "formula": r"\sigma_{Ed} = \frac{N_{Ed}}{A \cdot B}", "calculo": f"σ_Ed = {N_Ed_kN:.2f} / ({A_final_m:.2f} x {B_final_m:.2f}) = {sigma_Ed_kpa:.2f} kPa"})
+    sigma_Ed_kpa = m["sigma_Ed_kpa"]
+    passos.append({"titulo": "2.2. Tensão de Cálculo no Solo (ELU)", "formula": FORMULAS_SAPATA["tensao_solo"], "calculo": f"σ_Ed = {N_Ed_kN:.2f} / ({A_final_m:.2f} x {B_final_m:.2f}) = {sigma_Ed_kpa:.2f} kPa"})
     
-    d_pre_rigidez = (max(A_final_m, B_final_m)*1000 - max(bp_mm, hp_mm))/3
     calculo_d_pre = f"Para garantir um comportamento de sapata rígida, a altura útil (d) pode ser pré-dimensionada para ser superior a um terço do voo.<br>" + \
-                    f"d ≥ (B - h_p) / 3 = ({B_final_m*1000:.0f} - {hp_mm}) / 3 = {d_pre_rigidez:.0f} mm<br>" + \
+                    f"d ≥ (B - h_p) / 3 = ({B_final_m*1000:.0f} - {hp_mm}) / 3 = {m['d_pre_rigidez']:.0f} mm<br>" + \
                     "A verificação ao punçoamento determinará a altura final."
-    passos.append({"titulo":"2.3. Pré-dimensionamento da Altura (d)", "formula":r"d \ge \frac{B-h_p}{3}", "calculo":calculo_d_pre})
+    passos.append({"titulo":"2.3. Pré-dimensionamento da Altura (d)", "formula":FORMULAS_SAPATA["altura_pre"], "calculo":calculo_d_pre})
     
-    d_m, H_final_mm = 0.15, 0
-    for i in range(50):
-        d_mm_iter = d_m*1000; u1 = 2*(bp_mm+hp_mm)+math.pi*2*d_mm_iter; Acrit_m2 = (bp_mm/1000+math.pi*d_m)*(hp_mm/1000+math.pi*d_m)
-        V_Ed_pun_kN = N_Ed_kN - sigma_Ed_kpa*Acrit_m2; k = min(2.0, 1+math.sqrt(200/d_mm_iter)) if d_m>0 else 1.0; rho_l = 0.005
-        VRd_c_pun_kN = (0.18/gamma_c)*k*(100*rho_l*f_ck)**(1/3)*(u1/1000)*d_m*1000 if d_m>0 else 0
-        if VRd_c_pun_kN > V_Ed_pun_kN:
-            formula_pun = r"u_1 = 2(b_p+h_p) + 2\pi d \, ; \, A_{crit} = (b_p+\pi d)(h_p+\pi d) \, ; \, k = 1+\sqrt{\frac{200}{d}} \le 2.0"
-            formula_pun += r"\, ; \, V_{Ed} = N_{Ed} - \sigma_{Ed} \cdot A_{crit} \, ; \, V_{Rd,c} = \frac{0.18}{\gamma_c} k (100 \rho_l f_{ck})^{1/3} u_1 d"
-
-            calculo_pun = "A altura útil (d) é determinada pelo programa de forma iterativa, aumentando 'd' em incrementos de 10mm desde 150mm até que V_Ed ≤ V_Rd,c.<br>" + \
-                          f"<b>Verificação para a altura útil final d = {d_m*1000:.0f} mm:</b><br>" + \
-                          f"Perímetro crítico u₁ = 2({bp_mm}+{hp_mm}) + 2π({d_m*1000:.0f}) = {u1:.0f} mm<br>" + \
-                          f"Área crítica A_crit = ({bp_mm/1000:.3f} + π*{d_m:.3f}) * ({hp_mm/1000:.3f} + π*{d_m:.3f}) = {Acrit_m2:.2f} m²<br>" + \
-                          f"Taxa de armadura ρ_l = {rho_l*100:.1f}% (valor prático e seguro assumido para a verificação ao punçoamento)<br>" + \
-                          f"k = 1 + √(200/{d_m*1000:.0f}) = {k:.3f} (≤ 2.0)<br>" + \
-                          f"V_Ed = {N_Ed_kN:.2f} - {sigma_Ed_kpa:.2f} x {Acrit_m2:.2f} = {V_Ed_pun_kN:.2f} kN<br>" + \
-                          f"V_Rd,c = (0.18/{gamma_c}) x {k:.3f} x (100x{rho_l}x{f_ck})^(1/3) x {u1/1000:.3f} x {d_m:.3f} x 1000 = {VRd_c_pun_kN:.2f} kN<br>" + \
-                          f"<b>Condição: {V_Ed_pun_kN:.2f} kN ≤ {VRd_c_pun_kN:.2f} kN -> OK</b><br>"
-            H_m, H_final_mm = d_m + c_nom_mm/1000 + 0.016, math.ceil((d_m + c_nom_mm/1000 + 0.016)*1000/50)*50
-            calculo_pun += f"<br>Como d={d_m*1000:.0f}mm foi o primeiro valor a cumprir o requisito, é este o valor adotado.<br>" + \
-                            f"Altura Total (H) = d + c_nom + ø/2 ≈ {d_m*1000:.0f} + {c_nom_mm} + 16/2 = {d_m*1000+c_nom_mm+8:.0f} mm.<br>" + \
-                            f"(Nota: Adota-se um diâmetro de armadura comum e seguro, ø16, para esta estimativa de H)<br>" + \
-                           f"Arredondando para múltiplo de 50mm: <b>H = {H_final_mm:.0f} mm</b>"
-            passos.append({"titulo":"2.4. Altura da Sapata (Punçoamento)", "formula":formula_pun, "calculo":calculo_pun})
-            break
-        d_m += 0.01
-    else: raise ValueError("Não foi possível determinar uma altura válida contra o punçoamento.")
+    pun = m["puncoamento"]
+    d_m, u1, Acrit_m2, k, rho_l = pun["d_m"], pun["u1"], pun["Acrit_m2"], pun["k"], pun["rho_l"]
+    V_Ed_pun_kN, VRd_c_pun_kN, H_final_mm = pun["V_Ed_kN"], pun["VRd_c_kN"], m["H_final_mm"]
+
+    passo_d_mm, iteracoes_d = pun.get("passo_d_mm", PASSO_D_PUNCOAMENTO_MM), pun.get("iteracoes")
+    calculo_pun = f"A altura útil (d) é a menor de 150mm + k x {passo_d_mm:g}mm com V_Ed < V_Rd,c; como V_Rd,c - V_Ed cresce com d, resolve-se V_Rd,c(d) = V_Ed(d) diretamente (método de Brent" + \
+                  (f"; {iteracoes_d} avaliações" if iteracoes_d else "") + ") e arredonda-se ao passo.<br>" + \
+                  f"<b>Verificação para a altura útil final d = {d_m*1000:.0f} mm:</b><br>" + \
+                  f"Perímetro crítico u₁ = 2({bp_mm}+{hp_mm}) + 2π({d_m*1000:.0f}) = {u1:.0f} mm<br>" + \
+                  f"Área crítica A_crit = ({bp_mm/1000:.3f} + π*{d_m:.3f}) * ({hp_mm/1000:.3f} + π*{d_m:.3f}) = {Acrit_m2:.2f} m²<br>" + \
+                  f"Taxa de armadura ρ_l = {rho_l*100:.1f}% (valor prático e seguro assumido para a verificação ao punçoamento)<br>" + \
+                  f"k = 1 + √(200/{d_m*1000:.0f}) = {k:.3f} (≤ 2.0)<br>" + \
+                  f"V_Ed = {N_Ed_kN:.2f} - {sigma_Ed_kpa:.2f} x {Acrit_m2:.2f} = {V_Ed_pun_kN:.2f} kN<br>" + \
+                  f"V_Rd,c = (0.18/{gamma_c}) x {k:.3f} x (100x{rho_l}x{f_ck})^(1/3) x {u1/1000:.3f} x {d_m:.3f} x 1000 = {VRd_c_pun_kN:.2f} kN<br>" + \
+                  f"<b>Condição: {V_Ed_pun_kN:.2f} kN ≤ {VRd_c_pun_kN:.2f} kN -> OK</b><br>"
+    calculo_pun += f"<br>Como d={d_m*1000:.0f}mm é o menor valor da grelha que cumpre o requisito, é este o valor adotado.<br>" + \
+                    f"Altura Total (H) = d + c_nom + ø/2 ≈ {d_m*1000:.0f} + {c_nom_mm} + 16/2 = {d_m*1000+c_nom_mm+8:.0f} mm.<br>" + \
+                    f"(Nota: Adota-se um diâmetro de armadura comum e seguro, ø16, para esta estimativa de H)<br>" + \
+                   f"Arredondando para múltiplo de 50mm: <b>H = {H_final_mm:.0f} mm</b>"
+    passos.append({"titulo":"2.4. Altura da Sapata (Punçoamento)", "formula":FORMULAS_SAPATA["puncoamento"], "calculo":calculo_pun})
     
     passos.append({"titulo": "FASE 3: DIMENSIONAMENTO À FLEXÃO (ELU)", "calculo": "Objetivo: calcular a armadura necessária em cada direção."})
-    
-    _, phi_y_temp, _, _, _, _ = escolher_armadura_sapata_total(1, A_final_m, c_nom_mm)
-    _, phi_x_temp, _, _, _, _ = escolher_armadura_sapata_total(1, B_final_m, c_nom_mm)
-    phi_maior = max(phi_x_temp, phi_y_temp)
-    phi_menor = min(phi_x_temp, phi_y_temp)
-    d_flex_x = (H_final_mm - c_nom_mm - phi_maior/2) / 1000
-    d_flex_y = (H_final_mm - c_nom_mm - phi_maior - phi_menor/2) / 1000
-
-    ly = (B_final_m - hp_mm/1000) / 2
-    M_Edy_flex_kNm_m = (sigma_Ed_kpa * ly**2) / 2 
-    Asy_req_cm2_m = (M_Edy_flex_kNm_m / (0.9 * d_flex_y * f_yd_mpa * 1000)) * 10000 if d_flex_y > 0 else 0
 
+    d_flex_x, d_flex_y = m["d_flex_x"], m["d_flex_y"]
+    ly, M_Edy_flex_kNm_m, Asy_req_cm2_m = m["ly"], m["M_Edy_flex_kNm_m"], m["Asy_req_cm2_m"]
     calculo_asy = f"Voo da sapata: l_y = ({B_final_m:.2f} - {hp_mm/1000:.2f}) / 2 = {ly:.3f} m<br>" + \
                   f"Momento por metro: M_Ed,y = ({sigma_Ed_kpa:.2f} x {ly:.3f}²) / 2 = {M_Edy_flex_kNm_m:.2f} kNm/m<br>" + \
                   f"Altura útil (d_y): {H_final_mm} - {c_nom_mm} - ø_x - ø_y/2 ≈ {d_flex_y*1000:.1f} mm<br>" + \
                   f"As,y,req ≈ {M_Edy_flex_kNm_m:.2f} / (0.9 x {d_flex_y:.3f} x {f_yd_mpa*1000:.2f}) x 10000 = {Asy_req_cm2_m:.2f} cm²/m"
-    passos.append({"titulo": "3.1 Armadura na direção Y", "formula": r"l_y = \frac{B-h_p}{2} \, ; \, M_{Ed,y} = \frac{\sigma_{Ed} \cdot l_y^2}{2} \, ; \, A_{s,y} \approx \frac{M_{Ed,y}}{0.9d \cdot f_{yd}}", "calculo": calculo_asy})
+    passos.append({"titulo": "3.1 Armadura na direção Y", "formula": FORMULAS_SAPATA["armadura_y"], "calculo": calculo_asy})
     
-    lx, M_Edx_flex_kNm_m = (A_final_m - bp_mm/1000)/2, (sigma_Ed_kpa * ((A_final_m - bp_mm/1000)/2)**2)/2
-    Asx_req_cm2_m = (M_Edx_flex_kNm_m / (0.9 * d_flex_x * f_yd_mpa * 1000)) * 10000 if d_flex_x > 0 else 0
-
+    lx, M_Edx_flex_kNm_m, Asx_req_cm2_m = m["lx"], m["M_Edx_flex_kNm_m"], m["Asx_req_cm2_m"]
     calculo_asx = f"Voo da sapata: l_x = ({A_final_m:.2f} - {bp_mm/1000:.2f}) / 2 = {lx:.3f} m<br>" + \
                   f"Momento por metro: M_Ed,x = ({sigma_Ed_kpa:.2f} x {lx:.3f}²) / 2 = {M_Edx_flex_kNm_m:.2f} kNm/m<br>" + \
                   f"Altura útil (d_x): {H_final_mm} - {c_nom_mm} - ø_x/2 ≈ {d_flex_x*1000:.1f} mm<br>" + \
                   f"As,x,req ≈ {M_Edx_flex_kNm_m:.2f} / (0.9 x {d_flex_x:.3f} x {f_yd_mpa*1000:.2f}) x 10000 = {Asx_req_cm2_m:.2f} cm²/m"
-    passos.append({"titulo": "3.2 Armadura na direção X", "formula": r"l_x = \frac{A-b_p}{2} \, ; \, M_{Ed,x} = \frac{\sigma_{Ed} \cdot l_x^2}{2} \, ; \, A_{s,x} \approx \frac{M_{Ed,x}}{0.9d \cdot f_{yd}}", "calculo": calculo_asx})
+    passos.append({"titulo": "3.2 Armadura na direção X", "formula": FORMULAS_SAPATA["armadura_x"], "calculo": calculo_asx})
     
-    f_ctm = 0.3 * f_ck**(2/3)
-    As_min_cm2 = max(0.26 * (f_ctm/f_yk) * 1 * d_flex_x, 0.0013 * 1 * d_flex_x) * 10000
-    Asy_final_cm2_m, Asx_final_cm2_m = max(Asy_req_cm2_m, As_min_cm2), max(Asx_req_cm2_m, As_min_cm2)
-
+    f_ctm, As_min_cm2 = m["f_ctm"], m["As_min_cm2"]
+    Asx_final_cm2_m, Asy_final_cm2_m = m["Asx_final_cm2_m"], m["Asy_final_cm2_m"]
     calculo_as_min = f"f_ctm = 0.30 x {f_ck}^(2/3) = {f_ctm:.2f} MPa<br>" + \
                      f"As,min = max(0.26 x ({f_ctm:.2f}/{f_yk}) x 1000 x {d_flex_x*1000:.1f}; ...) = {As_min_cm2:.2f} cm²/m<br>" + \
                      f"<b>As,x final = max({Asx_req_cm2_m:.2f}, {As_min_cm2:.2f}) = {Asx_final_cm2_m:.2f} cm²/m</b><br>" + \
                      f"<b>As,y final = max({Asy_req_cm2_m:.2f}, {As_min_cm2:.2f}) = {Asy_final_cm2_m:.2f} cm²/m</b>"
-    passos.append({"titulo": "3.3 Verificação da Armadura Mínima", "formula": r"A_{s,min} = max(0.26\frac{f_{ctm}}{f_{yk}} b_t d; 0.0013 b_t d)", "calculo": calculo_as_min})
-    
-    quadrada = abs(A_final_m - B_final_m) < 0.01
-    malha_unica = False
-
-    As_req_total_x_cm2 = Asx_final_cm2_m * B_final_m
-    As_req_total_y_cm2 = Asy_final_cm2_m * A_final_m
-    
-    if quadrada:
-        vergalhoes_padrao = {
-            8:  0.503,
-            10: 0.785,
-            12: 1.131,
-            16: 2.011,
-            20: 3.142,
-            25: 4.909,
-        }
-        S_MAX_ABS = 300.0
-        S_ALVO    = 200.0
-
-        solucoes_unicas = []
-        L_distrib = A_final_m
-        largura_disp_mm = L_distrib * 1000.0 - 2.0 * c_nom_mm
-
-        for diametro, area_varao in vergalhoes_padrao.items():
-            espacamento_min = max(diametro, 20, 27)
-            largura_centros = largura_disp_mm - diametro
-            if largura_centros <= 0: continue
-
-            n_min_x = max(2, math.ceil(As_req_total_x_cm2 / area_varao))
-            for n_bx in range(n_min_x, 100):
-                area_prov_total_x = n_bx * area_varao
-                esp_x_mm = largura_centros / (n_bx - 1) if n_bx > 1 else largura_centros
-                if esp_x_mm < espacamento_min: break
-                if esp_x_mm > S_MAX_ABS: continue
-
-                n_min_y = max(2, math.ceil(As_req_total_y_cm2 / area_varao))
-                for n_by in range(n_min_y, 100):
-                    area_prov_total_y = n_by * area_varao
-                    esp_y_mm = largura_centros / (n_by - 1) if n_by > 1 else largura_centros
-                    if esp_y_mm < espacamento_min: break
-                    if esp_y_mm > S_MAX_ABS: continue
-
-                    excesso = (area_prov_total_x - As_req_total_x_cm2) + (area_prov_total_y - As_req_total_y_cm2)
-                    score = excesso + (abs(esp_x_mm - S_ALVO) + abs(esp_y_mm - S_ALVO)) * 0.01
-
-                    solucoes_unicas.append({
-                        "diametro": diametro,
-                        "n_bx": n_bx,
-                        "n_by": n_by,
-                        "area_prov_total_x": area_prov_total_x,
-                        "area_prov_total_y": area_prov_total_y,
-                        "esp_x_mm": esp_x_mm,
-                        "esp_y_mm": esp_y_mm,
-                        "score": score
-                    })
-
-        if solucoes_unicas:
-            sol_otima = min(solucoes_unicas, key=lambda x: x["score"])
-            phi_x = phi_y = sol_otima["diametro"]
-            n_barras_x = sol_otima["n_bx"]
-            n_barras_y = sol_otima["n_by"]
-            Asx_prov_total_cm2 = sol_otima["area_prov_total_x"]
-            Asy_prov_total_cm2 = sol_otima["area_prov_total_y"]
-            esp_x = sol_otima["esp_x_mm"]
-            esp_y = sol_otima["esp_y_mm"]
-            as_prov_x_m = Asx_prov_total_cm2 / B_final_m
-            as_prov_y_m = Asy_prov_total_cm2 / A_final_m
-            malha_unica = True
-
-    if not malha_unica:
-        n_barras_y, phi_y, Asy_prov_total_cm2, as_prov_y_m, esp_y, _ = escolher_armadura_sapata_total(Asy_final_cm2_m, A_final_m, c_nom_mm)
-        n_barras_x, phi_x, Asx_prov_total_cm2, as_prov_x_m, esp_x, _ = escolher_armadura_sapata_total(Asx_final_cm2_m, B_final_m, c_nom_mm)
-    
-    if n_barras_x == 0 or n_barras_y == 0: raise ValueError("Não foi possível encontrar uma combinação de armadura válida.")
+    passos.append({"titulo": "3.3 Verificação da Armadura Mínima", "formula": FORMULAS_SAPATA["armadura_minima"], "calculo": calculo_as_min})
     
+    n_barras_x, phi_x, Asx_prov_total_cm2, as_prov_x_m, esp_x = m["n_barras_x"], m["phi_x"], m["Asx_prov_total_cm2"], m["as_prov_x_m"], m["esp_x"]
+    n_barras_y, phi_y, Asy_prov_total_cm2, as_prov_y_m, esp_y = m["n_barras_y"], m["phi_y"], m["Asy_prov_total_cm2"], m["as_prov_y_m"], m["esp_y"]
     x_area_varao = Asx_prov_total_cm2 / n_barras_x if n_barras_x > 0 else 0
     texto_x = f"<b>Direção X:</b><br>" + \
-              f"- As,req,total,x = {Asx_final_cm2_m:.2f} cm²/m × {B_final_m:.2f} m = {As_req_total_x_cm2:.2f} cm²<br>" + \
+              f"- As,req,total,x = {Asx_final_cm2_m:.2f} cm²/m × {B_final_m:.2f} m = {m['As_req_total_x_cm2']:.2f} cm²<br>" + \
               f"- Adota-se <b>{n_barras_x}Ø{phi_x}</b> na direção X<br>" + \
               f"- As,prov,total,x = {n_barras_x} × {x_area_varao:.2f} = {Asx_prov_total_cm2:.2f} cm²<br>" + \
               f"- Espaçamento real resultante: s ≈ {esp_x:.0f} mm<br>" + \
@@ -401,12 +597,13 @@ def dimensionar_sapata(sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_k
 
     y_area_varao = Asy_prov_total_cm2 / n_barras_y if n_barras_y > 0 else 0
     texto_y = f"<b>Direção Y:</b><br>" + \
-              f"- As,req,total,y = {Asy_final_cm2_m:.2f} cm²/m × {A_final_m:.2f} m = {As_req_total_y_cm2:.2f} cm²<br>" + \
+              f"- As,req,total,y = {Asy_final_cm2_m:.2f} cm²/m × {A_final_m:.2f} m = {m['As_req_total_y_cm2']:.2f} cm²<br>" + \
               f"- Adota-se <b>{n_barras_y}Ø{phi_y}</b> na direção Y<br>" + \
               f"- As,prov,total,y = {n_barras_y} × {y_area_varao:.2f} = {Asy_prov_total_cm2:.2f} cm²<br>" + \
               f"- Espaçamento real resultante: s ≈ {esp_y:.0f} mm<br>" + \
               f"- As,prov,y = {Asy_prov_total_cm2:.2f} / {A_final_m:.2f} = {as_prov_y_m:.2f} cm²/m"
 
+    quadrada, malha_unica = m["quadrada"], m["malha_unica"]
     if quadrada and malha_unica:
         texto_escolha_arm = "Como a sapata é quadrada, adotou-se uma <b>malha única</b> (ϕx = ϕy), distribuindo-se as barras ao longo da dimensão total da sapata em cada direção.<br><br>" + texto_x + "<br><br>" + texto_y
     elif quadrada and not malha_unica:
@@ -414,10 +611,93 @@ def dimensionar_sapata(sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_k
     else:
         texto_escolha_arm = "Seleção de armadura baseada no número total de barras ao longo da dimensão de cada direção:<br><br>" + texto_x + "<br><br>" + texto_y
     passos.append({"titulo":"3.4. Escolha da Armadura Final", "calculo":texto_escolha_arm})
+    return passos
+
+# ==============================================================================
+# FUNÇÃO PRINCIPAL DE DIMENSIONAMENTO 
+# ==============================================================================
+def dimensionar_sapata(sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm, fast=False, passo_d_mm=PASSO_D_PUNCOAMENTO_MM):
+    """
+    Dimensiona uma sapata isolada. Com fast=True devolve apenas o resultado numérico
+    (sem 'passos' nem desenhos); o passo a passo pode ser gerado depois a partir de resultado['memoria'].
+    """
+    m = calcular_sapata(sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm, passo_d_mm)
+    A_final_m, B_final_m, H_final_mm = m["A_final_m"], m["B_final_m"], m["H_final_mm"]
+    n_barras_x, phi_x, esp_x = m["n_barras_x"], m["phi_x"], m["esp_x"]
+    n_barras_y, phi_y, esp_y = m["n_barras_y"], m["phi_y"], m["esp_y"]
 
-    tipo_sapata = "Quadrada" if quadrada else "Retangular"
+    tipo_sapata = "Quadrada" if m["quadrada"] else "Retangular"
     dados_desenho = {"A_m":A_final_m, "B_m":B_final_m, "H_mm":H_final_mm, "bp_mm":bp_mm, "hp_mm":hp_mm, "c_nom_mm":c_nom_mm, "phi_x":phi_x, "esp_x_mm":esp_x, "n_barras_x":n_barras_x, "phi_y":phi_y, "esp_y_mm":esp_y, "n_barras_y":n_barras_y}
-    resultado = {"status":"Sucesso", "mensagem":"Cálculo efetuado com sucesso.", "passos":passos, "tipo_sapata":tipo_sapata, "dimensoes":f"{A_final_m:.2f}m x {B_final_m:.2f}m x {H_final_mm/1000:.2f}m", "armadura_y":f"{n_barras_y}Ø{phi_y} (s ≈ {esp_y:.0f} mm)", "armadura_x":f"{n_barras_x}Ø{phi_x} (s ≈ {esp_x:.0f} mm)", "dados_desenho":dados_desenho}
+    resultado = {"status":"Sucesso", "mensagem":"Cálculo efetuado com sucesso.", "tipo_sapata":tipo_sapata, "dimensoes":f"{A_final_m:.2f}m x {B_final_m:.2f}m x {H_final_mm/1000:.2f}m", "armadura_y":f"{n_barras_y}Ø{phi_y} (s ≈ {esp_y:.0f} mm)", "armadura_x":f"{n_barras_x}Ø{phi_x} (s ≈ {esp_x:.0f} mm)", "dados_desenho":dados_desenho, "memoria": m}
+    if fast:
+        return resultado
+    resultado['passos'] = gerar_passos_sapata(m)
     resultado['desenho_planta_svg'] = desenhar_sapata_planta_svg(dados_desenho)
     resultado['desenho_corte_svg'] = desenhar_sapata_corte_svg(dados_desenho)
-    return resultado
\ No newline at end of file
+    return resultado
+
+# ==============================================================================
+# PLANTA DE FUNDAÇÕES (VÁRIAS SAPATAS EM PARALELO)
+# ==============================================================================
+DENSIDADE_ACO_KG_M3 = 7850
+MIN_SAPATAS_PROCESSOS = 64  # abaixo disto o arranque dos processos custa mais do que o cálculo
+CAMPOS_PLANTA_SAPATA = ("bp_mm", "hp_mm", "N_Ed_kN", "M_Edy_kNm")
+
+def _quantidades_sapata(m):
+    """Volume de betão e peso de aço (varões retos, sem amarrações) de uma sapata calculada."""
+    A_m, B_m, c_nom_m = m["A_final_m"], m["B_final_m"], m["c_nom_mm"] / 1000
+    area_x_m2 = m["n_barras_x"] * VERGALHOES_SAPATA[m["phi_x"]] / 10000
+    area_y_m2 = m["n_barras_y"] * VERGALHOES_SAPATA[m["phi_y"]] / 10000
+    peso_aco_kg = (area_x_m2 * (A_m - 2 * c_nom_m) + area_y_m2 * (B_m - 2 * c_nom_m)) * DENSIDADE_ACO_KG_M3
+    return A_m * B_m * m["H_final_mm"] / 1000, peso_aco_kg
+
+def _dimensionar_sapata_da_planta(dados):
+    """Uma sapata da planta (função de topo para poder ser enviada aos processos)."""
+    try:
+        resultado = dimensionar_sapata(**dados, fast=True)
+    except (ValueError, TypeError, KeyError, ZeroDivisionError) as e:
+        return {"status": "Erro", "mensagem": f"Erro no cálculo: {e}"}
+    m = resultado["memoria"]
+    volume_betao_m3, peso_aco_kg = _quantidades_sapata(m)
+    return {
+        "status": resultado["status"], "tipo_sapata": resultado["tipo_sapata"], "dimensoes": resultado["dimensoes"],
+        "A_m": m["A_final_m"], "B_m": m["B_final_m"], "H_mm": m["H_final_mm"],
+        "armadura_x": resultado["armadura_x"], "armadura_y": resultado["armadura_y"],
+        "volume_betao_m3": volume_betao_m3, "peso_aco_kg": peso_aco_kg,
+    }
+
+def dimensionar_planta_fundacoes(sapatas, sigma_adm_kpa, f_ck, f_yk, c_nom_mm, max_workers=None):
+    """
+    Dimensiona todas as sapatas de uma planta de fundações (lista de dicionários com
+    CAMPOS_PLANTA_SAPATA, ou tuplos (bp, hp, N_Ed, M_Edy)) com σ_adm e materiais comuns,
+    distribuindo-as por um ProcessPoolExecutor. Os resultados vêm pela ordem de entrada;
+    uma sapata com erro fica com status 'Erro' e não interrompe o lote. Inclui o resumo
+    com o volume total de betão e o peso total de aço.
+    Com max_workers=1, ou com menos de MIN_SAPATAS_PROCESSOS sapatas, calcula em série.
+    """
+    comuns = {"sigma_adm_kpa": sigma_adm_kpa, "f_ck": f_ck, "f_yk": f_yk, "c_nom_mm": c_nom_mm}
+    pedidos = []
+    for sapata in sapatas:
+        dados = dict(sapata) if isinstance(sapata, dict) else dict(zip(CAMPOS_PLANTA_SAPATA, sapata))
+        referencia = dados.pop("referencia", None)
+        pedidos.append((referencia, {**comuns, **{campo: dados.get(campo) for campo in CAMPOS_PLANTA_SAPATA}}))
+
+    argumentos = [dados for _, dados in pedidos]
+    if max_workers == 1 or len(pedidos) < MIN_SAPATAS_PROCESSOS:
+        resultados = list(map(_dimensionar_sapata_da_planta, argumentos))
+    else:
+        n_processos = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_processos) as executor:
+            resultados = list(executor.map(_dimensionar_sapata_da_planta, argumentos,
+                                           chunksize=max(1, math.ceil(len(argumentos) / (4 * n_processos)))))
+
+    for indice, ((referencia, dados), resultado) in enumerate(zip(pedidos, resultados), 1):
+        resultado.update({"indice": indice, "referencia": referencia, **{campo: dados[campo] for campo in CAMPOS_PLANTA_SAPATA}})
+
+    sucesso = [r for r in resultados if r["status"] == "Sucesso"]
+    resumo = {
+        "n_sapatas": len(resultados), "n_sucesso": len(sucesso), "n_erros": len(resultados) - len(sucesso),
+        "volume_betao_m3": sum(r["volume_betao_m3"] for r in sucesso),
+        "peso_aco_kg": sum(r["peso_aco_kg"] for r in sucesso),
+    }
+    return {"sapatas": resultados, "resumo": resumo}
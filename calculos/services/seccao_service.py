@@ -0,0 +1,92 @@
+# calculos/services/seccao_service.py
+import math
+import numpy as np
+from . import viga_service
+
+# ==============================================================================
+# OTIMIZAÇÃO DA SECÇÃO DE VIGAS (GRELHA b × h)
+# ==============================================================================
+
+PRECO_BETAO_EUR_M3 = 110.0
+PRECO_ACO_EUR_KG = 1.20
+DENSIDADE_ACO_KG_M3 = 7850.0
+
+# Ø estribo + Ø16 / 2, tal como na 1ª iteração de dimensionar_viga.
+_DESCONTO_ALTURA_UTIL_MM = 8.0 + 16.0 / 2
+
+def _valores_grelha(minimo, maximo, passo):
+    if passo <= 0 or maximo < minimo:
+        raise ValueError("Intervalo da grelha inválido: é necessário mínimo ≤ máximo e passo > 0.")
+    return minimo + passo * np.arange(int(math.floor((maximo - minimo) / passo + 1e-9)) + 1)
+
+def _altura_minima_ductil(M_Ed_kNm, b_mm, f_ck, c_nom):
+    """Menor h [mm] com μ ≤ μ_lim na 1ª iteração: d_min = √(M_Ed / (b·f_cd·μ_lim))."""
+    mu_lim = 0.8 * 0.45 * (1 - 0.5 * 0.8 * 0.45)
+    f_cd_pa = f_ck / 1.5 * 10**6
+    d_min_m = np.sqrt(M_Ed_kNm * 1000 / (b_mm / 1000 * f_cd_pa * mu_lim))
+    return d_min_m * 1000 + c_nom + _DESCONTO_ALTURA_UTIL_MM
+
+def _fronteira_pareto(objetivos):
+    """Máscara dos pontos não dominados (todos os objetivos a minimizar)."""
+    n = objetivos.shape[0]
+    nao_dominado = np.ones(n, dtype=bool)
+    for inicio in range(0, n, 1024):
+        bloco = objetivos[inicio:inicio + 1024]
+        melhor_ou_igual = (objetivos[None, :, :] <= bloco[:, None, :]).all(axis=2)
+        estritamente_melhor = (objetivos[None, :, :] < bloco[:, None, :]).any(axis=2)
+        nao_dominado[inicio:inicio + 1024] = ~(melhor_ou_igual & estritamente_melhor).any(axis=1)
+    return nao_dominado
+
+def otimizar_seccao_viga(M_Ed_kNm, f_ck, f_yk, c_nom, b_intervalo, h_intervalo,
+                         preco_betao_m3=PRECO_BETAO_EUR_M3, preco_aco_kg=PRECO_ACO_EUR_KG):
+    """
+    Procura, numa grelha de secções b × h, a viga de menor custo (betão + aço por
+    metro linear) para o momento M_Ed, e a fronteira de Pareto (custo, h, ρ).
+
+    b_intervalo e h_intervalo são tuplos (mínimo, máximo, passo) em mm. As alturas
+    abaixo do limite de ductilidade (μ > μ_lim) são eliminadas analiticamente
+    antes do cálculo; os restantes pontos são dimensionados de uma só vez por
+    viga_service.dimensionar_vigas_lote.
+    """
+    valores_b = _valores_grelha(*b_intervalo)
+    valores_h = _valores_grelha(*h_intervalo)
+    b, h = (grelha.ravel() for grelha in np.meshgrid(valores_b, valores_h, indexing="ij"))
+
+    candidatos = h >= _altura_minima_ductil(M_Ed_kNm, b, f_ck, c_nom)
+    b, h = b[candidatos], h[candidatos]
+
+    lote = viga_service.dimensionar_vigas_lote(b, h, f_ck, f_yk, M_Ed_kNm, c_nom)
+    validos = lote["status"] == viga_service.LOTE_SUCESSO
+    b, h = b[validos], h[validos]
+    As_final_cm2 = lote["As_final_cm2"][validos]
+    d_mm = lote["d_mm"][validos]
+    combinacoes = lote["combinacao_final"][validos]
+
+    volume_aco_m3 = As_final_cm2 / 10**4
+    custo = (b / 1000) * (h / 1000) * preco_betao_m3 + volume_aco_m3 * DENSIDADE_ACO_KG_M3 * preco_aco_kg
+    rho = As_final_cm2 * 100 / (b * d_mm)
+
+    resultado = {
+        "n_pontos_grelha": valores_b.size * valores_h.size,
+        "n_podados_ductilidade": int((~candidatos).sum()),
+        "n_avaliados": int(candidatos.sum()),
+        "n_validos": int(validos.sum()),
+        "melhor": None,
+        "pareto": [],
+    }
+    if not b.size:
+        return resultado
+
+    def _ponto(i):
+        return {
+            "b": float(b[i]), "h": float(h[i]), "d": round(float(d_mm[i]), 1),
+            "combinacao_final": combinacoes[i], "As_final_cm2": round(float(As_final_cm2[i]), 2),
+            "rho": round(float(rho[i]), 5), "custo_eur_m": round(float(custo[i]), 2),
+        }
+
+    # Em empate de custo, prefere-se a secção menos alta.
+    ordem = np.lexsort((h, custo))
+    resultado["melhor"] = _ponto(ordem[0])
+    pareto = np.flatnonzero(_fronteira_pareto(np.column_stack((custo, h, rho))))
+    resultado["pareto"] = [_ponto(i) for i in pareto[np.lexsort((h[pareto], custo[pareto]))]]
+    return resultado
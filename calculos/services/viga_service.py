@@ -1,11 +1,13 @@
 # calculos/services/viga_service.py
 import math
-from . import armadura_service
+import numpy as np
+from . import armadura_service, desenho_service
 
 # ==============================================================================
 # FUNÇÃO PARA DESENHAR A VIGA EM SVG 
 # ==============================================================================
 
+@desenho_service.svg_em_cache
 def desenhar_viga_svg(dados_desenho):
     """
     Gera uma representação SVG da secção transversal de uma viga.
@@ -18,107 +20,118 @@ def desenhar_viga_svg(dados_desenho):
     phi_long = dados_desenho.get('phi_long', 0)
 
     PADDING = 60
-    viewbox_width = b + PADDING * 2
-    viewbox_height = h + PADDING * 2
-
-    svg = f'<svg width="100%" viewBox="0 0 {viewbox_width} {viewbox_height}" xmlns="http://www.w3.org/2000/svg">'
-    svg += '<style>.dim-text { font-family: Arial, sans-serif; font-size: 14px; fill: #333; text-anchor: middle; }</style>'
-    svg += f'<rect x="{PADDING}" y="{PADDING}" width="{b}" height="{h}" fill="#e0e0e0" stroke="#555" stroke-width="2"/>'
+    desenho = desenho_service.DesenhoSVG(b + PADDING * 2, h + PADDING * 2)
+    desenho.seccao(PADDING, PADDING, b, h)
 
     estribo_x = PADDING + c_nom
     estribo_y = PADDING + c_nom
     estribo_w = b - 2 * c_nom
     estribo_h = h - 2 * c_nom
-    raio_curvatura_estribo = phi_estribo * 2
-    svg += f'<rect x="{estribo_x}" y="{estribo_y}" width="{estribo_w}" height="{estribo_h}" fill="none" stroke="#777" stroke-width="{phi_estribo / 2}" rx="{raio_curvatura_estribo}" ry="{raio_curvatura_estribo}"/>'
+    desenho.estribo(estribo_x, estribo_y, estribo_w, estribo_h, phi_estribo)
 
     phi_sup = 10
     y_pos_sup = PADDING + c_nom + phi_estribo + (phi_sup / 2)
     x1_pos_sup = estribo_x + (phi_estribo / 2) + (phi_sup / 2)
     x2_pos_sup = estribo_x + estribo_w - (phi_estribo / 2) - (phi_sup / 2)
-    svg += f'<circle cx="{x1_pos_sup}" cy="{y_pos_sup}" r="{phi_sup/2}" fill="#333"/>'
-    svg += f'<circle cx="{x2_pos_sup}" cy="{y_pos_sup}" r="{phi_sup/2}" fill="#333"/>'
+    desenho.varoes([(x1_pos_sup, y_pos_sup), (x2_pos_sup, y_pos_sup)], phi_sup)
 
-    if n_barras > 0 and phi_long > 0:
+    camadas = dados_desenho.get('camadas')
+    if camadas:
+        # Armadura em várias camadas (da inferior para a superior), afastadas de max(Ø, 20 mm)
+        y_pos_inf = PADDING + h - c_nom - phi_estribo - (max(camadas[0]) / 2)
+        for j, camada in enumerate(camadas):
+            if j > 0:
+                anterior = max(camadas[j - 1])
+                y_pos_inf -= anterior / 2 + max(anterior, max(camada), 20) + max(camada) / 2
+            phi_camada = max(camada)
+            start_x_inf = estribo_x + (phi_estribo / 2) + (phi_camada / 2)
+            available_width = estribo_w - phi_estribo - phi_camada
+            for i, phi in enumerate(camada):
+                x_pos = start_x_inf
+                if len(camada) > 1:
+                    x_pos += i * (available_width / (len(camada) - 1))
+                desenho.circulo(x_pos, y_pos_inf, phi/2)
+    elif n_barras > 0 and phi_long > 0:
         y_pos_inf = PADDING + h - c_nom - phi_estribo - (phi_long / 2)
         start_x_inf = estribo_x + (phi_estribo / 2) + (phi_long / 2)
         available_width = estribo_w - phi_estribo - phi_long
+        posicoes = []
         for i in range(n_barras):
             x_pos = start_x_inf
             if n_barras > 1:
                 x_pos += i * (available_width / (n_barras - 1))
-            svg += f'<circle cx="{x_pos}" cy="{y_pos_inf}" r="{phi_long/2}" fill="#333"/>'
+            posicoes.append((x_pos, y_pos_inf))
+        desenho.varoes(posicoes, phi_long)
 
-    svg += f'<path d="M {PADDING/4} {PADDING} L {PADDING*3/4} {PADDING} M {PADDING/2} {PADDING} L {PADDING/2} {PADDING+h} M {PADDING/4} {PADDING+h} L {PADDING*3/4} {PADDING+h}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{PADDING/2 - 10}" y="{PADDING + h/2}" class="dim-text" transform="rotate(-90, {PADDING/2 - 10}, {PADDING + h/2})">{h}</text>'
-    svg += f'<path d="M {PADDING} {PADDING/4} L {PADDING} {PADDING*3/4} M {PADDING} {PADDING/2} L {PADDING+b} {PADDING/2} M {PADDING+b} {PADDING/4} L {PADDING+b} {PADDING*3/4}" stroke="#333" stroke-width="1" fill="none"/>'
-    svg += f'<text x="{PADDING + b/2}" y="{PADDING/2 - 10}" class="dim-text">{b}</text>'
-    svg += '</svg>'
-    return svg
+    desenho.cota_vertical(PADDING/2, PADDING, PADDING + h, PADDING/4)
+    desenho.texto(PADDING/2 - 10, PADDING + h/2, h, rotacao=-90)
+    desenho.cota_horizontal(PADDING, PADDING + b, PADDING/2, PADDING/4)
+    desenho.texto(PADDING + b/2, PADDING/2 - 10, b)
+    return desenho.render()
 
-def dimensionar_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom):
+def _procurar_armadura(As_req_cm2, largura_disponivel):
     """
-    Função principal que realiza o dimensionamento de uma viga à flexão simples.
+    Procura a armadura no catálogo (até 8 varões numa camada) e, se não houver
+    solução, recorre ao otimizador exato (mais varões e várias camadas).
+    """
+    solucoes = armadura_service.encontrar_combinacoes_otimas(As_req_cm2, largura_disponivel)
+    if not solucoes.get('unica') and not solucoes.get('mista'):
+        solucoes = armadura_service.otimizar_armadura(As_req_cm2, largura_disponivel, "viga")
+    return solucoes
+
+# ==============================================================================
+# NÚCLEO NUMÉRICO
+# ==============================================================================
+
+class DuctilidadeInsuficiente(ValueError):
+    """Momento reduzido acima de μ_lim: a secção tem de ser redimensionada."""
+
+def calcular_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom):
+    """
+    Núcleo numérico do dimensionamento de uma viga à flexão simples.
+    Devolve a memória de cálculo (valores intermédios, serializável em JSON) sem
+    construir qualquer texto; gerar_passos_viga transforma-a no passo a passo.
     """
-    passos = []
-    
     gamma_c, gamma_s, alpha_cc, lambda_val = 1.5, 1.15, 1.0, 0.8
     f_cd_mpa = alpha_cc * f_ck / gamma_c
     f_yd_mpa = f_yk / gamma_s
     M_Ed_Nm = M_Ed_kNm * 1000
     b_m = b / 1000
     phi_estribo = 8.0
-
-    passos.append({"titulo": "1. Parâmetros de Cálculo", "calculo": f"f_cd = {f_ck:.0f} / {gamma_c} = {f_cd_mpa:.2f} MPa; f_yd = {f_yk:.0f} / {gamma_s} = {f_yd_mpa:.2f} MPa"})
-
     phi_long_assumido = 16.0
-    passos.append({"titulo": "2. Iteração 1 - Suposição inicial", "calculo": f"Assumir: Ø Estribo = {phi_estribo} mm; Ø Arm. Long. = {phi_long_assumido} mm."})
-    
+
     d = h - c_nom - phi_estribo - (phi_long_assumido / 2)
     d_m = d / 1000
-    passos.append({"titulo": "3. Altura útil estimada (d₁)", "formula": r"d = h - c_{nom} - \phi_{estribo} - \frac{\phi_{long}}{2}", "calculo": f"d₁ = {h:.1f} - {c_nom:.1f} - {phi_estribo:.1f} - {phi_long_assumido:.1f} / 2 = {d:.1f} mm"})
-
     mu = M_Ed_Nm / (b_m * d_m**2 * (f_cd_mpa * 10**6)) if (b_m * d_m**2 * f_cd_mpa) > 0 else 0
-    passos.append({"titulo": "4. Momento reduzido (μ₁)", "formula": r"\mu = \frac{M_{Ed}}{b \cdot d^2 \cdot f_{cd}}", "calculo": f"μ₁ = {M_Ed_Nm:.0f} / ({b_m} x {d_m:.3f}² x ({f_cd_mpa:.2f} x 10^6)) = {mu:.3f}"})
-    
+    d1, mu1 = d, mu
+
     mu_lim = lambda_val * 0.45 * (1 - 0.5 * lambda_val * 0.45)
     if mu > mu_lim:
-        raise ValueError(f"Momento reduzido (μ={mu:.3f}) excede o limite (μ_lim={mu_lim:.3f}). A secção necessita de ser redimensionada.")
-    passos.append({"titulo": "5. Verificação de ductilidade", "formula": r"\mu_{lim} = \lambda \cdot 0.45 \cdot (1 - 0.5 \cdot \lambda \cdot 0.45)", "calculo": f"μ ({mu:.3f}) <= μ_lim ({mu_lim:.3f}) -> OK"})
+        raise DuctilidadeInsuficiente(f"Momento reduzido (μ={mu:.3f}) excede o limite (μ_lim={mu_lim:.3f}). A secção necessita de ser redimensionada.")
 
     xi_temp = (1 - math.sqrt(1 - 2 * mu)) / lambda_val if mu < 0.5 else 1.25
     z_temp = d_m * (1 - 0.5 * lambda_val * xi_temp)
     As_req_cm2_temp = (M_Ed_Nm / (z_temp * (f_yd_mpa * 10**6))) * 10000 if z_temp > 0 else 0
-    
+
     largura_disponivel = b - 2 * c_nom - 2 * phi_estribo
-    solucoes_temp = armadura_service.encontrar_combinacoes_otimas(As_req_cm2_temp, largura_disponivel)
-    
-    solucao_unica_temp = solucoes_temp.get('unica')
-    
-    phi_long_final = 0
-    if solucao_unica_temp:
-        phi_long_final = int(solucao_unica_temp['combinacao_str'].split('Ø')[1])
+    solucao_unica_temp = _procurar_armadura(As_req_cm2_temp, largura_disponivel).get('unica')
+    phi_long_final = solucao_unica_temp.phi_max if solucao_unica_temp else 0
 
+    recalculo = None
     if phi_long_final and phi_long_final != phi_long_assumido:
-        passos.append({"titulo": "6. Recálculo (Iteração 2)", "calculo": f"O diâmetro da solução de varão único ({phi_long_final}mm) é diferente do assumido ({phi_long_assumido}mm). Procede-se a um recálculo para garantir a precisão."})
         d = h - c_nom - phi_estribo - (phi_long_final / 2)
         d_m = d / 1000
-        passos.append({"titulo": "6.1. Nova Altura útil (d₂)", "calculo": f"d₂ = {h:.1f} - {c_nom:.1f} - {phi_estribo:.1f} - {phi_long_final:.1f} / 2 = {d:.1f} mm"})
         mu = M_Ed_Nm / (b_m * d_m**2 * (f_cd_mpa * 10**6)) if (b_m * d_m**2 * f_cd_mpa) > 0 else 0
-        passos.append({"titulo": "6.2. Novo Momento reduzido (μ₂)", "formula": r"\mu = \frac{M_{Ed}}{b \cdot d^2 \cdot f_{cd}}", "calculo": f"μ₂ = {M_Ed_Nm:.0f} / ({b_m} x {d_m:.3f}² x ({f_cd_mpa:.2f} x 10^6)) = {mu:.3f}"})
+        recalculo = {"phi_long_final": phi_long_final, "d": d, "mu": mu}
         if mu > mu_lim:
-            raise ValueError("Momento reduzido excede o limite após recálculo.")
-    
+            raise DuctilidadeInsuficiente("Momento reduzido excede o limite após recálculo.")
+
     xi = (1 - math.sqrt(1 - 2 * mu)) / lambda_val if mu < 0.5 else 1.25
     z = d_m * (1 - 0.5 * lambda_val * xi)
     As_req_cm2 = (M_Ed_Nm / (z * (f_yd_mpa * 10**6))) * 10000 if z > 0 else 0
-    
-    calculo_as_req = (f"ξ = (1 - √(1 - 2 x {mu:.3f})) / {lambda_val} = {xi:.3f}<br>"
-                      f"z = {d_m:.3f} x (1 - 0.5 x {lambda_val} x {xi:.3f}) = {z:.3f} m<br>"
-                      f"As,req = {M_Ed_Nm:.0f} / ({z:.3f} x ({f_yd_mpa:.2f} x 10^6)) = <b>{As_req_cm2:.2f} cm²</b>")
-    passos.append({"titulo": "7. Área de Aço Necessária", "formula": r"\xi = \frac{1 - \sqrt{1 - 2\mu}}{\lambda} \ ; \ z = d(1 - 0.5\lambda\xi) \ ; \ A_s = \frac{M_{Ed}}{z \cdot f_{yd}}", "calculo": calculo_as_req})
+    flexao = {"d": d, "mu": mu, "xi": xi, "z": z, "As_req_cm2": As_req_cm2}
 
-    solucoes = armadura_service.encontrar_combinacoes_otimas(As_req_cm2, largura_disponivel)
+    solucoes = _procurar_armadura(As_req_cm2, largura_disponivel)
     solucao_unica = solucoes.get('unica')
     solucao_mista = solucoes.get('mista')
 
@@ -126,20 +139,40 @@ def dimensionar_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom):
         raise ValueError("Não foi possível encontrar uma combinação de armadura válida que coubesse na secção.")
 
     if solucao_unica and solucao_mista:
-        solucao_principal = min([solucao_unica, solucao_mista], key=lambda x: x['area_total_cm2'])
+        solucao_principal = min([solucao_unica, solucao_mista], key=lambda x: x.area_total_cm2)
     else:
         solucao_principal = solucao_unica or solucao_mista
-    
-    combinacao_final_str = solucao_principal['combinacao_str']
-    As_prov_cm2 = solucao_principal['As_final_cm2']
-    
-    texto_proposta = f"Para {As_req_cm2:.2f} cm², foram encontradas as seguintes soluções:<br>"
-    if solucao_mista:
-        texto_proposta += f" • <b>Opção Mista (mais económica): {solucao_mista['combinacao_str']}</b> ({solucao_mista['As_final_cm2']:.2f} cm²)<br>"
-    if solucao_unica:
-        texto_proposta += f" • <b>Opção Diâmetro Único: {solucao_unica['combinacao_str']}</b> ({solucao_unica['As_final_cm2']:.2f} cm²)<br>"
-    texto_proposta += f"<br>A solução ótima adotada é a de menor área total: <b>{combinacao_final_str}</b>."
-    passos.append({"titulo": "8. Proposta de Armadura (Soluções Ótimas)", "calculo": texto_proposta})
+
+    # Armadura em várias camadas: o centro de gravidade sobe e a altura útil diminui.
+    # Recalcula-se As,req com a nova altura útil até a solução adotada ser suficiente.
+    iteracoes_camadas = []
+    for _ in range(5):
+        camadas = solucao_principal.camadas
+        if len(camadas) <= 1:
+            break
+        desvio = armadura_service.desvio_centroide_camadas(camadas)
+        d = h - c_nom - phi_estribo - max(camadas[0]) / 2 - desvio
+        d_m = d / 1000
+        mu = M_Ed_Nm / (b_m * d_m**2 * (f_cd_mpa * 10**6)) if (b_m * d_m**2 * f_cd_mpa) > 0 else 0
+        if mu > mu_lim:
+            raise DuctilidadeInsuficiente(f"Momento reduzido (μ={mu:.3f}) excede o limite (μ_lim={mu_lim:.3f}) com a armadura em {len(camadas)} camadas. A secção necessita de ser redimensionada.")
+        xi = (1 - math.sqrt(1 - 2 * mu)) / lambda_val
+        z = d_m * (1 - 0.5 * lambda_val * xi)
+        As_req_cm2 = (M_Ed_Nm / (z * (f_yd_mpa * 10**6))) * 10000
+        iteracoes_camadas.append({"combinacao_str": solucao_principal.combinacao_str, "n_camadas": len(camadas), "desvio": desvio, "d": d, "mu": mu, "z": z, "As_req_cm2": As_req_cm2})
+        if solucao_principal.area_total_cm2 >= As_req_cm2:
+            break
+        solucoes = armadura_service.otimizar_armadura(As_req_cm2, largura_disponivel, "viga")
+        solucao_unica = solucoes.get('unica')
+        solucao_mista = solucoes.get('mista')
+        if not solucao_unica and not solucao_mista:
+            raise ValueError("Não foi possível encontrar uma combinação de armadura válida que coubesse na secção.")
+        solucao_principal = min([s for s in (solucao_unica, solucao_mista) if s], key=lambda x: x.area_total_cm2)
+    else:
+        # A última solução escolhida já não foi verificada com a sua altura útil.
+        raise ValueError("A armadura em várias camadas não converge: As,prov não verifica As,req com a altura útil recalculada.")
+
+    As_prov_cm2 = solucao_principal.As_final_cm2
 
     if f_ck <= 50: f_ctm = 0.30 * f_ck**(2/3)
     else: f_ctm = 2.12 * math.log(1 + (f_ck + 8) / 10)
@@ -147,13 +180,95 @@ def dimensionar_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom):
     as_min_termo2 = 0.0013 * b_m * d_m * 10000
     As_min_cm2 = max(as_min_termo1, as_min_termo2)
     As_final_cm2 = max(As_prov_cm2, As_min_cm2)
-    
+
+    return {
+        "b": b, "h": h, "f_ck": f_ck, "f_yk": f_yk, "M_Ed_kNm": M_Ed_kNm, "c_nom": c_nom,
+        "gamma_c": gamma_c, "gamma_s": gamma_s, "lambda_val": lambda_val,
+        "f_cd_mpa": f_cd_mpa, "f_yd_mpa": f_yd_mpa, "M_Ed_Nm": M_Ed_Nm, "b_m": b_m,
+        "phi_estribo": phi_estribo, "phi_long_assumido": phi_long_assumido,
+        "d1": d1, "mu1": mu1, "mu_lim": mu_lim,
+        "recalculo": recalculo,
+        "flexao": flexao,
+        "iteracoes_camadas": iteracoes_camadas,
+        "As_req_cm2": As_req_cm2,
+        "combinacao_unica": solucao_unica.para_dict() if solucao_unica else None,
+        "combinacao_mista": solucao_mista.para_dict() if solucao_mista else None,
+        "combinacao_final": solucao_principal.combinacao_str,
+        "n_barras": solucao_principal.n_barras,
+        "phi_long": solucao_principal.phi_max,
+        "camadas": [list(camada) for camada in solucao_principal.camadas],
+        "As_prov_cm2": As_prov_cm2,
+        "d": d, "f_ctm": f_ctm,
+        "as_min_termo1": as_min_termo1, "as_min_termo2": as_min_termo2,
+        "As_min_cm2": As_min_cm2, "As_final_cm2": As_final_cm2,
+    }
+
+# ==============================================================================
+# RELATÓRIO (PASSO A PASSO)
+# ==============================================================================
+
+FORMULAS_VIGA = {
+    "altura_util": r"d = h - c_{nom} - \phi_{estribo} - \frac{\phi_{long}}{2}",
+    "momento_reduzido": r"\mu = \frac{M_{Ed}}{b \cdot d^2 \cdot f_{cd}}",
+    "ductilidade": r"\mu_{lim} = \lambda \cdot 0.45 \cdot (1 - 0.5 \cdot \lambda \cdot 0.45)",
+    "area_aco": r"\xi = \frac{1 - \sqrt{1 - 2\mu}}{\lambda} \ ; \ z = d(1 - 0.5\lambda\xi) \ ; \ A_s = \frac{M_{Ed}}{z \cdot f_{yd}}",
+    "armadura_minima": r"A_{s,min} = max(0.26\frac{f_{ctm}}{f_{yk}} \cdot b_t \cdot d; 0.0013 \cdot b_t \cdot d)",
+}
+
+def gerar_passos_viga(memoria):
+    """Constrói o passo a passo do relatório a partir da memória de cálculo de calcular_viga."""
+    m = memoria
+    b, h, f_ck, f_yk, c_nom = m["b"], m["h"], m["f_ck"], m["f_yk"], m["c_nom"]
+    gamma_c, gamma_s, lambda_val = m["gamma_c"], m["gamma_s"], m["lambda_val"]
+    f_cd_mpa, f_yd_mpa, M_Ed_Nm, b_m = m["f_cd_mpa"], m["f_yd_mpa"], m["M_Ed_Nm"], m["b_m"]
+    phi_estribo, phi_long_assumido = m["phi_estribo"], m["phi_long_assumido"]
+    passos = []
+
+    passos.append({"titulo": "1. Parâmetros de Cálculo", "calculo": f"f_cd = {f_ck:.0f} / {gamma_c} = {f_cd_mpa:.2f} MPa; f_yd = {f_yk:.0f} / {gamma_s} = {f_yd_mpa:.2f} MPa"})
+    passos.append({"titulo": "2. Iteração 1 - Suposição inicial", "calculo": f"Assumir: Ø Estribo = {phi_estribo} mm; Ø Arm. Long. = {phi_long_assumido} mm."})
+
+    d, mu = m["d1"], m["mu1"]
+    d_m = d / 1000
+    passos.append({"titulo": "3. Altura útil estimada (d₁)", "formula": FORMULAS_VIGA["altura_util"], "calculo": f"d₁ = {h:.1f} - {c_nom:.1f} - {phi_estribo:.1f} - {phi_long_assumido:.1f} / 2 = {d:.1f} mm"})
+    passos.append({"titulo": "4. Momento reduzido (μ₁)", "formula": FORMULAS_VIGA["momento_reduzido"], "calculo": f"μ₁ = {M_Ed_Nm:.0f} / ({b_m} x {d_m:.3f}² x ({f_cd_mpa:.2f} x 10^6)) = {mu:.3f}"})
+    passos.append({"titulo": "5. Verificação de ductilidade", "formula": FORMULAS_VIGA["ductilidade"], "calculo": f"μ ({mu:.3f}) <= μ_lim ({m['mu_lim']:.3f}) -> OK"})
+
+    recalculo = m["recalculo"]
+    if recalculo:
+        phi_long_final, d, mu = recalculo["phi_long_final"], recalculo["d"], recalculo["mu"]
+        d_m = d / 1000
+        passos.append({"titulo": "6. Recálculo (Iteração 2)", "calculo": f"O diâmetro da solução de varão único ({phi_long_final}mm) é diferente do assumido ({phi_long_assumido}mm). Procede-se a um recálculo para garantir a precisão."})
+        passos.append({"titulo": "6.1. Nova Altura útil (d₂)", "calculo": f"d₂ = {h:.1f} - {c_nom:.1f} - {phi_estribo:.1f} - {phi_long_final:.1f} / 2 = {d:.1f} mm"})
+        passos.append({"titulo": "6.2. Novo Momento reduzido (μ₂)", "formula": FORMULAS_VIGA["momento_reduzido"], "calculo": f"μ₂ = {M_Ed_Nm:.0f} / ({b_m} x {d_m:.3f}² x ({f_cd_mpa:.2f} x 10^6)) = {mu:.3f}"})
+
+    flexao = m["flexao"]
+    mu, xi, z = flexao["mu"], flexao["xi"], flexao["z"]
+    d_m = flexao["d"] / 1000
+    calculo_as_req = (f"ξ = (1 - √(1 - 2 x {mu:.3f})) / {lambda_val} = {xi:.3f}<br>"
+                      f"z = {d_m:.3f} x (1 - 0.5 x {lambda_val} x {xi:.3f}) = {z:.3f} m<br>"
+                      f"As,req = {M_Ed_Nm:.0f} / ({z:.3f} x ({f_yd_mpa:.2f} x 10^6)) = <b>{flexao['As_req_cm2']:.2f} cm²</b>")
+    passos.append({"titulo": "7. Área de Aço Necessária", "formula": FORMULAS_VIGA["area_aco"], "calculo": calculo_as_req})
+
+    for it in m["iteracoes_camadas"]:
+        passos.append({"titulo": "7.1. Armadura em Várias Camadas", "calculo": f"A solução {it['combinacao_str']} ocupa {it['n_camadas']} camadas; o centro de gravidade sobe {it['desvio']:.1f} mm.<br>d = {it['d']:.1f} mm; μ = {it['mu']:.3f}; z = {it['z']:.3f} m<br>As,req = <b>{it['As_req_cm2']:.2f} cm²</b>"})
+
+    solucao_unica, solucao_mista = m["combinacao_unica"], m["combinacao_mista"]
+    texto_proposta = f"Para {m['As_req_cm2']:.2f} cm², foram encontradas as seguintes soluções:<br>"
+    if solucao_mista:
+        texto_proposta += f" • <b>Opção Mista (mais económica): {solucao_mista['combinacao_str']}</b> ({solucao_mista['As_final_cm2']:.2f} cm²)<br>"
+    if solucao_unica:
+        texto_proposta += f" • <b>Opção Diâmetro Único: {solucao_unica['combinacao_str']}</b> ({solucao_unica['As_final_cm2']:.2f} cm²)<br>"
+    texto_proposta += f"<br>A solução ótima adotada é a de menor área total: <b>{m['combinacao_final']}</b>."
+    passos.append({"titulo": "8. Proposta de Armadura (Soluções Ótimas)", "calculo": texto_proposta})
+
+    d, f_ctm = m["d"], m["f_ctm"]
+    as_min_termo1, as_min_termo2, As_min_cm2 = m["as_min_termo1"], m["as_min_termo2"], m["As_min_cm2"]
     calculo_as_min = (f"f_ctm = 0.30 x {f_ck:.0f}^(2/3) = {f_ctm:.2f} MPa<br>"
                       f"As,min₁ = 0.26 x ({f_ctm:.2f} / {f_yk:.0f}) x {b:.0f} x {d:.1f} = {as_min_termo1:.2f} cm²<br>"
                       f"As,min₂ = 0.0013 x {b:.0f} x {d:.1f} = {as_min_termo2:.2f} cm²<br>"
                       f"As,min = max({as_min_termo1:.2f}, {as_min_termo2:.2f}) = {As_min_cm2:.2f} cm²<br>"
-                      f"Área de armadura a adotar: max(As,prov, As,min) = max({As_prov_cm2:.2f}, {As_min_cm2:.2f}) = <b>{As_final_cm2:.2f} cm²</b>")
-    passos.append({"titulo": "9. Verificação da Armadura Mínima", "formula": r"A_{s,min} = max(0.26\frac{f_{ctm}}{f_{yk}} \cdot b_t \cdot d; 0.0013 \cdot b_t \cdot d)", "calculo": calculo_as_min})
+                      f"Área de armadura a adotar: max(As,prov, As,min) = max({m['As_prov_cm2']:.2f}, {As_min_cm2:.2f}) = <b>{m['As_final_cm2']:.2f} cm²</b>")
+    passos.append({"titulo": "9. Verificação da Armadura Mínima", "formula": FORMULAS_VIGA["armadura_minima"], "calculo": calculo_as_min})
 
     texto_passo_10 = (
         "Para garantir a correta montagem da armadura e o posicionamento dos estribos, adota-se uma armadura "
@@ -164,23 +279,161 @@ def dimensionar_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom):
         "em guias de detalhe compatíveis com o Eurocódigo 2 (EC2, secções 8 e 9; NP EN 1992-1-1)."
     )
     passos.append({"titulo": "10. Armadura Superior Construtiva (Porta-Estribos)", "calculo": texto_passo_10})
+    return passos
 
-    try:
-        n_barras = sum([int(s.split('Ø')[0].strip()) for s in combinacao_final_str.split(' + ')])
-        phi_long_desenho = max([int(s.split('Ø')[1].strip()) for s in combinacao_final_str.split(' + ')])
-    except:
-        n_barras, phi_long_desenho = 0, 0
+# ==============================================================================
+# FUNÇÃO PRINCIPAL DE DIMENSIONAMENTO
+# ==============================================================================
+
+def dimensionar_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom, fast=False):
+    """
+    Função principal que realiza o dimensionamento de uma viga à flexão simples.
+    Com fast=True devolve apenas o resultado numérico (sem 'passos'); o passo a
+    passo pode ser gerado mais tarde a partir de resultado['memoria'].
+    """
+    memoria = calcular_viga(b, h, f_ck, f_yk, M_Ed_kNm, c_nom)
+
+    dados_desenho = {"b": b, "h": h, "c_nom": c_nom, "phi_estribo": memoria["phi_estribo"], "n_barras": memoria["n_barras"], "phi_long": memoria["phi_long"]}
+    if len(memoria["camadas"]) > 1:
+        dados_desenho["camadas"] = memoria["camadas"]
 
-    dados_desenho = {"b": b, "h": h, "c_nom": c_nom, "phi_estribo": phi_estribo, "n_barras": n_barras, "phi_long": phi_long_desenho}
-    
     resultado = {
         'status': 'Sucesso',
         'mensagem': 'Cálculo iterativo efetuado com sucesso.',
-        'combinacao_final': combinacao_final_str,
-        'As_final_cm2': f"{As_final_cm2:.2f}",
-        'combinacao_unica': solucao_unica,
-        'combinacao_mista': solucao_mista,
-        'passos': passos,
-        'dados_desenho': dados_desenho
+        'combinacao_final': memoria["combinacao_final"],
+        'As_final_cm2': f"{memoria['As_final_cm2']:.2f}",
+        'combinacao_unica': memoria["combinacao_unica"],
+        'combinacao_mista': memoria["combinacao_mista"],
+        'dados_desenho': dados_desenho,
+        'memoria': memoria,
+    }
+    if not fast:
+        resultado['passos'] = gerar_passos_viga(memoria)
+    return resultado
+
+# ==============================================================================
+# DIMENSIONAMENTO EM LOTE (NUMPY)
+# ==============================================================================
+
+# Códigos de estado por linha em dimensionar_vigas_lote (em vez de exceções).
+LOTE_SUCESSO = 0
+LOTE_DUCTILIDADE = 1        # μ > μ_lim (também após o recálculo de d)
+LOTE_SEM_ARMADURA = 2       # nenhuma combinação cabe na secção
+LOTE_DADOS_INVALIDOS = 3    # b, d ou f_ck não positivos
+
+CAMPOS_LOTE_VIGA = ("b", "h", "f_ck", "f_yk", "M_Ed_kNm", "c_nom")
+
+def _momento_reduzido_lote(M_Ed_Nm, b_m, d_m, f_cd_mpa):
+    denominador = b_m * d_m**2 * (f_cd_mpa * 10**6)
+    return np.divide(M_Ed_Nm, denominador, out=np.zeros_like(denominador), where=denominador > 0)
+
+def _armadura_lote(M_Ed_Nm, d_m, mu, f_yd_mpa, lambda_val):
+    xi = (1 - np.sqrt(np.clip(1 - 2 * mu, 0, None))) / lambda_val
+    z = d_m * (1 - 0.5 * lambda_val * xi)
+    As_req_cm2 = np.divide(M_Ed_Nm, z * (f_yd_mpa * 10**6), out=np.zeros_like(z), where=z > 0) * 10000
+    return xi, z, As_req_cm2
+
+def dimensionar_vigas_lote(b, h=None, f_ck=None, f_yk=None, M_Ed_kNm=None, c_nom=None):
+    """
+    Versão vetorizada de dimensionar_viga para muitas secções de uma vez.
+
+    Aceita um array estruturado com os campos de CAMPOS_LOTE_VIGA (b, h, c_nom em mm;
+    f_ck, f_yk em MPa; M_Ed em kNm) ou os seis vetores/escalares em separado.
+    Os erros não interrompem o lote: cada linha recebe um código LOTE_* em 'status'
+    e a mensagem correspondente em 'mensagem'. Não gera 'passos' nem desenhos.
+
+    As linhas sem solução no catálogo (mais de 8 varões ou várias camadas) são
+    resolvidas pela função escalar, que recorre ao otimizador exato; nessas linhas
+    'd_mm', 'mu' e 'As_req_cm2' referem-se à armadura numa só camada.
+    """
+    if h is None and getattr(np.asarray(b), "dtype", None) is not None and np.asarray(b).dtype.names:
+        dados = np.asarray(b)
+        b, h, f_ck, f_yk, M_Ed_kNm, c_nom = (dados[campo] for campo in CAMPOS_LOTE_VIGA)
+    b, h, f_ck, f_yk, M_Ed_kNm, c_nom = (a.astype(float).ravel() for a in np.broadcast_arrays(b, h, f_ck, f_yk, M_Ed_kNm, c_nom))
+
+    gamma_c, gamma_s, alpha_cc, lambda_val = 1.5, 1.15, 1.0, 0.8
+    f_cd_mpa = alpha_cc * f_ck / gamma_c
+    f_yd_mpa = f_yk / gamma_s
+    M_Ed_Nm = M_Ed_kNm * 1000
+    b_m = b / 1000
+    phi_estribo = 8.0
+    phi_long_assumido = 16.0
+    mu_lim = lambda_val * 0.45 * (1 - 0.5 * lambda_val * 0.45)
+
+    status = np.full(b.shape, LOTE_SUCESSO, dtype=np.int8)
+    mensagem = np.full(b.shape, None, dtype=object)
+
+    # Iteração 1: Ø16 assumido
+    d = h - c_nom - phi_estribo - (phi_long_assumido / 2)
+    invalidas = (b <= 0) | (d <= 0) | (f_ck <= 0) | (f_yk <= 0)
+    status[invalidas] = LOTE_DADOS_INVALIDOS
+    mensagem[invalidas] = "Dados geométricos ou materiais inválidos."
+
+    mu = _momento_reduzido_lote(M_Ed_Nm, b_m, d / 1000, f_cd_mpa)
+    falha_ductilidade = ~invalidas & (mu > mu_lim)
+    status[falha_ductilidade] = LOTE_DUCTILIDADE
+    mensagem[falha_ductilidade] = "Momento reduzido excede o limite. A secção necessita de ser redimensionada."
+
+    largura_disponivel = b - 2 * c_nom - 2 * phi_estribo
+    _, _, As_req_temp = _armadura_lote(M_Ed_Nm, d / 1000, mu, f_yd_mpa, lambda_val)
+    ativas = status == LOTE_SUCESSO
+    solucoes_temp = armadura_service.encontrar_combinacoes_otimas_lote(np.where(ativas, As_req_temp, np.inf), largura_disponivel)
+    recurso_escalar = ativas & (solucoes_temp["unica"]["indice"] < 0) & (solucoes_temp["mista"]["indice"] < 0)
+
+    # Iteração 2: recálculo de d com o diâmetro da solução de varão único
+    phi_long_final = solucoes_temp["unica"]["phi_max"]
+    recalcular = ativas & ~recurso_escalar & (phi_long_final > 0) & (phi_long_final != phi_long_assumido)
+    d = np.where(recalcular, h - c_nom - phi_estribo - phi_long_final / 2, d)
+    mu = _momento_reduzido_lote(M_Ed_Nm, b_m, d / 1000, f_cd_mpa)
+    falha_ductilidade = recalcular & (mu > mu_lim)
+    status[falha_ductilidade] = LOTE_DUCTILIDADE
+    mensagem[falha_ductilidade] = "Momento reduzido excede o limite após recálculo."
+
+    xi, z, As_req_cm2 = _armadura_lote(M_Ed_Nm, d / 1000, mu, f_yd_mpa, lambda_val)
+    ativas = (status == LOTE_SUCESSO) & ~recurso_escalar
+    solucoes = armadura_service.encontrar_combinacoes_otimas_lote(np.where(ativas, As_req_cm2, np.inf), largura_disponivel)
+    area_unica = np.where(solucoes["unica"]["indice"] >= 0, solucoes["unica"]["area_total_cm2"], np.inf)
+    area_mista = np.where(solucoes["mista"]["indice"] >= 0, solucoes["mista"]["area_total_cm2"], np.inf)
+    recurso_escalar |= ativas & np.isinf(area_unica) & np.isinf(area_mista)
+
+    # Solução principal: a de menor área (em empate, a de diâmetro único)
+    usar_mista = area_mista < area_unica
+    As_prov_cm2 = np.where(usar_mista, solucoes["mista"]["As_final_cm2"], solucoes["unica"]["As_final_cm2"])
+    combinacao_final = np.where(usar_mista, solucoes["mista"]["combinacao_str"], solucoes["unica"]["combinacao_str"])
+
+    f_ctm = np.where(f_ck <= 50, 0.30 * np.abs(f_ck)**(2/3), 2.12 * np.log1p(np.abs(f_ck + 8) / 10))
+    b_d = b_m * (d / 1000) * 10000
+    As_min_cm2 = np.maximum(0.26 * np.divide(f_ctm, f_yk, out=np.zeros_like(f_ctm), where=f_yk > 0) * b_d, 0.0013 * b_d)
+    As_final_cm2 = np.maximum(As_prov_cm2, As_min_cm2)
+
+    for i in np.flatnonzero(recurso_escalar):
+        try:
+            resultado = dimensionar_viga(b[i], h[i], f_ck[i], f_yk[i], M_Ed_kNm[i], c_nom[i], fast=True)
+        except ValueError as erro:
+            status[i] = LOTE_DUCTILIDADE if isinstance(erro, DuctilidadeInsuficiente) else LOTE_SEM_ARMADURA
+            mensagem[i] = str(erro)
+            continue
+        principal = min((s for s in (resultado['combinacao_unica'], resultado['combinacao_mista']) if s), key=lambda s: s['area_total_cm2'])
+        combinacao_final[i] = resultado['combinacao_final']
+        As_prov_cm2[i] = principal['As_final_cm2']
+        As_final_cm2[i] = float(resultado['As_final_cm2'])
+
+    sem_solucao = status != LOTE_SUCESSO
+    As_prov_cm2[sem_solucao] = np.nan
+    As_final_cm2[sem_solucao] = np.nan
+    combinacao_final[sem_solucao] = None
+
+    return {
+        "status": status,
+        "mensagem": mensagem,
+        "mu_lim": mu_lim,
+        "d_mm": d,
+        "mu": mu,
+        "xi": xi,
+        "z_m": z,
+        "As_req_cm2": As_req_cm2,
+        "As_min_cm2": As_min_cm2,
+        "As_prov_cm2": As_prov_cm2,
+        "As_final_cm2": As_final_cm2,
+        "combinacao_final": combinacao_final,
     }
-    return resultado
\ No newline at end of file
@@ -1,6 +1,92 @@
 # calculos/tests.py
-from django.test import TestCase
-from .services import viga_service, pilar_service, sapata_service
+import io
+import json
+import math
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
+import numpy as np
+from django.core.management import call_command
+from django.http import FileResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from . import execucao, formulas, views
+from .models import HistoricoCalculo, RelatorioPDF
+from .services import viga_service, pilar_service, sapata_service, armadura_service, abacos_service, seccao_service, raizes, fibras_service, desenho_service, relatorios_service
+
+# ==============================================================================
+# TESTES PARA O SERVIÇO DE ARMADURAS
+# ==============================================================================
+class ArmaduraServiceTests(TestCase):
+
+    def test_catalogo_ordenado_e_consulta_minima(self):
+        """A consulta ao catálogo devolve a combinação válida de menor área."""
+        areas = armadura_service._AREAS_CATALOGO_VIGA
+        self.assertEqual(areas, sorted(areas))
+        As_req, largura = 7.3, 214
+        solucoes = armadura_service.encontrar_combinacoes_otimas(As_req, largura)
+        validas = [e for e in armadura_service._CATALOGO_VIGA
+                   if e.area_total_cm2 >= As_req and e.largura_mm <= largura and not e.mista]
+        self.assertEqual(solucoes['unica'].combinacao_str, min(validas, key=lambda e: e.area_total_cm2).combinacao_str)
+        # Uma largura inválida (NaN) não admite nenhuma combinação.
+        self.assertEqual(armadura_service.encontrar_combinacoes_otimas(As_req, float('nan')), {'unica': None, 'mista': None})
+
+    def test_lote_coincide_com_funcao_escalar(self):
+        """A avaliação vetorizada devolve as mesmas soluções que a função escalar."""
+        As_req = [3.0, 8.55, 16.5, 60.0, 400.0]
+        larguras = [214, 214, 264, 400, 200]
+        lote = armadura_service.encontrar_combinacoes_otimas_lote(As_req, larguras)
+        lote_pilar = armadura_service.encontrar_combinacoes_otimas_pilar_lote(As_req, larguras, 300, 300)
+        for i, (As, largura) in enumerate(zip(As_req, larguras)):
+            escalar = armadura_service.encontrar_combinacoes_otimas(As, largura)
+            escalar_pilar = armadura_service.encontrar_combinacoes_otimas_pilar(As, largura, 300, 300)
+            for tipo in ('unica', 'mista'):
+                esperado = escalar[tipo].combinacao_str if escalar[tipo] else None
+                self.assertEqual(lote[tipo]['combinacao_str'][i], esperado)
+                esperado = escalar_pilar[tipo].combinacao_str if escalar_pilar[tipo] else None
+                self.assertEqual(lote_pilar[tipo]['combinacao_str'][i], esperado)
+
+    def test_pilar_disposicoes_unicas_e_cache(self):
+        """Cada disposição de pilar é gerada uma vez e as pesquisas repetidas usam a cache."""
+        disposicoes = list(armadura_service._gerar_combinacoes_pilar())
+        self.assertEqual(len(disposicoes), len(set(disposicoes)))
+        armadura_service.limpar_cache_pilar()
+        primeira = armadura_service.encontrar_combinacoes_otimas_pilar(12.0, 250, 300, 400)
+        segunda = armadura_service.encontrar_combinacoes_otimas_pilar(12.0, 250, 300, 400)
+        self.assertEqual(primeira, segunda)
+        estatisticas = armadura_service.estatisticas_cache_pilar()
+        self.assertEqual((estatisticas['hits'], estatisticas['misses']), (1, 1))
+
+    def test_otimizador_exato_varias_camadas(self):
+        """O otimizador encontra soluções com mais de 8 varões e em várias camadas."""
+        solucoes = armadura_service.otimizar_armadura(150, 600, "viga")
+        self.assertEqual(solucoes['unica'].combinacao_str, '12 Ø 40')
+        self.assertEqual(solucoes['unica'].contagens, ((40, 12),))
+        self.assertEqual(len(solucoes['unica'].camadas), 2)
+        self.assertGreaterEqual(solucoes['unica'].area_total_cm2, 150)
+
+    def test_camadas_simetricas_com_varoes_nos_cantos(self):
+        """Cada camada tem pelo menos 2 varões, é simétrica e tem os maiores diâmetros nos cantos."""
+        self.assertIsNone(armadura_service.distribuir_camadas(((32, 2),), 80))
+        self.assertEqual(armadura_service.distribuir_camadas(((20, 5),), 140), [(20, 20, 20), (20, 20)])
+        self.assertEqual(armadura_service.distribuir_camadas(((10, 4), (20, 2)), 200), [(20, 10, 10, 10, 10, 20)])
+        for b, h, f_ck, M_Ed in [(160, 875, 25, 460), (170, 700, 30, 270), (200, 1000, 30, 650), (250, 900, 30, 900)]:
+            memoria = viga_service.calcular_viga(b, h, f_ck, 500, M_Ed, 30)
+            for camada in memoria['camadas']:
+                self.assertGreaterEqual(len(camada), 2)
+                self.assertEqual(camada, camada[::-1])
+                self.assertEqual(camada[0], max(camada))
+
+    def test_faces_pilar_com_a_regra_do_catalogo(self):
+        """O otimizador de pilares aceita as mesmas disposições que o catálogo (todos os varões numa fila)."""
+        for entrada in armadura_service._CATALOGO_PILAR[::37]:
+            for largura in (150, 250, 400):
+                faces = armadura_service._faces_pilar(entrada.contagens, largura)
+                self.assertEqual(faces is not None, entrada.largura_mm <= largura)
+
 
 # ==============================================================================
 # TESTES PARA O SERVIÇO DE VIGAS
@@ -35,6 +121,100 @@ class VigaServiceTests(TestCase):
         self.assertAlmostEqual(float(resultado['As_final_cm2']), 16.59, places=2)
         print("   Teste da viga (combinação mista) concluído com sucesso!")
 
+    def test_dimensionamento_viga_estreita_varias_camadas(self):
+        """Viga estreita que não cabe numa camada de 8 varões: recorre ao otimizador exato."""
+        dados_viga = {
+            "b": 200, "h": 1000, "f_ck": 30, "f_yk": 500,
+            "M_Ed_kNm": 650, "c_nom": 35
+        }
+        resultado = viga_service.dimensionar_viga(**dados_viga)
+        self.assertEqual(resultado['status'], 'Sucesso')
+        self.assertEqual(resultado['combinacao_final'], '6 Ø 20')
+        self.assertEqual(len(resultado['dados_desenho']['camadas']), 2)
+
+    def test_varias_camadas_sem_convergencia_recusadas(self):
+        """Se a última solução escolhida não verifica As,req com a sua altura útil, o cálculo falha."""
+        memoria = viga_service.calcular_viga(200, 1000, 30, 500, 650, 35)
+        primeira = viga_service._procurar_armadura(memoria['flexao']['As_req_cm2'], 200 - 2 * 35 - 2 * 8)['unica']
+        self.assertEqual(primeira.combinacao_str, memoria['iteracoes_camadas'][0]['combinacao_str'])
+        with mock.patch.object(armadura_service, 'otimizar_armadura', return_value={'unica': primeira, 'mista': None}):
+            with self.assertRaisesRegex(ValueError, 'não converge'):
+                viga_service.calcular_viga(200, 1000, 30, 500, 650, 35)
+
+    def test_dimensionamento_vigas_lote_coincide_com_escalar(self):
+        """O lote reproduz a função escalar e assinala as falhas com códigos de estado."""
+        dados = np.array([
+            (300, 500, 25, 500, 150, 30),
+            (300, 500, 30, 500, 160, 30),
+            (200, 1000, 30, 500, 650, 35),
+            (250, 300, 25, 500, 400, 30),
+            (150, 400, 30, 500, 100, 35),  # recurso à função escalar: μ > μ_lim só com 2 camadas
+        ], dtype=[(campo, float) for campo in viga_service.CAMPOS_LOTE_VIGA])
+        lote = viga_service.dimensionar_vigas_lote(dados)
+
+        self.assertEqual(list(lote['status']), [viga_service.LOTE_SUCESSO] * 3 + [viga_service.LOTE_DUCTILIDADE] * 2)
+        with self.assertRaises(viga_service.DuctilidadeInsuficiente):
+            viga_service.dimensionar_viga(*dados[4])
+        for i in range(3):
+            escalar = viga_service.dimensionar_viga(*dados[i])
+            self.assertEqual(lote['combinacao_final'][i], escalar['combinacao_final'])
+            self.assertEqual(f"{lote['As_final_cm2'][i]:.2f}", escalar['As_final_cm2'])
+        self.assertTrue(np.isnan(lote['As_final_cm2'][3]))
+
+
+# ==============================================================================
+# TESTES PARA A OTIMIZAÇÃO DA SECÇÃO DE VIGAS
+# ==============================================================================
+class SeccaoServiceTests(TestCase):
+
+    def test_otimizacao_seccao_coincide_com_pesquisa_escalar(self):
+        """O ótimo da grelha coincide com a pesquisa exaustiva pela função escalar."""
+        resultado = seccao_service.otimizar_seccao_viga(250, 30, 500, 30, (200, 400, 50), (300, 800, 50))
+        custos = {}
+        for b in range(200, 401, 50):
+            for h in range(300, 801, 50):
+                try:
+                    viga = viga_service.dimensionar_viga(b, h, 30, 500, 250, 30)
+                except ValueError:
+                    continue
+                custos[(b, h)] = b / 1000 * h / 1000 * seccao_service.PRECO_BETAO_EUR_M3 + float(viga['As_final_cm2']) / 10**4 * seccao_service.DENSIDADE_ACO_KG_M3 * seccao_service.PRECO_ACO_EUR_KG
+        b_otimo, h_otimo = min(custos, key=lambda chave: (round(custos[chave], 9), chave[1]))
+        self.assertEqual((resultado['melhor']['b'], resultado['melhor']['h']), (b_otimo, h_otimo))
+        self.assertEqual(resultado['n_validos'], len(custos))
+        self.assertGreater(resultado['n_podados_ductilidade'], 0)
+        self.assertIn(resultado['melhor'], resultado['pareto'])
+
+
+# ==============================================================================
+# TESTES PARA OS ÁBACOS DE FLEXÃO
+# ==============================================================================
+class AbacosServiceTests(TestCase):
+
+    def test_abaco_respeita_limite_de_erro_e_usa_cache_em_disco(self):
+        """A interpolação no ábaco fica dentro do erro verificado e a tabela é gravada em disco."""
+        with tempfile.TemporaryDirectory() as pasta, override_settings(ABACOS_DIR=pasta):
+            abacos_service.limpar_cache_abacos()
+            abaco = abacos_service.obter_abaco(30, 500)
+            self.assertTrue(os.listdir(pasta))
+            self.assertLess(abaco['erro_max_relativo'], 1e-4)
+            self.assertLessEqual(abacos_service.verificar_erro_abaco(30, 500), abaco['erro_max_relativo'])
+
+            b, d, M_Ed_kNm = 300, 542, 250
+            mu = M_Ed_kNm * 1000 / (b / 1000 * (d / 1000)**2 * abaco['f_cd_mpa'] * 10**6)
+            z = d / 1000 * (1 - 0.5 * 0.8 * (1 - math.sqrt(1 - 2 * mu)) / 0.8)
+            As_exato = M_Ed_kNm * 1000 / (z * abaco['f_yd_mpa'] * 10**6) * 10000
+            As_abaco = abacos_service.As_req_abaco(b, d, M_Ed_kNm, 30, 500)
+            self.assertLessEqual(abs(As_abaco - As_exato) / As_exato, abaco['erro_max_relativo'])
+            self.assertTrue(math.isnan(abacos_service.As_req_abaco(b, d, 2000, 30, 500)))
+
+            pedido = RequestFactory().get(reverse('abaco_viga_csv'), {'f_ck': 30, 'f_yk': 500})
+            csv_resposta = views.abaco_viga_csv_view(pedido)
+            self.assertEqual(csv_resposta.status_code, 200)
+            self.assertIn(b'mu,xi,z_d,omega', csv_resposta.content)
+            json_resposta = json.loads(views.abaco_viga_json_view(pedido).content)
+            self.assertEqual(len(json_resposta['mu']), abacos_service.N_PONTOS_ABACO)
+        abacos_service.limpar_cache_abacos()
+
 
 # ==============================================================================
 # TESTES PARA O SERVIÇO DE PILARES
@@ -57,6 +237,158 @@ class PilarServiceTests(TestCase):
         self.assertAlmostEqual(float(resultado['As_final_cm2']), 3.14, places=2)
         print("   Teste do pilar concluído com sucesso!")
 
+    def test_armadura_rigorosa_minima_resolvida_diretamente(self):
+        """MRd(As) = MEd é resolvido diretamente: MRd fica colado a MEd e com poucas avaliações."""
+        N_Ed_N, M_Ed_Nm = 1000e3, 150e3
+        rigoroso = pilar_service._dimensionar_pilar_rigoroso(300, 400, 30, 20.0, 434.78, N_Ed_N, M_Ed_Nm, 35)
+        self.assertGreater(rigoroso['As_req_mm2'], rigoroso['inicial']['As_mm2'])
+        self.assertGreaterEqual(rigoroso['MRd_kNm'], M_Ed_Nm / 1000)
+        self.assertLess(rigoroso['MRd_kNm'] - M_Ed_Nm / 1000, 1e-3)
+        self.assertLessEqual(rigoroso['iteracoes']['avaliacoes_MRd'], 15)
+
+        raiz, _ = raizes.brent(lambda x: x**3 - 2, 0.0, 2.0, xtol=1e-12)
+        self.assertAlmostEqual(raiz, 2 ** (1 / 3), places=10)
+
+    def test_diagrama_interacao_coerente_com_calculo_rigoroso(self):
+        """O ponto (N_Ed, M_Rd) do cálculo rigoroso fica na fronteira do diagrama, que é reutilizado da cache."""
+        rigoroso = pilar_service._dimensionar_pilar_rigoroso(300, 400, 30, 20.0, 500 / 1.15, 1000e3, 150e3, 35)
+        pilar_service._diagrama_interacao_cache.cache_clear()
+        diagrama = pilar_service.diagrama_interacao_pilar(300, 400, 35, 30, 500, rigoroso['As_req_mm2'])
+        self.assertIs(pilar_service.diagrama_interacao_pilar(300, 400, 35, 30, 500, rigoroso['As_req_mm2']), diagrama)
+        self.assertEqual(pilar_service._diagrama_interacao_cache.cache_info().hits, 1)
+        dentro = pilar_service.verificar_esforcos_diagrama(diagrama, [1000, 1000, 1000, diagrama['N_max_kN'] + 1], [149, -149, 152, 0])
+        self.assertEqual(dentro.tolist(), [True, True, False, False])
+
+        pedido = RequestFactory().post('/', {
+            'b': 300, 'h': 400, 'l': 3.5, 'lig_topo': 'artic', 'lig_base': 'artic', 'f_ck': 30, 'f_yk': 500,
+            'N_Ed': 1000, 'M_Ed': 120, 'c_nom': 35, 'phi_ef': 2.0,
+        })
+        resposta = views.pilar_view(pedido)
+        self.assertContains(resposta, 'Diagrama de Interação N–M')
+        calculo = HistoricoCalculo.objects.get()
+        self.assertTrue(calculo.resultado_final['memoria']['verificacao_diagrama']['dentro'])
+        self.assertNotIn('diagrama_interacao_svg', calculo.resultado_final)
+        self.assertContains(views.historico_detalhe_view(RequestFactory().get('/'), calculo.id), 'diagrama-interacao-dados')
+
+    def test_armadura_adotada_dentro_do_proprio_diagrama(self):
+        """Toda a armadura aceite pelo dimensionamento verifica o seu diagrama de interação (também com NEd elevado)."""
+        for b, h in [(250, 250), (300, 300), (300, 500)]:
+            for N_Ed in (100, 800, 1500, 3000, 5000):
+                for M_Ed in (0, 5, 50, 150):
+                    try:
+                        resultado = pilar_service.dimensionar_pilar(b, h, 3.0, 'encab', 'artic', 25, 500, N_Ed, M_Ed, 30, 2.0, fast=True)
+                    except ValueError:
+                        continue
+                    memoria = resultado['memoria']
+                    diagrama = pilar_service.diagrama_interacao_da_memoria(memoria)
+                    with self.subTest(b=b, h=h, N_Ed=N_Ed, M_Ed=M_Ed):
+                        self.assertTrue(pilar_service.verificar_esforcos_diagrama(diagrama, memoria['N_Ed_kN'], memoria['M_Ed_total_Nm'] / 1000))
+                        self.assertTrue(memoria['verificacao_diagrama']['dentro'])
+
+    def test_varias_combinacoes_dimensionadas_pela_condicionante(self):
+        """A armadura cobre a envolvente das combinações e fica registada uma única entrada no histórico."""
+        seccao = {"b_mm": 300, "h_mm": 400, "l_m": 5.0, "lig_topo": "artic", "lig_base": "encab",
+                  "f_ck": 30, "f_yk": 500, "c_nom_mm": 35, "phi_ef": 2.0}
+        casos = [(800, 60), (1500, -40), (300, 110), (1200, 90)]
+        with mock.patch.object(pilar_service, '_dimensionar_pilar_rigoroso', wraps=pilar_service._dimensionar_pilar_rigoroso) as rigoroso:
+            resultado = pilar_service.dimensionar_pilar_casos(casos=casos, **seccao)
+        # Só os casos fora do diagrama de As,min são resolvidos, e cada um uma única vez.
+        self.assertEqual(rigoroso.call_count, sum(caso['resolvido'] for caso in resultado['casos']))
+        individuais = [pilar_service.dimensionar_pilar(N_Ed_kN=N, M0_Ed_kNm=abs(M), **seccao, fast=True)['memoria'] for N, M in casos]
+        As_req = [m['As_final_req_cm2'] for m in individuais]
+        self.assertEqual(resultado['caso_condicionante'], As_req.index(max(As_req)) + 1)
+        self.assertAlmostEqual(resultado['memoria']['As_final_req_cm2'], max(As_req), places=6)
+        for caso, exato in zip(resultado['casos'], As_req):
+            if caso['As_req_majorante']:
+                self.assertGreaterEqual(caso['As_req_cm2'], exato - 1e-9)
+            else:
+                self.assertAlmostEqual(caso['As_req_cm2'], exato, places=6)
+        self.assertIn('As,req ≤', resultado['passos'][0]['calculo'])
+        self.assertTrue(all(caso['verifica'] for caso in resultado['casos']))
+        self.assertIn('0. Combinações de Ações', resultado['passos'][0]['titulo'])
+
+        pedido = RequestFactory().post('/', {
+            'b': 300, 'h': 400, 'l': 5.0, 'lig_topo': 'artic', 'lig_base': 'encab', 'f_ck': 30, 'f_yk': 500,
+            'N_Ed': 800, 'M_Ed': 60, 'c_nom': 35, 'phi_ef': 2.0, 'casos': '1500; -40\n300;110\n1200 90',
+        })
+        self.assertContains(views.pilar_view(pedido), 'condicionante: caso')
+        self.assertEqual(HistoricoCalculo.objects.count(), 1)
+        self.assertEqual(HistoricoCalculo.objects.get().resultado_final['caso_condicionante'], resultado['caso_condicionante'])
+
+    def test_varrimento_esbelteza_com_arranque_a_quente(self):
+        """O varrimento reproduz os cálculos isolados com menos avaliações de MRd e não grava no histórico."""
+        varrimento = pilar_service.varrimento_esbelteza_pilar(300, 300, 30, 500, 1200, 60, 30, (3.0, 7.0, 0.25), ['encab-encab', 'artic-artic'], (1.0, 2.0, 1.0))
+        self.assertEqual(varrimento['n_pontos'], 2 * 2 * 17)
+        avaliacoes_isoladas = 0
+        for ponto in varrimento['pontos']:
+            lig_topo, lig_base = ponto['ligacao'].split('-')
+            memoria = pilar_service.calcular_pilar(300, 300, ponto['l_m'], lig_topo, lig_base, 30, 500, 1200, 60, 30, ponto['phi_ef'])
+            avaliacoes_isoladas += memoria['rigoroso']['iteracoes']['avaliacoes_MRd']
+            self.assertAlmostEqual(ponto['esbelteza'], memoria['esbelteza'], places=9)
+            self.assertAlmostEqual(ponto['M_Ed_total_kNm'], memoria['M_Ed_total_Nm'] / 1000, places=9)
+            self.assertAlmostEqual(ponto['As_final_req_cm2'], memoria['As_final_req_cm2'], delta=pilar_service.TOL_AS_PILAR_MM2 / 100)
+        self.assertLess(varrimento['iteracoes']['avaliacoes_MRd'], 0.8 * avaliacoes_isoladas)
+        # Num arranque a quente a armadura mínima não é avaliada (inicial = None); o relatório continua a ser gerado.
+        memoria['rigoroso'] = {**memoria['rigoroso'], 'inicial': None}
+        passo = next(p for p in pilar_service.gerar_passos_pilar(memoria) if p['titulo'].startswith('6.'))
+        self.assertIn('ponto vizinho', passo['calculo'])
+
+        resposta = views.pilar_esbelteza_json_view(RequestFactory().get('/', {
+            'b': 300, 'h': 300, 'f_ck': 30, 'f_yk': 500, 'N_Ed': 1200, 'M_Ed': 60, 'c_nom': 30,
+            'l_min': 3, 'l_max': 4, 'l_passo': 0.5, 'ligacoes': 'encab-artic', 'phi_min': 2,
+        }))
+        self.assertEqual(len(json.loads(resposta.content)['pontos']), 3)
+        self.assertEqual(views.pilar_esbelteza_json_view(RequestFactory().get('/', {'l_min': 3})).status_code, 400)
+        self.assertFalse(HistoricoCalculo.objects.exists())
+
+# ==============================================================================
+# TESTES PARA A SECÇÃO EM FIBRAS (FLEXÃO DESVIADA)
+# ==============================================================================
+class FibrasServiceTests(TestCase):
+
+    def test_flexao_reta_coincide_com_diagrama_uniaxial(self):
+        """Com momento só segundo h, a secção em fibras reproduz o diagrama N–M uniaxial (bloco retangular)."""
+        b, h, d_linha, As = 300, 400, 51, 1600.0
+        varoes = [(y, z, As / 4) for y in (-100, 100) for z in (h / 2 - d_linha, d_linha - h / 2)]
+        seccao = fibras_service.seccao_retangular(b, h, 30, 500, varoes)
+        diagrama = pilar_service.diagrama_interacao_pilar(b, h, 35, 30, 500, As)
+        n = len(diagrama['x_mm'])
+        for N_Ed in (0, 500, 1000):
+            M_uniaxial = np.interp(N_Ed, diagrama['N_kN'][:n], diagrama['M_kNm'][:n])
+            verificacao = fibras_service.verificar_flexao_desviada(seccao, N_Ed, 1.0, 0.0)
+            self.assertAlmostEqual(verificacao['My_Rd_kNm'] / M_uniaxial, 1.0, delta=0.02)
+            self.assertAlmostEqual(verificacao['Mz_Rd_kNm'], 0.0, places=6)
+
+    def test_varoes_pilar_respeitam_estribo_do_diagrama_uniaxial(self):
+        """A disposição habitual (c_nom + Ø_estribo + Ø/2) dá a mesma resistência que o diagrama N–M uniaxial."""
+        varoes = fibras_service.varoes_pilar(300, 400, 35, 4, 16, phi_estribo=8)
+        self.assertEqual(sorted({round(abs(z), 6) for _, z, _ in varoes}), [200 - 51])
+        seccao = fibras_service.seccao_retangular(300, 400, 30, 500, varoes)
+        diagrama = pilar_service.diagrama_interacao_pilar(300, 400, 35, 30, 500, sum(area for _, _, area in varoes))
+        n = len(diagrama['x_mm'])
+        for N_Ed in (0, 500, 1000):
+            M_uniaxial = np.interp(N_Ed, diagrama['N_kN'][:n], diagrama['M_kNm'][:n])
+            self.assertAlmostEqual(fibras_service.verificar_flexao_desviada(seccao, N_Ed, 1.0, 0.0)['My_Rd_kNm'] / M_uniaxial, 1.0, delta=0.02)
+
+    def test_flexao_desviada_pilar_de_canto(self):
+        """Secção quadrada simétrica: mesma resistência nas duas direções e dimensionamento biaxial coerente."""
+        seccao = fibras_service.seccao_retangular(400, 400, 30, 500, fibras_service.varoes_pilar(400, 400, 35, 4, 20))
+        segundo_y = fibras_service.verificar_flexao_desviada(seccao, 800, 1, 0)
+        segundo_z = fibras_service.verificar_flexao_desviada(seccao, 800, 0, 1)
+        self.assertAlmostEqual(segundo_y['My_Rd_kNm'], segundo_z['Mz_Rd_kNm'], places=3)
+        self.assertFalse(fibras_service.verificar_flexao_desviada(seccao, 800, 1.01 * segundo_y['My_Rd_kNm'], 0)['dentro'])
+
+        superficie = fibras_service.superficie_interacao_pilar(400, 400, 35, 30, 500, 4, 20)
+        self.assertEqual(superficie['N_kN'].shape, (fibras_service.N_ANGULOS, fibras_service.N_PROFUNDIDADES))
+        self.assertAlmostEqual(superficie['N_min_kN'], -4 * 314.2 * 500 / 1.15 / 1000, places=1)
+
+        resultado = fibras_service.dimensionar_pilar_biaxial(400, 400, 35, 30, 500, 1200, 150, 110)
+        self.assertEqual(resultado['status'], 'Sucesso')
+        self.assertLessEqual(resultado['verificacao']['fator_utilizacao'], 1.0)
+        # Com flexão desviada não pode bastar menos armadura do que só com M_y.
+        so_y = fibras_service.dimensionar_pilar_biaxial(400, 400, 35, 30, 500, 1200, 150, 0)
+        self.assertGreaterEqual(float(resultado['As_final_cm2']), float(so_y['As_final_cm2']))
+
 # ==============================================================================
 # TESTES PARA O SERVIÇO DE SAPATAS
 # ==============================================================================
@@ -78,4 +410,402 @@ class SapataServiceTests(TestCase):
         self.assertEqual(resultado['dimensoes'], '2.30m x 2.30m x 0.45m')
         self.assertEqual(resultado['armadura_x'], '14Ø12 (s ≈ 168 mm)')
         self.assertEqual(resultado['armadura_y'], '14Ø12 (s ≈ 168 mm)')
-        print("   Teste da sapata concluído com sucesso!")
\ No newline at end of file
+        print("   Teste da sapata concluído com sucesso!")
+
+    def test_dimensoes_geotecnicas_resolvidas_diretamente(self):
+        """Sapatas muito maiores do que a estimativa inicial (antes: > 50 passos de 5 cm) ficam na menor dimensão admissível."""
+        N_k_kN, M_k_kNm, sigma_adm_kpa = 2000 / 1.4, 3000 / 1.4, 300
+        B_inicial = math.sqrt(N_k_kN / sigma_adm_kpa * 1.2)
+        A_m, B_m, tentativas = sapata_service._dimensoes_geotecnicas(B_inicial, B_inicial, 1.0, N_k_kN, M_k_kNm, sigma_adm_kpa)
+        passos = (B_m - B_inicial) / sapata_service.PASSO_PLANTA_M
+        self.assertGreater(passos, 50)
+        self.assertAlmostEqual(passos, round(passos), places=6)
+        self.assertTrue(sapata_service._tensoes_admissiveis(tentativas[-1], sigma_adm_kpa))
+        self.assertFalse(sapata_service._tensoes_admissiveis(tentativas[-2], sigma_adm_kpa))
+        self.assertAlmostEqual(tentativas[-2]['B_m'], B_m - sapata_service.PASSO_PLANTA_M, places=9)
+        with self.assertRaisesMessage(ValueError, "dimensões geotécnicas"):
+            sapata_service._dimensoes_geotecnicas(1.0, 1.0, 1.0, N_k_kN, 0, 10)
+
+    def test_altura_util_puncoamento_por_raiz(self):
+        """A altura útil resolvida é o primeiro ponto da grelha que verifica, também em sapatas profundas e em lote."""
+        casos = [(1200, 227, 400, 400, 25), (9000, 450, 300, 300, 25), (30000, 500, 600, 800, 30)]
+        lote, _ = sapata_service.altura_util_puncoamento_lote(*zip(*casos))
+        for (N, sigma, bp, hp, f_ck), d_lote in zip(casos, lote):
+            d_m, avaliacoes = sapata_service.altura_util_puncoamento(N, sigma, bp, hp, f_ck)
+            self.assertAlmostEqual(d_m, d_lote, places=9)
+            self.assertLessEqual(avaliacoes, 16)
+            _, _, V_Ed, VRd_c, _ = sapata_service._esforcos_puncoamento([d_m - 0.01, d_m], N, sigma, bp, hp, f_ck)
+            self.assertEqual((VRd_c > V_Ed).tolist(), [d_m == 0.15, True])
+        self.assertGreater(lote.max(), 0.15 + 50 * 0.01)
+        d_5mm, _ = sapata_service.altura_util_puncoamento(*casos[1], passo_d_mm=5)
+        self.assertTrue(lote[1] - 0.01 < d_5mm <= lote[1])
+
+    def test_malha_quadrada_separavel_coincide_com_pesquisa_exaustiva(self):
+        """Otimizar x e y separadamente por diâmetro dá a mesma malha que a pesquisa em diâmetro x n_x x n_y."""
+        for As_x, As_y, largura in [(14.5, 15.2, 2200), (40.0, 31.0, 3400), (3.0, 3.0, 900)]:
+            candidatos = []
+            for diametro in sapata_service.VERGALHOES_SAPATA:
+                por_n = {}
+                for As in (As_x, As_y):
+                    por_n[As] = [(n, (largura - diametro) / (n - 1)) for n in range(2, 100)
+                                 if n * sapata_service.VERGALHOES_SAPATA[diametro] >= As
+                                 and max(diametro, 27) <= (largura - diametro) / (n - 1) <= sapata_service.S_MAX_ABS_SAPATA]
+                for n_x, s_x in por_n[As_x]:
+                    for n_y, s_y in por_n[As_y]:
+                        area = sapata_service.VERGALHOES_SAPATA[diametro] * (n_x + n_y)
+                        candidatos.append((area - As_x - As_y + (abs(s_x - 200) + abs(s_y - 200)) * 0.01, diametro, n_x, n_y))
+            _, diametro, n_x, n_y = min(candidatos)
+            malha = sapata_service._melhor_malha_quadrada(As_x, As_y, largura)
+            self.assertEqual((malha[0], malha[1][1], malha[2][1]), (diametro, n_x, n_y))
+
+    def test_planta_de_fundacoes_em_paralelo(self):
+        """O lote mantém a ordem, isola os erros e soma as quantidades; em série e em processos dá o mesmo."""
+        planta = [{"bp_mm": 400, "hp_mm": 400, "N_Ed_kN": 1200, "M_Edy_kNm": 60, "referencia": "S1"},
+                  (300, 500, 900, 40), {"bp_mm": 400, "hp_mm": 400, "N_Ed_kN": -5, "M_Edy_kNm": 0}]
+        planta += [(400, 400, 500 + 25 * i, 10) for i in range(sapata_service.MIN_SAPATAS_PROCESSOS)]
+        em_serie = sapata_service.dimensionar_planta_fundacoes(planta, 200, 25, 500, 50, max_workers=1)
+        em_processos = sapata_service.dimensionar_planta_fundacoes(planta, 200, 25, 500, 50, max_workers=2)
+        self.assertEqual(em_processos, em_serie)
+
+        sapatas, resumo = em_serie['sapatas'], em_serie['resumo']
+        self.assertEqual([s['indice'] for s in sapatas], list(range(1, len(planta) + 1)))
+        self.assertEqual((sapatas[0]['referencia'], sapatas[0]['dimensoes']), ('S1', '2.30m x 2.30m x 0.45m'))
+        self.assertEqual(sapatas[1]['dimensoes'], sapata_service.dimensionar_sapata(200, 25, 500, 50, 300, 500, 900, 40)['dimensoes'])
+        self.assertEqual(sapatas[2]['status'], 'Erro')
+        self.assertEqual((resumo['n_sucesso'], resumo['n_erros']), (len(planta) - 1, 1))
+        self.assertAlmostEqual(resumo['volume_betao_m3'], sum(s.get('volume_betao_m3', 0) for s in sapatas))
+        self.assertAlmostEqual(sapatas[0]['volume_betao_m3'], 2.3 * 2.3 * 0.45)
+        # 14Ø12 em cada direção, com 2.30 - 2 x 0.05 m de comprimento.
+        self.assertAlmostEqual(sapatas[0]['peso_aco_kg'], 2 * 14 * 1.131e-4 * 2.2 * 7850)
+
+    def test_modo_rapido_e_passos_gerados_a_partir_da_memoria(self):
+        """O modo rápido não gera relatório; o passo a passo reconstrói-se da memória guardada no histórico."""
+        dados_sapata = {
+            "sigma_adm_kpa": 200, "f_ck": 25, "f_yk": 500,
+            "c_nom_mm": 50, "bp_mm": 400, "hp_mm": 300,
+            "N_Ed_kN": 900, "M_Edy_kNm": 40
+        }
+        completo = sapata_service.dimensionar_sapata(**dados_sapata)
+        rapido = sapata_service.dimensionar_sapata(**dados_sapata, fast=True)
+        self.assertNotIn('passos', rapido)
+        self.assertNotIn('desenho_planta_svg', rapido)
+        self.assertEqual(rapido['dimensoes'], completo['dimensoes'])
+
+        pedido = RequestFactory().post('/', dados_sapata)
+        calculo = views._salvar_calculo_no_historico(pedido, 'Sapata', completo)
+        calculo.refresh_from_db()
+        self.assertNotIn('passos', calculo.resultado_final)
+        resultado_final = relatorios_service.preencher_passos(calculo.elemento, calculo.resultado_final)
+        self.assertEqual(resultado_final['passos'], completo['passos'])
+
+        viga = viga_service.dimensionar_viga(300, 500, 25, 500, 150, 30)
+        memoria = json.loads(json.dumps(viga['memoria']))
+        self.assertEqual(viga_service.gerar_passos_viga(memoria), viga['passos'])
+
+
+# ==============================================================================
+# TESTES PARA OS DESENHOS SVG
+# ==============================================================================
+class DesenhoServiceTests(TestCase):
+
+    def setUp(self):
+        desenho_service.limpar_cache_desenhos()
+
+    def test_cache_de_desenhos_reutiliza_o_mesmo_svg(self):
+        """Dados iguais (em qualquer ordem) reutilizam o SVG em cache, igual ao gerado sem cache."""
+        dados = {'b': 300, 'h': 500, 'c_nom': 30, 'phi_estribo': 8, 'n_barras': 3, 'phi_long': 16}
+        svg = viga_service.desenhar_viga_svg(dados)
+        self.assertEqual(svg, viga_service.desenhar_viga_svg.sem_cache(dados))
+        self.assertTrue(svg.startswith('<svg') and svg.endswith('</svg>'))
+        self.assertEqual(svg.count('<circle'), 5)
+
+        repetido = viga_service.desenhar_viga_svg(dict(reversed(list(dados.items()))))
+        self.assertIs(repetido, svg)
+        self.assertNotEqual(pilar_service.desenhar_pilar_svg(dados), svg)
+        estatisticas = desenho_service.estatisticas_cache_desenhos()
+        self.assertEqual((estatisticas['hits'], estatisticas['misses'], estatisticas['currsize']), (1, 2, 2))
+
+
+# ==============================================================================
+# TESTES PARA A CONVERSÃO DE FÓRMULAS
+# ==============================================================================
+class FormulasTests(TestCase):
+
+    def test_conversao_de_formulas_aninhadas_e_cache(self):
+        """\\frac e \\sqrt aninhados são convertidos numa passagem; as fórmulas declaradas ficam em cache."""
+        html = formulas.formatar_latex_para_html(r"k = 1+\sqrt{\frac{200}{d}} \le 2.0 \, ; \, \sigma_{Ed} = \frac{M_{Ed,y}}{0.9d \cdot f_{yd}}")
+        self.assertTrue(html.startswith('k = 1+√(<span'))
+        self.assertIn('<span style="display: block; padding: 0 0.2em;">d</span></span>) ≤ 2.0 , ; , σ<sub>Ed</sub>', html)
+        self.assertIn('M<sub>Ed,y</sub></span><span style="display: block; padding: 0 0.2em;">0.9d × f<sub>yd</sub></span>', html)
+        self.assertNotIn('{', html)
+        self.assertNotIn('\\', html)
+
+        formulas.limpar_cache_formulas()
+        self.assertEqual(formulas.aquecer_cache_formulas(), len(set(formulas.formulas_declaradas())))
+        pilar = pilar_service.dimensionar_pilar(300, 300, 6.0, "artic", "artic", 25, 500, 900, 40, 35, 2.0)
+        self.assertIn(pilar_service.FORMULAS_PILAR['segunda_ordem'], [passo.get('formula') for passo in pilar['passos']])
+        for passo in pilar['passos']:
+            if 'formula' in passo:
+                formulas.formatar_latex_para_html(passo['formula'])
+        self.assertEqual(formulas.estatisticas_cache_formulas()['misses'], len(set(formulas.formulas_declaradas())))
+
+
+# ==============================================================================
+# TESTES PARA A API JSON
+# ==============================================================================
+class ApiJsonTests(TestCase):
+
+    def _post(self, view, corpo, **opcoes):
+        pedido = RequestFactory().post('/', json.dumps(corpo), content_type='application/json', QUERY_STRING='&'.join(f'{k}={v}' for k, v in opcoes.items()))
+        resposta = view(pedido)
+        return resposta.status_code, json.loads(resposta.content)
+
+    def test_lote_de_vigas_com_historico_opcional(self):
+        """Um lote devolve os resultados do serviço (sem passos nem SVG), erros por entrada e grava só se pedido."""
+        vigas = [{'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': 150, 'c_nom': 35}, {'b': 300, 'h': 500, 'f_ck': 25}]
+        estado, corpo = self._post(views.viga_api_view, vigas)
+        self.assertEqual(estado, 200)
+        self.assertEqual(corpo['resumo'], {'n_entradas': 2, 'n_sucesso': 1, 'n_erros': 1})
+        esperado = viga_service.dimensionar_viga(300, 500, 25, 500, 150, 35, fast=True)
+        self.assertEqual(corpo['resultados'][0], json.loads(json.dumps(esperado)))
+        self.assertIn('f_yk', corpo['resultados'][1]['mensagem'])
+        self.assertFalse(HistoricoCalculo.objects.exists())
+
+        estado, corpo = self._post(views.viga_api_view, vigas, historico=1, passos=1, desenhos=1)
+        calculo = HistoricoCalculo.objects.get()
+        self.assertEqual(corpo['resultados'][0]['calculo_id'], calculo.id)
+        self.assertEqual(corpo['resultados'][0]['passos'], viga_service.gerar_passos_viga(esperado['memoria']))
+        self.assertTrue(corpo['resultados'][0]['desenho_svg'].startswith('<svg'))
+        self.assertNotIn('passos', calculo.resultado_final)
+
+        estado, corpo = self._post(views.sapata_api_view, {'sigma_adm': 300, 'f_ck': 25, 'f_yk': 500, 'c_nom': 50, 'bp': 300, 'hp': 400, 'N_Ed': -10, 'M_Edy': 0})
+        self.assertEqual((estado, corpo['status']), (400, 'Erro'))
+        self.assertEqual(views.pilar_api_view(RequestFactory().get('/')).status_code, 405)
+
+    def test_valores_nao_finitos_recusados_por_entrada(self):
+        """NaN e infinito dão erro na própria entrada e a resposta continua a ser JSON estrito."""
+        viga = {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': 150, 'c_nom': 35}
+        pilar = {'b': 300, 'h': 300, 'l': 3, 'lig_topo': 'artic', 'lig_base': 'encab', 'f_ck': 25, 'f_yk': 500,
+                 'c_nom': 30, 'phi_ef': 2, 'N_Ed': 800, 'M_Ed': 40, 'casos': 'nan; 10'}
+        resposta = views.viga_api_view(RequestFactory().post('/', json.dumps([viga, {**viga, 'b': 'nan'}, {**viga, 'M_Ed': 'inf'}]), content_type='application/json'))
+        corpo = json.loads(resposta.content, parse_constant=lambda constante: self.fail(f'{constante} na resposta'))
+        self.assertEqual(corpo['resumo'], {'n_entradas': 3, 'n_sucesso': 1, 'n_erros': 2})
+        self.assertIn("'b' não é um número finito", corpo['resultados'][1]['mensagem'])
+        self.assertIn("'M_Ed' não é um número finito", corpo['resultados'][2]['mensagem'])
+
+        estado, corpo = self._post(views.pilar_api_view, pilar)
+        self.assertEqual((estado, corpo['status']), (400, 'Erro'))
+        self.assertIn("'casos' não é um número finito", corpo['mensagem'])
+        estado, corpo = self._post(views.sapata_api_view, {'sigma_adm': '-Infinity', 'f_ck': 25, 'f_yk': 500, 'c_nom': 50, 'bp': 300, 'hp': 400, 'N_Ed': 1000, 'M_Edy': 0})
+        self.assertIn("'sigma_adm' não é um número finito", corpo['mensagem'])
+
+
+# ==============================================================================
+# TESTES PARA AS VIEWS ASSÍNCRONAS (ASGI)
+# ==============================================================================
+class ViewsAssincronasTests(TestCase):
+
+    async def test_calculo_e_historico_assincronos_com_fila_limitada(self):
+        """O cálculo corre no conjunto de trabalhadores, grava pelo ORM assíncrono e recusa com a fila cheia."""
+        dados_viga = {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': 150, 'c_nom': 35}
+        resposta = await views.viga_view_async(RequestFactory().post('/', dados_viga))
+        self.assertContains(resposta, '4 Ø 12 + 2 Ø 16')
+        calculo = await HistoricoCalculo.objects.aget()
+        self.assertEqual(calculo.input_data['M_Ed'], '150')
+
+        resposta = await views.historico_detalhe_view_async(RequestFactory().get('/'), calculo.id)
+        self.assertContains(resposta, '<svg')
+        self.assertEqual(execucao.tarefas_pendentes(), 0)
+
+        with self.settings(CALCULOS_MAX_PENDENTES=0):
+            resposta = await views.sapata_view_async(RequestFactory().post('/', {'N_Ed': 1000}))
+            self.assertEqual(resposta.status_code, 503)
+        await views.historico_delete_view_async(RequestFactory().get('/'), calculo.id)
+        self.assertFalse(await HistoricoCalculo.objects.aexists())
+
+    def test_submeter_e_mapear_contam_na_fila(self):
+        """submeter e mapear reservam vagas de CALCULOS_MAX_PENDENTES; mapear espera pelas suas próprias tarefas."""
+        with self.settings(CALCULOS_MAX_PENDENTES=1):
+            self.assertEqual(list(execucao.mapear(pow, [2, 3, 4], [2, 2, 2], em_curso=3)), [4, 9, 16])
+            self.assertEqual(execucao.submeter(pow, 2, 5).result(), 32)
+        self.assertEqual(execucao.tarefas_pendentes(), 0)
+        with self.settings(CALCULOS_MAX_PENDENTES=0):
+            self.assertTrue(execucao.fila_cheia())
+            with self.assertRaises(execucao.FilaCheia):
+                execucao.submeter(pow, 2, 5)
+            with self.assertRaises(execucao.FilaCheia):
+                list(execucao.mapear(pow, [2], [2]))
+
+
+class RelatorioAssincronoTests(TransactionTestCase):
+    # O PDF é gerado (com acesso à base de dados) numa thread do conjunto de execucao,
+    # que só vê os registos fora da transação de cada teste.
+
+    async def test_relatorio_sincrono_assincrono_usa_fila_limitada(self):
+        """Com RELATORIOS_PDF_SINCRONOS o PDF é gerado no conjunto de execucao (503 com a fila cheia)."""
+        await views.viga_view_async(RequestFactory().post('/', {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': 150, 'c_nom': 35}))
+        calculo = await HistoricoCalculo.objects.aget()
+        with tempfile.TemporaryDirectory() as pasta, self.settings(RELATORIOS_DIR=pasta, RELATORIOS_PDF_SINCRONOS=True):
+            with self.settings(CALCULOS_MAX_PENDENTES=0):
+                self.assertEqual((await views.gerar_relatorio_pdf_view_async(RequestFactory().get('/'), calculo.id)).status_code, 503)
+            resposta = await views.gerar_relatorio_pdf_view_async(RequestFactory().get('/'), calculo.id)
+            self.assertTrue(resposta.is_async)
+            self.assertEqual(resposta['Content-Type'], 'application/pdf')
+            self.assertTrue(b''.join([bloco async for bloco in resposta.streaming_content]).startswith(b'%PDF'))
+
+            # Com o PDF já em disco, é enviado do ficheiro em blocos (sem FileResponse).
+            resposta = await views.gerar_relatorio_pdf_view_async(RequestFactory().get('/'), calculo.id)
+            self.assertNotIsInstance(resposta, FileResponse)
+            conteudo = b''.join([bloco async for bloco in resposta.streaming_content])
+            self.assertEqual(int(resposta['Content-Length']), len(conteudo))
+            self.assertIn(f'relatorio_viga_{calculo.id}.pdf', resposta['Content-Disposition'])
+
+    async def test_exportacao_assincrona_em_streaming(self):
+        """Em ASGI o ZIP e o PDF único são enviados por um iterador assíncrono, bloco a bloco."""
+        for M_Ed in (100, 150):
+            await views.viga_view_async(RequestFactory().post('/', {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': M_Ed, 'c_nom': 35}))
+        ids = [calculo_id async for calculo_id in HistoricoCalculo.objects.order_by('id').values_list('id', flat=True)]
+        with tempfile.TemporaryDirectory() as pasta, self.settings(RELATORIOS_DIR=pasta):
+            resposta = await views.exportar_relatorios_view_async(RequestFactory().get('/'))
+            self.assertTrue(resposta.is_async)
+            blocos = [bloco async for bloco in resposta.streaming_content]
+            self.assertGreater(len(blocos), 2)
+            with zipfile.ZipFile(io.BytesIO(b''.join(blocos))) as arquivo:
+                self.assertEqual(arquivo.namelist(), [f'001_viga_{ids[0]}.pdf', f'002_viga_{ids[1]}.pdf', 'indice.csv'])
+
+            resposta = await views.exportar_relatorios_view_async(RequestFactory().get('/', {'formato': 'pdf'}))
+            self.assertTrue(resposta.is_async)
+            conteudo = b''.join([bloco async for bloco in resposta.streaming_content])
+            self.assertTrue(conteudo.startswith(b'%PDF'))
+            self.assertEqual(int(resposta['Content-Length']), len(conteudo))
+            resposta = await views.exportar_relatorios_view_async(RequestFactory().get('/', {'elemento': 'Sapata'}))
+            self.assertEqual(resposta.status_code, 400)
+
+
+# ==============================================================================
+# TESTES PARA A FILA DE RELATÓRIOS PDF
+# ==============================================================================
+@override_settings(RELATORIOS_PDF_SINCRONOS=False)
+class RelatorioPDFTests(TestCase):
+
+    def test_relatorio_gerado_em_segundo_plano_e_servido_do_disco(self):
+        """O pedido põe o relatório em fila; o comando gera-o e os pedidos seguintes servem o ficheiro."""
+        views.viga_view(RequestFactory().post('/', {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': 150, 'c_nom': 35}))
+        calculo = HistoricoCalculo.objects.get()
+        with tempfile.TemporaryDirectory() as pasta, override_settings(RELATORIOS_DIR=pasta):
+            resposta = views.gerar_relatorio_pdf_view(RequestFactory().get('/'), calculo.id)
+            self.assertEqual(resposta.status_code, 202)
+            views.gerar_relatorio_pdf_view(RequestFactory().get('/'), calculo.id)
+            relatorio = RelatorioPDF.objects.get()
+            self.assertEqual(relatorio.estado, RelatorioPDF.ESTADO_PENDENTE)
+
+            call_command('processar_relatorios', '--uma-vez', stdout=io.StringIO())
+            relatorio.refresh_from_db()
+            self.assertEqual(relatorio.estado, RelatorioPDF.ESTADO_CONCLUIDO)
+            caminho = relatorios_service.caminho_relatorio_pdf(calculo.id, relatorio.hash_conteudo)
+            self.assertTrue(caminho.exists())
+
+            resposta = views.gerar_relatorio_pdf_view(RequestFactory().get('/'), calculo.id)
+            self.assertIsInstance(resposta, FileResponse)
+            self.assertEqual(b''.join(resposta.streaming_content), caminho.read_bytes())
+            resposta.close()
+            estado = json.loads(views.estado_relatorio_pdf_view(RequestFactory().get('/'), calculo.id).content)
+            self.assertEqual(estado['estado'], RelatorioPDF.ESTADO_CONCLUIDO)
+
+            views.historico_delete_view(RequestFactory().get('/'), calculo.id)
+            self.assertFalse(caminho.exists())
+            self.assertFalse(RelatorioPDF.objects.exists())
+
+    def test_pedido_em_curso_interrompido_volta_a_fila(self):
+        """Um pedido reservado por um trabalhador que morreu volta a pendente após RELATORIOS_TEMPO_MAXIMO_S."""
+        views.viga_view(RequestFactory().post('/', {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': 150, 'c_nom': 35}))
+        calculo = HistoricoCalculo.objects.get()
+        with tempfile.TemporaryDirectory() as pasta, override_settings(RELATORIOS_DIR=pasta, RELATORIOS_TEMPO_MAXIMO_S=600):
+            self.assertEqual(views.gerar_relatorio_pdf_view(RequestFactory().get('/'), calculo.id).status_code, 202)
+            relatorio = RelatorioPDF.objects.get()
+            recente = timezone.now() - timedelta(seconds=60)
+            RelatorioPDF.objects.filter(id=relatorio.id).update(estado=RelatorioPDF.ESTADO_EM_CURSO, iniciado_em=recente)
+            self.assertEqual(relatorios_service.processar_relatorios_pendentes(), 0)
+            views.gerar_relatorio_pdf_view(RequestFactory().get('/'), calculo.id)
+            relatorio.refresh_from_db()
+            self.assertEqual(relatorio.estado, RelatorioPDF.ESTADO_EM_CURSO)
+
+            # Pelo pedido: o cliente que consulta a página volta a pôr o relatório em fila.
+            RelatorioPDF.objects.filter(id=relatorio.id).update(iniciado_em=timezone.now() - timedelta(hours=1))
+            views.gerar_relatorio_pdf_view(RequestFactory().get('/'), calculo.id)
+            relatorio.refresh_from_db()
+            self.assertEqual((relatorio.estado, relatorio.iniciado_em), (RelatorioPDF.ESTADO_PENDENTE, None))
+
+            # Pelo trabalhador: a passagem seguinte repõe e gera o relatório.
+            RelatorioPDF.objects.filter(id=relatorio.id).update(estado=RelatorioPDF.ESTADO_EM_CURSO, iniciado_em=timezone.now() - timedelta(hours=1))
+            self.assertEqual(relatorios_service.processar_relatorios_pendentes(), 1)
+            relatorio.refresh_from_db()
+            self.assertEqual(relatorio.estado, RelatorioPDF.ESTADO_CONCLUIDO)
+            self.assertIsNotNone(relatorio.iniciado_em)
+
+    def test_exportacao_de_varios_relatorios_em_zip_e_pdf_unico(self):
+        """A exportação gera os PDF em falta na cache em disco e envia-os num ZIP em streaming."""
+        for M_Ed in (100, 150, 200):
+            views.viga_view(RequestFactory().post('/', {'b': 300, 'h': 500, 'f_ck': 25, 'f_yk': 500, 'M_Ed': M_Ed, 'c_nom': 35}))
+        ids = list(HistoricoCalculo.objects.order_by('id').values_list('id', flat=True))
+        with tempfile.TemporaryDirectory() as pasta, override_settings(RELATORIOS_DIR=pasta):
+            resposta = views.exportar_relatorios_view(RequestFactory().get('/', {'ids': f'{ids[0]},{ids[2]}'}))
+            self.assertIsInstance(resposta, StreamingHttpResponse)
+            with zipfile.ZipFile(io.BytesIO(b''.join(resposta.streaming_content))) as arquivo:
+                nomes = arquivo.namelist()
+                self.assertEqual(nomes, [f'001_viga_{ids[0]}.pdf', f'002_viga_{ids[2]}.pdf', 'indice.csv'])
+                self.assertTrue(arquivo.read(nomes[0]).startswith(b'%PDF'))
+                self.assertIn('7 Ø 10', arquivo.read('indice.csv').decode())
+            self.assertEqual(len(os.listdir(pasta)), 2)
+
+            with mock.patch.object(execucao, 'mapear', wraps=execucao.mapear) as mapear:
+                resposta = views.exportar_relatorios_view(RequestFactory().get('/', {'formato': 'pdf', 'elemento': 'Viga'}))
+            mapear.assert_called_once()
+            self.assertEqual(resposta['Content-Type'], 'application/pdf')
+            self.assertTrue(b''.join(resposta.streaming_content).startswith(b'%PDF'))
+            self.assertEqual(execucao.tarefas_pendentes(), 0)
+
+            # Os PDF da exportação contam na fila limitada: 503 com a fila cheia.
+            with self.settings(CALCULOS_MAX_PENDENTES=0):
+                for formato in ('zip', 'pdf'):
+                    self.assertEqual(views.exportar_relatorios_view(RequestFactory().get('/', {'formato': formato, 'elemento': 'Viga'})).status_code, 503)
+            self.assertEqual(views.exportar_relatorios_view(RequestFactory().get('/', {'elemento': 'Sapata'})).status_code, 400)
+
+
+# ==============================================================================
+# TESTES PARA A LISTAGEM DO HISTÓRICO
+# ==============================================================================
+class HistoricoListagemTests(TestCase):
+
+    def test_paginacao_por_chave_filtros_e_resumo(self):
+        """As páginas seguem (timestamp, id) sem repetir linhas e só trazem as colunas do resumo."""
+        HistoricoCalculo.objects.bulk_create(
+            [HistoricoCalculo(elemento='Viga', input_data={'M_Ed': str(100 + i)}, resultado_final={'combinacao_final': '3 Ø 16', 'passos': [{}] * 20}) for i in range(70)]
+            + [HistoricoCalculo(elemento='Pilar', input_data={'N_Ed': ['900'], 'M_Ed': ['45']}, resultado_final={'combinacao_final': '4 Ø 12'}) for _ in range(50)]
+        )
+        esperado = list(HistoricoCalculo.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+        def pagina(**dados):
+            consulta, sentido, erro = views._consulta_historico(dados)
+            return views._contexto_historico(dados, list(consulta), sentido, erro)
+
+        paginas = [pagina()]
+        while paginas[-1]['cursor_seguinte']:
+            paginas.append(pagina(antes=paginas[-1]['cursor_seguinte']))
+        self.assertEqual([len(p['calculos']) for p in paginas], [50, 50, 20])
+        self.assertEqual([linha['id'] for p in paginas for linha in p['calculos']], esperado)
+        self.assertIsNone(paginas[0]['cursor_anterior'])
+        self.assertEqual(pagina(depois=paginas[1]['cursor_anterior'])['calculos'], paginas[0]['calculos'])
+        self.assertEqual(set(paginas[0]['calculos'][0]), {'id', 'elemento', 'timestamp', 'M_Ed', 'N_Ed', 'combinacao_final', 'dimensoes'})
+
+        pilares = pagina(elemento='Pilar')['calculos']
+        self.assertEqual((len(pilares), pilares[0]['N_Ed'], pilares[0]['M_Ed']), (50, '900', '45'))
+        self.assertEqual(pagina(elemento='Viga', desde='2999-01-01')['calculos'], [])
+        ontem = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(pagina(ate=ontem)['calculos'], [])
+        self.assertEqual(len(pagina(desde=timezone.localdate().isoformat(), ate=timezone.localdate().isoformat())['calculos']), 50)
+
+        html = views.historico_view(RequestFactory().get('/', {'elemento': 'Viga'})).content.decode()
+        self.assertIn('<strong>M_Ed:</strong> 169 kNm', html)
+        self.assertIn('Mais antigos', html)
+        self.assertIn('Filtros inválidos', views.historico_view(RequestFactory().get('/', {'desde': 'ontem'})).content.decode())
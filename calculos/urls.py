@@ -1,32 +1,55 @@
 # calculos/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
+def _vista(sincrona, assincrona):
+    """Em ASGI (CALCULOS_VIEWS_ASSINCRONAS) usa a versão assíncrona da view."""
+    return assincrona if settings.CALCULOS_VIEWS_ASSINCRONAS else sincrona
+
 urlpatterns = [
     # URL para a página inicial
     path('', views.index_view, name='pagina_inicial'),
 
     # URL para a página de vigas
-    path('viga/', views.viga_view, name='viga_dimensionamento'),
+    path('viga/', _vista(views.viga_view, views.viga_view_async), name='viga_dimensionamento'),
+
+    # URLs dos ábacos de flexão (JSON para a análise rápida e exportação CSV)
+    path('viga/abaco/', views.abaco_viga_json_view, name='abaco_viga_json'),
+    path('viga/abaco/csv/', views.abaco_viga_csv_view, name='abaco_viga_csv'),
     
     # URL para a página de pilares
-    path('pilar/', views.pilar_view, name='pilar_dimensionamento'),
+    path('pilar/', _vista(views.pilar_view, views.pilar_view_async), name='pilar_dimensionamento'),
+
+    # URL do varrimento paramétrico de esbelteza (JSON, sem histórico)
+    path('pilar/esbelteza/', _vista(views.pilar_esbelteza_json_view, views.pilar_esbelteza_json_view_async), name='pilar_esbelteza_json'),
 
     # URL para a página de sapatas
-    path('sapata/', views.sapata_view, name='sapata_dimensionamento'),
+    path('sapata/', _vista(views.sapata_view, views.sapata_view_async), name='sapata_dimensionamento'),
     
+    # URLs da API JSON (um cálculo ou um lote; sem HTML, SVG ou passos salvo pedido)
+    path('api/viga/', _vista(views.viga_api_view, views.viga_api_view_async), name='viga_api'),
+    path('api/pilar/', _vista(views.pilar_api_view, views.pilar_api_view_async), name='pilar_api'),
+    path('api/sapata/', _vista(views.sapata_api_view, views.sapata_api_view_async), name='sapata_api'),
+
     # URL para a página de historico
-    path('historico/', views.historico_view, name='historico_calculos'),
+    path('historico/', _vista(views.historico_view, views.historico_view_async), name='historico_calculos'),
 
     # URL para a página de historico detalhe
-    path('historico/<int:calculo_id>/', views.historico_detalhe_view, name='historico_detalhe'),
+    path('historico/<int:calculo_id>/', _vista(views.historico_detalhe_view, views.historico_detalhe_view_async), name='historico_detalhe'),
 
     # URL para deletar historico
-    path('historico/delete/<int:calculo_id>/', views.historico_delete_view, name='historico_delete'),
+    path('historico/delete/<int:calculo_id>/', _vista(views.historico_delete_view, views.historico_delete_view_async), name='historico_delete'),
 
     # URL de configuração
     path('configuracao/', views.configuracao_view, name='configuracao_sistema'),
 
     # URL PARA GERAR O RELATÓRIO PDF
-    path('relatorio/<int:calculo_id>/pdf/', views.gerar_relatorio_pdf_view, name='gerar_relatorio_pdf'),
+    path('relatorio/<int:calculo_id>/pdf/', _vista(views.gerar_relatorio_pdf_view, views.gerar_relatorio_pdf_view_async), name='gerar_relatorio_pdf'),
+
+    # URL da exportação de vários relatórios (ZIP em streaming ou PDF único com índice)
+    path('relatorios/exportar/', _vista(views.exportar_relatorios_view, views.exportar_relatorios_view_async), name='exportar_relatorios'),
+
+    # URL do estado do relatório PDF (JSON, para consulta enquanto é gerado)
+    path('relatorio/<int:calculo_id>/pdf/estado/', _vista(views.estado_relatorio_pdf_view, views.estado_relatorio_pdf_view_async), name='estado_relatorio_pdf'),
 ]
\ No newline at end of file
@@ -1,214 +1,491 @@
 # calculos/views.py
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
 from weasyprint import HTML
-from .services import viga_service, pilar_service, sapata_service
-from .models import HistoricoCalculo, SystemConfiguration
+from . import execucao
+from .services import viga_service, pilar_service, sapata_service, abacos_service, relatorios_service
+from .models import HistoricoCalculo, RelatorioPDF, SystemConfiguration
 from .forms import SystemConfigurationForm
+import csv
+import io
+import json
+import math
+import os
 import re
+import tempfile
+import zipfile
+from collections import deque
+from datetime import date, datetime, time, timedelta
+import numpy as np
 
-# ==============================================================================
-# FUNÇÃO DE FORMATAÇÃO DE FÓRMULAS 
-# ==============================================================================
-def formatar_latex_para_html(texto):
-    """
-    Converte uma string LaTeX para um HTML mais robusto e visualmente correto.
-    """
-    if not texto:
-        return ""
-
-    # 1. Normalizar separadores e remover comandos de display
-    texto = texto.replace(r'\,;\,', ' ; ').replace(r'\;', ' ')
-    texto = texto.replace(r'\displaylines', '').replace(r'\\', '<br/>')
-
-    # 2. Substituir símbolos (ADIÇÃO DO \pm)
-    substituicoes = {
-        r'\cdot': '×', r'\beta': 'β', r'\lambda': 'λ', r'\mu': 'μ',
-        r'\phi': 'φ', r'\sigma': 'σ', r'\xi': 'ξ', r'\omega': 'ω',
-        r'\epsilon': 'ε', r'\gamma': 'γ', r'\rho': 'ρ',
-        r'\ge': '≥', r'\le': '≤', r'\approx': '≈', r'\implies': '=>',
-        r'\pm': '±' # ADICIONADO
-    }
-    for original, novo in substituicoes.items():
-        texto = texto.replace(original, novo)
-
-    # Função interna para processar comandos de forma recursiva
-    def processar_comandos(t):
-        def processar_fracoes(match):
-            numerador = processar_comandos(match.group(1))
-            denominador = processar_comandos(match.group(2))
-            return (f'<span style="display: inline-block; vertical-align: middle; text-align: center; font-size: 0.9em; margin: 0 0.2em;">'
-                    f'<span style="display: block; border-bottom: 1px solid black; padding: 0 0.2em;">{numerador}</span>'
-                    f'<span style="display: block; padding: 0 0.2em;">{denominador}</span>'
-                    f'</span>')
-        
-        while r'\frac' in t:
-            t = re.sub(r'\\frac\{((?:[^{}]|\{[^{}]*\})+)\}\{((?:[^{}]|\{[^{}]*\})+)\}', processar_fracoes, t, 1)
-
-        t = re.sub(r'\\sqrt\{([^}]+)\}', r'√(\1)', t)
-        t = re.sub(r'_\{([^}]+)\}', r'<sub>\1</sub>', t)
-        t = re.sub(r'_([a-zA-Z0-9,]+)', r'<sub>\1</sub>', t)
-        t = re.sub(r'\^\{([^}]+)\}', r'<sup>\1</sup>', t)
-        t = re.sub(r'\^([a-zA-Z0-9]+)', r'<sup>\1</sup>', t)
-        
-        return t
-
-    texto = processar_comandos(texto)
-    
-    # Limpeza final
-    texto = texto.replace('{', '').replace('}', '').replace('\\', '')
-    
-    return texto
+
+def _registo_historico(elemento, input_data, resultado):
+    """Linha de histórico (por gravar) com o resultado sem desenhos nem passo a passo."""
+    resultado_final_para_db = resultado.copy()
+    resultado_final_para_db.pop('desenho_svg', None)
+    resultado_final_para_db.pop('desenho_planta_svg', None)
+    resultado_final_para_db.pop('desenho_corte_svg', None)
+    resultado_final_para_db.pop('diagrama_interacao_svg', None)
+    resultado_final_para_db.pop('diagrama_interacao', None)
+    # O passo a passo é reconstruído a partir da memória de cálculo quando é pedido.
+    if 'memoria' in resultado_final_para_db:
+        resultado_final_para_db.pop('passos', None)
+    return HistoricoCalculo(elemento=elemento, input_data=input_data, resultado_final=resultado_final_para_db)
+
+def _input_data_historico(request):
+    input_data_copy = request.POST.copy().dict()
+    input_data_copy.pop('csrfmiddlewaretoken', None)
+    if not input_data_copy.get('casos', '').strip():
+        input_data_copy.pop('casos', None)
+    return input_data_copy
 
 def _salvar_calculo_no_historico(request, elemento, resultado):
     if resultado.get('status') == 'Sucesso':
-        input_data_copy = request.POST.copy().dict()
-        input_data_copy.pop('csrfmiddlewaretoken', None)
-        resultado_final_para_db = resultado.copy()
-        resultado_final_para_db.pop('desenho_svg', None)
-        resultado_final_para_db.pop('desenho_planta_svg', None)
-        resultado_final_para_db.pop('desenho_corte_svg', None)
-        calculo_obj = HistoricoCalculo.objects.create(
-            elemento=elemento,
-            input_data=input_data_copy,
-            resultado_final=resultado_final_para_db
-        )
+        calculo_obj = _registo_historico(elemento, _input_data_historico(request), resultado)
+        calculo_obj.save()
         return calculo_obj
     return None
 
 def index_view(request):
     return render(request, 'calculos/index.html')
 
-def viga_view(request):
+def _calculo_view(request, elemento, calcular, template):
+    """Página de cálculo: calcular(dados do formulário) não acede à base de dados."""
     context = {}
     if request.method == 'POST':
-        try:
-            b = float(request.POST.get('b'))
-            h = float(request.POST.get('h'))
-            f_ck = float(request.POST.get('f_ck'))
-            f_yk = float(request.POST.get('f_yk'))
-            M_Ed_kNm = float(request.POST.get('M_Ed'))
-            c_nom = float(request.POST.get('c_nom'))
-            context['input_data'] = request.POST
-            resultado = viga_service.dimensionar_viga(b=b, h=h, f_ck=f_ck, f_yk=f_yk, M_Ed_kNm=M_Ed_kNm, c_nom=c_nom)
-            if resultado.get('status') == 'Sucesso':
-                resultado['desenho_svg'] = viga_service.desenhar_viga_svg(resultado['dados_desenho'])
-            calculo_salvo = _salvar_calculo_no_historico(request, 'Viga', resultado)
-            if calculo_salvo:
-                resultado['calculo_id'] = calculo_salvo.id
-            context['resultado'] = resultado
-        except (ValueError, TypeError) as e:
-            context['resultado'] = {'status': 'Erro', 'mensagem': f'Erro no cálculo: {e}'}
-    return render(request, 'calculos/viga_dimensionamento.html', context)
+        context['input_data'] = request.POST
+        resultado = calcular(request.POST)
+        calculo_salvo = _salvar_calculo_no_historico(request, elemento, resultado)
+        if calculo_salvo:
+            resultado['calculo_id'] = calculo_salvo.id
+        context['resultado'] = resultado
+    return render(request, template, context)
 
-def pilar_view(request):
-    context = {}
-    if request.method == 'POST':
-        try:
-            b_mm = float(request.POST.get('b'))
-            h_mm = float(request.POST.get('h'))
-            l_m = float(request.POST.get('l'))
-            lig_topo = request.POST.get('lig_topo')
-            lig_base = request.POST.get('lig_base')
-            f_ck = float(request.POST.get('f_ck'))
-            f_yk = float(request.POST.get('f_yk'))
-            N_Ed_kN = float(request.POST.get('N_Ed'))
-            M0_Ed_kNm = float(request.POST.get('M_Ed'))
-            c_nom_mm = float(request.POST.get('c_nom'))
-            phi_ef = float(request.POST.get('phi_ef'))
-            context['input_data'] = request.POST
+def _resultado_viga(dados):
+    try:
+        b = float(dados.get('b'))
+        h = float(dados.get('h'))
+        f_ck = float(dados.get('f_ck'))
+        f_yk = float(dados.get('f_yk'))
+        M_Ed_kNm = float(dados.get('M_Ed'))
+        c_nom = float(dados.get('c_nom'))
+        resultado = viga_service.dimensionar_viga(b=b, h=h, f_ck=f_ck, f_yk=f_yk, M_Ed_kNm=M_Ed_kNm, c_nom=c_nom)
+        if resultado.get('status') == 'Sucesso':
+            resultado['desenho_svg'] = viga_service.desenhar_viga_svg(resultado['dados_desenho'])
+        return resultado
+    except (ValueError, TypeError) as e:
+        return {'status': 'Erro', 'mensagem': f'Erro no cálculo: {e}'}
+
+def viga_view(request):
+    return _calculo_view(request, 'Viga', _resultado_viga, 'calculos/viga_dimensionamento.html')
+
+def _ler_materiais_abaco(request):
+    return float(request.GET.get('f_ck', 25)), float(request.GET.get('f_yk', 500))
+
+def abaco_viga_json_view(request):
+    """Ábaco μ → ω do par de materiais, para a análise rápida (sem novo cálculo) na página de vigas."""
+    try:
+        f_ck, f_yk = _ler_materiais_abaco(request)
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros f_ck/f_yk inválidos.'}, status=400)
+    abaco = abacos_service.obter_abaco(f_ck, f_yk)
+    return JsonResponse({
+        'f_cd_mpa': abaco['f_cd_mpa'], 'f_yd_mpa': abaco['f_yd_mpa'],
+        'mu_lim': abaco['mu_lim'], 'erro_max_relativo': abaco['erro_max_relativo'],
+        'mu': np.round(abaco['mu'], 7).tolist(), 'omega': np.round(abaco['omega'], 7).tolist(),
+    })
+
+def abaco_viga_csv_view(request):
+    try:
+        f_ck, f_yk = _ler_materiais_abaco(request)
+    except ValueError:
+        return HttpResponse("Parâmetros f_ck/f_yk inválidos.", status=400)
+    response = HttpResponse(abacos_service.exportar_abaco_csv(f_ck, f_yk), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="abaco_flexao_C{f_ck:g}_A{f_yk:g}.csv"'
+    return response
+
+def _ler_casos_carga(texto):
+    """Combinações adicionais, uma por linha: 'N_Ed; M_Ed' (aceita vírgula decimal, tabulação ou espaços)."""
+    casos = []
+    for numero, linha in enumerate(texto.strip().splitlines(), 1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        campos = re.split(r'\s*[;\t]\s*', linha) if (';' in linha or '\t' in linha) else linha.split()
+        if len(campos) != 2:
+            raise ValueError(f"combinação na linha {numero} inválida ('{linha}'); use 'N_Ed; M_Ed'")
+        casos.append(tuple(float(campo.replace(',', '.')) for campo in campos))
+    return casos
 
+def _resultado_pilar(dados):
+    try:
+        b_mm = float(dados.get('b'))
+        h_mm = float(dados.get('h'))
+        l_m = float(dados.get('l'))
+        lig_topo = dados.get('lig_topo')
+        lig_base = dados.get('lig_base')
+        f_ck = float(dados.get('f_ck'))
+        f_yk = float(dados.get('f_yk'))
+        N_Ed_kN = float(dados.get('N_Ed'))
+        M0_Ed_kNm = float(dados.get('M_Ed'))
+        c_nom_mm = float(dados.get('c_nom'))
+        phi_ef = float(dados.get('phi_ef'))
+        casos_adicionais = _ler_casos_carga(dados.get('casos', ''))
+
+        if casos_adicionais:
+            resultado = pilar_service.dimensionar_pilar_casos(
+                b_mm=b_mm, h_mm=h_mm, l_m=l_m, lig_topo=lig_topo, lig_base=lig_base,
+                f_ck=f_ck, f_yk=f_yk, casos=[(N_Ed_kN, M0_Ed_kNm)] + casos_adicionais,
+                c_nom_mm=c_nom_mm, phi_ef=phi_ef
+            )
+        else:
             resultado = pilar_service.dimensionar_pilar(
                 b_mm=b_mm, h_mm=h_mm, l_m=l_m, lig_topo=lig_topo, lig_base=lig_base,
                 f_ck=f_ck, f_yk=f_yk, N_Ed_kN=N_Ed_kN, M0_Ed_kNm=M0_Ed_kNm,
                 c_nom_mm=c_nom_mm, phi_ef=phi_ef
             )
-            if resultado.get('status') == 'Sucesso':
-                resultado['desenho_svg'] = pilar_service.desenhar_pilar_svg(resultado['dados_desenho'])
-            calculo_salvo = _salvar_calculo_no_historico(request, 'Pilar', resultado)
-            if calculo_salvo:
-                resultado['calculo_id'] = calculo_salvo.id
-            context['resultado'] = resultado
-        except (ValueError, TypeError, ZeroDivisionError) as e:
-            context['resultado'] = {'status': 'Erro', 'mensagem': f'Erro: {e}. Verifique os valores de entrada.'}
-    return render(request, 'calculos/pilar_dimensionamento.html', context)
+        if resultado.get('status') == 'Sucesso':
+            resultado['desenho_svg'] = pilar_service.desenhar_pilar_svg(resultado['dados_desenho'])
+            resultado.update(relatorios_service.diagrama_pilar(resultado['memoria']))
+        return resultado
+    except (ValueError, TypeError, ZeroDivisionError) as e:
+        return {'status': 'Erro', 'mensagem': f'Erro: {e}. Verifique os valores de entrada.'}
 
-def sapata_view(request):
-    context = {}
-    if request.method == 'POST':
+def pilar_view(request):
+    return _calculo_view(request, 'Pilar', _resultado_pilar, 'calculos/pilar_dimensionamento.html')
+
+def _varrimento_esbelteza(dados):
+    """Varrimento de esbelteza a partir dos parâmetros do pedido; devolve (estado HTTP, JSON)."""
+    try:
+        l_min = float(dados.get('l_min'))
+        phi_min = float(dados.get('phi_min', dados.get('phi_ef', 2.0)))
+        ligacoes = [lig.strip() for lig in dados.get('ligacoes', '').split(',') if lig.strip()] or None
+        resultado = pilar_service.varrimento_esbelteza_pilar(
+            b_mm=float(dados.get('b')), h_mm=float(dados.get('h')),
+            f_ck=float(dados.get('f_ck')), f_yk=float(dados.get('f_yk')),
+            N_Ed_kN=float(dados.get('N_Ed')), M0_Ed_kNm=float(dados.get('M_Ed')), c_nom_mm=float(dados.get('c_nom')),
+            l_intervalo=(l_min, float(dados.get('l_max', l_min)), float(dados.get('l_passo', 0.25))),
+            ligacoes=ligacoes,
+            phi_ef_intervalo=(phi_min, float(dados.get('phi_max', phi_min)), float(dados.get('phi_passo', 0.5))),
+        )
+    except (ValueError, TypeError, ZeroDivisionError) as e:
+        return 400, {'erro': f'Erro: {e}. Verifique os valores de entrada.'}
+    return 200, resultado
+
+def pilar_esbelteza_json_view(request):
+    """
+    Varrimento paramétrico de esbelteza (l, ligações, φ_ef) para a secção e esforços
+    indicados. Devolve JSON; não grava no histórico.
+    """
+    estado, corpo = _varrimento_esbelteza(request.POST if request.method == 'POST' else request.GET)
+    return JsonResponse(corpo, status=estado)
+
+# ==============================================================================
+# API JSON (UM CÁLCULO OU UM LOTE, SEM HTML)
+# ==============================================================================
+MAX_ENTRADAS_API = 10000
+
+def _finito(valor, campo):
+    """NaN e infinito são recusados: passariam pelo cálculo e não são JSON válido na resposta."""
+    numero = float(valor)
+    if not math.isfinite(numero):
+        raise ValueError(f"o campo '{campo}' não é um número finito")
+    return numero
+
+def _numero_api(dados, campo):
+    return _finito(dados[campo], campo)
+
+def _casos_api(casos):
+    """Combinações adicionais do pilar: texto como no formulário ou lista de pares [N_Ed, M_Ed]."""
+    if not casos:
+        return []
+    if isinstance(casos, str):
+        casos = _ler_casos_carga(casos)
+    return [(_finito(N_Ed, 'casos'), _finito(M_Ed, 'casos')) for N_Ed, M_Ed in casos]
+
+def _viga_api(dados):
+    return viga_service.dimensionar_viga(
+        b=_numero_api(dados, 'b'), h=_numero_api(dados, 'h'), f_ck=_numero_api(dados, 'f_ck'), f_yk=_numero_api(dados, 'f_yk'),
+        M_Ed_kNm=_numero_api(dados, 'M_Ed'), c_nom=_numero_api(dados, 'c_nom'), fast=True
+    )
+
+def _pilar_api(dados):
+    geometria = {
+        'b_mm': _numero_api(dados, 'b'), 'h_mm': _numero_api(dados, 'h'), 'l_m': _numero_api(dados, 'l'),
+        'lig_topo': dados['lig_topo'], 'lig_base': dados['lig_base'], 'f_ck': _numero_api(dados, 'f_ck'), 'f_yk': _numero_api(dados, 'f_yk'),
+        'c_nom_mm': _numero_api(dados, 'c_nom'), 'phi_ef': _numero_api(dados, 'phi_ef'),
+    }
+    N_Ed_kN, M0_Ed_kNm = _numero_api(dados, 'N_Ed'), _numero_api(dados, 'M_Ed')
+    casos_adicionais = _casos_api(dados.get('casos'))
+    if casos_adicionais:
+        return pilar_service.dimensionar_pilar_casos(**geometria, casos=[(N_Ed_kN, M0_Ed_kNm)] + casos_adicionais, fast=True)
+    return pilar_service.dimensionar_pilar(**geometria, N_Ed_kN=N_Ed_kN, M0_Ed_kNm=M0_Ed_kNm, fast=True)
+
+def _sapata_api(dados):
+    return sapata_service.dimensionar_sapata(
+        _numero_api(dados, 'sigma_adm'), _numero_api(dados, 'f_ck'), _numero_api(dados, 'f_yk'), _numero_api(dados, 'c_nom'),
+        _numero_api(dados, 'bp'), _numero_api(dados, 'hp'), _numero_api(dados, 'N_Ed'), _numero_api(dados, 'M_Edy'), fast=True
+    )
+
+def _desenhos_api(elemento, resultado):
+    """SVG do elemento (e diagrama de interação do pilar), como nas páginas de cálculo."""
+    if elemento == 'Viga':
+        return {'desenho_svg': viga_service.desenhar_viga_svg(resultado['dados_desenho'])}
+    if elemento == 'Pilar':
+        return {'desenho_svg': pilar_service.desenhar_pilar_svg(resultado['dados_desenho']), **relatorios_service.diagrama_pilar(resultado['memoria'])}
+    return {
+        'desenho_planta_svg': sapata_service.desenhar_sapata_planta_svg(resultado['dados_desenho']),
+        'desenho_corte_svg': sapata_service.desenhar_sapata_corte_svg(resultado['dados_desenho']),
+    }
+
+def _opcao_api(request, nome):
+    return request.GET.get(nome, '').lower() in ('1', 'true', 'sim')
+
+CALCULOS_API = {'Viga': _viga_api, 'Pilar': _pilar_api, 'Sapata': _sapata_api}
+
+def _ler_entradas_api(request):
+    """Entradas do pedido (lista de objetos) e se vieram em lote, ou a resposta de erro."""
+    if request.method != 'POST':
+        return JsonResponse({'erro': 'Utilize POST com um corpo JSON.'}, status=405)
+    try:
+        entradas = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'erro': 'O corpo do pedido não é JSON válido.'}, status=400)
+    lote = isinstance(entradas, list)
+    if not lote:
+        entradas = [entradas]
+    if not all(isinstance(dados, dict) for dados in entradas):
+        return JsonResponse({'erro': 'Cada entrada deve ser um objeto JSON.'}, status=400)
+    if len(entradas) > MAX_ENTRADAS_API:
+        return JsonResponse({'erro': f'O lote está limitado a {MAX_ENTRADAS_API} entradas.'}, status=400)
+    return entradas, lote
+
+def _calcular_entradas_api(elemento, entradas, incluir_passos, incluir_desenhos, historico):
+    """Resultados das entradas e, se historico, as linhas de histórico por gravar (índice, registo)."""
+    calcular = CALCULOS_API[elemento]
+    resultados, registos = [], []
+    for dados in entradas:
         try:
-            sigma_adm_kpa = float(request.POST.get('sigma_adm'))
-            f_ck = float(request.POST.get('f_ck'))
-            f_yk = float(request.POST.get('f_yk'))
-            c_nom_mm = float(request.POST.get('c_nom'))
-            bp_mm = float(request.POST.get('bp'))
-            hp_mm = float(request.POST.get('hp'))
-            N_Ed_kN = float(request.POST.get('N_Ed'))
-            M_Edy_kNm = float(request.POST.get('M_Edy'))
-            context['input_data'] = request.POST
-            
-            resultado = sapata_service.dimensionar_sapata(
-                sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm
-            )
-            calculo_salvo = _salvar_calculo_no_historico(request, 'Sapata', resultado)
-            if calculo_salvo:
-                resultado['calculo_id'] = calculo_salvo.id
-            context['resultado'] = resultado
+            resultado = calcular(dados)
+        except KeyError as e:
+            resultado = {'status': 'Erro', 'mensagem': f'Erro: falta o campo {e}.'}
         except (ValueError, TypeError, ZeroDivisionError) as e:
-            context['resultado'] = {'status': 'Erro', 'mensagem': f'Erro: {e}. Verifique os valores de entrada.'}
-    return render(request, 'calculos/sapata_dimensionamento.html', context)
+            resultado = {'status': 'Erro', 'mensagem': f'Erro: {e}. Verifique os valores de entrada.'}
+        if resultado.get('status') == 'Sucesso':
+            if historico:
+                registos.append((len(resultados), _registo_historico(elemento, dados, resultado)))
+            if incluir_passos:
+                resultado['passos'] = relatorios_service.GERADORES_PASSOS[elemento](resultado['memoria'])
+            if incluir_desenhos:
+                resultado.update(_desenhos_api(elemento, resultado))
+        resultados.append(resultado)
+    return resultados, registos
+
+def _resposta_api(resultados, lote):
+    if not lote:
+        return JsonResponse(resultados[0], status=200 if resultados[0].get('status') == 'Sucesso' else 400)
+    n_sucesso = sum(resultado.get('status') == 'Sucesso' for resultado in resultados)
+    return JsonResponse({
+        'resultados': resultados,
+        'resumo': {'n_entradas': len(resultados), 'n_sucesso': n_sucesso, 'n_erros': len(resultados) - n_sucesso},
+    })
+
+def _calculo_api(request, elemento):
+    """
+    Recebe (POST) um objeto JSON com os campos do formulário do elemento, ou uma lista
+    desses objetos, e devolve só os resultados numéricos (incluindo a memória de cálculo).
+    Opções na query string: passos=1 (passo a passo), desenhos=1 (SVG) e
+    historico=1 (grava os cálculos com sucesso no histórico, numa só operação).
+    Num lote, os erros ficam na respetiva entrada e não interrompem os restantes.
+    """
+    pedido = _ler_entradas_api(request)
+    if isinstance(pedido, HttpResponse):
+        return pedido
+    entradas, lote = pedido
+    resultados, registos = _calcular_entradas_api(
+        elemento, entradas, _opcao_api(request, 'passos'), _opcao_api(request, 'desenhos'), _opcao_api(request, 'historico')
+    )
+    if registos:
+        calculos = HistoricoCalculo.objects.bulk_create([registo for _, registo in registos])
+        for (indice, _), calculo in zip(registos, calculos):
+            resultados[indice]['calculo_id'] = calculo.id
+    return _resposta_api(resultados, lote)
+
+@csrf_exempt
+def viga_api_view(request):
+    return _calculo_api(request, 'Viga')
+
+@csrf_exempt
+def pilar_api_view(request):
+    return _calculo_api(request, 'Pilar')
+
+@csrf_exempt
+def sapata_api_view(request):
+    return _calculo_api(request, 'Sapata')
+
+def _resultado_sapata(dados):
+    try:
+        sigma_adm_kpa = float(dados.get('sigma_adm'))
+        f_ck = float(dados.get('f_ck'))
+        f_yk = float(dados.get('f_yk'))
+        c_nom_mm = float(dados.get('c_nom'))
+        bp_mm = float(dados.get('bp'))
+        hp_mm = float(dados.get('hp'))
+        N_Ed_kN = float(dados.get('N_Ed'))
+        M_Edy_kNm = float(dados.get('M_Edy'))
+        return sapata_service.dimensionar_sapata(
+            sigma_adm_kpa, f_ck, f_yk, c_nom_mm, bp_mm, hp_mm, N_Ed_kN, M_Edy_kNm
+        )
+    except (ValueError, TypeError, ZeroDivisionError) as e:
+        return {'status': 'Erro', 'mensagem': f'Erro: {e}. Verifique os valores de entrada.'}
+
+def sapata_view(request):
+    return _calculo_view(request, 'Sapata', _resultado_sapata, 'calculos/sapata_dimensionamento.html')
+
+# Linhas por página na listagem do histórico.
+HISTORICO_POR_PAGINA = 50
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+def _filtrar_historico(calculos, dados):
+    """
+    Filtros de elemento e de datas (desde/ate, dias completos no fuso horário atual).
+    As datas são comparadas com timestamp diretamente, para a base de dados usar os índices.
+    Levanta ValueError com datas inválidas.
+    """
+    if dados.get('desde'):
+        calculos = calculos.filter(timestamp__gte=_inicio_do_dia(date.fromisoformat(dados['desde'])))
+    if dados.get('ate'):
+        calculos = calculos.filter(timestamp__lt=_inicio_do_dia(date.fromisoformat(dados['ate']) + timedelta(days=1)))
+    if dados.get('elemento'):
+        calculos = calculos.filter(elemento=dados['elemento'])
+    return calculos
+
+def _valor_resumo(campo):
+    # O input_data antigo guarda listas (request.POST) e o atual valores simples.
+    return Coalesce(KT(f'input_data__{campo}__0'), KT(f'input_data__{campo}'))
+
+def _resumo_historico(calculos):
+    """Só as colunas mostradas na listagem, extraídas dos JSON pela base de dados."""
+    return calculos.values(
+        'id', 'elemento', 'timestamp',
+        M_Ed=_valor_resumo('M_Ed'), N_Ed=_valor_resumo('N_Ed'),
+        combinacao_final=KT('resultado_final__combinacao_final'), dimensoes=KT('resultado_final__dimensoes'),
+    )
+
+def _cursor_historico(linha):
+    return f"{linha['timestamp'].isoformat()}_{linha['id']}"
+
+def _ler_cursor_historico(texto):
+    """(timestamp, id) de um cursor de página, ou None se for inválido."""
+    try:
+        instante, _, calculo_id = texto.rpartition('_')
+        instante = datetime.fromisoformat(instante)
+        if timezone.is_naive(instante):
+            instante = timezone.make_aware(instante)
+        return instante, int(calculo_id)
+    except ValueError:
+        return None
+
+def _consulta_historico(dados):
+    """
+    Paginação por chave (keyset) ordenada por (timestamp, id) decrescentes: antes=<cursor>
+    pede as linhas mais antigas que o cursor e depois=<cursor> as mais recentes, sem OFFSET
+    nem COUNT.
+    Devolve (queryset com HISTORICO_POR_PAGINA + 1 linhas, sentido ('inicio' sem cursor válido), erro dos filtros).
+    """
+    erro = None
+    try:
+        calculos = _filtrar_historico(HistoricoCalculo.objects.all(), dados)
+    except ValueError as e:
+        calculos, erro = HistoricoCalculo.objects.all(), f"Filtros inválidos: {e}"
+    sentido, cursor = 'inicio', None
+    for nome in ('antes', 'depois'):
+        if dados.get(nome):
+            cursor = _ler_cursor_historico(dados[nome])
+            sentido = nome if cursor else 'inicio'
+            break
+    if sentido == 'antes':
+        calculos = calculos.filter(Q(timestamp__lt=cursor[0]) | Q(timestamp=cursor[0], id__lt=cursor[1]))
+    elif sentido == 'depois':
+        calculos = calculos.filter(Q(timestamp__gt=cursor[0]) | Q(timestamp=cursor[0], id__gt=cursor[1]))
+    ordem = ('timestamp', 'id') if sentido == 'depois' else ('-timestamp', '-id')
+    return _resumo_historico(calculos).order_by(*ordem)[:HISTORICO_POR_PAGINA + 1], sentido, erro
+
+def _contexto_historico(dados, linhas, sentido, erro):
+    """Contexto da listagem a partir das linhas lidas por _consulta_historico."""
+    mais = len(linhas) > HISTORICO_POR_PAGINA
+    linhas = linhas[:HISTORICO_POR_PAGINA]
+    if sentido == 'depois':
+        linhas.reverse()
+    # A linha do cursor garante que há sempre linhas do outro lado da página.
+    tem_seguinte = sentido == 'depois' or mais
+    tem_anterior = sentido == 'antes' or (sentido == 'depois' and mais)
+    return {
+        'calculos': linhas,
+        'cursor_seguinte': _cursor_historico(linhas[-1]) if tem_seguinte and linhas else None,
+        'cursor_anterior': _cursor_historico(linhas[0]) if tem_anterior and linhas else None,
+        'filtros': {nome: dados.get(nome, '') for nome in ('elemento', 'desde', 'ate')},
+        'elementos': [valor for valor, _ in HistoricoCalculo.ELEMENTO_CHOICES],
+        'erro_filtros': erro,
+    }
 
 def historico_view(request):
-    todos_os_calculos = HistoricoCalculo.objects.all().order_by('-timestamp')
-    context = {'calculos': todos_os_calculos}
+    consulta, sentido, erro = _consulta_historico(request.GET)
+    context = _contexto_historico(request.GET, list(consulta), sentido, erro)
     return render(request, 'calculos/historico.html', context)
 
+def _contexto_historico_detalhe(calculo):
+    """Contexto da página de detalhe (passo a passo e desenhos); não acede à base de dados."""
+    resultado_final = relatorios_service.preencher_passos(calculo.elemento, calculo.resultado_final)
+    context = {
+        'calculo': {
+            'id': calculo.id,
+            'elemento': calculo.elemento,
+            'timestamp': calculo.timestamp,
+            'resultado_final': resultado_final,
+        }
+    }
+    if 'dados_desenho' in resultado_final:
+        if calculo.elemento == 'Viga':
+            context['calculo']['desenho_svg'] = viga_service.desenhar_viga_svg(resultado_final['dados_desenho'])
+        elif calculo.elemento == 'Pilar':
+            context['calculo']['desenho_svg'] = pilar_service.desenhar_pilar_svg(resultado_final['dados_desenho'])
+            if 'memoria' in resultado_final:
+                context['calculo'].update(relatorios_service.diagrama_pilar(resultado_final['memoria']))
+        elif calculo.elemento == 'Sapata':
+            context['calculo']['desenho_planta_svg'] = sapata_service.desenhar_sapata_planta_svg(resultado_final['dados_desenho'])
+            context['calculo']['desenho_corte_svg'] = sapata_service.desenhar_sapata_corte_svg(resultado_final['dados_desenho'])
+    input_formatado = []
+    for key, value in calculo.input_data.items():
+        if key in relatorios_service.INPUT_MAP:
+            info = relatorios_service.INPUT_MAP[key]
+            input_formatado.append({'label': info['label'], 'symbol': info['symbol'], 'value': value, 'unit': info['unit']})
+    context['calculo']['input_data_formatado'] = input_formatado
+    return context
+
 def historico_detalhe_view(request, calculo_id):
     try:
         calculo = HistoricoCalculo.objects.get(id=calculo_id)
-        resultado_final = calculo.resultado_final
-        input_data = calculo.input_data
-        context = {
-            'calculo': {
-                'id': calculo.id,
-                'elemento': calculo.elemento,
-                'timestamp': calculo.timestamp,
-                'resultado_final': resultado_final,
-            }
-        }
-        if 'dados_desenho' in resultado_final:
-            if calculo.elemento == 'Viga':
-                context['calculo']['desenho_svg'] = viga_service.desenhar_viga_svg(resultado_final['dados_desenho'])
-            elif calculo.elemento == 'Pilar':
-                context['calculo']['desenho_svg'] = pilar_service.desenhar_pilar_svg(resultado_final['dados_desenho'])
-            elif calculo.elemento == 'Sapata':
-                context['calculo']['desenho_planta_svg'] = sapata_service.desenhar_sapata_planta_svg(resultado_final['dados_desenho'])
-                context['calculo']['desenho_corte_svg'] = sapata_service.desenhar_sapata_corte_svg(resultado_final['dados_desenho'])
-        INPUT_MAP = {
-            'b': {'label': 'Largura', 'symbol': 'b', 'unit': 'mm'}, 'h': {'label': 'Altura', 'symbol': 'h', 'unit': 'mm'},
-            'l': {'label': 'Comprimento Real', 'symbol': 'l', 'unit': 'm'}, 'f_ck': {'label': 'Classe do Betão', 'symbol': 'f_{ck}', 'unit': ''},
-            'f_yk': {'label': 'Classe do Aço', 'symbol': 'f_{yk}', 'unit': ''}, 'M_Ed': {'label': 'Momento Fletor', 'symbol': 'M_{Ed}', 'unit': 'kNm'},
-            'c_nom': {'label': 'Recobrimento', 'symbol': 'c_{nom}', 'unit': 'mm'}, 'lig_topo': {'label': 'Ligação no Topo', 'symbol': '', 'unit': ''},
-            'lig_base': {'label': 'Ligação na Base', 'symbol': '', 'unit': ''}, 'N_Ed': {'label': 'Esforço Axial', 'symbol': 'N_{Ed}', 'unit': 'kN'},
-            'phi_ef': {'label': 'Coef. Fluência', 'symbol': r'\phi_{ef}', 'unit': ''}, 'sigma_adm': {'label': 'Tensão Admissível', 'symbol': r'\sigma_{adm}', 'unit': 'kPa'},
-            'bp': {'label': 'Largura do Pilar', 'symbol': 'b_p', 'unit': 'mm'}, 'hp': {'label': 'Altura do Pilar', 'symbol': 'h_p', 'unit': 'mm'},
-            'M_Edy': {'label': 'Momento Fletor', 'symbol': 'M_{Ed,y}', 'unit': 'kNm'},
-        }
-        input_formatado = []
-        for key, value in input_data.items():
-            if key in INPUT_MAP:
-                info = INPUT_MAP[key]
-                input_formatado.append({'label': info['label'], 'symbol': info['symbol'], 'value': value, 'unit': info['unit']})
-        context['calculo']['input_data_formatado'] = input_formatado
-        return render(request, 'calculos/historico_detalhe.html', context)
     except HistoricoCalculo.DoesNotExist:
         return redirect('historico_calculos')
+    return render(request, 'calculos/historico_detalhe.html', _contexto_historico_detalhe(calculo))
 
 def historico_delete_view(request, calculo_id):
     try:
         calculo = HistoricoCalculo.objects.get(id=calculo_id)
         calculo.delete()
+        relatorios_service.apagar_relatorios_em_disco(calculo_id)
     except HistoricoCalculo.DoesNotExist:
         pass
     return redirect('historico_calculos')
@@ -224,47 +501,415 @@ def configuracao_view(request):
         form = SystemConfigurationForm(instance=config)
     return render(request, 'calculos/configuracao.html', {'form': form})
     
+# ==============================================================================
+# RELATÓRIOS PDF EM SEGUNDO PLANO
+# ==============================================================================
+# O pedido do relatório não gera o PDF: devolve o ficheiro já existente em disco ou
+# cria um RelatorioPDF pendente, que o comando processar_relatorios gera depois.
+
+def _url_base(request):
+    return f"{request.scheme}://{request.get_host()}"
+
+def _resposta_pdf(calculo, caminho):
+    return FileResponse(open(caminho, 'rb'), content_type='application/pdf',
+                        filename=f"relatorio_{calculo.elemento.lower()}_{calculo.id}.pdf")
+
+def _resposta_relatorio(request, relatorio, estado_anterior):
+    if estado_anterior == RelatorioPDF.ESTADO_ERRO:
+        return HttpResponse(f"Não foi possível gerar o relatório: {relatorio.mensagem_erro}. Volte a pedi-lo para tentar de novo.", status=500)
+    response = render(request, 'calculos/relatorio_em_preparacao.html', {'relatorio': relatorio}, status=202)
+    response['Retry-After'] = '3'
+    return response
+
 def gerar_relatorio_pdf_view(request, calculo_id):
+    """
+    Devolve o PDF (FileResponse, a partir do disco) se já estiver gerado; caso contrário
+    põe-no em fila e responde 202 com uma página que se atualiza até o PDF estar pronto.
+    """
     try:
         calculo = HistoricoCalculo.objects.get(id=calculo_id)
     except HistoricoCalculo.DoesNotExist:
         return HttpResponse("Cálculo não encontrado.", status=404)
 
-    resultado_final = calculo.resultado_final
-    if 'dados_desenho' in resultado_final:
-        if calculo.elemento == 'Viga':
-            calculo.desenho_svg = viga_service.desenhar_viga_svg(resultado_final['dados_desenho'])
-        elif calculo.elemento == 'Pilar':
-            calculo.desenho_svg = pilar_service.desenhar_pilar_svg(resultado_final['dados_desenho'])
-        elif calculo.elemento == 'Sapata':
-            calculo.desenho_planta_svg = sapata_service.desenhar_sapata_planta_svg(resultado_final['dados_desenho'])
-            calculo.desenho_corte_svg = sapata_service.desenhar_sapata_corte_svg(resultado_final['dados_desenho'])
-
-    INPUT_MAP = {
-        'b': {'label': 'Largura', 'symbol': 'b', 'unit': 'mm'}, 'h': {'label': 'Altura', 'symbol': 'h', 'unit': 'mm'},
-        'l': {'label': 'Comprimento Real', 'symbol': 'l', 'unit': 'm'}, 'f_ck': {'label': 'Classe do Betão', 'symbol': 'f_{ck}', 'unit': ''},
-        'f_yk': {'label': 'Classe do Aço', 'symbol': 'f_{yk}', 'unit': ''}, 'M_Ed': {'label': 'Momento Fletor', 'symbol': 'M_{Ed}', 'unit': 'kNm'},
-        'c_nom': {'label': 'Recobrimento', 'symbol': 'c_{nom}', 'unit': 'mm'}, 'lig_topo': {'label': 'Ligação no Topo', 'symbol': '', 'unit': ''},
-        'lig_base': {'label': 'Ligação na Base', 'symbol': '', 'unit': ''}, 'N_Ed': {'label': 'Esforço Axial', 'symbol': 'N_{Ed}', 'unit': 'kN'},
-        'phi_ef': {'label': 'Coef. Fluência', 'symbol': r'\phi_{ef}', 'unit': ''}, 'sigma_adm': {'label': 'Tensão Admissível', 'symbol': r'\sigma_{adm}', 'unit': 'kPa'},
-        'bp': {'label': 'Largura do Pilar', 'symbol': 'b_p', 'unit': 'mm'}, 'hp': {'label': 'Altura do Pilar', 'symbol': 'h_p', 'unit': 'mm'},
-        'M_Edy': {'label': 'Momento Fletor', 'symbol': 'M_{Ed,y}', 'unit': 'kNm'},
+    url_base = _url_base(request)
+    hash_conteudo = relatorios_service.hash_relatorio(calculo, SystemConfiguration.objects.first(), url_base)
+    caminho = relatorios_service.caminho_relatorio_pdf(calculo.id, hash_conteudo)
+    if caminho.exists():
+        return _resposta_pdf(calculo, caminho)
+
+    relatorio, _ = RelatorioPDF.objects.get_or_create(calculo=calculo, hash_conteudo=hash_conteudo, defaults={'url_base': url_base})
+    estado_anterior = relatorio.estado
+    if relatorios_service.repor_pedido_relatorio(relatorio):
+        relatorio.save(update_fields=['estado', 'iniciado_em'])
+    if settings.RELATORIOS_PDF_SINCRONOS and relatorios_service.processar_relatorio(relatorio) and caminho.exists():
+        return _resposta_pdf(calculo, caminho)
+    return _resposta_relatorio(request, relatorio, estado_anterior)
+
+def _estado_relatorio(calculo, relatorio, caminho):
+    if caminho.exists():
+        estado = RelatorioPDF.ESTADO_CONCLUIDO
+    else:
+        estado = relatorio.estado if relatorio else None
+    return {
+        'calculo_id': calculo.id, 'estado': estado,
+        'mensagem_erro': relatorio.mensagem_erro if relatorio else '',
+        'pdf_url': reverse('gerar_relatorio_pdf', args=[calculo.id]),
     }
-    input_formatado = []
-    for key, value in calculo.input_data.items():
-        if key in INPUT_MAP:
-            info = INPUT_MAP[key]
-            input_formatado.append({'label': info['label'], 'value': value, 'unit': info['unit']})
-    calculo.input_data_formatado = input_formatado
-
-    if calculo.resultado_final.get('passos'):
-        for passo in calculo.resultado_final['passos']:
-            if 'formula' in passo and passo['formula']:
-                passo['formula_formatada'] = formatar_latex_para_html(passo['formula'])
-
-    html_string = render_to_string('calculos/relatorio_pdf.html', {'calculo': calculo}, request=request)
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="relatorio_{calculo.elemento.lower()}_{calculo.id}.pdf"'
-    
-    return response
\ No newline at end of file
+
+def estado_relatorio_pdf_view(request, calculo_id):
+    """Estado do relatório (JSON) para consulta periódica; não cria pedidos."""
+    try:
+        calculo = HistoricoCalculo.objects.get(id=calculo_id)
+    except HistoricoCalculo.DoesNotExist:
+        return JsonResponse({'erro': 'Cálculo não encontrado.'}, status=404)
+    hash_conteudo = relatorios_service.hash_relatorio(calculo, SystemConfiguration.objects.first(), _url_base(request))
+    relatorio = RelatorioPDF.objects.filter(calculo=calculo, hash_conteudo=hash_conteudo).first()
+    return JsonResponse(_estado_relatorio(calculo, relatorio, relatorios_service.caminho_relatorio_pdf(calculo.id, hash_conteudo)))
+
+# ==============================================================================
+# EXPORTAÇÃO DE VÁRIOS RELATÓRIOS (ZIP EM STREAMING OU PDF ÚNICO)
+# ==============================================================================
+# O PDF único é montado em memória pelo WeasyPrint (páginas de todos os relatórios),
+# por isso tem um limite; o ZIP é enviado à medida que os relatórios ficam prontos.
+MAX_RELATORIOS_PDF_UNICO = 100
+_BLOCO_LEITURA = 64 * 1024
+
+def _calculos_exportacao(dados):
+    """Cálculos a exportar: ids (lista ou separados por vírgulas), intervalo de datas e elemento."""
+    calculos = _filtrar_historico(HistoricoCalculo.objects.all(), dados)
+    ids = [valor for texto in dados.getlist('ids') for valor in texto.split(',') if valor.strip()]
+    if ids:
+        calculos = calculos.filter(id__in=[int(valor) for valor in ids])
+    return calculos.order_by('timestamp', 'id')
+
+def _relatorios_em_disco(calculos, config, url_base):
+    """
+    Produz (cálculo, caminho do PDF, erro) pela ordem dos cálculos. Os PDF que ainda não
+    estão na cache em disco são gerados no conjunto de trabalhadores partilhado
+    (contados em CALCULOS_MAX_PENDENTES), com no máximo 2 × CALCULOS_MAX_WORKERS
+    relatórios em curso, para a memória não crescer. Com a fila cheia espera pelos seus
+    próprios relatórios; se não tiver nenhum em curso, o relatório fica com o erro.
+    """
+    em_curso = deque()
+
+    def entregar():
+        calculo, caminho, futuro = em_curso.popleft()
+        try:
+            if isinstance(futuro, execucao.FilaCheia):
+                raise futuro
+            if futuro is not None:
+                futuro.result()
+            return calculo, caminho, None
+        except Exception as e:  # um relatório com erro não interrompe a exportação
+            return calculo, None, str(e)
+
+    for calculo in calculos.iterator(chunk_size=100):
+        caminho = relatorios_service.caminho_relatorio_pdf(calculo.id, relatorios_service.hash_relatorio(calculo, config, url_base))
+        futuro = None
+        if not caminho.exists():
+            html_string = relatorios_service.html_relatorio(calculo, config, url_base)
+            while True:
+                try:
+                    futuro = execucao.submeter(relatorios_service.gerar_pdf_em_ficheiro, html_string, url_base, caminho)
+                    break
+                except execucao.FilaCheia as erro:
+                    if not em_curso:
+                        futuro = erro
+                        break
+                    yield entregar()
+        em_curso.append((calculo, caminho, futuro))
+        if len(em_curso) > 2 * settings.CALCULOS_MAX_WORKERS:
+            yield entregar()
+    while em_curso:
+        yield entregar()
+
+def _nome_relatorio(numero, calculo):
+    return f"{numero:03d}_{calculo.elemento.lower()}_{calculo.id}.pdf"
+
+def _resumo_resultado(calculo):
+    return calculo.resultado_final.get('combinacao_final') or calculo.resultado_final.get('dimensoes', '')
+
+class _DestinoStreaming:
+    """Destino (não posicionável) do ZipFile: guarda os bytes escritos até serem enviados."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+def _zip_relatorios(calculos, config, url_base):
+    """Conteúdo do ZIP, em blocos: um PDF por cálculo e um indice.csv no fim."""
+    destino = _DestinoStreaming()
+    indice = io.StringIO()
+    escritor_indice = csv.writer(indice)
+    escritor_indice.writerow(['n', 'calculo_id', 'elemento', 'data', 'resultado', 'ficheiro'])
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as arquivo:
+        for numero, (calculo, caminho, erro) in enumerate(_relatorios_em_disco(calculos, config, url_base), 1):
+            data_hora = timezone.localtime(calculo.timestamp).timetuple()[:6]
+            if erro is None:
+                nome = _nome_relatorio(numero, calculo)
+                with open(caminho, 'rb') as origem, arquivo.open(zipfile.ZipInfo(nome, data_hora), 'w') as entrada:
+                    for bloco in iter(lambda: origem.read(_BLOCO_LEITURA), b''):
+                        entrada.write(bloco)
+                        yield destino.esvaziar()
+            else:
+                nome = f"{numero:03d}_{calculo.elemento.lower()}_{calculo.id}_ERRO.txt"
+                arquivo.writestr(zipfile.ZipInfo(nome, data_hora), f"Não foi possível gerar o relatório: {erro}")
+            escritor_indice.writerow([numero, calculo.id, calculo.elemento, calculo.timestamp.isoformat(), _resumo_resultado(calculo), nome])
+            yield destino.esvaziar()
+        arquivo.writestr('indice.csv', indice.getvalue())
+    yield destino.esvaziar()
+
+def _pdf_unico_relatorios(calculos, config, url_base):
+    """
+    PDF único: índice (com a página inicial de cada relatório) seguido dos relatórios,
+    renderizados pelo WeasyPrint no conjunto de trabalhadores partilhado e juntos página
+    a página. Devolve um ficheiro temporário (apagado ao fechar) posicionado no início;
+    levanta execucao.FilaCheia se a fila de cálculos estiver cheia.
+    """
+    calculos = list(calculos)
+    paginas_html = [relatorios_service.html_relatorio(calculo, config, url_base) for calculo in calculos]
+    # Os documentos do WeasyPrint não passam entre processos: são renderizados num
+    # conjunto de threads, também no modo 'processos'.
+    documentos = list(execucao.mapear(relatorios_service.renderizar_documento, paginas_html, [url_base] * len(paginas_html), threads=True))
+
+    # O nº de páginas do índice desloca os relatórios: repete-se até estabilizar.
+    n_paginas_indice, indice = 1, None
+    for _ in range(5):
+        entradas, pagina = [], n_paginas_indice + 1
+        for numero, (calculo, documento) in enumerate(zip(calculos, documentos), 1):
+            entradas.append({'numero': numero, 'calculo': calculo, 'resultado': _resumo_resultado(calculo), 'pagina': pagina})
+            pagina += len(documento.pages)
+        html_indice = render_to_string('calculos/relatorios_indice_pdf.html', {'entradas': entradas, 'system_config': config})
+        indice = HTML(string=html_indice, base_url=f"{url_base}/").render()
+        if len(indice.pages) == n_paginas_indice:
+            break
+        n_paginas_indice = len(indice.pages)
+
+    paginas = list(indice.pages) + [pagina for documento in documentos for pagina in documento.pages]
+    ficheiro = tempfile.TemporaryFile()
+    indice.copy(paginas).write_pdf(ficheiro)
+    ficheiro.seek(0)
+    return ficheiro
+
+def _pedido_exportacao(request):
+    """Seleção a exportar: (dados, cálculos, configuração, URL base) ou a resposta de erro (400)."""
+    dados = request.POST if request.method == 'POST' else request.GET
+    try:
+        calculos = _calculos_exportacao(dados)
+    except ValueError as e:
+        return HttpResponse(f"Filtros inválidos: {e}", status=400)
+    n_calculos = calculos.count()
+    if not n_calculos:
+        return HttpResponse("Nenhum cálculo corresponde à seleção.", status=400)
+    if dados.get('formato', 'zip') == 'pdf' and n_calculos > MAX_RELATORIOS_PDF_UNICO:
+        return HttpResponse(f"O PDF único está limitado a {MAX_RELATORIOS_PDF_UNICO} cálculos; utilize o formato ZIP.", status=400)
+    if execucao.fila_cheia():
+        return _resposta_ocupado()
+    return dados, calculos, SystemConfiguration.objects.first(), _url_base(request)
+
+def _resposta_zip_relatorios(blocos):
+    response = StreamingHttpResponse(blocos, content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="relatorios.zip"'
+    return response
+
+def exportar_relatorios_view(request):
+    """
+    Relatórios de vários cálculos do histórico num só download (filtros em _calculos_exportacao).
+    formato=zip (por defeito): ZIP em streaming com um PDF por cálculo e um índice CSV;
+    formato=pdf: um só PDF com índice (até MAX_RELATORIOS_PDF_UNICO cálculos).
+    """
+    pedido = _pedido_exportacao(request)
+    if isinstance(pedido, HttpResponse):
+        return pedido
+    dados, calculos, config, url_base = pedido
+    if dados.get('formato', 'zip') == 'pdf':
+        try:
+            ficheiro = _pdf_unico_relatorios(calculos, config, url_base)
+        except execucao.FilaCheia:
+            return _resposta_ocupado()
+        return FileResponse(ficheiro, content_type='application/pdf', filename="relatorios.pdf")
+    return _resposta_zip_relatorios(_zip_relatorios(calculos, config, url_base))
+
+# ==============================================================================
+# VERSÕES ASSÍNCRONAS (ASGI)
+# ==============================================================================
+# Os cálculos, os desenhos e o PDF correm no conjunto limitado de calculos.execucao;
+# a base de dados é acedida pela API assíncrona do ORM e o render (que consulta a
+# configuração do sistema) por sync_to_async. Com a fila cheia devolvem 503.
+
+def _resposta_ocupado():
+    response = HttpResponse("Servidor ocupado com outros cálculos. Tente novamente dentro de instantes.", status=503)
+    response['Retry-After'] = '5'
+    return response
+
+async def _blocos_assincronos(blocos):
+    """
+    Consome um gerador síncrono bloco a bloco (cada next() numa thread), para que o
+    StreamingHttpResponse não o converta numa lista inteira em memória.
+    """
+    proximo = sync_to_async(next)
+    try:
+        while True:
+            bloco = await proximo(blocos, None)
+            if bloco is None:
+                break
+            yield bloco
+    finally:
+        await sync_to_async(blocos.close)()
+
+def _blocos_ficheiro(ficheiro):
+    with ficheiro:
+        yield from iter(lambda: ficheiro.read(_BLOCO_LEITURA), b'')
+
+def _pdf_em_blocos(ficheiro, disposicao):
+    """PDF enviado bloco a bloco (o FileResponse seria lido por inteiro para memória em ASGI)."""
+    response = StreamingHttpResponse(_blocos_assincronos(_blocos_ficheiro(ficheiro)), content_type='application/pdf')
+    response['Content-Length'] = str(os.fstat(ficheiro.fileno()).st_size)
+    response['Content-Disposition'] = disposicao
+    return response
+
+def _resposta_pdf_async(calculo, caminho):
+    return _pdf_em_blocos(open(caminho, 'rb'), f'inline; filename="relatorio_{calculo.elemento.lower()}_{calculo.id}.pdf"')
+
+async def _calculo_view_async(request, elemento, calcular, template):
+    context = {}
+    if request.method == 'POST':
+        context['input_data'] = request.POST
+        try:
+            resultado = await execucao.executar(calcular, request.POST.dict())
+        except execucao.FilaCheia:
+            return _resposta_ocupado()
+        if resultado.get('status') == 'Sucesso':
+            calculo_salvo = _registo_historico(elemento, _input_data_historico(request), resultado)
+            await calculo_salvo.asave()
+            resultado['calculo_id'] = calculo_salvo.id
+        context['resultado'] = resultado
+    return await sync_to_async(render)(request, template, context)
+
+async def viga_view_async(request):
+    return await _calculo_view_async(request, 'Viga', _resultado_viga, 'calculos/viga_dimensionamento.html')
+
+async def pilar_view_async(request):
+    return await _calculo_view_async(request, 'Pilar', _resultado_pilar, 'calculos/pilar_dimensionamento.html')
+
+async def sapata_view_async(request):
+    return await _calculo_view_async(request, 'Sapata', _resultado_sapata, 'calculos/sapata_dimensionamento.html')
+
+async def _calculo_api_async(request, elemento):
+    pedido = _ler_entradas_api(request)
+    if isinstance(pedido, HttpResponse):
+        return pedido
+    entradas, lote = pedido
+    try:
+        resultados, registos = await execucao.executar(
+            _calcular_entradas_api, elemento, entradas,
+            _opcao_api(request, 'passos'), _opcao_api(request, 'desenhos'), _opcao_api(request, 'historico')
+        )
+    except execucao.FilaCheia:
+        return _resposta_ocupado()
+    if registos:
+        calculos = await HistoricoCalculo.objects.abulk_create([registo for _, registo in registos])
+        for (indice, _), calculo in zip(registos, calculos):
+            resultados[indice]['calculo_id'] = calculo.id
+    return _resposta_api(resultados, lote)
+
+@csrf_exempt
+async def viga_api_view_async(request):
+    return await _calculo_api_async(request, 'Viga')
+
+@csrf_exempt
+async def pilar_api_view_async(request):
+    return await _calculo_api_async(request, 'Pilar')
+
+@csrf_exempt
+async def sapata_api_view_async(request):
+    return await _calculo_api_async(request, 'Sapata')
+
+async def pilar_esbelteza_json_view_async(request):
+    dados = request.POST if request.method == 'POST' else request.GET
+    try:
+        estado, corpo = await execucao.executar(_varrimento_esbelteza, dados.dict())
+    except execucao.FilaCheia:
+        return _resposta_ocupado()
+    return JsonResponse(corpo, status=estado)
+
+async def historico_view_async(request):
+    consulta, sentido, erro = _consulta_historico(request.GET)
+    context = _contexto_historico(request.GET, [linha async for linha in consulta], sentido, erro)
+    return await sync_to_async(render)(request, 'calculos/historico.html', context)
+
+async def historico_detalhe_view_async(request, calculo_id):
+    try:
+        calculo = await HistoricoCalculo.objects.aget(id=calculo_id)
+    except HistoricoCalculo.DoesNotExist:
+        return redirect('historico_calculos')
+    try:
+        context = await execucao.executar(_contexto_historico_detalhe, calculo)
+    except execucao.FilaCheia:
+        return _resposta_ocupado()
+    return await sync_to_async(render)(request, 'calculos/historico_detalhe.html', context)
+
+async def historico_delete_view_async(request, calculo_id):
+    await HistoricoCalculo.objects.filter(id=calculo_id).adelete()
+    await sync_to_async(relatorios_service.apagar_relatorios_em_disco, thread_sensitive=False)(calculo_id)
+    return redirect('historico_calculos')
+
+async def gerar_relatorio_pdf_view_async(request, calculo_id):
+    try:
+        calculo = await HistoricoCalculo.objects.aget(id=calculo_id)
+    except HistoricoCalculo.DoesNotExist:
+        return HttpResponse("Cálculo não encontrado.", status=404)
+
+    url_base = _url_base(request)
+    hash_conteudo = relatorios_service.hash_relatorio(calculo, await SystemConfiguration.objects.afirst(), url_base)
+    caminho = relatorios_service.caminho_relatorio_pdf(calculo.id, hash_conteudo)
+    if caminho.exists():
+        return _resposta_pdf_async(calculo, caminho)
+
+    relatorio, _ = await RelatorioPDF.objects.aget_or_create(calculo=calculo, hash_conteudo=hash_conteudo, defaults={'url_base': url_base})
+    estado_anterior = relatorio.estado
+    if relatorios_service.repor_pedido_relatorio(relatorio):
+        await relatorio.asave(update_fields=['estado', 'iniciado_em'])
+    if settings.RELATORIOS_PDF_SINCRONOS:
+        try:
+            processado = await execucao.executar(relatorios_service.processar_relatorio, relatorio)
+        except execucao.FilaCheia:
+            return _resposta_ocupado()
+        if processado and caminho.exists():
+            return _resposta_pdf_async(calculo, caminho)
+    return await sync_to_async(_resposta_relatorio)(request, relatorio, estado_anterior)
+
+async def exportar_relatorios_view_async(request):
+    pedido = await sync_to_async(_pedido_exportacao)(request)
+    if isinstance(pedido, HttpResponse):
+        return pedido
+    dados, calculos, config, url_base = pedido
+    if dados.get('formato', 'zip') == 'pdf':
+        # Os relatórios são renderizados no conjunto partilhado por _pdf_unico_relatorios,
+        # que não pode, por isso, correr ele próprio num trabalhador desse conjunto.
+        try:
+            ficheiro = await sync_to_async(_pdf_unico_relatorios)(calculos, config, url_base)
+        except execucao.FilaCheia:
+            return _resposta_ocupado()
+        return _pdf_em_blocos(ficheiro, 'attachment; filename="relatorios.pdf"')
+    return _resposta_zip_relatorios(_blocos_assincronos(_zip_relatorios(calculos, config, url_base)))
+
+async def estado_relatorio_pdf_view_async(request, calculo_id):
+    try:
+        calculo = await HistoricoCalculo.objects.aget(id=calculo_id)
+    except HistoricoCalculo.DoesNotExist:
+        return JsonResponse({'erro': 'Cálculo não encontrado.'}, status=404)
+    hash_conteudo = relatorios_service.hash_relatorio(calculo, await SystemConfiguration.objects.afirst(), _url_base(request))
+    relatorio = await RelatorioPDF.objects.filter(calculo=calculo, hash_conteudo=hash_conteudo).afirst()
+    return JsonResponse(_estado_relatorio(calculo, relatorio, relatorios_service.caminho_relatorio_pdf(calculo.id, hash_conteudo)))
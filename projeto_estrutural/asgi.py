@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projeto_estrutural.settings')
+# Em ASGI as páginas de cálculo, histórico e relatório usam as views assíncronas.
+os.environ.setdefault('CALCULOS_ASGI', '1')
 
 application = get_asgi_application()
@@ -136,3 +136,24 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Caminho para onde o comando collectstatic irá juntar todos os ficheiros estáticos
 STATIC_ROOT = os.path.join(BASE_DIR, 'static_root')
+
+# Pasta onde são guardados os ábacos de dimensionamento pré-calculados (cache em disco)
+ABACOS_DIR = os.path.join(BASE_DIR, 'cache', 'abacos')
+
+# Pasta dos relatórios PDF gerados em segundo plano (comando processar_relatorios).
+# Com RELATORIOS_PDF_SINCRONOS o pedido gera o PDF de imediato, sem trabalhador; por
+# omissão só em DEBUG (runserver), porque em produção o pedido ficaria à espera do WeasyPrint.
+RELATORIOS_DIR = os.path.join(BASE_DIR, 'cache', 'relatorios')
+RELATORIOS_PDF_SINCRONOS = os.environ.get('RELATORIOS_PDF_SINCRONOS', '1' if DEBUG else '0') == '1'
+# Um pedido em curso há mais do que isto (trabalhador interrompido) volta a ficar pendente.
+RELATORIOS_TEMPO_MAXIMO_S = int(os.environ.get('RELATORIOS_TEMPO_MAXIMO_S', 600))
+# Converte no arranque as fórmulas LaTeX do passo a passo para HTML (cache de calculos/formulas.py).
+CALCULOS_AQUECER_FORMULAS = os.environ.get('CALCULOS_AQUECER_FORMULAS', '1') == '1'
+
+# Execução das views assíncronas (ASGI): os cálculos e os PDF correm num conjunto
+# limitado de trabalhadores ('threads' ou 'processos'); acima de CALCULOS_MAX_PENDENTES
+# tarefas em curso ou em espera, os pedidos recebem 503 em vez de se acumularem.
+CALCULOS_VIEWS_ASSINCRONAS = os.environ.get('CALCULOS_ASGI', '0') == '1'
+CALCULOS_TIPO_POOL = os.environ.get('CALCULOS_TIPO_POOL', 'threads')
+CALCULOS_MAX_WORKERS = int(os.environ.get('CALCULOS_MAX_WORKERS', min(4, os.cpu_count() or 1)))
+CALCULOS_MAX_PENDENTES = int(os.environ.get('CALCULOS_MAX_PENDENTES', 32))